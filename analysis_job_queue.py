@@ -0,0 +1,782 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+重い分析のバックグラウンドジョブキュー
+
+- Mind Reader・ブループリント・MECE 抽出・離職リスクなどの分析は数分かかるが、
+  これまで Dash のコールバック (= gunicorn ワーカーのリクエストスレッド) の中で
+  同期実行しており、その間ワーカーが 1 つ塞がっていた。
+- コールバックは ``submit`` でジョブを投入して ID を受け取り、``dcc.Interval`` で
+  ``status`` をポーリングし、完了したら ``result`` で結果を取る。
+- ジョブ表はディスク上の SQLite (``jobs.sqlite3``) に置く。同じホストの複数の
+  gunicorn ワーカーが同じ表を共有し、同時実行数 ``max_workers`` はインスタンス全体で
+  守られる。再起動後も投入済みのジョブは残り、実行中だったジョブは interrupted になる。
+- 各ジョブは ``python -m analysis_job_queue`` の子プロセスで実行する (Web プロセスの
+  fork や、__main__ (dash_app) を読み直す spawn を避ける)。
+    - キャンセル: 子プロセスを terminate する (別ワーカーからの要求は表経由で伝える)
+    - 資源制限: 経過時間 (親が監視)、アドレス空間と CPU 時間 (POSIX の setrlimit)、
+      nice 値
+- 結果は入力ハッシュ (ジョブ種別 + 引数 + 入力ファイルのサイズ・mtime) ごとに
+  ``results/<hash>.pkl`` へ保存する。同じ入力の再投入はキャッシュ済み結果を返し、
+  実行中・待機中の同じ入力のジョブには相乗りする。
+- 相乗りしたセッションはジョブ所有者表 (``job_owners``) に記録する。``cancel_owner`` は
+  そのセッションを所有者から外すだけで、最後の所有者が抜けたときにだけジョブを止める。
+- ジョブディレクトリは実行ユーザー専用 (0700) に作り、所有者と権限を確かめてから使う。
+  結果の読み込みは制限付き unpickle (``safe_pickle_loads``) で行う。
+"""
+
+import hashlib
+import importlib
+import json
+import logging
+import os
+import pickle
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from byte_budget_cache import ByteBudgetCache, shared_cache
+
+try:
+    import resource
+    _HAS_RESOURCE = True
+except ImportError:  # Windows
+    _HAS_RESOURCE = False
+
+log = logging.getLogger(__name__)
+
+
+def _default_job_dir() -> Path:
+    # 共有の一時ディレクトリでは他ユーザーと衝突・改ざんされないようユーザーごとに分ける
+    user = os.getuid() if hasattr(os, "getuid") else (os.environ.get("USERNAME") or "user")
+    return Path(tempfile.gettempdir()) / f"shift_suite_jobs-{user}"
+
+
+DEFAULT_JOB_DIR = Path(os.environ.get("SHIFT_SUITE_JOB_DIR") or _default_job_dir())
+DEFAULT_MAX_WORKERS = int(os.environ.get("SHIFT_SUITE_JOB_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+DEFAULT_TIMEOUT_S = float(os.environ.get("SHIFT_SUITE_JOB_TIMEOUT", "900"))
+DEFAULT_MEMORY_MB = int(os.environ.get("SHIFT_SUITE_JOB_MEMORY_MB", "4096"))
+RESULT_NAMESPACE = "jobs:results"
+# 結果の unpickle で numpy / pandas に加えて許すモジュール
+RESULT_PICKLE_MODULES = ("shift_suite", "sklearn")
+_POLL_S = 0.25
+_RECOVER_S = 30.0
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+INTERRUPTED = "interrupted"
+TERMINAL = frozenset({DONE, FAILED, CANCELLED, INTERRUPTED})
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    input_hash TEXT NOT NULL,
+    inputs TEXT NOT NULL,
+    limits TEXT NOT NULL,
+    status TEXT NOT NULL,
+    owner TEXT,
+    worker TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    cached INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_hash ON jobs (input_hash, status);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+CREATE TABLE IF NOT EXISTS job_owners (
+    job_id TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    PRIMARY KEY (job_id, owner)
+);
+CREATE INDEX IF NOT EXISTS job_owners_owner ON job_owners (owner);
+"""
+# 所有者なしで投入されたジョブ (バッチ処理など) の所有者。セッションの離脱では外れない
+_ANONYMOUS_OWNER = ""
+
+
+# ─────────────────────────── ジョブ種別 ───────────────────────────
+def _read_long_df(long_df_path: str):
+    from shift_suite.tasks.artifact_store import read_artifact
+
+    return read_artifact(long_df_path)
+
+
+def _mind_reader_job(long_df_path: str) -> Dict[str, Any]:
+    from shift_suite.tasks.shift_mind_reader import ShiftMindReader
+
+    return ShiftMindReader().read_creator_mind(_read_long_df(long_df_path))
+
+
+def _mind_reader_lite_job(long_df_path: str) -> Dict[str, Any]:
+    from shift_suite.tasks.shift_mind_reader_lite import ShiftMindReaderLite
+
+    return ShiftMindReaderLite().read_creator_mind(_read_long_df(long_df_path))
+
+
+def _blueprint_job(long_df_path: str) -> Dict[str, Any]:
+    from shift_suite.tasks.blueprint_integrated_system import BlueprintIntegratedConstraintSystem
+
+    return BlueprintIntegratedConstraintSystem().execute_blueprint_analysis(_read_long_df(long_df_path))
+
+
+def _mece_job(long_df_path: str) -> Dict[str, Any]:
+    from shift_suite.tasks.mece_fact_extractor import MECEFactExtractor
+
+    return MECEFactExtractor().extract_axis1_facility_rules(_read_long_df(long_df_path))
+
+
+def _turnover_job(long_df_path: str):
+    from shift_suite.tasks.improved_turnover_predictor import analyze_turnover_risk
+
+    return analyze_turnover_risk(_read_long_df(long_df_path))
+
+
+# 種別 → "モジュール:関数"。子プロセスで import して呼ぶ
+JOB_KINDS: Dict[str, str] = {
+    "mind_reader": f"{__name__}:_mind_reader_job",
+    "mind_reader_lite": f"{__name__}:_mind_reader_lite_job",
+    "blueprint": f"{__name__}:_blueprint_job",
+    "mece": f"{__name__}:_mece_job",
+    "turnover": f"{__name__}:_turnover_job",
+}
+
+
+def register_job_kind(kind: str, target: str) -> None:
+    """ジョブ種別を登録する。``target`` は子プロセスから import できる "モジュール:関数" """
+    if ":" not in target:
+        raise ValueError(f"target must be 'module:function': {target!r}")
+    JOB_KINDS[kind] = target
+
+
+# ─────────────────────────── データ型 ───────────────────────────
+@dataclass
+class JobLimits:
+    """ジョブ 1 件の資源制限 (None は無制限)"""
+
+    timeout_s: Optional[float] = DEFAULT_TIMEOUT_S
+    memory_mb: Optional[int] = DEFAULT_MEMORY_MB
+    cpu_s: Optional[int] = None
+    nice: int = 10
+
+
+@dataclass
+class JobRecord:
+    job_id: str
+    kind: str
+    input_hash: str
+    status: str
+    owner: Optional[str] = None
+    cached: bool = False
+    created: float = 0.0
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    error: Optional[str] = None
+    cancel_requested: bool = False
+    inputs: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL
+
+    @property
+    def elapsed(self) -> Optional[float]:
+        if self.started is None:
+            return None
+        return (self.finished or time.time()) - self.started
+
+    def handle(self) -> Dict[str, Any]:
+        """dcc.Store に載せる小さな辞書"""
+        return {"job_id": self.job_id, "kind": self.kind, "status": self.status}
+
+
+def _canonical(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def _file_version(path: Path) -> Optional[str]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return f"{st.st_size:x}-{st.st_mtime_ns:x}"
+
+
+def input_hash(kind: str, inputs: Dict[str, Any]) -> str:
+    """種別 + 引数 + 引数が指すファイルのバージョン"""
+    versions = {}
+    for name, value in sorted(inputs.items()):
+        if isinstance(value, (str, Path)) and name.endswith("_path"):
+            versions[name] = _file_version(Path(value))
+    payload = _canonical([kind, inputs, versions])
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+# ─────────────────────────── 子プロセス ───────────────────────────
+def _apply_limits(limits: JobLimits) -> None:
+    if limits.nice and hasattr(os, "nice"):
+        try:
+            os.nice(limits.nice)
+        except OSError:
+            pass
+    if not _HAS_RESOURCE:
+        return
+    if limits.memory_mb:
+        nbytes = int(limits.memory_mb) * 1024 * 1024
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (nbytes, nbytes))
+        except (ValueError, OSError) as e:
+            log.debug(f"[jobs] RLIMIT_AS not applied: {e}")
+    if limits.cpu_s:
+        try:
+            resource.setrlimit(resource.RLIMIT_CPU, (int(limits.cpu_s), int(limits.cpu_s) + 5))
+        except (ValueError, OSError) as e:
+            log.debug(f"[jobs] RLIMIT_CPU not applied: {e}")
+
+
+def _resolve_target(target: str) -> Callable[..., Any]:
+    module, _, name = target.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def _private_dir(path: Path) -> None:
+    """実行ユーザー専用 (0700) のディレクトリを用意する。他人の物・シンボリックリンクは拒否"""
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    st = path.lstat()
+    if os.path.islink(path) or not os.path.isdir(path):
+        raise PermissionError(f"job directory is not a plain directory: {path}")
+    if hasattr(os, "getuid"):
+        if st.st_uid != os.getuid():
+            raise PermissionError(f"job directory is owned by another user: {path}")
+        if st.st_mode & 0o077:
+            os.chmod(path, 0o700)
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _job_main(target: str, inputs: Dict[str, Any], result_path: str, error_path: str, limits: JobLimits) -> int:
+    """子プロセスの本体。結果は pickle、例外はトレースバックをファイルに書く"""
+    _apply_limits(limits)
+    try:
+        result = _resolve_target(target)(**inputs)
+        _atomic_write(Path(result_path), pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+        return 0
+    except BaseException as e:  # noqa: BLE001  MemoryError も報告する
+        message = f"{type(e).__name__}: {e}\n{traceback.format_exc(limit=20)}"
+        try:
+            _atomic_write(Path(error_path), message.encode("utf-8"))
+        except OSError:
+            pass
+        return 1
+
+
+def _child_env() -> Dict[str, str]:
+    """親と同じ import パスで子を起動する"""
+    env = dict(os.environ)
+    paths = [str(Path(__file__).resolve().parent)] + [p for p in sys.path if p and os.path.isdir(p)]
+    env["PYTHONPATH"] = os.pathsep.join(dict.fromkeys(paths))
+    return env
+
+
+# ─────────────────────────── キュー ───────────────────────────
+class AnalysisJobQueue:
+    """SQLite のジョブ表 + 子プロセスで実行するローカルジョブキュー"""
+
+    def __init__(
+        self,
+        job_dir: Path = DEFAULT_JOB_DIR,
+        *,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        default_limits: Optional[JobLimits] = None,
+        cache: ByteBudgetCache = shared_cache,
+    ):
+        self.job_dir = Path(job_dir)
+        self.results_dir = self.job_dir / "results"
+        self.db_path = self.job_dir / "jobs.sqlite3"
+        self.max_workers = max(1, int(max_workers))
+        self.default_limits = default_limits or JobLimits()
+        self.cache = cache
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._procs: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._ready = False
+
+    # ---- 表 ------------------------------------------------------------------
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _ensure_ready(self) -> None:
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            _private_dir(self.job_dir)
+            _private_dir(self.results_dir)
+            conn = self._connect()
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+                # 所有者表より前に作られたジョブは jobs.owner を所有者として引き継ぐ
+                conn.execute(
+                    "INSERT OR IGNORE INTO job_owners (job_id, owner) "
+                    "SELECT job_id, COALESCE(owner, ?) FROM jobs",
+                    (_ANONYMOUS_OWNER,),
+                )
+            finally:
+                conn.close()
+            self._recover_stale()
+            self._ready = True
+
+    def _recover_stale(self) -> None:
+        """同じホストで実行プロセスが居なくなった running ジョブを interrupted にする"""
+        host = socket.gethostname()
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT job_id, worker FROM jobs WHERE status = ?", (RUNNING,)).fetchall()
+            for row in rows:
+                worker_host, _, pid = (row["worker"] or "").rpartition(":")
+                if worker_host != host or not pid.isdigit():
+                    continue
+                if int(pid) == os.getpid():
+                    if row["job_id"] in self._procs:
+                        continue
+                elif _pid_alive(int(pid)):
+                    continue
+                conn.execute(
+                    "UPDATE jobs SET status = ?, finished = ?, error = ? WHERE job_id = ? AND status = ?",
+                    (INTERRUPTED, time.time(), "worker process exited", row["job_id"], RUNNING),
+                )
+                log.info(f"[jobs] {row['job_id']} marked interrupted")
+        finally:
+            conn.close()
+
+    def _row(self, conn: sqlite3.Connection, job_id: str) -> Optional[JobRecord]:
+        row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return None if row is None else _record(row)
+
+    def result_path(self, digest: str) -> Path:
+        return self.results_dir / f"{digest}.pkl"
+
+    # ---- 投入 ----------------------------------------------------------------
+    def submit(
+        self,
+        kind: str,
+        inputs: Optional[Dict[str, Any]] = None,
+        *,
+        owner: Optional[str] = None,
+        limits: Optional[JobLimits] = None,
+        force: bool = False,
+    ) -> JobRecord:
+        """
+        ジョブを投入してレコードを返す。同じ入力の結果が保存済みなら完了状態の
+        レコード (cached=True) を、同じ入力のジョブが待機・実行中ならそのレコードを返す。
+        相乗りした場合も ``owner`` をそのジョブの所有者に加える。
+        ``force=True`` は保存済み結果を使わずに再計算する。
+        """
+        if kind not in JOB_KINDS:
+            raise KeyError(f"unknown job kind: {kind}")
+        self._ensure_ready()
+        inputs = dict(inputs or {})
+        digest = input_hash(kind, inputs)
+        limits = limits or self.default_limits
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                active = conn.execute(
+                    "SELECT * FROM jobs WHERE input_hash = ? AND status IN (?, ?) AND cancel_requested = 0 "
+                    "ORDER BY created LIMIT 1",
+                    (digest, QUEUED, RUNNING),
+                ).fetchone()
+                if active is not None:
+                    conn.execute(
+                        "INSERT OR IGNORE INTO job_owners (job_id, owner) VALUES (?, ?)",
+                        (active["job_id"], owner or _ANONYMOUS_OWNER),
+                    )
+                    conn.execute("COMMIT")
+                    return _record(active)
+                cached = not force and self.result_path(digest).exists()
+                job_id = uuid.uuid4().hex[:16]
+                conn.execute(
+                    "INSERT INTO jobs (job_id, kind, input_hash, inputs, limits, status, owner, cached, "
+                    "created, started, finished) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        job_id, kind, digest, _canonical(inputs), _canonical(asdict(limits)),
+                        DONE if cached else QUEUED, owner, int(cached), now,
+                        now if cached else None, now if cached else None,
+                    ),
+                )
+                conn.execute(
+                    "INSERT INTO job_owners (job_id, owner) VALUES (?, ?)", (job_id, owner or _ANONYMOUS_OWNER)
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            record = self._row(conn, job_id)
+        finally:
+            conn.close()
+        if not cached:
+            log.info(f"[jobs] queued {kind} {job_id} ({digest[:8]})")
+            self._start_dispatcher()
+            self._wake.set()
+        return record
+
+    # ---- 参照・取り消し --------------------------------------------------------
+    def status(self, job_id: Optional[str]) -> Optional[JobRecord]:
+        if not job_id:
+            return None
+        self._ensure_ready()
+        conn = self._connect()
+        try:
+            return self._row(conn, job_id)
+        finally:
+            conn.close()
+
+    def jobs(self, *, owner: Optional[str] = None, limit: int = 50) -> List[JobRecord]:
+        self._ensure_ready()
+        conn = self._connect()
+        try:
+            if owner is None:
+                rows = conn.execute("SELECT * FROM jobs ORDER BY created DESC LIMIT ?", (limit,)).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT jobs.* FROM jobs JOIN job_owners USING (job_id) WHERE job_owners.owner = ? "
+                    "ORDER BY created DESC LIMIT ?",
+                    (owner, limit),
+                ).fetchall()
+            return [_record(r) for r in rows]
+        finally:
+            conn.close()
+
+    def result(self, job_id: Optional[str], default: Any = None) -> Any:
+        """完了したジョブの結果 (入力ハッシュ単位でメモリにも保持する)"""
+        record = self.status(job_id)
+        if record is None or record.status != DONE:
+            return default
+        sentinel = object()
+        value = self.cache.get(RESULT_NAMESPACE, record.input_hash, sentinel)
+        if value is not sentinel:
+            return value
+        from shift_suite.tasks.utils import safe_pickle_loads
+
+        path = self.result_path(record.input_hash)
+        try:
+            value = safe_pickle_loads(path.read_bytes(), allowed_modules=RESULT_PICKLE_MODULES)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+            log.warning(f"[jobs] result of {job_id} unavailable: {e}")
+            return default
+        self.cache.set(RESULT_NAMESPACE, record.input_hash, value)
+        return value
+
+    def cancel(self, job_id: Optional[str], *, owner: Optional[str] = None) -> bool:
+        """
+        待機中なら即取り消し、実行中なら実行ワーカーに停止を要求する。
+        ``owner`` を指定すると所有者から外し、他の所有者が残っていれば止めずに False を返す。
+        """
+        if not job_id:
+            return False
+        self._ensure_ready()
+        conn = self._connect()
+        try:
+            if owner is not None:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.execute("DELETE FROM job_owners WHERE job_id = ? AND owner = ?", (job_id, owner))
+                    remaining = conn.execute(
+                        "SELECT COUNT(*) FROM job_owners WHERE job_id = ?", (job_id,)
+                    ).fetchone()[0]
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                if remaining:
+                    return False
+            cur = conn.execute(
+                "UPDATE jobs SET status = ?, finished = ?, cancel_requested = 1 WHERE job_id = ? AND status = ?",
+                (CANCELLED, time.time(), job_id, QUEUED),
+            )
+            if cur.rowcount:
+                return True
+            cur = conn.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE job_id = ? AND status = ?", (job_id, RUNNING)
+            )
+        finally:
+            conn.close()
+        self._wake.set()
+        return bool(cur.rowcount)
+
+    def cancel_owner(self, owner: str) -> int:
+        """
+        ``owner`` (セッションなど) を未完了ジョブの所有者から外し、
+        ほかに所有者が居なくなったジョブを取り消す。取り消した件数を返す
+        """
+        if not owner or not self.db_path.exists():
+            return 0
+        self._ensure_ready()
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT jobs.job_id FROM jobs JOIN job_owners USING (job_id) "
+                "WHERE job_owners.owner = ? AND jobs.status IN (?, ?)",
+                (owner, QUEUED, RUNNING),
+            ).fetchall()
+        finally:
+            conn.close()
+        return sum(self.cancel(r[0], owner=owner) for r in rows)
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[JobRecord]:
+        """ジョブの終了を待つ (バッチ処理・テスト用。コールバックでは使わない)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            record = self.status(job_id)
+            if record is None or record.done:
+                return record
+            if deadline is not None and time.monotonic() >= deadline:
+                return record
+            time.sleep(_POLL_S)
+
+    def purge(self, max_age_s: float = 7 * 24 * 3600) -> int:
+        """古い終了済みジョブと、どのジョブからも参照されない結果ファイルを消す"""
+        self._ensure_ready()
+        cutoff = time.time() - max_age_s
+        conn = self._connect()
+        try:
+            placeholders = ",".join("?" * len(TERMINAL))
+            cur = conn.execute(
+                f"DELETE FROM jobs WHERE status IN ({placeholders}) AND finished < ?", (*TERMINAL, cutoff)
+            )
+            removed = cur.rowcount
+            conn.execute("DELETE FROM job_owners WHERE job_id NOT IN (SELECT job_id FROM jobs)")
+            live = {r[0] for r in conn.execute("SELECT DISTINCT input_hash FROM jobs")}
+        finally:
+            conn.close()
+        for path in self.results_dir.glob("*.pkl"):
+            if path.stem not in live:
+                path.unlink(missing_ok=True)
+                self.cache.pop(RESULT_NAMESPACE, path.stem)
+        return removed
+
+    # ---- ディスパッチャ --------------------------------------------------------
+    def _start_dispatcher(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._dispatch_loop, name="analysis-job-dispatcher", daemon=True)
+            self._thread.start()
+
+    def shutdown(self, *, cancel_running: bool = True) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if cancel_running:
+            for job_id in list(self._procs):
+                self._finish(job_id, INTERRUPTED, "queue shut down", terminate=True)
+
+    def _dispatch_loop(self) -> None:
+        last_recover = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self._reap()
+                if time.monotonic() - last_recover > _RECOVER_S:
+                    # 他のワーカーが落ちて running のまま残ったジョブが枠を塞がないように
+                    self._recover_stale()
+                    last_recover = time.monotonic()
+                self._claim()
+            except Exception as e:  # noqa: BLE001  ディスパッチャは止めない
+                log.warning(f"[jobs] dispatcher error: {e}")
+            self._wake.wait(_POLL_S)
+            self._wake.clear()
+
+    def _claim(self) -> None:
+        """インスタンス全体の実行数が max_workers 未満なら待機ジョブを 1 件ずつ取る"""
+        while not self._stop.is_set():
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                running = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (RUNNING,)).fetchone()[0]
+                row = None
+                if running < self.max_workers:
+                    row = conn.execute(
+                        "SELECT * FROM jobs WHERE status = ? ORDER BY created LIMIT 1", (QUEUED,)
+                    ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return
+                conn.execute(
+                    "UPDATE jobs SET status = ?, worker = ?, started = ? WHERE job_id = ?",
+                    (RUNNING, self.worker_id, time.time(), row["job_id"]),
+                )
+                conn.execute("COMMIT")
+            finally:
+                conn.close()
+            self._launch(_record(row), json.loads(row["limits"]))
+
+    def _launch(self, record: JobRecord, limits: Dict[str, Any]) -> None:
+        limits = JobLimits(**limits)
+        result_path = self.result_path(record.input_hash)
+        error_path = self.results_dir / f"{record.job_id}.err"
+        spec = {
+            "target": JOB_KINDS[record.kind],
+            "inputs": record.inputs,
+            "result_path": str(result_path),
+            "error_path": str(error_path),
+            "limits": asdict(limits),
+        }
+        try:
+            proc = subprocess.Popen(
+                [sys.executable, "-m", "analysis_job_queue", _canonical(spec)],
+                env=_child_env(),
+                stdin=subprocess.DEVNULL,
+            )
+        except Exception as e:  # noqa: BLE001
+            self._finish(record.job_id, FAILED, f"failed to start: {e}")
+            return
+        with self._lock:
+            self._procs[record.job_id] = (proc, time.monotonic(), limits, error_path)
+        log.info(f"[jobs] started {record.kind} {record.job_id} pid={proc.pid}")
+
+    def _reap(self) -> None:
+        if not self._procs:
+            return
+        conn = self._connect()
+        try:
+            placeholders = ",".join("?" * len(self._procs))
+            cancelled = {
+                r[0]
+                for r in conn.execute(
+                    f"SELECT job_id FROM jobs WHERE cancel_requested = 1 AND job_id IN ({placeholders})",
+                    tuple(self._procs),
+                )
+            }
+        finally:
+            conn.close()
+        for job_id, (proc, started, limits, error_path) in list(self._procs.items()):
+            if job_id in cancelled:
+                self._finish(job_id, CANCELLED, "cancelled", terminate=True)
+            elif proc.poll() is not None:
+                if proc.returncode == 0:
+                    self._finish(job_id, DONE, None)
+                else:
+                    try:
+                        error = error_path.read_text(encoding="utf-8")
+                        error_path.unlink(missing_ok=True)
+                    except OSError:
+                        error = f"exit code {proc.returncode} (resource limit or crash)"
+                    self._finish(job_id, FAILED, error)
+            elif limits.timeout_s and time.monotonic() - started > limits.timeout_s:
+                self._finish(job_id, FAILED, f"timed out after {limits.timeout_s:.0f}s", terminate=True)
+
+    def _finish(self, job_id: str, status: str, error: Optional[str], *, terminate: bool = False) -> None:
+        with self._lock:
+            entry = self._procs.pop(job_id, None)
+        if entry is not None:
+            proc = entry[0]
+            if terminate and proc.poll() is None:
+                proc.terminate()
+                try:
+                    proc.wait(5)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                    proc.wait(5)
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished = ?, error = ? WHERE job_id = ?",
+                (status, time.time(), error, job_id),
+            )
+        finally:
+            conn.close()
+        log.info(f"[jobs] {job_id} {status}" + (f": {error.splitlines()[0]}" if error else ""))
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _record(row: sqlite3.Row) -> JobRecord:
+    return JobRecord(
+        job_id=row["job_id"],
+        kind=row["kind"],
+        input_hash=row["input_hash"],
+        status=row["status"],
+        owner=row["owner"],
+        cached=bool(row["cached"]),
+        created=row["created"],
+        started=row["started"],
+        finished=row["finished"],
+        error=row["error"],
+        cancel_requested=bool(row["cancel_requested"]),
+        inputs=json.loads(row["inputs"]),
+    )
+
+
+# プロセス全体で共有するインスタンス
+job_queue = AnalysisJobQueue()
+
+
+def submit_job(kind: str, inputs: Optional[Dict[str, Any]] = None, **kwargs: Any) -> JobRecord:
+    return job_queue.submit(kind, inputs, **kwargs)
+
+
+def job_status(job_id: Optional[str]) -> Optional[JobRecord]:
+    return job_queue.status(job_id)
+
+
+def job_result(job_id: Optional[str], default: Any = None) -> Any:
+    return job_queue.result(job_id, default)
+
+
+def cancel_job(job_id: Optional[str], *, owner: Optional[str] = None) -> bool:
+    return job_queue.cancel(job_id, owner=owner)
+
+
+def cancel_owner_jobs(owner: str) -> int:
+    return job_queue.cancel_owner(owner)
+
+
+if __name__ == "__main__":
+    # 子プロセス: python -m analysis_job_queue '<spec json>'
+    _spec = json.loads(sys.argv[1])
+    sys.exit(
+        _job_main(
+            _spec["target"],
+            _spec["inputs"],
+            _spec["result_path"],
+            _spec["error_path"],
+            JobLimits(**_spec["limits"]),
+        )
+    )
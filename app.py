@@ -94,6 +94,7 @@ from shift_suite.tasks.utils import (
     _valid_df,
     date_with_weekday,
 )
+from shift_suite.tasks.workbook_cache import open_workbook
 
 # 🎯 統一分析結果管理システム
 try:
@@ -142,6 +143,9 @@ except ImportError:
     _HAS_ANOMALY = False
     def detect_anomaly(*args, **kwargs):
         return {"error": "Anomaly detection not available due to sklearn dependency issues"}
+from shift_suite.tasks.artifact_store import pack_scenario_artifacts
+from shift_suite.tasks.heatmap_pyramid import downsample_heatmap
+from shift_suite.tasks.scenario_manifest import write_scenario_manifest
 from shift_suite.tasks.build_stats import build_stats
 # Clustering import with fallback for sklearn issues
 try:
@@ -170,7 +174,7 @@ from shift_suite.tasks.leave_analyzer import (
     LEAVE_TYPE_REQUESTED,
     LEAVE_TYPE_OTHER,
 )
-# from shift_suite.tasks.rl import learn_roster  # Temporarily disabled due to gymnasium dependency
+from shift_suite.tasks.rl import learn_roster
 from shift_suite.tasks.shortage import (
     merge_shortage_leave,
     shortage_and_brief,
@@ -941,7 +945,7 @@ def estimate_date_range_from_excel(excel_path: Path, sheet_name: str, header_row
     """📅 Excelファイルから参照期間を自動推定"""
     try:
         # ヘッダー行を読み込んで日付列を検出
-        df_header = pd.read_excel(excel_path, sheet_name=sheet_name, header=header_row, nrows=1)
+        df_header = open_workbook(excel_path).read_sheet(sheet_name, header=header_row, nrows=1)
         
         date_columns = []
         for col in df_header.columns:
@@ -990,7 +994,7 @@ def run_import_wizard() -> None:
         default_excel = os.getenv("SHIFT_SUITE_DEFAULT_EXCEL")
         if default_excel and not st.session_state.get("wizard_excel_path"):
             try:
-                xls = pd.ExcelFile(default_excel)
+                xls = open_workbook(default_excel)
             except Exception as e:  # noqa: BLE001
                 log_and_display_error(
                     "Excel\u30d5\u30a1\u30a4\u30eb\u306e\u81ea\u52d5\u8aad\u307f\u8fbc\u307f\u306b\u5931\u6557\u3057\u307e\u3057\u305f",
@@ -1013,7 +1017,7 @@ def run_import_wizard() -> None:
                 st.session_state.wizard_excel_path = str(path)
                 st.session_state.wizard_file_size = uploaded.size
                 st.session_state.work_root_path_str = str(tmp)
-                xls = pd.ExcelFile(path)
+                xls = open_workbook(path)
                 st.session_state.wizard_sheet_names = xls.sheet_names
         if st.session_state.wizard_excel_path:
             master = st.selectbox(
@@ -1053,12 +1057,8 @@ def run_import_wizard() -> None:
             data_start = st.number_input(
                 "データ開始行番号", 1, 20, value=3, key=f"data_{sheet}", help="データが開始される行番号"
             )
-            df_prev = pd.read_excel(
-                st.session_state.wizard_excel_path,
-                sheet_name=sheet,
-                header=int(hdr) - 1,
-                nrows=10,
-            )
+            workbook = open_workbook(st.session_state.wizard_excel_path)
+            df_prev = workbook.read_sheet(sheet, header=int(hdr) - 1, nrows=10)
             st.dataframe(df_prev, use_container_width=True)
             
             # 📅 参照期間の自動推定を実行
@@ -1079,16 +1079,7 @@ def run_import_wizard() -> None:
             if rc is not None:
                 r, c = rc
                 try:
-                    cell_df = pd.read_excel(
-                        st.session_state.wizard_excel_path,
-                        sheet_name=sheet,
-                        header=None,
-                        skiprows=r,
-                        nrows=1,
-                        usecols=[c],
-                        dtype=str,
-                    )
-                    ym_text = str(cell_df.iloc[0, 0])
+                    ym_text = workbook.cell_text(sheet, r, c)
                 except Exception as e:
                     pass
             st.caption(f"抽出年月: {ym_text}")
@@ -1108,11 +1099,8 @@ def run_import_wizard() -> None:
         hdr = st.session_state.get(
             f"hdr_{first}", st.session_state.get("header_row_input_widget", 1)
         )
-        df_cols = pd.read_excel(
-            st.session_state.wizard_excel_path,
-            sheet_name=first,
-            header=int(hdr) - 1,
-            nrows=1,
+        df_cols = open_workbook(st.session_state.wizard_excel_path).read_sheet(
+            first, header=int(hdr) - 1, nrows=1
         )
         cols = list(df_cols.columns)
         guessed: dict[str, str] = {}
@@ -1241,10 +1229,16 @@ def prepare_heatmap_display_data(df_heat: pd.DataFrame, mode: str) -> pd.DataFra
 def optimize_large_heatmap_display(
     df: pd.DataFrame, max_cells: int = 10000
 ) -> pd.DataFrame:
-    """Optimize large heatmap display by intelligent sampling."""
+    """Aggregate large heatmaps to a coarser pyramid level (peak-preserving max)."""
     if df.empty or df.shape[0] * df.shape[1] <= max_cells:
         return df
 
+    level, display_df = downsample_heatmap(df, max_cells=max_cells)
+    if level:
+        log.info("heatmap display aggregated to %s %s", level, display_df.shape)
+        return display_df
+
+    # 日付列が無い表はピラミッドにできないため従来どおり間引く
     sample_step_rows = max(1, len(df) // 100)
     sample_step_cols = max(1, len(df.columns) // 50)
     return df.iloc[::sample_step_rows, ::sample_step_cols]
@@ -1976,9 +1970,8 @@ if (
         first_file_path = next(iter(st.session_state.uploaded_files_info.values()))[
             "path"
         ]
-        preview_df_sidebar = pd.read_excel(
-            first_file_path,
-            sheet_name=st.session_state.shift_sheets_multiselect_widget[0],
+        preview_df_sidebar = open_workbook(first_file_path).read_sheet(
+            st.session_state.shift_sheets_multiselect_widget[0],
             nrows=5,
             header=None,
         )
@@ -2162,9 +2155,8 @@ if run_button_clicked:
                 update_progress_exec_run("File Preview (first 8 rows)")
                 st.subheader(_("File Preview (first 8 rows)"))
                 try:
-                    preview_df_exec_run = pd.read_excel(
-                        excel_path_to_use,
-                        sheet_name=param_selected_sheets[0],
+                    preview_df_exec_run = open_workbook(excel_path_to_use).read_sheet(
+                        param_selected_sheets[0],
                         header=None,
                         nrows=8,
                     )
@@ -2391,7 +2383,7 @@ if run_button_clicked:
 
                 try:
                     update_progress_exec_run("Heatmap: Generating heatmap...")
-                    build_heatmap(
+                    heatmap_result_exec_run = build_heatmap(
                         long_df,
                         scenario_out_dir,
                         param_slot,
@@ -2404,11 +2396,16 @@ if run_button_clicked:
                         need_remove_outliers=param_need_remove_outliers,
                         upper_calc_method=param_upper_method,
                         upper_calc_param=param_upper_param,
+                        return_result=True,
                     )
                     if _("基準乖離分析") in param_ext_opts and param_need_calc_method == _(
                         "人員配置基準に基づき設定する"
                     ):
-                        heat_all_df = pd.read_parquet(scenario_out_dir / "heat_ALL.parquet")
+                        heat_all_df = (
+                            heatmap_result_exec_run.heat_all
+                            if heatmap_result_exec_run is not None
+                            else pd.read_parquet(scenario_out_dir / "heat_ALL.parquet")
+                        )
                         gap_results = analyze_standards_gap(heat_all_df, param_need_manual)
                         st.session_state.gap_analysis_results = gap_results
                         gap_results["gap_summary"].to_excel(
@@ -2435,6 +2432,7 @@ if run_button_clicked:
                         wage_direct=param_wage_direct,
                         wage_temp=param_wage_temp,
                         penalty_per_lack=param_penalty_lack,
+                        heatmap_result=heatmap_result_exec_run,
                     )
                     
                     # 🎯 統一分析管理システムによる不足分析結果保存
@@ -3182,21 +3180,16 @@ if run_button_clicked:
                                 scenario_out_dir / "demand_series.csv"
                             )
                             rl_roster_xls_exec_run_rl = scenario_out_dir / "rl_roster.xlsx"
-                            model_zip_rl = scenario_out_dir / "ppo_model.zip"
-                            fc_xls = scenario_out_dir / "forecast.xlsx"
-                            shortage_xlsx = scenario_out_dir / "shortage_time.xlsx"
                             if demand_csv_rl_exec_run_rl.exists():
-                                # learn_roster temporarily disabled due to gymnasium dependency
-                                # learn_roster(
-                                #     demand_csv_rl_exec_run_rl,
-                                #     rl_roster_xls_exec_run_rl,
-                                #     forecast_csv=fc_xls if fc_xls.exists() else None,
-                                #     shortage_csv=shortage_xlsx
-                                #     if shortage_xlsx.exists()
-                                #     else None,
-                                #     model_path=model_zip_rl,
-                                # )
-                                pass
+                                learn_roster(
+                                    demand_csv_rl_exec_run_rl,
+                                    rl_roster_xls_exec_run_rl,
+                                    long_df=long_df,
+                                    wt_df=wt_df,
+                                    need_per_date_slot=scenario_out_dir
+                                    / "need_per_date_slot.parquet",
+                                    slot_minutes=param_slot,
+                                )
                             else:
                                 st.warning(
                                     _("RL Roster")
@@ -3382,6 +3375,17 @@ if run_button_clicked:
                 except Exception as e_cost:
                     log.warning(f"daily cost calculation failed: {e_cost}")
 
+            # --- シナリオ概要マニフェストと Dash ワーカー共有用の Arrow バンドル ---
+            for scenario_dir_pack in st.session_state.get("current_scenario_dirs", {}).values():
+                try:
+                    write_scenario_manifest(scenario_dir_pack)
+                except Exception as e_manifest:
+                    log.warning(f"scenario manifest failed for {scenario_dir_pack}: {e_manifest}")
+                try:
+                    pack_scenario_artifacts(scenario_dir_pack)
+                except Exception as e_pack:
+                    log.warning(f"artifact packing failed for {scenario_dir_pack}: {e_pack}")
+
             progress_bar_val.progress(100)
             progress_text_area.success("✨ 全工程完了！")
             st.balloons()
@@ -3697,11 +3701,9 @@ if run_button_clicked:
                                 enable_early_warning=True
                             )
                             
-                            # 特徴量抽出と予測
+                            # 特徴量抽出と予測（登録済みモデルを再利用し、ドリフト時のみ再学習）
                             features_df = engine.extract_turnover_features(st.session_state.long_df)
-                            features_df = engine.generate_synthetic_labels(features_df)
-                            engine.train_models(features_df)
-                            predictions_df = engine.predict_turnover_risk(features_df)
+                            predictions_df, _ = engine.score_or_train(features_df)
                             
                             # 結果をJSONとして保存
                             if not predictions_df.empty:
@@ -4014,8 +4016,10 @@ if run_button_clicked:
                         
                         # 8. 離職予測 (Phase 4: ML版 - 高精度予測)
                         try:
-                            from shift_suite.tasks.turnover_prediction import TurnoverPredictionEngine
-                            import pickle
+                            from shift_suite.tasks.turnover_prediction import (
+                                TurnoverPredictionEngine,
+                                TurnoverModelRegistry,
+                            )
                             
                             # 高精度モデル（XGBoost/LightGBM）を使用
                             predictor = TurnoverPredictionEngine(
@@ -4028,49 +4032,18 @@ if run_button_clicked:
                             risk_scores = {}
                             
                             if not features_df.empty:
-                                # モデル保存パスの確認
-                                model_path = Path('models/turnover_model.pkl')
-                                
-                                # 保存済みモデルがあれば読み込み
-                                if model_path.exists():
+                                # 登録済みモデルで推論（未登録・分布ドリフト時のみ再学習）
+                                if len(features_df) >= 5:  # 最低5人分のデータが必要
                                     try:
-                                        with open(model_path, 'rb') as f:
-                                            predictor.models = safe_pickle_load(f)
-                                        log.info("学習済みモデルを読み込みました")
-                                        
-                                        # 予測実行
-                                        risk_df = predictor.predict_turnover_risk(features_df)
-                                        if not risk_df.empty and 'risk_score' in risk_df.columns:
-                                            risk_scores = dict(zip(risk_df['staff'], risk_df['risk_score']))
-                                    except Exception as e:
-                                        log.debug(f"モデル読み込みエラー、新規学習します: {e}")
-                                
-                                # モデルがない場合は新規学習
-                                if not risk_scores and len(features_df) >= 5:  # 最低5人分のデータが必要
-                                    try:
-                                        # 合成ラベル生成
-                                        features_df = predictor.generate_synthetic_labels(features_df)
-                                        
-                                        # モデル学習
-                                        X, y, feature_names = predictor.prepare_model_data(features_df)
-                                        if X is not None and len(X) > 0:
-                                            predictor.train_models(X, y, feature_names)
-                                            
-                                            # 予測実行
-                                            risk_df = predictor.predict_turnover_risk(features_df)
-                                            if not risk_df.empty and 'risk_score' in risk_df.columns:
-                                                risk_scores = dict(zip(risk_df['staff'], risk_df['risk_score']))
-                                            
-                                            # モデル保存（次回使用のため）
-                                            try:
-                                                model_path.parent.mkdir(exist_ok=True)
-                                                with open(model_path, 'wb') as f:
-                                                    pickle.dump(predictor.models, f)
-                                                log.info("学習済みモデルを保存しました")
-                                            except Exception as e:
-                                                log.debug(f"モデル保存エラー: {e}")
+                                        risk_df, run_info = predictor.score_or_train(
+                                            features_df,
+                                            registry=TurnoverModelRegistry(),
+                                        )
+                                        if not risk_df.empty:
+                                            risk_scores = dict(zip(risk_df['staff'], risk_df['turnover_probability']))
+                                        log.info(f"離職予測モデル v{run_info['model_version']} ({run_info['action']})")
                                     except Exception as e:
-                                        log.debug(f"ML学習エラー: {e}")
+                                        log.debug(f"ML予測エラー: {e}")
                                 
                                 # MLが失敗した場合のフォールバック（簡易計算）
                                 if not risk_scores:
@@ -4515,6 +4488,72 @@ def display_heatmap_tab(tab_container, data_dir):
                 st.warning("ヒートマップデータが見つかりません")
 
 
+def display_cost_risk_bands(data_dir):
+    """需要変動・欠勤率・採用リードタイムを振ったコスト分布 (5-95% 帯) を表示"""
+    from shift_suite.tasks.constants import COST_PARAMETERS, WAGE_RATES
+    from shift_suite.tasks.cost_simulation import (
+        ALL_ROLES,
+        LEGACY_POLICIES,
+        SimulationConfig,
+        best_policies,
+        simulate_cost_benefit,
+    )
+
+    st.markdown("---")
+    st.write("コストのリスク幅 (モンテカルロ試算)")
+    c1, c2, c3, c4 = st.columns(4)
+    demand_cv = c1.slider("需要の変動係数", 0.0, 0.5, 0.15, 0.05, key="cost_sim_demand_cv")
+    absence_rate = c2.slider("欠勤率", 0.0, 0.2, 0.05, 0.01, key="cost_sim_absence")
+    lead_time = c3.slider("採用リードタイム (日)", 0, 180, 30, 10, key="cost_sim_lead_time")
+    horizon = c4.slider("評価期間 (日)", 30, 730, 365, 30, key="cost_sim_horizon")
+    try:
+        summary = simulate_cost_benefit(
+            data_dir,
+            st.session_state.get("wage_direct_widget", WAGE_RATES["regular_staff"]),
+            st.session_state.get("wage_temp_widget", WAGE_RATES["temporary_staff"]),
+            st.session_state.get("hiring_cost_once_widget", COST_PARAMETERS["hiring_cost_once"]),
+            st.session_state.get("penalty_per_lack_widget", COST_PARAMETERS["penalty_per_shortage_hour"]),
+            config=SimulationConfig(
+                demand_cv=demand_cv,
+                absence_rate=absence_rate,
+                lead_time_days=float(lead_time),
+                horizon_days=float(horizon),
+            ),
+        )
+    except Exception as e:
+        log_and_display_error("コストシミュレーション エラー", e)
+        return
+    if summary is None or summary.empty:
+        st.info("Data not available")
+        return
+
+    total = summary[summary["role"] == ALL_ROLES]
+    if total.empty:
+        total = summary
+    best = best_policies(summary, by="cost_p95", n=5)
+    bands = pd.concat(
+        [total[total["policy"].isin(list(LEGACY_POLICIES))], best], ignore_index=True
+    ).drop_duplicates("policy")
+    fig = go.Figure(
+        go.Bar(
+            x=bands["policy"],
+            y=bands["cost_p50"] / 1_000_000,
+            error_y=dict(
+                type="data",
+                symmetric=False,
+                array=(bands["cost_p95"] - bands["cost_p50"]) / 1_000_000,
+                arrayminus=(bands["cost_p50"] - bands["cost_p5"]) / 1_000_000,
+            ),
+        )
+    )
+    fig.update_layout(
+        title="ポリシー別コスト (中央値と 5-95% 帯)",
+        yaxis_title=_("Estimated Cost Impact (Million ¥)"),
+    )
+    st.plotly_chart(fig, use_container_width=True, key="cost_risk_band_chart")
+    st.dataframe(best, use_container_width=True, hide_index=True)
+
+
 def display_shortage_tab(tab_container, data_dir):
     with tab_container:
         if st.session_state.analysis_status.get("shortage") != "success":
@@ -5181,6 +5220,9 @@ def display_shortage_tab(tab_container, data_dir):
             except Exception as e:
                 log_and_display_error("cost_benefit.parquet 表示エラー", e)
 
+        if (data_dir / "shortage_role_summary.parquet").exists():
+            display_cost_risk_bands(data_dir)
+
         fp_stats = data_dir / "stats_alerts.parquet"
         if fp_stats.exists():
             try:
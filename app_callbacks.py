@@ -24,6 +24,11 @@ from datetime import datetime, timedelta
 from plotly.subplots import make_subplots
 from dash import State
 from session_integration import session_integration, session_aware_data_get, session_aware_save_data
+from shift_suite.tasks.artifact_store import read_artifact
+from shift_suite.tasks.heatmap_pyramid import load_heatmap_pyramid, parse_visible_range
+from shift_suite.tasks.scenario_manifest import basic_info_from_manifest, read_scenario_manifest
+from server_side_store import artifact_version, figure_cache
+from analysis_job_queue import DONE as JOB_DONE, cancel_job, job_result, job_status, submit_job
 
 # Global variable to store current scenario directory (dash_app依存を除去)
 CURRENT_SCENARIO_DIR = None
@@ -542,7 +547,7 @@ def load_shortage_data_with_emp_filter(scenario_dir: Path, data_type: str):
         if data_type == "role":
             file_path = scenario_dir / "shortage_role_summary.parquet"
             if file_path.exists():
-                df = safe_data_read(file_path, pd.read_parquet)
+                df = safe_data_read(file_path, read_artifact)
                 # Filter out emp_ contaminated roles
                 if 'role' in df.columns:
                     df = df[~df['role'].str.contains('emp_', na=False)]
@@ -550,7 +555,7 @@ def load_shortage_data_with_emp_filter(scenario_dir: Path, data_type: str):
         elif data_type == "employment":
             file_path = scenario_dir / "shortage_employment_summary.parquet"
             if file_path.exists():
-                df = safe_data_read(file_path, pd.read_parquet)
+                df = safe_data_read(file_path, read_artifact)
                 return df
         return pd.DataFrame()
     except Exception as e:
@@ -573,6 +578,11 @@ def get_unified_analysis_data(file_pattern: str) -> dict:
 def collect_dashboard_basic_info(scenario_dir: Path) -> dict:
     """ダッシュボードの基本情報を収集"""
     try:
+        # 解析時に書き出したマニフェストがあればそれだけで足りる
+        manifest = read_scenario_manifest(scenario_dir)
+        if manifest is not None:
+            return basic_info_from_manifest(manifest, scenario_dir)
+
         basic_info = {}
         
         # シナリオ名（ディレクトリ名から）
@@ -640,7 +650,7 @@ def _calculate_shortage_metrics_from_files(scenario_dir: Path, kpis: dict) -> di
     if 'total_shortage_hours' not in kpis or kpis['total_shortage_hours'] == 0:
         shortage_role_file = scenario_dir / "shortage_role_summary.parquet"
         if shortage_role_file.exists():
-            df = safe_data_read(shortage_role_file, pd.read_parquet)
+            df = safe_data_read(shortage_role_file, read_artifact)
             
             # emp_で始まる職種（雇用形態の誤混入）を除外
             if 'role' in df.columns:
@@ -674,7 +684,7 @@ def _calculate_additional_metrics_from_files(scenario_dir: Path, kpis: dict) ->
         fatigue_file = scenario_dir / "fatigue_score.parquet"
         fatigue_xlsx_file = scenario_dir / "fatigue_score.xlsx"
         if fatigue_file.exists():
-            df = safe_data_read(fatigue_file, pd.read_parquet)
+            df = safe_data_read(fatigue_file, read_artifact)
             kpis['avg_fatigue_score'] = df.get('fatigue_score', pd.Series()).mean()
         elif fatigue_xlsx_file.exists():
             # Fallback to Excel format
@@ -688,7 +698,7 @@ def _calculate_additional_metrics_from_files(scenario_dir: Path, kpis: dict) ->
     if 'fairness_score' not in kpis or kpis['fairness_score'] == 0:
         fairness_file = scenario_dir / "fairness_after.parquet"
         if fairness_file.exists():
-            df = pd.read_parquet(fairness_file)
+            df = read_artifact(fairness_file)
             kpis['fairness_score'] = df.get('fairness_score', pd.Series()).mean()
             
     return kpis
@@ -736,7 +746,7 @@ def collect_dashboard_role_analysis(scenario_dir: Path) -> list:
         if not shortage_file.exists():
             return []
         
-        df = safe_data_read(shortage_file, pd.read_parquet)
+        df = safe_data_read(shortage_file, read_artifact)
         
         # emp_で始まる職種（雇用形態の誤混入）を除外
         if 'role' in df.columns:
@@ -765,7 +775,7 @@ def collect_dashboard_employment_analysis(scenario_dir: Path) -> list:
         if not shortage_file.exists():
             return []
         
-        df = safe_data_read(shortage_file, pd.read_parquet)
+        df = safe_data_read(shortage_file, read_artifact)
         return [
             {
                 'employment': row.get('employment', 'N/A'),
@@ -823,7 +833,7 @@ def analyze_leave_patterns(scenario_dir):
         if not intermediate_file.exists():
             return None
             
-        df = pd.read_parquet(intermediate_file)
+        df = read_artifact(intermediate_file)
         
         # 日付カラムの判定
         date_col = 'date' if 'date' in df.columns else 'ds' if 'ds' in df.columns else None
@@ -972,7 +982,7 @@ def calculate_actual_costs(scenario_dir):
                 'cost_efficiency': 0.75
             }
             
-        df = pd.read_parquet(intermediate_file)
+        df = read_artifact(intermediate_file)
         
         # 職種別の標準時給（仮定）
         hourly_rates = {
@@ -1116,7 +1126,7 @@ def collect_dashboard_cost_analysis(scenario_dir: Path) -> dict:
         breakdown = {'正社員': 1500000, 'パート': 700000, 'アルバイト': 300000}  # デフォルト
         
         if intermediate_file.exists():
-            df = pd.read_parquet(intermediate_file)
+            df = read_artifact(intermediate_file)
             if 'employment' in df.columns:
                 breakdown = {}
                 hourly_rates = {
@@ -1228,7 +1238,7 @@ def session_aware_data_get(scenario_dir: Path, key: str, default=None, session_i
                 
                 if file_path.suffix == '.parquet':
                     import pandas as pd
-                    return pd.read_parquet(file_path)
+                    return read_artifact(file_path)
                 elif file_path.suffix == '.csv':
                     import pandas as pd
                     return pd.read_csv(file_path, encoding='utf-8')
@@ -1290,9 +1300,14 @@ def calculate_overview_kpis(scenario_dir: Path):
         fairness_score = max(0, 1.0 - (avg_fatigue / 10)) if avg_fatigue > 0 else 0.8
         kpis['fairness_score'] = fairness_score
         
-        # Calculate staff utilization
-        intermediate_data = session_aware_data_get(scenario_dir, 'intermediate_data', pd.DataFrame(), session_id=session_id)
-        total_staff = len(intermediate_data) if not intermediate_data.empty else 0
+        # Calculate staff utilization (行数はマニフェストがあれば intermediate_data を読まない)
+        manifest = read_scenario_manifest(scenario_dir)
+        record_counts = (manifest or {}).get('record_counts', {})
+        if 'intermediate_data' in record_counts:
+            total_staff = int(record_counts['intermediate_data'])
+        else:
+            intermediate_data = session_aware_data_get(scenario_dir, 'intermediate_data', pd.DataFrame(), session_id=session_id)
+            total_staff = len(intermediate_data) if not intermediate_data.empty else 0
         kpis['total_staff'] = total_staff
         
         # Calculate efficiency metrics
@@ -1326,12 +1341,12 @@ def load_fatigue_data(scenario_dir):
     try:
         fatigue_file = scenario_dir / "fatigue_score.parquet"
         if fatigue_file.exists():
-            return pd.read_parquet(fatigue_file)
+            return read_artifact(fatigue_file)
         
         # フォールバック: intermediate_dataから疲労データを生成
         intermediate_file = scenario_dir / "intermediate_data.parquet"
         if intermediate_file.exists():
-            df = pd.read_parquet(intermediate_file)
+            df = read_artifact(intermediate_file)
             # 簡易的な疲労スコア計算
             if 'consecutive_work_days' in df.columns:
                 df['fatigue_score'] = df['consecutive_work_days'] * 10 + np.random.uniform(-5, 5, len(df))
@@ -1689,7 +1704,7 @@ def collect_all_tabs_summary(scenario_dir):
         # Shortage分析サマリー
         shortage_file = Path(scenario_dir) / "shortage_role_summary.parquet"
         if shortage_file.exists():
-            df = pd.read_parquet(shortage_file)
+            df = read_artifact(shortage_file)
             if not df.empty and 'lack_h' in df.columns:
                 total_shortage = df['lack_h'].sum()
                 summary['shortage'] = {
@@ -1701,7 +1716,7 @@ def collect_all_tabs_summary(scenario_dir):
         # Fatigue分析サマリー
         fatigue_file = Path(scenario_dir) / "fatigue_scores.parquet"
         if fatigue_file.exists():
-            df = pd.read_parquet(fatigue_file)
+            df = read_artifact(fatigue_file)
             if not df.empty and 'fatigue_score' in df.columns:
                 avg_fatigue = df['fatigue_score'].mean()
                 high_risk = len(df[df['fatigue_score'] > 55])
@@ -1715,7 +1730,7 @@ def collect_all_tabs_summary(scenario_dir):
         # Fairness分析サマリー
         fairness_file = Path(scenario_dir) / "fairness_after.parquet"
         if fairness_file.exists():
-            df = pd.read_parquet(fairness_file)
+            df = read_artifact(fairness_file)
             if not df.empty and 'fairness_score' in df.columns:
                 avg_fairness = df['fairness_score'].mean()
                 summary['fairness'] = {
@@ -1727,7 +1742,7 @@ def collect_all_tabs_summary(scenario_dir):
         # Cost分析サマリー（実データベース）
         intermediate_file = Path(scenario_dir) / "intermediate_data.parquet"
         if intermediate_file.exists():
-            df = pd.read_parquet(intermediate_file)
+            df = read_artifact(intermediate_file)
             # 簡易コスト計算
             total_hours = len(df) * 0.5  # 30分スロット
             avg_hourly_rate = 1800  # デフォルト時給
@@ -2118,21 +2133,21 @@ def export_data_to_csv(scenario_dir, data_type='all'):
         if data_type in ['all', 'shortage']:
             shortage_file = scenario_path / "shortage_role_summary.parquet"
             if shortage_file.exists():
-                df = pd.read_parquet(shortage_file)
+                df = read_artifact(shortage_file)
                 export_data['shortage_analysis'] = df
         
         # 疲労分析データ
         if data_type in ['all', 'fatigue']:
             fatigue_file = scenario_path / "fatigue_scores.parquet"
             if fatigue_file.exists():
-                df = pd.read_parquet(fatigue_file)
+                df = read_artifact(fatigue_file)
                 export_data['fatigue_analysis'] = df
         
         # 公平性分析データ
         if data_type in ['all', 'fairness']:
             fairness_file = scenario_path / "fairness_after.parquet"
             if fairness_file.exists():
-                df = pd.read_parquet(fairness_file)
+                df = read_artifact(fairness_file)
                 export_data['fairness_analysis'] = df
         
         # CSVファイルをZIPアーカイブとして返す
@@ -2191,7 +2206,7 @@ def create_role_filter(scenario_dir):
         # intermediate_dataから職種リストを取得
         intermediate_file = scenario_dir / "intermediate_data.parquet"
         if intermediate_file.exists():
-            df = pd.read_parquet(intermediate_file)
+            df = read_artifact(intermediate_file)
             if 'role' in df.columns:
                 roles = df['role'].dropna().unique().tolist()
                 roles = sorted([str(r) for r in roles if r and str(r) != 'nan'])
@@ -2223,7 +2238,7 @@ def create_employment_filter(scenario_dir):
         # intermediate_dataから雇用形態リストを取得
         intermediate_file = scenario_dir / "intermediate_data.parquet"
         if intermediate_file.exists():
-            df = pd.read_parquet(intermediate_file)
+            df = read_artifact(intermediate_file)
             if 'employment' in df.columns:
                 employments = df['employment'].dropna().unique().tolist()
                 employments = sorted([str(e) for e in employments if e and str(e) != 'nan'])
@@ -2479,7 +2494,7 @@ def generate_pdf_report(scenario_dir):
         shortage_file = scenario_path / "shortage_role_summary.parquet"
         if shortage_file.exists():
             try:
-                df = pd.read_parquet(shortage_file)
+                df = read_artifact(shortage_file)
                 if not df.empty and 'lack_h' in df.columns:
                     story.append(Paragraph("2. Shortage Analysis Summary", heading_style))
                     
@@ -2968,6 +2983,7 @@ def create_blueprint_analysis_tab(scenario_dir) -> html.Div:
         
         html.Button('分析を実行', id='run-blueprint-analysis', n_clicks=0,
                    style={'marginTop': '20px'}),
+        *create_analysis_job_controls('blueprint-analysis'),
         html.Div(id='blueprint-analysis-results', style={'marginTop': '20px'})
     ])
 
@@ -2978,6 +2994,7 @@ def create_ai_analysis_tab(scenario_dir) -> html.Div:
         
         html.Button("AI分析実行", id='run-ai-analysis-btn', n_clicks=0,
                    style={'padding': '10px 20px', 'fontSize': '16px'}),
+        *create_analysis_job_controls('ai-analysis'),
         
         html.Div(id='ai-insights-content', children=[
             html.H4("AI分析結果", style={'marginTop': '20px'}),
@@ -3024,6 +3041,7 @@ def create_mind_reader_tab(scenario_dir) -> html.Div:
         
         html.Button('分析を実行', id='run-mind-reader', n_clicks=0,
                    style={'marginTop': '20px'}),
+        *create_analysis_job_controls('mind-reader'),
         
         html.Div(id='mind-reader-results', children=[
             html.H5("検出されたパターン", style={'marginTop': '20px'}),
@@ -3917,62 +3935,37 @@ def register_additional_tab_callbacks(app):
         State('scenario-dir-store', 'data')
     )
     def update_heatmap_graph_callback(role_filter, emp_filter, scenario_dir):
-        return update_heatmap_graph(role_filter, emp_filter, scenario_dir)
-    
-    # ブループリント分析コールバック
-    @app.callback(
-        Output('blueprint-analysis-results', 'children'),
-        Input('run-blueprint-analysis', 'n_clicks'),
-        State('scenario-dir-store', 'data'),
-        prevent_initial_call=True
-    )
-    def run_blueprint_analysis_callback(n_clicks, scenario_dir):
-        return run_blueprint_analysis(n_clicks, scenario_dir)
-    
-    # AI分析コールバック
+        area_id = dash.callback_context.outputs_list['id']['index']
+        return update_heatmap_graph(role_filter, emp_filter, scenario_dir, area_id=area_id)
+
+    # ズーム・パンに応じてピラミッドの階層を切り替える
     @app.callback(
-        Output('ai-analysis-results', 'children'),
-        Input('run-ai-analysis', 'n_clicks'),
-        State('scenario-dir-store', 'data'),
+        Output({'type': 'heatmap-lod-graph', 'index': MATCH}, 'figure'),
+        Input({'type': 'heatmap-lod-graph', 'index': MATCH}, 'relayoutData'),
+        [
+            State({'type': 'heatmap-filter-role', 'index': MATCH}, 'value'),
+            State({'type': 'heatmap-filter-employment', 'index': MATCH}, 'value'),
+            State('scenario-dir-store', 'data'),
+        ],
         prevent_initial_call=True
     )
-    def run_ai_analysis_callback(n_clicks, scenario_dir):
-        return run_ai_analysis(n_clicks, scenario_dir)
+    def update_heatmap_lod_callback(relayout_data, role_filter, emp_filter, scenario_dir):
+        changed, start, end = parse_visible_range(relayout_data)
+        if not changed or not scenario_dir:
+            raise PreventUpdate
+        heat_file = _resolve_heatmap_file(Path(scenario_dir), role_filter, emp_filter)
+        fig = create_heatmap_lod_figure(heat_file, role_filter, emp_filter, start, end)
+        if fig is None:
+            raise PreventUpdate
+        return fig
     
-    # Mind Reader分析コールバック
-    @app.callback(
-        Output('mind-reader-results', 'children'),
-        Input('run-mind-reader', 'n_clicks'),
-        State('scenario-dir-store', 'data'),
-        prevent_initial_call=True
-    )
-    def run_mind_reader_callback(n_clicks, scenario_dir):
-        if not n_clicks or not scenario_dir:
-            return html.Div()
-        
-        try:
-            from shift_suite.tasks.shift_mind_reader_lite import ShiftMindReaderLite
-            mind_reader = ShiftMindReaderLite()
-            
-            scenario_path = Path(scenario_dir)
-            long_file = scenario_path / 'long_df.parquet'
-            
-            if long_file.exists():
-                long_df = pd.read_parquet(long_file)
-                results = mind_reader.analyze(long_df)
-                
-                return html.Div([
-                    html.H4("Mind Reader分析結果"),
-                    html.Pre(json.dumps(results, ensure_ascii=False, indent=2))
-                ])
-            else:
-                return html.Div("分析用データがありません")
-        except Exception as e:
-            log.error(f"Mind Reader分析エラー: {e}")
-            return html.Div([
-                html.H4("エラー", style={'color': 'red'}),
-                html.P(str(e))
-            ])
+    # 重い分析はジョブキューに投入し、インターバルで完了を確認する
+    register_analysis_job_callback(app, 'blueprint-analysis', 'blueprint', "ブループリント分析結果",
+                                   run_id='run-blueprint-analysis', output_id='blueprint-analysis-results')
+    register_analysis_job_callback(app, 'ai-analysis', 'mind_reader_lite', "Mind Reader AI分析結果",
+                                   run_id='run-ai-analysis-btn', output_id='ai-insights-content')
+    register_analysis_job_callback(app, 'mind-reader', 'mind_reader_lite', "Mind Reader分析結果",
+                                   run_id='run-mind-reader', output_id='mind-reader-results')
 
 
 
@@ -4018,7 +4011,7 @@ def register_additional_tab_callbacks(app):
                 # 時間帯分析
                 intermediate_file = scenario_dir / 'intermediate_data.parquet'
                 if intermediate_file.exists():
-                    df = pd.read_parquet(intermediate_file)
+                    df = read_artifact(intermediate_file)
                     if 'slot' in df.columns:
                         time_summary = df.groupby('slot').size().reset_index(name='staff_count')
                         fig = px.bar(
@@ -4147,7 +4140,7 @@ def create_shortage_heatmap(scenario_dir):
         if not intermediate_file.exists():
             return html.Div("データファイルが見つかりません")
         
-        df = pd.read_parquet(intermediate_file)
+        df = read_artifact(intermediate_file)
         
         # 時間帯別・日付別でグループ化
         if 'slot' in df.columns and 'ds' in df.columns:
@@ -4384,7 +4377,7 @@ def create_shortage_heatmap(scenario_dir):
         if not intermediate_file.exists():
             return html.Div("データファイルが見つかりません")
         
-        df = pd.read_parquet(intermediate_file)
+        df = read_artifact(intermediate_file)
         
         # 時間帯別・日付別でグループ化
         if 'slot' in df.columns and 'ds' in df.columns:
@@ -4476,7 +4469,7 @@ def create_shortage_pattern_analysis(scenario_dir):
         if not intermediate_file.exists():
             return None
             
-        df = pd.read_parquet(intermediate_file)
+        df = read_artifact(intermediate_file)
         
         # 日付カラムの判定
         date_col = 'date' if 'date' in df.columns else 'ds' if 'ds' in df.columns else None
@@ -4715,7 +4708,7 @@ def create_initial_heatmap(scenario_dir):
         # ヒートマップデータを読み込み
         heatmap_file = scenario_dir / 'heatmap.parquet'
         if heatmap_file.exists():
-            df = pd.read_parquet(heatmap_file)
+            df = read_artifact(heatmap_file)
             
             # データを行列形式に変換
             if not df.empty:
@@ -4778,7 +4771,7 @@ def create_heatmap_tab(scenario_dir) -> html.Div:
                 # メタデータがない場合はintermediate_dataから取得
                 intermediate_data = scenario_dir / 'intermediate_data.parquet'
                 if intermediate_data.exists():
-                    df = pd.read_parquet(intermediate_data)
+                    df = read_artifact(intermediate_data)
                     if 'role' in df.columns:
                         roles = df['role'].dropna().unique().tolist()
                     if 'employment' in df.columns:
@@ -5052,273 +5045,170 @@ def create_overview_tab(scenario_dir):
         ])
     ])
 
-def update_heatmap_graph(role_filter, emp_filter, scenario_dir):
+def _resolve_heatmap_file(scenario_path: Path, role_filter, emp_filter) -> Path:
+    """フィルタに対応する heat_*.parquet"""
+    heat_file = scenario_path / 'heat_ALL.parquet'
+    if role_filter and role_filter != 'all':
+        # 職種別フィルタ
+        role_file = scenario_path / f'heat_{role_filter}.parquet'
+        if role_file.exists():
+            heat_file = role_file
+    if emp_filter and emp_filter != 'all':
+        # 雇用形態別フィルタ
+        emp_file = scenario_path / f'heat_emp_{emp_filter}.parquet'
+        if emp_file.exists():
+            heat_file = emp_file
+    return heat_file
+
+
+def create_heatmap_lod_figure(heat_file: Path, role_filter, emp_filter, start=None, end=None):
+    """
+    表示範囲 [start, end] に合わせてピラミッドの階層を選んだヒートマップ。
+    全期間表示では粗い階層 (最大値) を、ズームするとより細かい階層を使う。
+    同じファイル (バージョン) と表示条件の図は figure_cache から返す。
+    """
+    return figure_cache.get_or_build(
+        artifact_version(heat_file),
+        {'view': 'heatmap_lod', 'file': heat_file.name, 'role': role_filter,
+         'employment': emp_filter, 'start': start, 'end': end},
+        lambda: _build_heatmap_lod_figure(heat_file, role_filter, emp_filter, start, end),
+    )
+
+
+def _build_heatmap_lod_figure(heat_file: Path, role_filter, emp_filter, start=None, end=None):
+    pyramid = load_heatmap_pyramid(heat_file)
+    if pyramid is None or pyramid.empty:
+        return None
+    level, view = pyramid.view(start, end)
+    stat_label = '' if level == 'slot_day' else ' (最大)'
+
+    fig = go.Figure(data=go.Heatmap(
+        z=view.values,
+        x=view.columns,
+        y=view.index,
+        colorscale='RdBu_r',
+        zmid=0,
+        hovertemplate='%{x|%Y-%m-%d}<br>%{y}<br>%{z}<extra>' + level + '</extra>',
+    ))
+
+    fig.update_layout(
+        title=f"ヒートマップ - {role_filter if role_filter != 'all' else '全体'} / {emp_filter if emp_filter != 'all' else '全体'} [{level}{stat_label}]",
+        height=500,
+        xaxis_title="日付",
+        yaxis_title="時間帯",
+        uirevision=str(heat_file),
+    )
+    if start is not None and end is not None:
+        fig.update_xaxes(range=[start, end])
+    return fig
+
+
+def update_heatmap_graph(role_filter, emp_filter, scenario_dir, area_id=0):
     """ヒートマップグラフを更新"""
     if not scenario_dir:
         return html.Div("データが読み込まれていません")
     
     try:
-        # データ読み込み
-        scenario_path = Path(scenario_dir)
-        heat_file = scenario_path / 'heat_ALL.parquet'
+        heat_file = _resolve_heatmap_file(Path(scenario_dir), role_filter, emp_filter)
         
         if not heat_file.exists():
             return html.Div("ヒートマップデータがありません")
         
-        df = pd.read_parquet(heat_file)
-        
-        # フィルタリング
-        if role_filter and role_filter != 'all':
-            # 職種別フィルタ
-            role_file = scenario_path / f'heat_{role_filter}.parquet'
-            if role_file.exists():
-                df = pd.read_parquet(role_file)
-        
-        if emp_filter and emp_filter != 'all':
-            # 雇用形態別フィルタ
-            emp_file = scenario_path / f'heat_emp_{emp_filter}.parquet'
-            if emp_file.exists():
-                df = pd.read_parquet(emp_file)
-        
-        # ヒートマップ作成
-        fig = go.Figure(data=go.Heatmap(
-            z=df.values,
-            x=df.columns,
-            y=df.index,
-            colorscale='RdBu_r',
-            zmid=0
-        ))
-        
-        fig.update_layout(
-            title=f"ヒートマップ - {role_filter if role_filter != 'all' else '全体'} / {emp_filter if emp_filter != 'all' else '全体'}",
-            height=500,
-            xaxis_title="日付",
-            yaxis_title="時間帯"
-        )
+        fig = create_heatmap_lod_figure(heat_file, role_filter, emp_filter)
+        if fig is None:
+            return html.Div("ヒートマップデータがありません")
         
-        return dcc.Graph(figure=fig)
+        return dcc.Graph(id={'type': 'heatmap-lod-graph', 'index': area_id}, figure=fig)
         
     except Exception as e:
         log.error(f"ヒートマップ更新エラー: {e}")
         return html.Div(f"エラー: {str(e)}")
 
 
-# ========== ブループリント分析コールバック ==========
+# ========== 分析ジョブ (ブループリント / AI分析) ==========
+# 分析はジョブキューの子プロセスで実行し、コールバックは投入・状態確認・取り消しだけを行う。
+# ジョブのハンドルは '<prefix>-job-store'、ポーリングは '<prefix>-job-interval' が担う。
 
-def run_blueprint_analysis(n_clicks, scenario_dir):
-    """ブループリント分析を実行"""
-    if not n_clicks or not scenario_dir:
-        return html.Div()
-    
-    try:
-        # ブループリント分析モジュールをインポート
-        try:
-            from shift_suite.tasks.blueprint_integrated_system import BlueprintIntegratedSystem
-            analyzer = BlueprintIntegratedSystem()
-            
-            # データ読み込み
-            scenario_path = Path(scenario_dir)
-            long_file = scenario_path / 'long_df.parquet'
-            
-            if long_file.exists():
-                long_df = pd.read_parquet(long_file)
-                results = analyzer.analyze(long_df)
-                
-                return html.Div([
-                    html.H4("ブループリント分析結果"),
-                    html.Pre(json.dumps(results, ensure_ascii=False, indent=2))
-                ])
-            else:
-                return html.Div("分析用データがありません")
-                
-        except ImportError:
-            return html.Div("ブループリント分析モジュールが利用できません")
-            
-    except Exception as e:
-        log.error(f"ブループリント分析エラー: {e}")
+def create_analysis_job_controls(prefix: str) -> list:
+    """分析ジョブ用のストア・インターバル・取り消しボタン"""
+    return [
+        dcc.Store(id=f'{prefix}-job-store'),
+        dcc.Interval(id=f'{prefix}-job-interval', interval=2000, n_intervals=0, disabled=True),
+        html.Button('取り消し', id=f'{prefix}-job-cancel', n_clicks=0,
+                    style={'marginTop': '20px', 'marginLeft': '10px'}),
+    ]
+
+
+def _render_analysis_job(job, title: str) -> html.Div:
+    if job.status == JOB_DONE:
+        results = job_result(job.job_id, {})
         return html.Div([
-            html.H4("エラー", style={'color': 'red'}),
-            html.P(str(e))
+            html.H4(title),
+            html.Pre(json.dumps(results, ensure_ascii=False, indent=2, default=str))
         ])
+    if not job.done:
+        elapsed = job.elapsed or 0
+        label = "待機中" if job.status == 'queued' else f"実行中 ({elapsed:.0f} 秒経過)"
+        return html.Div([
+            html.H4(f"⏳ 分析{label}...", style={'color': '#3498db'}),
+            html.P("バックグラウンドで分析しています。完了すると自動で表示されます。")
+        ])
+    if job.status == 'cancelled':
+        return html.Div("分析を取り消しました", style={'color': 'gray'})
+    return html.Div([
+        html.H4("エラー", style={'color': 'red'}),
+        html.P((job.error or job.status).splitlines()[0])
+    ])
 
 
-# ========== AI分析コールバック ==========
+def run_analysis_job(trigger_id, kind: str, title: str, scenario_dir, job_handle, run_id: str,
+                     session_id=None):
+    """
+    分析ジョブの投入・取り消し・状態確認。
+    (結果表示, ジョブハンドル, インターバルを止めるか) を返す。
+    ジョブはセッションを所有者として投入し、取り消しも自セッションの分だけ外す
+    (同じ入力に相乗りした他セッションのジョブは止めない)。
+    """
+    job_id = (job_handle or {}).get('job_id')
+    if trigger_id == run_id:
+        scenario_path = get_scenario_dir(scenario_dir)
+        long_file = scenario_path / 'long_df.parquet' if scenario_path else None
+        if long_file is None or not long_file.exists():
+            return html.Div("分析用データがありません"), None, True
+        job_id = submit_job(kind, {'long_df_path': str(long_file)}, owner=session_id).job_id
+    elif trigger_id and trigger_id.endswith('-job-cancel'):
+        cancel_job(job_id, owner=session_id or '')
 
-def run_ai_analysis(n_clicks, scenario_dir):
-    """マインドリーダーAI分析を実行"""
-    if not n_clicks or not scenario_dir:
-        return html.Div()
-    
-    try:
-        # Mind Readerモジュールをインポート
-        try:
-            from shift_suite.tasks.shift_mind_reader_lite import ShiftMindReaderLite
-            mind_reader = ShiftMindReaderLite()
-            
-            # データ読み込み
-            scenario_path = Path(scenario_dir)
-            long_file = scenario_path / 'long_df.parquet'
-            
-            if long_file.exists():
-                long_df = pd.read_parquet(long_file)
-                results = mind_reader.analyze(long_df)
-                
-                return html.Div([
-                    html.H4("Mind Reader AI分析結果"),
-                    html.Pre(json.dumps(results, ensure_ascii=False, indent=2))
-                ])
-            else:
-                return html.Div("分析用データがありません")
-                
-        except ImportError:
-            return html.Div("Mind Readerモジュールが利用できません")
-            
-    except Exception as e:
-        log.error(f"AI分析エラー: {e}")
-        return html.Div([
-            html.H4("エラー", style={'color': 'red'}),
-            html.P(str(e))
-        ])
-        try:
-            output_dir = workspace
-            # ダッシュボード統合コンテンツを構築
-            comprehensive_dashboard_content = [
-                html.Hr(style={'margin': '40px 0', 'border': '2px solid #3498db'}),
-                html.H3("🏥 統合シフト分析ダッシュボード", 
-                       style={'color': '#2c3e50', 'marginBottom': '20px', 'textAlign': 'center'})
-            ]
-            
-            log.info("統合ダッシュボードを概要タブに統合しました")
-            
-        except Exception as e:
-            log.warning(f"統合ダッシュボード統合エラー: {e}")
-            comprehensive_dashboard_content = [
-                html.Hr(style={'margin': '40px 0', 'border': '2px solid #e74c3c'}),
-                html.Div([
-                    html.H4("⚠️ 統合ダッシュボード読み込みエラー", style={'color': '#e74c3c'}),
-                    html.P(f"エラー詳細: {str(e)}"),
-                    html.P("データが不足している可能性があります。分析を実行してからお試しください。")
-                ], style={
-                    'padding': '20px',
-                    'backgroundColor': '#fff5f5',
-                    'borderRadius': '8px',
-                    'border': '1px solid #fed7d7'
-                })
-            ]
+    job = job_status(job_id)
+    if job is None:
+        raise PreventUpdate
+    return _render_analysis_job(job, title), job.handle(), job.done
 
-    # 正しい不足時間計算
-    lack_h = 0
-    shortage_time_df = session_aware_data_get(scenario_dir, 'shortage_time', pd.DataFrame(), session_id=session_id)
-    if not shortage_time_df.empty:
-        try:
-            numeric_cols = shortage_time_df.select_dtypes(include=[np.number])
-            if not numeric_cols.empty:
-                total_shortage_slots = float(np.nansum(numeric_cols.values))
-                lack_h = total_shortage_slots * 0.5  # SLOT_HOURS
-                log.info(f"正確な不足時間: {lack_h:.2f}h")
-            else:
-                lack_h = 0
-        except Exception as e:
-            log.error(f"shortage_time読み取りエラー: {e}")
-            lack_h = 0
-    
-    # コスト計算
-    excess_cost = 0
-    lack_temp_cost = 0
-    lack_penalty_cost = 0
-    
-    # Jain指数の安全な取得
-    jain_index = "N/A"
-    try:
-        if not df_fairness.empty and 'metric' in df_fairness.columns:
-            jain_row = df_fairness[df_fairness['metric'] == 'jain_index']
-            if not jain_row.empty and 'value' in jain_row.columns:
-                value = jain_row['value'].iloc[0]
-                if pd.notna(value):
-                    jain_index = f"{float(value):.3f}"
-    except (ValueError, TypeError, IndexError) as e:
-        log.debug(f"Jain指数の計算でエラー: {e}")
-        jain_index = "エラー"
-
-    # 基本統計の安全な計算
-    staff_count = len(df_staff) if not df_staff.empty else 0
-    avg_night_ratio = 0
-    try:
-        if not df_staff.empty and 'night_ratio' in df_staff.columns:
-            night_ratios = df_staff['night_ratio'].dropna()
-            avg_night_ratio = float(night_ratios.mean()) if len(night_ratios) > 0 else 0
-    except (ValueError, TypeError) as e:
-        log.debug(f"夜勤比率の計算でエラー: {e}")
-        avg_night_ratio = 0
-    
-    alerts_count = len(df_alerts) if not df_alerts.empty else 0
 
-    return html.Div([
-        html.Div(id='overview-insights', style={
-            'padding': '15px',
-            'backgroundColor': '#e9f2fa',
-            'borderRadius': '8px',
-            'marginBottom': '20px',
-            'border': '1px solid #cce5ff'
-        }),
-        html.H3("分析概要", style={'marginBottom': '20px'}),
-        # 📊 重要指標を大きく表示
-        html.Div([
-            html.Div([
-                html.Div([
-                    html.H2(f"{lack_h:.1f}", style={
-                        'margin': '0', 'color': '#d32f2f' if lack_h > 100 else '#2e7d32', 
-                        'fontSize': '3rem', 'fontWeight': 'bold'
-                    }),
-                    html.P("総不足時間(h)", style={'margin': '5px 0', 'fontSize': '1.1rem', 'color': '#666'})
-                ], style={
-                    'textAlign': 'center', 'padding': '20px', 'backgroundColor': 'white',
-                    'borderRadius': '12px', 'boxShadow': '0 4px 8px rgba(0,0,0,0.12)',
-                    'border': f"3px solid {'#d32f2f' if lack_h > 100 else '#2e7d32'}"
-                }),
-            ], style={'width': '24%', 'display': 'inline-block', 'padding': '5px'}),
-            
-            html.Div([
-                html.Div([
-                    html.H3(f"{excess_cost:,.0f}", style={
-                        'margin': '0', 'color': '#ff9800', 'fontSize': '2rem', 'fontWeight': 'bold'
-                    }),
-                    html.P("総過剰コスト(¥)", style={'margin': '5px 0', 'fontSize': '1rem', 'color': '#666'})
-                ], style={
-                    'textAlign': 'center', 'padding': '15px', 'backgroundColor': 'white',
-                    'borderRadius': '8px', 'boxShadow': '0 2px 4px rgba(0,0,0,0.1)',
-                    'border': '2px solid #ff9800'
-                }),
-            ], style={'width': '24%', 'display': 'inline-block', 'padding': '5px'}),
-            
-            html.Div([
-                html.Div([
-                    html.H3(f"{lack_temp_cost:,.0f}", style={
-                        'margin': '0', 'color': '#f44336', 'fontSize': '2rem', 'fontWeight': 'bold'
-                    }),
-                    html.P("不足コスト(派遣)(¥)", style={'margin': '5px 0', 'fontSize': '1rem', 'color': '#666'})
-                ], style={
-                    'textAlign': 'center', 'padding': '15px', 'backgroundColor': 'white',
-                    'borderRadius': '8px', 'boxShadow': '0 2px 4px rgba(0,0,0,0.1)',
-                    'border': '2px solid #f44336'
-                }),
-            ], style={'width': '24%', 'display': 'inline-block', 'padding': '5px'}),
-            
-            html.Div([
-                html.Div([
-                    html.H3(str(alerts_count), style={
-                        'margin': '0', 'color': '#ff7f0e' if alerts_count > 0 else '#1f77b4', 
-                        'fontSize': '2rem', 'fontWeight': 'bold'
-                    }),
-                    html.P("アラート数", style={'margin': '5px 0', 'fontSize': '1rem', 'color': '#666'})
-                ], style={
-                    'textAlign': 'center', 'padding': '15px', 'backgroundColor': 'white',
-                    'borderRadius': '8px', 'boxShadow': '0 2px 4px rgba(0,0,0,0.1)',
-                    'border': f"2px solid {'#ff7f0e' if alerts_count > 0 else '#1f77b4'}"
-                }),
-            ], style={'width': '24%', 'display': 'inline-block', 'padding': '5px'}),
-        ], style={'marginBottom': '20px'}),
-    ] + (comprehensive_dashboard_content if comprehensive_dashboard_content else []))
+def register_analysis_job_callback(app, prefix: str, kind: str, title: str, *, run_id: str, output_id: str):
+    """実行ボタン・インターバル・取り消しボタンを 1 つのコールバックにまとめて登録する"""
+
+    @app.callback(
+        [Output(output_id, 'children'),
+         Output(f'{prefix}-job-store', 'data'),
+         Output(f'{prefix}-job-interval', 'disabled')],
+        [Input(run_id, 'n_clicks'),
+         Input(f'{prefix}-job-interval', 'n_intervals'),
+         Input(f'{prefix}-job-cancel', 'n_clicks')],
+        [State('scenario-dir-store', 'data'),
+         State(f'{prefix}-job-store', 'data'),
+         State('session-id-store', 'data')],
+        prevent_initial_call=True
+    )
+    def _analysis_job_callback(n_clicks, n_intervals, n_cancel, scenario_dir, job_handle, session_id):
+        trigger_id = dash.callback_context.triggered_id
+        if trigger_id == run_id and not n_clicks:
+            raise PreventUpdate
+        return run_analysis_job(trigger_id, kind, title, scenario_dir, job_handle, run_id,
+                                session_id=session_id)
+
+    return _analysis_job_callback
+
 
 # ===== 未定義タブの実装 =====
 
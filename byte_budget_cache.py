@@ -0,0 +1,404 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+バイト予算付き統一キャッシュ
+
+- 従来のキャッシュ (ThreadSafeLRUCache / ManagedCache / SmartCacheManager /
+  lru_cache) はいずれも件数で上限を決めていたため、巨大なヒートマップが
+  数件入るだけでメモリガードの緊急クリーンアップが走り、全キャッシュが消えていた。
+- ByteBudgetCache はプロセス全体で 1 つのバイト予算を持ち、値のサイズを
+  DataFrame なら ``memory_usage(deep=True)`` で実測して積算する。
+  予算を超えたら名前空間 (セッション・シナリオ・用途) をまたいで LRU / LFU で追い出す。
+- 既存のキャッシュクラスは ``namespace()`` のビューを通してこの 1 つの予算を共有する。
+- メモリガードの圧迫コールバックでは全消去ではなく、予算の一定割合まで縮める。
+- ``pin`` されたエントリ (セッションが参照中の共有成果物など) は追い出さない。
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BUDGET_MB = int(os.environ.get("SHIFT_SUITE_CACHE_MB", "512"))
+_CONTAINER_SAMPLE = 1000  # dict / list はこの件数までを実測して外挿
+
+
+def estimate_nbytes(value: Any) -> int:
+    """キャッシュ値のおおよそのメモリ量 (バイト)"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if PYARROW_AVAILABLE and isinstance(value, (pa.Table, pa.RecordBatch, pa.Array, pa.ChunkedArray)):
+        return int(value.nbytes)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, str):
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        items = list(value.items())
+        sample = items[:_CONTAINER_SAMPLE]
+        size = sum(estimate_nbytes(k) + estimate_nbytes(v) for k, v in sample)
+        if len(items) > len(sample):
+            size = size * len(items) // len(sample)
+        return sys.getsizeof(value) + size
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = list(value)
+        sample = items[:_CONTAINER_SAMPLE]
+        size = sum(estimate_nbytes(v) for v in sample)
+        if len(items) > len(sample):
+            size = size * len(items) // len(sample)
+        return sys.getsizeof(value) + size
+    return sys.getsizeof(value)
+
+
+@dataclass
+class _Entry:
+    value: Any
+    nbytes: int
+    hits: int = 0
+    expires_at: Optional[float] = None
+    pins: int = 0
+
+
+class ByteBudgetCache:
+    """
+    名前空間付き・バイト予算付きのスレッドセーフなキャッシュ
+
+    Args:
+        budget_bytes: 全名前空間合計の上限
+        policy: 追い出し方式。``"lru"`` (最終アクセスが古い順) /
+            ``"lfu"`` (ヒット数が少ない順、同数なら古い順)
+        max_item_fraction: 1 件がこの割合を超える値はキャッシュしない
+        pressure_target: メモリ圧迫時に縮める先 (予算に対する割合)
+    """
+
+    def __init__(
+        self,
+        budget_bytes: int = DEFAULT_BUDGET_MB * 1024 * 1024,
+        *,
+        policy: str = "lru",
+        max_item_fraction: float = 0.5,
+        pressure_target: float = 0.5,
+    ):
+        if policy not in ("lru", "lfu"):
+            raise ValueError(f"unknown eviction policy: {policy}")
+        self.budget_bytes = int(budget_bytes)
+        self.policy = policy
+        self.max_item_fraction = max_item_fraction
+        self.pressure_target = pressure_target
+        self._entries: "OrderedDict[Tuple[str, Hashable], _Entry]" = OrderedDict()
+        self._ns_bytes: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejected = 0
+        self.expired = 0
+
+    # ---- 基本操作 -----------------------------------------------------------
+    def get(self, namespace: str, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            full_key = (namespace, key)
+            entry = self._entries.get(full_key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if entry.expires_at is not None and entry.expires_at <= time.monotonic():
+                self._remove(full_key)
+                self.expired += 1
+                self.misses += 1
+                return default
+            entry.hits += 1
+            self._entries.move_to_end(full_key)
+            self.hits += 1
+            return entry.value
+
+    def set(
+        self,
+        namespace: str,
+        key: Hashable,
+        value: Any,
+        *,
+        ttl: Optional[float] = None,
+        nbytes: Optional[int] = None,
+    ) -> bool:
+        """値を格納する。大きすぎて格納しなかった場合は False"""
+        size = estimate_nbytes(value) if nbytes is None else int(nbytes)
+        full_key = (namespace, key)
+        with self._lock:
+            pins = 0
+            if full_key in self._entries:
+                pins = self._remove(full_key).pins
+            if size > self.budget_bytes * self.max_item_fraction:
+                self.rejected += 1
+                log.info(
+                    f"[cache] {namespace}:{key} は {size / 1024 / 1024:.1f}MB のためキャッシュしません"
+                )
+                return False
+            expires_at = time.monotonic() + ttl if ttl else None
+            self._entries[full_key] = _Entry(value, size, 0, expires_at, pins)
+            self._bytes += size
+            self._ns_bytes[namespace] = self._ns_bytes.get(namespace, 0) + size
+            self._shrink_to(self.budget_bytes, protect=full_key)
+            return True
+
+    def get_or_load(
+        self,
+        namespace: str,
+        key: Hashable,
+        loader: Callable[[], Any],
+        *,
+        ttl: Optional[float] = None,
+    ) -> Any:
+        """キャッシュになければ ``loader()`` の結果を格納して返す"""
+        sentinel = object()
+        value = self.get(namespace, key, sentinel)
+        if value is sentinel:
+            value = loader()
+            self.set(namespace, key, value, ttl=ttl)
+        return value
+
+    def pop(self, namespace: str, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._remove((namespace, key))
+            return default if entry is None else entry.value
+
+    def pin(self, namespace: str, key: Hashable) -> bool:
+        """追い出し対象から外す (参照カウント)。エントリが無ければ False"""
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                return False
+            entry.pins += 1
+            return True
+
+    def unpin(self, namespace: str, key: Hashable) -> None:
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is not None and entry.pins > 0:
+                entry.pins -= 1
+
+    def contains(self, namespace: str, key: Hashable) -> bool:
+        with self._lock:
+            return (namespace, key) in self._entries
+
+    def keys(self, namespace: str) -> List[Hashable]:
+        with self._lock:
+            return [k for ns, k in self._entries if ns == namespace]
+
+    def clear(self, namespace: Optional[str] = None) -> int:
+        """名前空間 (省略時は全体) を消去し、消した件数を返す"""
+        with self._lock:
+            if namespace is None:
+                n = len(self._entries)
+                self._entries.clear()
+                self._ns_bytes.clear()
+                self._bytes = 0
+                return n
+            doomed = [k for k in self._entries if k[0] == namespace]
+            for k in doomed:
+                self._remove(k)
+            return len(doomed)
+
+    def clear_prefix(self, prefix: str) -> int:
+        """``prefix`` で始まる名前空間をまとめて消去 (例: セッション単位)"""
+        with self._lock:
+            doomed = [k for k in self._entries if k[0].startswith(prefix)]
+            for k in doomed:
+                self._remove(k)
+            return len(doomed)
+
+    def clear_expired(self) -> int:
+        with self._lock:
+            now = time.monotonic()
+            doomed = [
+                k for k, e in self._entries.items()
+                if e.expires_at is not None and e.expires_at <= now
+            ]
+            for k in doomed:
+                self._remove(k)
+            self.expired += len(doomed)
+            return len(doomed)
+
+    # ---- 追い出し -----------------------------------------------------------
+    def _remove(self, full_key: Tuple[str, Hashable]) -> Optional[_Entry]:
+        entry = self._entries.pop(full_key, None)
+        if entry is not None:
+            self._bytes -= entry.nbytes
+            ns = full_key[0]
+            left = self._ns_bytes.get(ns, 0) - entry.nbytes
+            if left > 0:
+                self._ns_bytes[ns] = left
+            else:
+                self._ns_bytes.pop(ns, None)
+        return entry
+
+    def _victim(self, protect: Optional[Tuple[str, Hashable]]) -> Optional[Tuple[str, Hashable]]:
+        candidates = (k for k, e in self._entries.items() if k != protect and not e.pins)
+        if self.policy == "lru":
+            return next(candidates, None)
+        # OrderedDict は古い順なので、min は同数なら古い方を返す
+        return min(candidates, key=lambda k: self._entries[k].hits, default=None)
+
+    def _shrink_to(self, target_bytes: int, protect: Optional[Tuple[str, Hashable]] = None) -> int:
+        """``protect`` (格納直後のキー) 以外を追い出して target_bytes 以下にする"""
+        evicted = 0
+        while self._bytes > target_bytes:
+            victim = self._victim(protect)
+            if victim is None:
+                break
+            self._remove(victim)
+            evicted += 1
+            log.debug(f"[cache] evicted {victim[0]}:{victim[1]}")
+        self.evictions += evicted
+        return evicted
+
+    def trim(self) -> int:
+        """予算を超えていれば追い出す (pin を外した直後などに使う)"""
+        with self._lock:
+            return self._shrink_to(self.budget_bytes)
+
+    def relieve_pressure(self) -> int:
+        """メモリ圧迫時: 予算の ``pressure_target`` まで縮める (全消去はしない)"""
+        with self._lock:
+            self.clear_expired()
+            target = int(min(self._bytes, self.budget_bytes) * self.pressure_target)
+            evicted = self._shrink_to(target)
+        log.warning(f"[cache] memory pressure: {evicted} 件を追い出しました")
+        return evicted
+
+    def attach_memory_guard(self, guard: Any) -> None:
+        """ImprovedMemoryGuard / IntelligentMemoryManager の圧迫コールバックに登録"""
+        if hasattr(guard, "register_cleanup"):
+            guard.register_cleanup(self.relieve_pressure)
+        elif hasattr(guard, "add_cleanup_callback"):
+            guard.add_cleanup_callback(self.relieve_pressure)
+
+    # ---- 統計 -----------------------------------------------------------------
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def pinned_nbytes(self) -> int:
+        with self._lock:
+            return sum(e.nbytes for e in self._entries.values() if e.pins)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "pinned_bytes": sum(e.nbytes for e in self._entries.values() if e.pins),
+                "budget_bytes": self.budget_bytes,
+                "usage_ratio": self._bytes / self.budget_bytes if self.budget_bytes else 0.0,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "rejected": self.rejected,
+                "expired": self.expired,
+                "policy": self.policy,
+                "namespaces": dict(self._ns_bytes),
+            }
+
+    def namespace(
+        self, name: str, *, ttl: Optional[float] = None, max_entries: Optional[int] = None
+    ) -> "CacheNamespace":
+        return CacheNamespace(self, name, ttl=ttl, max_entries=max_entries)
+
+
+class CacheNamespace:
+    """
+    1 つの名前空間に対する dict 風のビュー
+
+    ``get(key, default)`` / ``set(key, value)`` / ``clear()`` / ``keys()`` /
+    ``get_stats()`` を持ち、従来の DATA_CACHE と同じ使い方ができる。
+    """
+
+    def __init__(
+        self,
+        cache: ByteBudgetCache,
+        name: str,
+        *,
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+    ):
+        self.cache = cache
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        return self.cache.get(self.name, key, default)
+
+    def set(self, key: Hashable, value: Any, *, ttl: Optional[float] = None) -> bool:
+        stored = self.cache.set(self.name, key, value, ttl=ttl if ttl is not None else self.ttl)
+        if self.max_entries is not None:
+            keys = self.keys()  # 古い順
+            for old in keys[: max(0, len(keys) - self.max_entries)]:
+                self.cache.pop(self.name, old)
+        return stored
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        return self.cache.get_or_load(self.name, key, loader, ttl=self.ttl)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        return self.cache.pop(self.name, key, default)
+
+    def clear(self) -> int:
+        return self.cache.clear(self.name)
+
+    def clear_expired(self) -> int:
+        return self.cache.clear_expired()
+
+    def keys(self) -> List[Hashable]:
+        return self.cache.keys(self.name)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.cache.contains(self.name, key)
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self.keys())
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self.cache.stats()
+        return {
+            "namespace": self.name,
+            "entries": len(self),
+            "bytes": stats["namespaces"].get(self.name, 0),
+            "global": stats,
+        }
+
+
+# プロセス全体で共有するキャッシュ
+shared_cache = ByteBudgetCache()
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    return shared_cache.stats()
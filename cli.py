@@ -3,6 +3,9 @@ import argparse, shutil
 from pathlib import Path
 from shift_suite import ingest_excel, build_heatmap, shortage_and_brief, summary
 from shift_suite.utils import safe_make_archive
+from shift_suite.tasks.artifact_store import pack_scenario_artifacts
+from shift_suite.tasks.scenario_manifest import write_scenario_manifest
+from shift_suite.tasks.utils import log
 
 def main():
     ap = argparse.ArgumentParser("shift‑suite CLI")
@@ -17,10 +20,28 @@ def main():
     shutil.rmtree(out, ignore_errors=True)
 
     long, wt, _ = ingest_excel(excel, out, args.slot)
-    build_heatmap(long, wt, out, args.slot)
-    shortage_and_brief(out, args.slot)
+    ds = long["ds"]
+    heat = build_heatmap(
+        long,
+        out,
+        args.slot,
+        ref_start_date_for_need=ds.min().date(),
+        ref_end_date_for_need=ds.max().date(),
+        return_result=True,
+    )
+    # 同一プロセスなのでヒートマップは再読込せずにそのまま渡す
+    shortage_and_brief(out, args.slot, heatmap_result=heat)
     summary_df = summary.daily_summary(out)
     summary_df.to_csv(out / "summary.csv", index=False)
+    # 概要マニフェストと Arrow バンドルは任意の後処理 (失敗しても CLI は続ける)
+    try:
+        write_scenario_manifest(out, long_df=long, slot_minutes=args.slot)
+    except Exception as e_manifest:
+        log.warning(f"scenario manifest failed for {out}: {e_manifest}")
+    try:
+        pack_scenario_artifacts(out)
+    except Exception as e_pack:
+        log.warning(f"artifact packing failed for {out}: {e_pack}")
 
     if args.zip:
         safe_make_archive(out, out.with_suffix(".zip"))
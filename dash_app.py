@@ -61,10 +61,9 @@ try:
     import psutil
 except ImportError:
     psutil = None  # psutilが利用できない場合はNoneに設定
-from functools import lru_cache, wraps
+from functools import wraps
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional, Any
-from collections import OrderedDict
 import unicodedata
 
 from datetime import datetime
@@ -77,7 +76,7 @@ import pyarrow.parquet as pq
 
 import plotly.express as px
 import plotly.graph_objects as go
-from dash import dash_table, dcc, html
+from dash import Patch, dash_table, dcc, html, no_update
 from dash.dependencies import Input, Output, State, ALL
 from dash.exceptions import PreventUpdate
 from flask import jsonify
@@ -131,15 +130,23 @@ except ImportError:
     }
 # メモリガードインポート（改善版）
 from improved_memory_guard import ImprovedMemoryGuard, ManagedCache, memory_guard, check_memory_usage, get_memory_report, with_memory_limit
+from byte_budget_cache import shared_cache
+from shared_artifact_cache import shared_artifacts
+from server_side_store import artifact_version, figure_cache, scenario_version
+from analysis_job_queue import DONE as JOB_DONE, cancel_owner_jobs, job_result, job_status, submit_job
 
 from shift_suite.tasks.utils import safe_read_excel, gen_labels, _valid_df
+from shift_suite.tasks.staff_index import staff_partition
 from shift_suite.tasks.shortage_factor_analyzer import ShortageFactorAnalyzer
 from shift_suite.tasks import over_shortage_log
 from shift_suite.tasks.daily_cost import calculate_daily_cost
 from shift_suite.tasks import leave_analyzer
 from shift_suite.tasks.shortage import shortage_and_brief  # 統一された計算メソッド
+from shift_suite.tasks.shortage_cube import ROLLUP_FILE as SHORTAGE_CUBE_ROLLUP_FILE, load_shortage_cube
+from shift_suite.tasks.artifact_store import clear_artifact_store_cache, read_artifact
+from shift_suite.tasks.heatmap_pyramid import clear_pyramid_cache
+from shift_suite.tasks.scenario_manifest import basic_info_from_manifest, read_scenario_manifest
 from shift_suite.tasks.constants import SLOT_HOURS, WAGE_RATES, COST_PARAMETERS, DEFAULT_SLOT_MINUTES, STATISTICAL_THRESHOLDS, SUMMARY5
-from shift_suite.tasks.shift_mind_reader import ShiftMindReader
 from shift_suite.tasks.advanced_blueprint_engine_v2 import AdvancedBlueprintEngineV2
 
 # ログ初期化（早期実行）
@@ -423,6 +430,11 @@ def create_dashboard_analysis_report(scenario_dir: Path, analysis_type: str = "D
 def collect_dashboard_basic_info(scenario_dir: Path) -> dict:
     """ダッシュボードの基本情報を収集"""
     try:
+        # 解析時に書き出したマニフェストがあればそれだけで足りる
+        manifest = read_scenario_manifest(scenario_dir)
+        if manifest is not None:
+            return basic_info_from_manifest(manifest, scenario_dir)
+
         basic_info = {}
         
         # シナリオ名（ディレクトリ名から）
@@ -455,24 +467,11 @@ def collect_dashboard_overview_kpis(scenario_dir: Path) -> dict:
     try:
         kpis = {}
         
-        # 不足・過剰時間
-        shortage_role_file = scenario_dir / "shortage_role_summary.parquet"
-        if shortage_role_file.exists():
-            df = pd.read_parquet(shortage_role_file)
-            kpis['total_shortage_hours'] = df.get('lack_h', pd.Series()).sum()
-            kpis['total_excess_hours'] = df.get('excess_h', pd.Series()).sum()
-        
-        # 疲労スコア
-        fatigue_file = scenario_dir / "fatigue_score.parquet"
-        if fatigue_file.exists():
-            df = pd.read_parquet(fatigue_file)
-            kpis['avg_fatigue_score'] = df.get('fatigue_score', pd.Series()).mean()
-        
-        # 公平性スコア
-        fairness_file = scenario_dir / "fairness_after.parquet"
-        if fairness_file.exists():
-            df = pd.read_parquet(fairness_file)
-            kpis['fairness_score'] = df.get('fairness_score', pd.Series()).mean()
+        manifest = read_scenario_manifest(scenario_dir)
+        if manifest is not None:
+            kpis.update({k: v for k, v in manifest.get('kpis', {}).items() if v is not None})
+        else:
+            kpis.update(_read_overview_kpis_from_files(scenario_dir))
         
         # デフォルト値設定
         kpis.setdefault('total_shortage_hours', 0)
@@ -487,6 +486,31 @@ def collect_dashboard_overview_kpis(scenario_dir: Path) -> dict:
         return {}
 
 
+def _read_overview_kpis_from_files(scenario_dir: Path) -> dict:
+    """マニフェストが無い場合の概要KPI (各 parquet から計算)"""
+    kpis = {}
+    
+    # 不足・過剰時間
+    shortage_role_file = scenario_dir / "shortage_role_summary.parquet"
+    if shortage_role_file.exists():
+        df = pd.read_parquet(shortage_role_file)
+        kpis['total_shortage_hours'] = df.get('lack_h', pd.Series()).sum()
+        kpis['total_excess_hours'] = df.get('excess_h', pd.Series()).sum()
+    
+    # 疲労スコア
+    fatigue_file = scenario_dir / "fatigue_score.parquet"
+    if fatigue_file.exists():
+        df = pd.read_parquet(fatigue_file)
+        kpis['avg_fatigue_score'] = df.get('fatigue_score', pd.Series()).mean()
+    
+    # 公平性スコア
+    fairness_file = scenario_dir / "fairness_after.parquet"
+    if fairness_file.exists():
+        df = pd.read_parquet(fairness_file)
+        kpis['fairness_score'] = df.get('fairness_score', pd.Series()).mean()
+    return kpis
+
+
 def collect_dashboard_role_analysis(scenario_dir: Path) -> list:
     """職種別分析データを収集"""
     try:
@@ -773,21 +797,20 @@ def simple_synergy_analysis(long_df: pd.DataFrame, target_staff: str) -> pd.Data
         return pd.DataFrame()
     
     # 対象職員の勤務記録
-    target_work = long_df[long_df['staff'] == target_staff]
+    staff_parts = staff_partition(long_df)
+    target_work = staff_parts.get(target_staff)
     if target_work.empty:
         return pd.DataFrame()
     
     # 他の職員との共働分析
     synergy_scores = []
-    other_staff = long_df[long_df['staff'] != target_staff]['staff'].unique()
+    target_slots = set(target_work['ds'])
     
-    for coworker in other_staff:
-        coworker_work = long_df[long_df['staff'] == coworker]
-        if coworker_work.empty:
+    for coworker, coworker_work in staff_parts.items():
+        if coworker == target_staff or coworker_work.empty:
             continue
         
         # 共働した日時を特定
-        target_slots = set(target_work['ds'])
         coworker_slots = set(coworker_work['ds'])
         together_slots = target_slots & coworker_slots
         
@@ -869,6 +892,8 @@ app.layout = html.Div([
     # セッションストア
     dcc.Store(id='session-id-store', storage_type='session'),
     dcc.Store(id='data-ingestion-output', storage_type='memory'),
+    # 描画済みタブ ({'view': シナリオのバージョン, 'tabs': [タブ ID (ペインの並び順)]})
+    dcc.Store(id='rendered-tabs-store', storage_type='memory'),
 
     # ヘッダー
     html.Div([
@@ -946,10 +971,10 @@ app.layout = html.Div([
             dcc.Tab(label='ブループリント', value='blueprint-tab'),
             dcc.Tab(label='AI分析', value='ai-tab'),
         ]),
-        html.Div(id='tab-content', style={'padding': '20px'})
+        html.Div(id='tab-content', children=[], style={'padding': '20px'})
     ], id='main-content-area', style={'display': 'none'}),
 
-    # AI分析用インターバル
+    # AI分析用インターバル (AI分析タブでジョブが実行中の間だけ有効にする)
     dcc.Interval(id='ai-analysis-interval', interval=5000, n_intervals=0, disabled=True),
 
     # Mind Reader結果表示エリア
@@ -957,22 +982,53 @@ app.layout = html.Div([
 ])
 
 # タブコンテンツの動的レンダリング
+# 一度描画したタブはペインとしてブラウザに残し、切り替え時は表示/非表示だけを
+# Patch で送る (タブを往復するたびに図を含む子要素を JSON にし直さない)。
+# シナリオ (またはその成果物) が更新されたら全ペインを作り直す。
 @app.callback(
-    Output('tab-content', 'children'),
+    [Output('tab-content', 'children'),
+     Output('rendered-tabs-store', 'data')],
     [Input('main-tabs', 'value'),
      Input('scenario-dropdown', 'value')],
-    [State('session-id-store', 'data')]
+    [State('session-id-store', 'data'),
+     State('rendered-tabs-store', 'data')]
 )
-def render_tab_content(active_tab, selected_scenario, session_id):
+def render_tab_content(active_tab, selected_scenario, session_id, rendered):
     """選択されたタブのコンテンツを動的にレンダリング"""
 
     if not selected_scenario:
-        return html.Div([
+        return [html.Div([
             html.H3("データを選択してください"),
             html.P("上部のドロップダウンからシナリオを選択するか、新しいZIPファイルをアップロードしてください。")
-        ])
+        ])], None
+
+    view = f"{selected_scenario}:{scenario_version(selected_scenario)}:{session_id}"
+    rendered = rendered or {}
+    tabs = list(rendered.get('tabs') or [])
+
+    if rendered.get('view') != view:
+        pane = _tab_pane(active_tab, _build_tab_content(active_tab, selected_scenario, session_id), True)
+        return [pane], {'view': view, 'tabs': [active_tab]}
+
+    patched = Patch()
+    for i, tab in enumerate(tabs):
+        patched[i]['props']['style'] = _tab_pane_style(tab == active_tab)
+    if active_tab in tabs:
+        return patched, no_update
+    patched.append(_tab_pane(active_tab, _build_tab_content(active_tab, selected_scenario, session_id), True))
+    return patched, {'view': view, 'tabs': tabs + [active_tab]}
+
 
-    # タブに応じたコンテンツを返す
+def _tab_pane_style(visible: bool) -> dict:
+    return {'display': 'block' if visible else 'none'}
+
+
+def _tab_pane(tab: str, content, visible: bool) -> html.Div:
+    return html.Div(content, id={'type': 'tab-pane', 'tab': tab}, style=_tab_pane_style(visible))
+
+
+def _build_tab_content(active_tab, selected_scenario, session_id):
+    """タブに応じたコンテンツを返す"""
     if active_tab == 'overview-tab':
         return create_overview_tab(selected_scenario, session_id)
     elif active_tab == 'heatmap-tab':
@@ -1104,62 +1160,6 @@ def handle_500(e):
     return jsonify({"error": "Internal server error", "message": str(e)}), 200
 
 # === グローバル状態管理（安定性向上版） ===
-# メモリ効率的なLRUキャッシュの実装
-class ThreadSafeLRUCache:
-    """スレッドセーフなLRUキャッシュ実装"""
-    def __init__(self, maxsize: int = 50):
-        self._cache = OrderedDict()
-        self._lock = threading.RLock()
-        self._maxsize = maxsize
-        self._hits = 0
-        self._misses = 0
-        
-    def get(self, key: str, default=None):
-        with self._lock:
-            if key in self._cache:
-                # LRU: 最近使用したものを末尾に移動
-                self._cache.move_to_end(key)
-                self._hits += 1
-                return self._cache[key]
-            self._misses += 1
-            return default
-            
-    def set(self, key: str, value: Any):
-        with self._lock:
-            if key in self._cache:
-                del self._cache[key]
-            self._cache[key] = value
-            # サイズ制限を超えたら最も古いものを削除
-            if len(self._cache) > self._maxsize:
-                oldest_key = next(iter(self._cache))
-                del self._cache[oldest_key]
-                log.debug(f"Cache evicted: {oldest_key}")
-                
-    def clear(self):
-        with self._lock:
-            self._cache.clear()
-            self._hits = 0
-            self._misses = 0
-            
-    def get_stats(self):
-        with self._lock:
-            total = self._hits + self._misses
-            hit_rate = self._hits / total if total > 0 else 0
-            return {
-                "size": len(self._cache),
-                "hits": self._hits,
-                "misses": self._misses,
-                "hit_rate": hit_rate
-            }
-            
-    def __contains__(self, key):
-        with self._lock:
-            return key in self._cache
-            
-    def keys(self):
-        with self._lock:
-            return list(self._cache.keys())
-
 # グローバルキャッシュとロック
 # 統一キャッシュシステム（メモリ管理改善）
 class ImprovedUnifiedCacheManager:
@@ -1187,30 +1187,20 @@ class ImprovedUnifiedCacheManager:
             self.data_cache = ManagedCache(
                 maxsize=data_size,
                 ttl=3600,
-                memory_guard=self.memory_guard
+                memory_guard=self.memory_guard,
+                name="data"
             )
             self.synergy_cache = ManagedCache(
                 maxsize=synergy_size,
                 ttl=1800,
-                memory_guard=self.memory_guard
+                memory_guard=self.memory_guard,
+                name="synergy"
             )
             
             log.info(f"ManagedCacheを使用 (data:{data_size}, synergy:{synergy_size})")
         
-        # メモリ監視開始
+        # メモリ監視開始 (緊急時は memory_guard が共有キャッシュを予算の一定割合まで縮める)
         self.memory_guard.start_monitoring()
-        
-        # クリーンアップコールバック登録
-        self.memory_guard.register_cleanup(self._emergency_cache_cleanup)
-    
-    def _emergency_cache_cleanup(self):
-        """緊急時のキャッシュクリーンアップ"""
-        log.warning("Emergency cache cleanup triggered")
-        if hasattr(self.data_cache, 'clear'):
-            self.data_cache.clear()
-        if hasattr(self.synergy_cache, 'clear'):
-            self.synergy_cache.clear()
-        gc.collect()
     
     def get_memory_usage(self):
         """現在のメモリ使用量を取得（MB）"""
@@ -1231,6 +1221,7 @@ class ImprovedUnifiedCacheManager:
             'memory': memory_stats,
             'data_cache': data_stats,
             'synergy_cache': synergy_stats,
+            'shared_cache': shared_cache.stats(),
             'timestamp': datetime.now().isoformat()
         }
 
@@ -1332,6 +1323,19 @@ def detect_slot_intervals_from_data(temp_dir_path: Path, scenarios: List[str]) -
         scenario_path = temp_dir_path / first_scenario
         long_df_path = scenario_path / "intermediate_data.parquet"
         
+        # 解析時のスロット間隔がマニフェストにあれば intermediate_data を読まない
+        manifest = read_scenario_manifest(scenario_path)
+        if manifest and manifest.get('slot_minutes'):
+            slot_minutes = int(manifest['slot_minutes'])
+            DETECTED_SLOT_INFO.update({
+                'slot_minutes': slot_minutes,
+                'slot_hours': slot_minutes / 60.0,
+                'confidence': 1.0,
+                'auto_detected': True,
+            })
+            log.info(f"[ダッシュボード] マニフェストからスロット間隔を取得: {slot_minutes}分")
+            return
+        
         if long_df_path.exists():
             long_df = pd.read_parquet(long_df_path)
             if not long_df.empty and 'ds' in long_df.columns:
@@ -1630,9 +1634,13 @@ def date_with_weekday(date_str: str) -> str:
         return str(date_str)
 
 
-@lru_cache(maxsize=8)
+# ファイル読み込み結果は内容ハッシュ単位でセッション間共有する (バイト予算内)
 def safe_read_parquet(filepath: Path) -> pd.DataFrame:
-    """Parquetファイルを安全に読み込み結果をキャッシュ"""
+    """Parquetファイルを安全に読み込み結果をキャッシュ (共有値のため変更しないこと)"""
+    return shared_artifacts.load(filepath, _read_parquet_file)
+
+
+def _read_parquet_file(filepath: Path) -> pd.DataFrame:
     try:
         if not filepath.exists():
             log.debug(f"File does not exist: {filepath}")
@@ -1642,7 +1650,8 @@ def safe_read_parquet(filepath: Path) -> pd.DataFrame:
             log.warning(f"Empty file detected: {filepath}")
             return pd.DataFrame()
             
-        df = pd.read_parquet(filepath)
+        # artifacts.manifest.json があればメモリマップから (読み取り専用)
+        df = read_artifact(filepath)
         log.debug(f"Successfully loaded {filepath}: shape={df.shape}")
         return df
     except FileNotFoundError:
@@ -1656,15 +1665,18 @@ def safe_read_parquet(filepath: Path) -> pd.DataFrame:
         return pd.DataFrame()
 
 
-@lru_cache(maxsize=8)
 def safe_read_csv(filepath: Path) -> pd.DataFrame:
     """CSVファイルを安全に読み込み（Parquet優先）結果をキャッシュ"""
+    return shared_artifacts.load(filepath, _read_csv_file)
+
+
+def _read_csv_file(filepath: Path) -> pd.DataFrame:
     try:
         # PARQUET OPTIMIZATION: Try Parquet version first
         parquet_path = filepath.with_suffix('.parquet')
         if parquet_path.exists():
             log.debug(f"[PARQUET OPTIMIZATION] Loading Parquet version instead: {parquet_path}")
-            return pd.read_parquet(parquet_path)
+            return read_artifact(parquet_path)
         
         return pd.read_csv(filepath)  # type: ignore
     except Exception as e:
@@ -1685,8 +1697,9 @@ def clear_data_cache(session_id=None) -> None:
         # レガシーサポートのための警告のみ
         log.warning('Global cache clear attempted - use session-specific clear instead')
         # DATA_CACHE.clear()  # 無効化
-    safe_read_parquet.cache_clear()
-    safe_read_csv.cache_clear()
+    shared_artifacts.clear()
+    clear_artifact_store_cache()
+    clear_pyramid_cache()
     
     # 積極的なガベージコレクション
     gc.collect()
@@ -1739,10 +1752,7 @@ def emergency_cleanup():
     # メモリ圧迫が続く場合
     if check_memory_pressure():
         # 段階2: 関数キャッシュをクリア
-        if 'safe_read_parquet' in globals():
-            safe_read_parquet.cache_clear()
-        if 'safe_read_csv' in globals():
-            safe_read_csv.cache_clear()
+        shared_artifacts.clear()
         log.info("Stage 2: 関数キャッシュをクリア")
     
     # それでもメモリ圧迫が続く場合
@@ -1909,6 +1919,8 @@ def clear_session_cache(session_id: str) -> bool:
     """セッションキャッシュをクリア（DATA_CACHE.clearの代替）"""
     if not session_id:
         return False
+    shared_artifacts.release(session_id)
+    cancel_owner_jobs(session_id)
     return enhanced_session_manager.clear_cache(session_id)
 
 
@@ -2333,83 +2345,41 @@ def session_aware_data_get(key: str, default=None, for_display: bool = False, se
         if cached_result is not None:
             return cached_result
         
-        # リアルタイム分析実行（タイムアウト付き）
-        long_df = session_aware_data_get('long_df', session_id=session_id)
-        if long_df is not None and not long_df.empty:
-            # メモリ使用量チェック
-            if psutil and psutil.virtual_memory().percent > 80:
-                log.warning("メモリ使用率が高いためMind Reader分析をスキップします")
-                return {'status': 'skipped', 'reason': 'high_memory_usage'}
-            
-            mind_reader = ShiftMindReader()
-            try:
-                # Windows/Unix両対応のタイムアウト設定
-                import platform
-                import threading
-                
-                def run_with_timeout(func, args=(), kwargs={}, timeout=30):
-                    """タイムアウト付き関数実行（Windows対応）"""
-                    result = [None]
-                    exception = [None]
-                    
-                    def target():
-                        try:
-                            result[0] = func(*args, **kwargs)
-                        except Exception as e:
-                            exception[0] = e
-                    
-                    thread = threading.Thread(target=target)
-                    thread.daemon = True
-                    thread.start()
-                    thread.join(timeout)
-                    
-                    if thread.is_alive():
-                        # タイムアウト
-                        return None, TimeoutError("Mind Reader analysis timed out")
-                    if exception[0]:
-                        return None, exception[0]
-                    return result[0], None
-                
-                # プラットフォーム判定
-                if platform.system() == 'Windows':
-                    # Windows: threadingを使用
-                    mind_results, error = run_with_timeout(
-                        mind_reader.read_creator_mind, 
-                        args=(long_df,), 
-                        timeout=30
-                    )
-                    if error:
-                        if isinstance(error, TimeoutError):
-                            log.warning("Mind Reader分析がタイムアウトしました")
-                            return {'status': 'timeout', 'reason': 'analysis_timeout'}
-                        else:
-                            raise error
-                else:
-                    # Unix系: signalを使用（既存コード）
-                    import signal
-                    def timeout_handler(signum, frame):
-                        raise TimeoutError("Mind Reader analysis timed out")
-                    
-                    signal.signal(signal.SIGALRM, timeout_handler)
-                    signal.alarm(30)
-                    try:
-                        mind_results = mind_reader.read_creator_mind(long_df)
-                        signal.alarm(0)
-                    finally:
-                        signal.alarm(0)
-                
-                # Phase 3: 内部関数からの外部session_id参照
-                if 'session_id' in locals() and session_id:
-                    set_session_cache_item(session_id, cache_key, mind_results)
-                else:
-                    DATA_CACHE.set(cache_key, mind_results)  # レガシーフォールバック
-                return mind_results
-            except TimeoutError:
-                log.warning("Mind Reader分析がタイムアウトしました")
-                return {'status': 'timeout', 'reason': 'analysis_timeout'}
-            except Exception as e:
-                log.warning(f"Mind Reader分析に失敗: {e}")
-                return {'status': 'error', 'reason': str(e)}
+        # 分析はジョブキューの子プロセスで実行し、ここでは投入と完了確認だけを行う
+        # (コールバックのスレッドを数分塞がない。ai-analysis-interval で再度呼ばれる)
+        job_key = f"{cache_key}_job"
+        job_id = get_session_cache_item(session_id, job_key) if session_id else DATA_CACHE.get(job_key)
+        job = job_status(job_id)
+        if job is None:
+            long_df_file = next(
+                (d / "intermediate_data.parquet" for d in search_dirs if (d / "intermediate_data.parquet").exists()),
+                None,
+            )
+            if long_df_file is None:
+                return default
+            job = submit_job("mind_reader", {"long_df_path": str(long_df_file)}, owner=session_id)
+            if session_id:
+                set_session_cache_item(session_id, job_key, job.job_id)
+            else:
+                DATA_CACHE.set(job_key, job.job_id)  # レガシーフォールバック
+
+        if not job.done:
+            return {'status': 'running', 'job_id': job.job_id, 'elapsed': job.elapsed}
+        if job.status != JOB_DONE:
+            log.warning(f"Mind Reader分析ジョブ {job.job_id} が {job.status} で終了: {job.error}")
+            # 失敗・取り消しのジョブ ID を残すと再投入されないので忘れる
+            if session_id:
+                set_session_cache_item(session_id, job_key, None)
+            else:
+                DATA_CACHE.set(job_key, None)  # レガシーフォールバック
+            return {'status': job.status, 'reason': (job.error or job.status).splitlines()[0], 'job_id': job.job_id}
+
+        mind_results = job_result(job.job_id, default)
+        if session_id:
+            set_session_cache_item(session_id, cache_key, mind_results)
+        else:
+            DATA_CACHE.set(cache_key, mind_results)  # レガシーフォールバック
+        return mind_results
     
     log.debug(f"データキー '{key}' に対応するファイルが見つかりませんでした。")
     # Phase 3: 内部関数からの外部session_id参照
@@ -2823,56 +2793,6 @@ def create_enhanced_rest_exclusion_filter(df: pd.DataFrame) -> pd.DataFrame:
     """
     return apply_rest_exclusion_filter(df, "dashboard")
 
-def optimize_heatmap_data(df: pd.DataFrame, max_days: int = 60, remove_zero_rows: bool = False) -> pd.DataFrame:
-    """ヒートマップデータを最適化する"""
-    if df.empty:
-        return df
-    
-    # 日付列を特定
-    date_cols = [c for c in df.columns if pd.to_datetime(c, errors='coerce') is not pd.NaT]
-    
-    if not date_cols:
-        return df
-    
-    # 最新の日付から指定数だけを取得
-    if len(date_cols) > max_days:
-        log.info(f"[Heatmap最適化] {len(date_cols)}日 -> 直近{max_days}日に制限")
-        # 日付をソートして最新のものを取得
-        sorted_dates = sorted(date_cols, key=lambda x: pd.to_datetime(x, errors='coerce'))
-        recent_dates = sorted_dates[-max_days:]
-        
-        # 必要な列のみを取得
-        non_date_cols = [c for c in df.columns if c not in date_cols]
-        optimized_df = df[non_date_cols + recent_dates].copy()
-    else:
-        optimized_df = df.copy()
-    
-    # データクリーニング
-    numeric_cols = optimized_df.select_dtypes(include=[np.number]).columns
-    optimized_df[numeric_cols] = optimized_df[numeric_cols].fillna(0)
-    
-    # 全て0の行を除去（オプション）
-    if remove_zero_rows and len(numeric_cols) > 0:
-        zero_rows = (optimized_df[numeric_cols] == 0).all(axis=1)
-        if zero_rows.any():
-            rows_removed = zero_rows.sum()
-            log.info(f"[Heatmap最適化] 全て0の行を{rows_removed}行除去")
-            optimized_df = optimized_df[~zero_rows]
-    
-    # メモリ使用量を最適化
-    for col in numeric_cols:
-        if optimized_df[col].dtype == 'float64':
-            # 値の範囲に応じてデータ型を最適化
-            max_val = optimized_df[col].max()
-            if max_val <= 255:
-                optimized_df[col] = optimized_df[col].astype('uint8')
-            elif max_val <= 32767:
-                optimized_df[col] = optimized_df[col].astype('int16')
-            else:
-                optimized_df[col] = optimized_df[col].astype('float32')
-    
-    return optimized_df
-
 def create_knowledge_network_graph(network_data: Dict) -> cyto.Cytoscape:
     """Return an interactive network graph of implicit knowledge."""
     nodes = [
@@ -3519,10 +3439,17 @@ def create_shortage_tab(selected_scenario: str = None, session_id: str = None) -
         if not df_shortage_role.empty:
             content.append(html.H4("職種別不足時間"))  # type: ignore
 
-            # 正確な不足時間計算（shortage_timeから直接取得）
+            # 正確な不足時間計算（過不足キューブのロールアップ、無ければshortage_timeから直接取得）
             total_lack = 0
-            shortage_time_df = session_aware_data_get('shortage_time', pd.DataFrame(), session_id=session_id)
-            if not shortage_time_df.empty:
+            shortage_cube = load_shortage_cube(get_session_scenario_dir(session_id) or workspace)
+            shortage_time_df = (
+                pd.DataFrame() if shortage_cube is not None
+                else session_aware_data_get('shortage_time', pd.DataFrame(), session_id=session_id)
+            )
+            if shortage_cube is not None:
+                total_lack = shortage_cube.total('lack')
+                log.info(f"不足分析タブ: キューブから不足時間 {total_lack:.2f}h")
+            elif not shortage_time_df.empty:
                 try:
                     numeric_cols = shortage_time_df.select_dtypes(include=[np.number])
                     if not numeric_cols.empty:
@@ -3731,6 +3658,78 @@ def create_shortage_tab(selected_scenario: str = None, session_id: str = None) -
         ])
 
 
+@app.callback(
+    Output('shortage-heatmap-detail-container', 'children'),
+    [Input('shortage-heatmap-scope', 'value'),
+     Input('session-id-store', 'data')],
+)
+@safe_callback
+def update_shortage_heatmap_detail(scope, session_id):
+    """表示範囲が職種別/雇用形態別のとき、対象を選ぶドロップダウンを出す (全体では非表示)"""
+    keys = []
+    if scope in ('role', 'employment'):
+        cube = load_shortage_cube(get_session_scenario_dir(session_id) or workspace)
+        keys = cube.keys(scope) if cube is not None else []
+    return dcc.Dropdown(
+        id='shortage-heatmap-key',
+        options=[{'label': k, 'value': k} for k in keys],
+        value=keys[0] if keys else None,
+        clearable=False,
+        style={'width': '300px', 'display': 'block' if keys else 'none'}
+    )
+
+
+@app.callback(
+    Output('shortage-ratio-heatmap', 'children'),
+    [Input('shortage-heatmap-scope', 'value'),
+     Input('shortage-heatmap-key', 'value'),
+     Input('session-id-store', 'data')],
+)
+@safe_callback
+def update_shortage_ratio_heatmap(scope, key, session_id):
+    """曜日 × 時間帯の平均不足率ヒートマップ (キューブのロールアップから取得)"""
+    scenario_dir = get_session_scenario_dir(session_id) or workspace
+    cube = load_shortage_cube(scenario_dir)
+    if cube is None:
+        return html.P("過不足キューブが見つかりません。分析を再実行してください。")
+    scope = scope or 'overall'
+    cube_scope = 'all' if scope == 'overall' else scope
+    if cube_scope != 'all' and not key:
+        raise PreventUpdate
+
+    # 同じキューブ・同じ表示条件の図は組み立て直さない
+    fig = figure_cache.get_or_build(
+        artifact_version(Path(scenario_dir) / SHORTAGE_CUBE_ROLLUP_FILE),
+        {'view': 'shortage_ratio_heatmap', 'scope': cube_scope, 'key': key},
+        lambda: _build_shortage_ratio_figure(cube, cube_scope, key),
+    )
+    if fig is None:
+        return html.P("該当するデータがありません。")
+    return dcc.Graph(figure=fig)
+
+
+def _build_shortage_ratio_figure(cube, cube_scope, key):
+
+    lack = cube.query('lack', by='weekday', scope=cube_scope, key=key)
+    need = cube.query('need', by='weekday', scope=cube_scope, key=key)
+    if lack.empty:
+        return None
+    ratio = lack.assign(
+        value=(lack['value'].clip(lower=0) / need['value'].replace(0, np.nan)).fillna(0)
+    ).pivot(index='slot', columns='weekday', values='value')
+    title = '全体' if cube_scope == 'all' else key
+    fig = px.imshow(
+        ratio,
+        aspect='auto',
+        color_continuous_scale='Reds',
+        zmin=0,
+        zmax=1,
+        labels={'x': '曜日', 'y': '時間帯', 'color': '不足率'},
+        title=f'曜日×時間帯 平均不足率 ({title})'
+    )
+    return fig
+
+
 def create_optimization_tab() -> html.Div:
     """最適化分析タブを作成"""
     return html.Div([  # type: ignore
@@ -3782,38 +3781,54 @@ def create_optimization_tab() -> html.Div:
 
 
 # Mind Reader分析を動的実行するコールバック
+# AI分析タブを開くとジョブを投入してインターバルを有効にし、終了したら無効に戻す
 @app.callback(
-    Output('mind-reader-results', 'children'),
-    [Input('ai-analysis-interval', 'n_intervals'),
+    [Output('mind-reader-results', 'children'),
+     Output('ai-analysis-interval', 'disabled')],
+    [Input('main-tabs', 'value'),
+     Input('ai-analysis-interval', 'n_intervals'),
      Input('session-id-store', 'data')],
     prevent_initial_call=True
 )
 @safe_callback
-def execute_mind_reader_analysis(n_intervals, session_id):
+def execute_mind_reader_analysis(active_tab, n_intervals, session_id):
     """Mind Reader分析をリアルタイム実行"""
-    if n_intervals == 0:
-        raise PreventUpdate
+    if active_tab != 'ai-tab':
+        # 他のタブではポーリングしない (ジョブは続行し、タブに戻ったときに結果を拾う)
+        return no_update, True
     
     try:
-        # Mind Reader分析を実行
+        # Mind Reader分析ジョブを投入・確認 (完了するまでは進捗だけを返す)
         mind_results = session_aware_data_get('mind_reader_analysis', {}, session_id=session_id)
         
+        status = mind_results.get('status') if isinstance(mind_results, dict) else None
+        if status == 'running':
+            elapsed = mind_results.get('elapsed') or 0
+            return html.Div([
+                html.H4("⏳ AI分析を実行中...", style={'color': '#3498db'}),
+                html.P(f"バックグラウンドで分析しています (経過 {elapsed:.0f} 秒)。完了すると自動で表示されます。")
+            ]), False
+        if status in ('failed', 'cancelled', 'interrupted'):
+            return html.Div([
+                html.H4("❌ 分析エラー", style={'color': '#e74c3c'}),
+                html.P(f"Error: {mind_results.get('reason', status)}")
+            ]), True
         if mind_results:
             return html.Div([
                 html.H4("✅ AI分析完了", style={'color': '#27ae60'}),
                 *create_mind_reader_display(mind_results)
-            ])
+            ]), True
         else:
             return html.Div([
                 html.H4("⚠️ 分析データが不足しています", style={'color': '#f39c12'}),
                 html.P("より詳細な分析を行うには、十分なシフトデータが必要です。")
-            ])
+            ]), True
     
     except Exception as e:
         return html.Div([
             html.H4("❌ 分析エラー", style={'color': '#e74c3c'}),
             html.P(f"Error: {str(e)}")
-        ])
+        ]), True
 
 
 # --- アプリケーション起動 ---
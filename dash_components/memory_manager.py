@@ -11,7 +11,6 @@ import threading
 import weakref
 from typing import Dict, Any, Optional, Callable, Set
 from dataclasses import dataclass
-from collections import OrderedDict
 import pandas as pd
 import numpy as np
 
@@ -21,6 +20,8 @@ try:
 except ImportError:
     PSUTIL_AVAILABLE = False
 
+from byte_budget_cache import shared_cache
+
 # ログ設定
 log = logging.getLogger(__name__)
 
@@ -274,95 +275,64 @@ class IntelligentMemoryManager:
         }
 
 class SmartCacheManager:
-    """スマートキャッシュ管理システム"""
+    """
+    スマートキャッシュ管理システム
+
+    値は byte_budget_cache.shared_cache の名前空間に置き、件数上限に加えて
+    プロセス全体のバイト予算を共有する。メモリ圧迫時は全消去せず予算の一定割合まで縮める。
+    """
     
-    def __init__(self, max_size: int = 100, memory_manager: IntelligentMemoryManager = None):
+    def __init__(self, max_size: int = 100, memory_manager: IntelligentMemoryManager = None,
+                 namespace: str = "smart"):
         self.max_size = max_size
         self.memory_manager = memory_manager or IntelligentMemoryManager()
-        self._cache: OrderedDict = OrderedDict()
-        self._access_counts: Dict[str, int] = {}
-        self._lock = threading.RLock()
+        self._ns = shared_cache.namespace(namespace, max_entries=max_size)
         
         # メモリマネージャーにクリーンアップコールバックを登録
         self.memory_manager.add_cleanup_callback(self._emergency_cache_cleanup)
     
     def get(self, key: str, default: Any = None) -> Any:
         """キャッシュから値を取得"""
-        with self._lock:
-            if key in self._cache:
-                # LRU: アクセスされたアイテムを末尾に移動
-                value = self._cache.pop(key)
-                self._cache[key] = value
-                self._access_counts[key] = self._access_counts.get(key, 0) + 1
-                self.memory_manager.cache_hits += 1
-                return value
-            else:
-                self.memory_manager.cache_misses += 1
-                return default
+        sentinel = object()
+        value = self._ns.get(key, sentinel)
+        if value is sentinel:
+            self.memory_manager.cache_misses += 1
+            return default
+        self.memory_manager.cache_hits += 1
+        return value
     
     def set(self, key: str, value: Any) -> None:
         """キャッシュに値を設定"""
-        with self._lock:
-            # 既存キーの更新
-            if key in self._cache:
-                self._cache.pop(key)
-            
-            # 新しい値を追加
-            self._cache[key] = value
-            self._access_counts[key] = 1
-            
+        if self._ns.set(key, value):
             # メモリマネージャーに登録
             self.memory_manager.register_cache_object(key, value)
-            
-            # サイズ制限チェック
-            while len(self._cache) > self.max_size:
-                self._evict_least_used()
-    
-    def _evict_least_used(self) -> None:
-        """最も使用頻度の低いアイテムを削除"""
-        if not self._cache:
-            return
-        
-        # アクセス数が最も少ないキーを見つける
-        min_access_key = min(self._access_counts.keys(), 
-                           key=lambda k: self._access_counts.get(k, 0))
-        
-        # 削除
-        self._cache.pop(min_access_key, None)
-        self._access_counts.pop(min_access_key, None)
-        
-        log.debug(f"[スマートキャッシュ] LRU削除: {min_access_key}")
     
     def _emergency_cache_cleanup(self) -> None:
         """緊急時のキャッシュクリーンアップ"""
-        with self._lock:
-            # キャッシュサイズを半分に削減
-            target_size = self.max_size // 2
-            while len(self._cache) > target_size:
-                self._evict_least_used()
-            
-            log.info(f"[スマートキャッシュ] 緊急クリーンアップ完了: {len(self._cache)}個保持")
+        shared_cache.relieve_pressure()
+        log.info(f"[スマートキャッシュ] 緊急クリーンアップ完了: {len(self._ns)}個保持")
     
     def clear(self) -> None:
         """キャッシュを全クリア"""
-        with self._lock:
-            self._cache.clear()
-            self._access_counts.clear()
+        self._ns.clear()
     
     def keys(self) -> list:
         """キャッシュキー一覧を取得"""
-        with self._lock:
-            return list(self._cache.keys())
+        return self._ns.keys()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return self._ns.get_stats()
     
     def get_cache_info(self) -> Dict[str, Any]:
         """キャッシュ情報を取得"""
-        with self._lock:
-            return {
-                'size': len(self._cache),
-                'max_size': self.max_size,
-                'hit_rate': self.memory_manager.cache_hits / (self.memory_manager.cache_hits + self.memory_manager.cache_misses) * 100 if (self.memory_manager.cache_hits + self.memory_manager.cache_misses) > 0 else 0,
-                'most_accessed': max(self._access_counts.items(), key=lambda x: x[1]) if self._access_counts else None
-            }
+        stats = self._ns.get_stats()
+        return {
+            'size': stats['entries'],
+            'max_size': self.max_size,
+            'bytes': stats['bytes'],
+            'hit_rate': self.memory_manager.cache_hits / (self.memory_manager.cache_hits + self.memory_manager.cache_misses) * 100 if (self.memory_manager.cache_hits + self.memory_manager.cache_misses) > 0 else 0,
+            'evictions': stats['global']['evictions'],
+        }
 
 # グローバルインスタンス
 memory_manager = IntelligentMemoryManager()
@@ -46,6 +46,8 @@ from flask import jsonify
 import traceback
 import gc
 
+from byte_budget_cache import shared_cache
+
 # Error handling imports
 from error_boundary import error_boundary, safe_callback, safe_component, apply_error_boundaries
 from global_error_handler import GlobalErrorHandler, global_error_handler, safe_data_operation, error_handler
@@ -210,26 +212,25 @@ log.setLevel(logging.INFO)
 
 # Memory management utilities
 class ManagedCache:
-    """Simple cache manager with size limits"""
+    """Session-aware view over the shared byte-budget cache"""
     def __init__(self, max_size_mb: float = 100):
-        self._cache = {}
         self.max_size_mb = max_size_mb
 
+    @staticmethod
+    def _namespace(session_id: str = None) -> str:
+        return f"session:{session_id}:data" if session_id else "dash_core:data"
+
     def get(self, key: str, session_id: str = None):
-        cache_key = f"{session_id}:{key}" if session_id else key
-        return self._cache.get(cache_key)
+        return shared_cache.get(self._namespace(session_id), key)
 
     def set(self, key: str, value, session_id: str = None):
-        cache_key = f"{session_id}:{key}" if session_id else key
-        self._cache[cache_key] = value
+        shared_cache.set(self._namespace(session_id), key, value)
 
     def clear(self, session_id: str = None):
         if session_id:
-            keys_to_remove = [k for k in self._cache.keys() if k.startswith(f"{session_id}:")]
-            for key in keys_to_remove:
-                del self._cache[key]
+            shared_cache.clear_prefix(f"session:{session_id}:")
         else:
-            self._cache.clear()
+            shared_cache.clear(self._namespace())
 
 # Global cache instance
 DATA_CACHE = ManagedCache(max_size_mb=200)
@@ -12,7 +12,7 @@ import sys
 import time
 import threading
 from typing import Dict, Any, Optional, List, Callable
-from datetime import datetime, timedelta
+from datetime import datetime
 import weakref
 from functools import wraps
 
@@ -23,6 +23,8 @@ except ImportError:
     PSUTIL_AVAILABLE = False
     print("Warning: psutil not available. Memory monitoring limited.")
 
+from byte_budget_cache import shared_cache
+
 log = logging.getLogger(__name__)
 
 class ImprovedMemoryGuard:
@@ -204,6 +206,7 @@ class ImprovedMemoryGuard:
             log.info("Starting gentle memory cleanup")
             
             # 1. 期限切れキャッシュのクリア
+            shared_cache.clear_expired()
             for cache_ref in self.cache_refs:
                 if hasattr(cache_ref, 'clear_expired'):
                     cache_ref.clear_expired()
@@ -232,8 +235,12 @@ class ImprovedMemoryGuard:
         with self._lock:
             log.warning("Starting emergency memory cleanup")
             
-            # 1. 全キャッシュクリア
+            # 1. 共有バイト予算のキャッシュ (ManagedCache の実体) は全消去せず、
+            #    予算の一定割合まで縮める。それ以外の登録キャッシュはクリア
+            shared_cache.relieve_pressure()
             for cache_ref in self.cache_refs:
+                if isinstance(cache_ref, ManagedCache):
+                    continue
                 if hasattr(cache_ref, 'clear'):
                     try:
                         cache_ref.clear()
@@ -338,102 +345,70 @@ Thresholds:
 
 
 class ManagedCache:
-    """メモリ管理機能付きキャッシュ"""
+    """
+    メモリ管理機能付きキャッシュ
+
+    実体は byte_budget_cache.shared_cache の名前空間 ``managed:<name>`` で、件数上限
+    (maxsize) に加えてプロセス全体のバイト予算を共有する。同じ name のインスタンスは
+    同じエントリを共有する。
+    """
     
-    def __init__(self, maxsize=128, ttl=3600, memory_guard=None):
-        self.cache = {}
-        self.timestamps = {}
-        self.access_count = {}
+    def __init__(self, maxsize=128, ttl=3600, memory_guard=None, name="default"):
         self.maxsize = maxsize
         self.ttl = ttl
-        self._lock = threading.RLock()
+        self._ns = shared_cache.namespace(
+            f"managed:{name}", ttl=ttl, max_entries=maxsize
+        )
         
-        # メモリガードに登録
+        # メモリガードに登録 (圧迫時は共有キャッシュを予算の一定割合まで縮める)
         if memory_guard:
             memory_guard.register_cache(self)
     
-    def get(self, key):
+    def get(self, key, default=None):
         """キャッシュから取得"""
-        with self._lock:
-            if key in self.cache:
-                # TTLチェック
-                if datetime.now() - self.timestamps[key] < timedelta(seconds=self.ttl):
-                    self.access_count[key] = self.access_count.get(key, 0) + 1
-                    return self.cache[key]
-                else:
-                    # 期限切れ
-                    del self.cache[key]
-                    del self.timestamps[key]
-                    if key in self.access_count:
-                        del self.access_count[key]
-            return None
+        return self._ns.get(key, default)
     
     def set(self, key, value):
         """キャッシュに設定"""
-        with self._lock:
-            # サイズ制限チェック
-            if len(self.cache) >= self.maxsize:
-                # LRU: 最も使用頻度の低いアイテムを削除
-                lru_key = min(self.access_count.items(), key=lambda x: x[1])[0] if self.access_count else min(self.timestamps, key=self.timestamps.get)
-                del self.cache[lru_key]
-                del self.timestamps[lru_key]
-                if lru_key in self.access_count:
-                    del self.access_count[lru_key]
-            
-            self.cache[key] = value
-            self.timestamps[key] = datetime.now()
-            self.access_count[key] = 0
+        self._ns.set(key, value)
+    
+    def keys(self):
+        return self._ns.keys()
     
     def clear(self):
         """キャッシュをクリア"""
-        with self._lock:
-            self.cache.clear()
-            self.timestamps.clear()
-            self.access_count.clear()
+        self._ns.clear()
     
     def clear_expired(self):
         """期限切れアイテムをクリア"""
-        with self._lock:
-            now = datetime.now()
-            expired_keys = [
-                k for k, t in self.timestamps.items()
-                if now - t > timedelta(seconds=self.ttl)
-            ]
-            
-            for key in expired_keys:
-                del self.cache[key]
-                del self.timestamps[key]
-                if key in self.access_count:
-                    del self.access_count[key]
-            
-            return len(expired_keys)
+        return self._ns.clear_expired()
     
     def get_stats(self) -> Dict[str, Any]:
         """キャッシュ統計を取得"""
-        with self._lock:
-            total_size = sys.getsizeof(self.cache) if self.cache else 0
-            
-            return {
-                'entries': len(self.cache),
-                'max_entries': self.maxsize,
-                'total_size_bytes': total_size,
-                'ttl_seconds': self.ttl,
-                'hit_rate': sum(self.access_count.values()) if self.access_count else 0
-            }
+        stats = self._ns.get_stats()
+        shared = stats["global"]
+        return {
+            'entries': stats["entries"],
+            'max_entries': self.maxsize,
+            'total_size_bytes': stats["bytes"],
+            'ttl_seconds': self.ttl,
+            'hit_rate': shared["hit_rate"],
+            'hits': shared["hits"],
+            'misses': shared["misses"],
+            'evictions': shared["evictions"],
+        }
+    
+    def __contains__(self, key):
+        return key in self._ns
     
     def __len__(self):
-        return len(self.cache)
+        return len(self._ns)
     
     def popitem(self):
         """最も古いアイテムを削除"""
-        with self._lock:
-            if self.timestamps:
-                oldest_key = min(self.timestamps, key=self.timestamps.get)
-                value = self.cache.pop(oldest_key)
-                del self.timestamps[oldest_key]
-                if oldest_key in self.access_count:
-                    del self.access_count[oldest_key]
-                return oldest_key, value
+        keys = self._ns.keys()
+        if keys:
+            return keys[0], self._ns.pop(keys[0])
         return None
 
 
@@ -12,9 +12,11 @@ import sys
 import time
 import threading
 from typing import Dict, Any, Optional, List
-from datetime import datetime, timedelta
+from datetime import datetime
 import weakref
 
+from byte_budget_cache import shared_cache
+
 try:
     import psutil
     PSUTIL_AVAILABLE = True
@@ -22,6 +24,8 @@ except ImportError:
     PSUTIL_AVAILABLE = False
     print("Warning: psutil not available. Memory monitoring limited.")
 
+from improved_memory_guard import ManagedCache as _BudgetManagedCache
+
 log = logging.getLogger(__name__)
 
 class MemoryGuard:
@@ -177,8 +181,12 @@ class MemoryGuard:
         """緊急メモリクリーンアップ"""
         log.warning("Starting emergency memory cleanup")
         
-        # 1. 全キャッシュクリア
+        # 1. 共有バイト予算のキャッシュ (ManagedCache の実体) は全消去せず、
+        #    予算の一定割合まで縮める。それ以外の登録キャッシュはクリア
+        shared_cache.relieve_pressure()
         for cache_ref in self.cache_refs:
+            if isinstance(cache_ref, _BudgetManagedCache):
+                continue
             if hasattr(cache_ref, 'clear'):
                 cache_ref.clear()
                 log.debug(f"Cleared cache: {type(cache_ref).__name__}")
@@ -260,72 +268,11 @@ Last Cleanup: {stats['last_cleanup'] or 'Never'}
 memory_guard = MemoryGuard()
 
 # キャッシュデコレータ with メモリ管理
-class ManagedCache:
-    """メモリ管理機能付きキャッシュ"""
-    
-    def __init__(self, maxsize=128, ttl=3600):
-        self.cache = {}
-        self.timestamps = {}
-        self.maxsize = maxsize
-        self.ttl = ttl
-        
-        # メモリガードに登録
-        memory_guard.register_cache(self)
-    
-    def get(self, key):
-        """キャッシュから取得"""
-        if key in self.cache:
-            # TTLチェック
-            if datetime.now() - self.timestamps[key] < timedelta(seconds=self.ttl):
-                return self.cache[key]
-            else:
-                # 期限切れ
-                del self.cache[key]
-                del self.timestamps[key]
-        return None
-    
-    def set(self, key, value):
-        """キャッシュに設定"""
-        # サイズ制限チェック
-        if len(self.cache) >= self.maxsize:
-            # 最も古いアイテムを削除
-            oldest_key = min(self.timestamps, key=self.timestamps.get)
-            del self.cache[oldest_key]
-            del self.timestamps[oldest_key]
-        
-        self.cache[key] = value
-        self.timestamps[key] = datetime.now()
-    
-    def clear(self):
-        """キャッシュをクリア"""
-        self.cache.clear()
-        self.timestamps.clear()
-    
-    def clear_expired(self):
-        """期限切れアイテムをクリア"""
-        now = datetime.now()
-        expired_keys = [
-            k for k, t in self.timestamps.items()
-            if now - t > timedelta(seconds=self.ttl)
-        ]
-        
-        for key in expired_keys:
-            del self.cache[key]
-            del self.timestamps[key]
-        
-        return len(expired_keys)
-    
-    def __len__(self):
-        return len(self.cache)
+class ManagedCache(_BudgetManagedCache):
+    """メモリ管理機能付きキャッシュ (improved_memory_guard と同じ共有バイト予算を使う)"""
     
-    def popitem(self):
-        """最も古いアイテムを削除"""
-        if self.timestamps:
-            oldest_key = min(self.timestamps, key=self.timestamps.get)
-            value = self.cache.pop(oldest_key)
-            del self.timestamps[oldest_key]
-            return oldest_key, value
-        return None
+    def __init__(self, maxsize=128, ttl=3600, name="default"):
+        super().__init__(maxsize=maxsize, ttl=ttl, memory_guard=memory_guard, name=name)
 
 # 便利な関数
 def check_memory_usage():
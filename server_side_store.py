@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+図のサーバ側キャッシュ (Dash コールバック間の受け渡しを小さくする)
+
+- dcc.Store やコールバックの戻り値に載せたものは JSON にしてブラウザとの間を
+  往復する。DataFrame や図を載せるとタブを切り替えるたびに数 MB の JSON を
+  作り直していた。
+- ``FigureCache`` は (成果物バージョン, 表示パラメータ) をキーに図を保持し、
+  同じ表示条件では DataFrame からの図の組み立てをやり直さない。
+- バージョンはサーバ側で決めたファイルのパスと (サイズ, mtime) から作るため
+    - ``artifact_version``: 再解析でファイルが更新されると自動的に別キーになる
+    - ``scenario_version``: シナリオマニフェスト (無ければディレクトリ) の更新で変わる
+"""
+
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Any, Callable, Optional, Union
+
+from byte_budget_cache import ByteBudgetCache, estimate_nbytes, shared_cache
+
+log = logging.getLogger(__name__)
+
+FIGURE_NAMESPACE = "server:figures"
+MANIFEST_FILE = "scenario.manifest.json"
+
+
+def _short_hash(text: str, size: int = 8) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=size).hexdigest()
+
+
+def _file_version(path: Path) -> Optional[str]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return f"{st.st_size:x}-{st.st_mtime_ns:x}"
+
+
+def _canonical(params: Any) -> str:
+    return json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def artifact_version(path: Union[str, Path]) -> Optional[str]:
+    """成果物ファイルのバージョン (パス + サイズ + mtime)。無ければ None"""
+    path = Path(path)
+    version = _file_version(path)
+    if version is None:
+        return None
+    return f"{_short_hash(str(path.resolve()))}:{version}"
+
+
+def scenario_version(scenario_dir: Union[str, Path]) -> str:
+    """マニフェスト (無ければディレクトリ) の更新で変わるバージョン"""
+    scenario_dir = Path(scenario_dir)
+    return _file_version(scenario_dir / MANIFEST_FILE) or _file_version(scenario_dir) or "missing"
+
+
+class FigureCache:
+    """(成果物バージョン, 表示パラメータ) → 図"""
+
+    def __init__(self, cache: ByteBudgetCache = shared_cache, namespace: str = FIGURE_NAMESPACE):
+        self.cache = cache
+        self.namespace = namespace
+        self.builds = 0
+        self.hits = 0
+
+    @staticmethod
+    def key(version: Any, params: Any = None) -> str:
+        return _short_hash(_canonical([version, params]), size=12)
+
+    def get_or_build(self, version: Any, params: Any, builder: Callable[[], Any]) -> Any:
+        """
+        キャッシュにあればその図を、無ければ ``builder()`` の結果を保持して返す。
+        ``version`` が None (成果物が無いなど) のときはキャッシュしない。
+        None を返した builder の結果も保持しない。
+        """
+        if version is None:
+            return builder()
+        key = self.key(version, params)
+        sentinel = object()
+        fig = self.cache.get(self.namespace, key, sentinel)
+        if fig is not sentinel:
+            self.hits += 1
+            return fig
+        fig = builder()
+        self.builds += 1
+        if fig is not None:
+            self.cache.set(self.namespace, key, fig, nbytes=_figure_nbytes(fig))
+        return fig
+
+    def clear(self) -> int:
+        return self.cache.clear(self.namespace)
+
+
+def _figure_nbytes(fig: Any) -> int:
+    """plotly の図は to_plotly_json() (配列を含む dict) で大きさを見積もる"""
+    to_json = getattr(fig, "to_plotly_json", None)
+    try:
+        return estimate_nbytes(to_json() if to_json is not None else fig)
+    except Exception:  # noqa: BLE001
+        return estimate_nbytes(fig)
+
+
+# プロセス全体で共有するインスタンス
+figure_cache = FigureCache()
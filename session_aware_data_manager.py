@@ -5,6 +5,10 @@ SessionAwareDataManager - セッション対応データ管理システム
 Phase 1: データ抽象化基盤の実装
 
 目的: DATA_CACHEをセッション対応にし、会社間のデータ分離を実現
+
+セッションストアにはセッション固有の可変状態だけを置く。シナリオ成果物のような
+不変データは get_artifact() で shared_artifact_cache から取得し、同じ内容なら
+全セッションで 1 つの値を共有する (セッション破棄時に参照を解放)。
 """
 
 import logging
@@ -23,6 +27,8 @@ try:
 except ImportError:
     EXISTING_CACHE_AVAILABLE = False
 
+from shared_artifact_cache import shared_artifacts
+
 log = logging.getLogger(__name__)
 
 
@@ -119,8 +125,8 @@ class SessionAwareDataManager:
             # セッションデータを削除
             if oldest_key in self._session_stores:
                 del self._session_stores[oldest_key]
-            if oldest_key in self._contexts:
-                del self._contexts[oldest_key]
+            context = self._contexts.pop(oldest_key)
+            self._release_artifacts(context.session_id)
 
             self._stats['session_expires'] += 1
             log.info(f"Expired session: {oldest_key}")
@@ -204,6 +210,31 @@ class SessionAwareDataManager:
 
             log.debug(f"Data set: {context_key}:{key}")
 
+    def get_artifact(self, path, loader, session_id: str = None,
+                     company_id: str = None, user_id: str = None) -> Any:
+        """
+        不変のシナリオ成果物を取得（セッション間で共有・読み取り専用）
+
+        Args:
+            path: 成果物ファイルのパス
+            loader: path を受け取り値を返す関数（モジュールレベルの関数を渡すこと）
+            session_id: セッションID
+            company_id: 会社ID
+            user_id: ユーザーID
+        """
+        if session_id:
+            context_key = SessionContext(session_id, company_id, user_id).to_key()
+            with self._lock:
+                self._contexts.setdefault(context_key, SessionContext(session_id, company_id, user_id))
+                self._contexts[context_key].update_access()
+        # 共有成果物の参照は (会社・ユーザーではなく) セッション ID 単位で数える
+        return shared_artifacts.load(path, loader, owner=session_id or None)
+
+    def _release_artifacts(self, session_id: Optional[str]) -> None:
+        """同じセッション ID のコンテキストが残っていなければ共有成果物の参照を外す"""
+        if session_id and not any(c.session_id == session_id for c in self._contexts.values()):
+            shared_artifacts.release(session_id)
+
     def clear_session(self, session_id: str, company_id: str = None, user_id: str = None):
         """特定セッションのデータをクリア"""
         context = SessionContext(session_id, company_id, user_id)
@@ -214,6 +245,7 @@ class SessionAwareDataManager:
                 del self._session_stores[context_key]
             if context_key in self._contexts:
                 del self._contexts[context_key]
+            self._release_artifacts(session_id)
 
             log.info(f"Session cleared: {context_key}")
 
@@ -223,7 +255,8 @@ class SessionAwareDataManager:
             return {
                 **self._stats,
                 'active_sessions': len(self._session_stores),
-                'total_keys': sum(len(store) for store in self._session_stores.values())
+                'total_keys': sum(len(store) for store in self._session_stores.values()),
+                'shared_artifacts': shared_artifacts.stats()
             }
 
     def cleanup_expired_sessions(self):
@@ -239,9 +272,10 @@ class SessionAwareDataManager:
             for key in expired_keys:
                 if key in self._session_stores:
                     del self._session_stores[key]
-                if key in self._contexts:
-                    del self._contexts[key]
+                context = self._contexts.pop(key)
+                self._release_artifacts(context.session_id)
                 self._stats['session_expires'] += 1
+            shared_artifacts.release_expired()
 
             if expired_keys:
                 log.info(f"Cleaned up {len(expired_keys)} expired sessions")
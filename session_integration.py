@@ -20,6 +20,7 @@ except ImportError:
     callback_context = None
 
 from session_manager import session_manager, get_workspace
+from shared_artifact_cache import shared_artifacts
 
 # ロガー設定
 log = logging.getLogger(__name__)
@@ -185,6 +186,22 @@ class SessionIntegration:
 session_integration = SessionIntegration()
 
 
+# 成果物ファイルのローダー (共有キャッシュのキーに使うためモジュール関数にする)
+def _read_parquet(file_path: Path) -> pd.DataFrame:
+    return pd.read_parquet(file_path)
+
+
+def _read_csv(file_path: Path) -> pd.DataFrame:
+    return pd.read_csv(file_path)
+
+
+def _read_excel(file_path: Path) -> pd.DataFrame:
+    return pd.read_excel(file_path)
+
+
+_LOADERS = {'.parquet': _read_parquet, '.csv': _read_csv, '.xlsx': _read_excel}
+
+
 # 既存のdata_get関数を置き換える新しい実装
 def session_aware_data_get(key: str, default=None, for_display: bool = False,
                           session_id: Optional[str] = None,
@@ -200,7 +217,7 @@ def session_aware_data_get(key: str, default=None, for_display: bool = False,
         use_global_fallback: グローバル変数へのフォールバック
 
     Returns:
-        要求されたデータ
+        要求されたデータ (同じ内容のファイルは全セッションで共有される読み取り専用の値)
     """
     # セッションIDを取得
     if session_id is None:
@@ -237,15 +254,11 @@ def session_aware_data_get(key: str, default=None, for_display: bool = False,
         for pattern in patterns:
             file_path = search_dir / pattern
 
-            if file_path.exists():
+            loader = _LOADERS.get(file_path.suffix)
+            if loader is not None and file_path.exists():
                 try:
-                    # ファイル読み込み
-                    if file_path.suffix == '.parquet':
-                        return pd.read_parquet(file_path)
-                    elif file_path.suffix == '.csv':
-                        return pd.read_csv(file_path)
-                    elif file_path.suffix == '.xlsx':
-                        return pd.read_excel(file_path)
+                    # 内容ハッシュで共有し、このセッションの参照として数える
+                    return shared_artifacts.load(file_path, loader, owner=session_id)
 
                 except Exception as e:
                     log.error(f"Failed to load {file_path}: {e}")
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+セッション横断の共有成果物キャッシュ (2 階層キャッシュの共有層)
+
+- シナリオ成果物 (heat_*.parquet など) は分析後に変更されない。同じ結果 ZIP を
+  10 人が開くと、従来はセッションごとのワークスペースから同じ内容を 10 回読み込み、
+  10 個の DataFrame を保持していた。
+- SharedArtifactCache はファイル内容のハッシュ (blake2b) をキーに読み込み結果を
+  1 つだけ保持し、全セッションで同じオブジェクトを返す。共有値は読み取り専用として
+  扱うこと (変更する場合は ``.copy()`` してセッション側に置く)。
+- セッションが取得した成果物は参照カウント (pin) され、参照中は追い出されない。
+  所有者キーは生のセッション ID で、pin と ``release(owner)`` で同じ値を使う。
+  セッション終了時に ``release(owner)`` で参照を外すと、以後は
+  byte_budget_cache のバイト予算内で LRU により追い出される。
+- pin は参照のたびに延長されるリースで、``pin_ttl`` 秒参照されなければ外れる
+  (終了通知の来ないセッションが参照を持ち続けない)。pin 中の合計が予算の
+  ``max_pinned_fraction`` を超えたら、古い pin から外して追い出せるようにする。
+- セッション固有の可変状態は従来どおり SessionAwareDataManager 側に置く。
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+from byte_budget_cache import ByteBudgetCache, shared_cache
+
+log = logging.getLogger(__name__)
+
+SHARED_NAMESPACE = "shared:artifacts"
+_HASH_CHUNK = 1024 * 1024
+_MAX_DIGESTS = 4096
+DEFAULT_PIN_TTL_S = float(os.environ.get("SHIFT_SUITE_PIN_TTL", "3600"))
+
+_Key = Tuple[str, str]
+
+
+def _loader_name(loader: Callable) -> str:
+    return f"{getattr(loader, '__module__', '')}.{getattr(loader, '__qualname__', repr(loader))}"
+
+
+class SharedArtifactCache:
+    """内容ハッシュで成果物を共有し、所有者 (セッション) ごとに参照を数える"""
+
+    def __init__(
+        self,
+        cache: ByteBudgetCache = shared_cache,
+        namespace: str = SHARED_NAMESPACE,
+        *,
+        pin_ttl: Optional[float] = DEFAULT_PIN_TTL_S,
+        max_pinned_fraction: float = 0.5,
+    ):
+        self.cache = cache
+        self.namespace = namespace
+        self.pin_ttl = pin_ttl
+        self.max_pinned_fraction = max_pinned_fraction
+        # (path, size, mtime_ns) → digest。同じファイルを再ハッシュしない
+        self._digests: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+        # (owner, key) → 最終参照時刻 (古い順)
+        self._pins: "OrderedDict[Tuple[str, _Key], float]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.shared_hits = 0
+        self.loads = 0
+
+    def digest(self, path: Path | str) -> Optional[str]:
+        """ファイル内容のハッシュ (読めなければ None)"""
+        path = Path(path)
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        sig = (str(path.resolve()), st.st_size, st.st_mtime_ns)
+        with self._lock:
+            digest = self._digests.get(sig)
+            if digest is not None:
+                self._digests.move_to_end(sig)
+                return digest
+        h = hashlib.blake2b(digest_size=20)
+        try:
+            with open(path, "rb") as fh:
+                for chunk in iter(lambda: fh.read(_HASH_CHUNK), b""):
+                    h.update(chunk)
+        except OSError:
+            return None
+        digest = f"{h.hexdigest()}:{st.st_size}"
+        with self._lock:
+            self._digests[sig] = digest
+            while len(self._digests) > _MAX_DIGESTS:
+                self._digests.popitem(last=False)
+        return digest
+
+    def load(
+        self,
+        path: Path | str,
+        loader: Callable[[Path], Any],
+        *,
+        owner: Optional[str] = None,
+        cache_empty: bool = False,
+    ) -> Any:
+        """
+        ``loader(path)`` の結果を内容ハッシュ単位で共有して返す。
+
+        ``owner`` (セッション ID) を指定するとその所有者の参照として pin し、
+        ``release(owner)`` か pin の期限切れ・上限超過まで追い出さない。
+        空の DataFrame は ``cache_empty=True`` のときだけ保持する。
+        """
+        path = Path(path)
+        digest = self.digest(path)
+        if digest is None:
+            return loader(path)
+        key = (digest, _loader_name(loader))
+        sentinel = object()
+        value = self.cache.get(self.namespace, key, sentinel)
+        if value is sentinel:
+            value = loader(path)
+            self.loads += 1
+            if isinstance(value, pd.DataFrame) and value.empty and not cache_empty:
+                return value
+            if not self.cache.set(self.namespace, key, value):
+                return value
+        else:
+            self.shared_hits += 1
+        if owner is not None:
+            self._pin(owner, key)
+        return value
+
+    def _pin(self, owner: str, key: _Key) -> None:
+        pair = (owner, key)
+        with self._lock:
+            if pair in self._pins:
+                self._pins.move_to_end(pair)
+            elif not self.cache.pin(self.namespace, key):
+                return
+            self._pins[pair] = time.monotonic()
+            self._expire_pins(protect=pair)
+
+    def _unpin(self, pair: Tuple[str, _Key]) -> None:
+        del self._pins[pair]
+        self.cache.unpin(self.namespace, pair[1])
+
+    def _expire_pins(self, protect: Optional[Tuple[str, _Key]] = None) -> int:
+        """期限切れの pin と、pin 中の合計が上限を超えた分の古い pin を外す"""
+        released = 0
+        if self.pin_ttl:
+            cutoff = time.monotonic() - self.pin_ttl
+            for pair in [p for p, seen in self._pins.items() if seen < cutoff]:
+                self._unpin(pair)
+                released += 1
+        limit = self.cache.budget_bytes * self.max_pinned_fraction
+        while self.cache.pinned_nbytes() > limit:
+            oldest = next((p for p in self._pins if p != protect), None)
+            if oldest is None:
+                break
+            self._unpin(oldest)
+            released += 1
+        if released:
+            self.cache.trim()
+            log.debug(f"[shared_artifacts] released {released} stale or over-budget pins")
+        return released
+
+    def release(self, owner: str) -> int:
+        """所有者の参照をすべて外す (値は予算内で残り、他セッションが再利用できる)"""
+        with self._lock:
+            pairs = [p for p in self._pins if p[0] == owner]
+            for pair in pairs:
+                self._unpin(pair)
+        if pairs:
+            self.cache.trim()
+            log.debug(f"[shared_artifacts] released {len(pairs)} artifacts for {owner}")
+        return len(pairs)
+
+    def release_expired(self) -> int:
+        """期限切れ・上限超過の pin を外す (定期クリーンアップ用)"""
+        with self._lock:
+            return self._expire_pins()
+
+    def clear(self) -> int:
+        """参照されていない共有値を破棄する"""
+        with self._lock:
+            held = {key for _, key in self._pins}
+        dropped = 0
+        for key in self.cache.keys(self.namespace):
+            if key not in held:
+                self.cache.pop(self.namespace, key)
+                dropped += 1
+        return dropped
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            owners = dict(Counter(owner for owner, _ in self._pins))
+        global_stats = self.cache.stats()
+        return {
+            "artifacts": len(self.cache.keys(self.namespace)),
+            "bytes": global_stats["namespaces"].get(self.namespace, 0),
+            "pinned_bytes": global_stats["pinned_bytes"],
+            "shared_hits": self.shared_hits,
+            "loads": self.loads,
+            "owners": owners,
+        }
+
+
+# プロセス全体で共有するインスタンス
+shared_artifacts = SharedArtifactCache()
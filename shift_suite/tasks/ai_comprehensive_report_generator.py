@@ -70,6 +70,8 @@ import numpy as np
 from collections import defaultdict, Counter
 import os
 from .constants import DEFAULT_SLOT_MINUTES
+from .artifact_store import read_artifact
+from .heatmap_pyramid import PYRAMID_PREFIX
 from .utils import validate_and_convert_slot_minutes, safe_slot_calculation
 import platform
 import psutil
@@ -1276,8 +1278,10 @@ class AIComprehensiveReportGenerator:
                     enriched_results["fairness_analysis"] = fairness_data
                     log.info(f"公平性分析データを抽出: {len(fairness_data.get('staff_fairness', {}))}人分")
             
-            # ヒートマップデータの抽出（heat_で始まるファイル）
-            heatmap_files = list(output_path.glob("**/*heat*.parquet"))
+            # ヒートマップデータの抽出（heat_で始まるファイル。多段解像度ピラミッドは除く）
+            heatmap_files = [
+                f for f in output_path.glob("**/*heat*.parquet") if not f.name.startswith(PYRAMID_PREFIX)
+            ]
             if heatmap_files:
                 log.info(f"ヒートマップファイル候補: {[f.name for f in heatmap_files]}")
                 heatmap_data = self._extract_heatmap_data_from_parquet(heatmap_files[0])
@@ -1307,7 +1311,7 @@ class AIComprehensiveReportGenerator:
     def _extract_shortage_data_from_parquet(self, parquet_file: Path) -> Optional[Dict[str, Any]]:
         """不足分析Parquetファイルからデータを抽出（実際のデータ構造に対応）"""
         try:
-            df = pd.read_parquet(parquet_file)
+            df = read_artifact(parquet_file)
             log.info(f"Parquetファイル読み込み: {parquet_file.name}, 行数: {len(df)}, 列: {list(df.columns)[:5]}...")
             
             # データ形式の判定を改善
@@ -1458,7 +1462,7 @@ class AIComprehensiveReportGenerator:
     def _extract_fatigue_data_from_parquet(self, parquet_file: Path) -> Optional[Dict[str, Any]]:
         """疲労分析Parquetファイルからデータを抽出"""
         try:
-            df = pd.read_parquet(parquet_file)
+            df = read_artifact(parquet_file)
             
             # 基本統計の算出
             fatigue_scores = df.get('fatigue_score', pd.Series([0.5])).fillna(0.5)
@@ -1500,7 +1504,7 @@ class AIComprehensiveReportGenerator:
     def _extract_fairness_data_from_parquet(self, parquet_file: Path) -> Optional[Dict[str, Any]]:
         """公平性分析Parquetファイルからデータを抽出"""
         try:
-            df = pd.read_parquet(parquet_file)
+            df = read_artifact(parquet_file)
             
             # 基本統計の算出
             fairness_scores = df.get('fairness_score', pd.Series([0.8])).fillna(0.8)
@@ -1541,7 +1545,7 @@ class AIComprehensiveReportGenerator:
     def _extract_heatmap_data_from_parquet(self, parquet_file: Path) -> Optional[Dict[str, Any]]:
         """ヒートマップParquetファイルからデータを抽出"""
         try:
-            df = pd.read_parquet(parquet_file)
+            df = read_artifact(parquet_file)
             
             # 時間枠別データ
             time_slots = []
@@ -1,5 +1,6 @@
 """shift_suite.anomaly – 異常シフト日検知 (IsolationForest)
 v0.3.1 (constants.py から SUMMARY5 を参照)
+v0.3.2 (日付列は utils.date_columns で判定)
 """
 
 from __future__ import annotations
@@ -9,8 +10,7 @@ from pathlib import Path
 import pandas as pd
 import numpy as np
 
-from .constants import SUMMARY5  # SUMMARY5 を constants からインポート
-from .utils import log, save_df_parquet
+from .utils import date_columns, log, read_df_parquet, save_df_parquet
 
 # sklearn-free anomaly detection using simple statistical methods
 class SimpleAnomalyDetector:
@@ -43,18 +43,18 @@ def detect_anomaly(out_dir: Path, contamination: float = 0.05):
         log.error(f"[anomaly] heat_ALL.parquet が見つかりません: {hp}")
         return None
     try:
-        heat = pd.read_parquet(hp)
+        heat = read_df_parquet(hp)
     except Exception as e:
         log.error(
             f"[anomaly] heat_ALL.parquet の読み込み中にエラー: {e}", exc_info=True
         )
         return None
 
-    date_columns = [col for col in heat.columns if col not in SUMMARY5]
-    if not date_columns:
+    date_cols = list(date_columns(heat.columns))
+    if not date_cols:
         log.warning("[anomaly] heat_ALL.xlsx に日付データ列が見つかりませんでした。")
         return None
-    heat_data_only = heat[date_columns]
+    heat_data_only = heat[date_cols]
     log.debug(f"[anomaly] 異常検知対象の日付列数: {len(heat_data_only.columns)}")
     X = heat_data_only.fillna(0).T.values
     if X.shape[0] == 0:
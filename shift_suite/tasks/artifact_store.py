@@ -0,0 +1,266 @@
+"""
+shift_suite.tasks.artifact_store v1.0.0 – シナリオ成果物の Arrow IPC ストア
+────────────────────────────────────────────────────────────────
+* シナリオ出力は heat_*.parquet / need_per_date_slot_*.parquet /
+  shortage_*.parquet / *.meta.json など数十個の小さなファイルで、
+  Dash の各ワーカーがそれぞれ parquet をデコードして pandas のコピーを持っていた。
+* ``pack_scenario_artifacts`` は parquet を系統ごと (heat / need / shortage /
+  other) に少数のバンドルファイル ``artifacts_<group>.<世代>.arrow`` へまとめる。
+  バンドルは非圧縮の Arrow IPC ファイルを 64 バイト境界で連結したもので、
+  各テーブルの位置・行数・列と元ファイルの size / mtime は
+  ``artifacts.manifest.json`` に記録する。*.meta.json などの JSON は対象外
+  (小さく、読み手も少ないので従来どおり個別に読む)。
+* ``ScenarioArtifactStore`` はバンドルを memory map で開き、テーブルは
+  マップ上のバッファをそのまま参照する (ゼロコピー)。数値列はデシリアライズ
+  なしで DataFrame になり、複数ワーカーが同じページを OS キャッシュ経由で共有する。
+  このため返される DataFrame は読み取り専用 (変更する場合は ``.copy()``)。
+* バンドル名は packing ごとに世代を変え、マニフェストを置き換えてから古い
+  バンドルを削除する。既存ワーカーが開いているマップは古い世代のまま有効。
+* 元ファイルが packing 後に書き換えられた場合はそのエントリを使わず、
+  ``read_artifact`` は通常どおり parquet を読む。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from .utils import log
+
+MANIFEST_FILE = "artifacts.manifest.json"
+BUNDLE_TEMPLATE = "artifacts_{group}.{generation}.arrow"
+BUNDLE_GLOB = "artifacts_*.arrow"
+STORE_VERSION = 1
+_ALIGNMENT = 64
+MAX_OPEN_STORES = 8
+
+# バンドルの振り分け (先頭一致、上から順に判定)
+GROUP_PREFIXES: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ("heat", ("heat_", "pyramid_")),
+    ("need", ("need_",)),
+    ("shortage", ("shortage_", "excess_", "surplus_", "lack_")),
+)
+DEFAULT_GROUP = "other"
+
+
+def _group_for(name: str) -> str:
+    for group, prefixes in GROUP_PREFIXES:
+        if name.startswith(prefixes):
+            return group
+    return DEFAULT_GROUP
+
+
+def _source_sig(fp: Path) -> Tuple[int, int] | None:
+    try:
+        st = fp.stat()
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def _ipc_bytes(table: pa.Table) -> pa.Buffer:
+    sink = pa.BufferOutputStream()
+    with ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def pack_scenario_artifacts(scenario_dir: Path | str) -> Path | None:
+    """
+    ``scenario_dir`` 直下の parquet をバンドルにまとめ、マニフェストを書く。
+    読み込めない / Arrow に変換できないファイルは対象外 (従来どおり個別に読まれる)。
+    """
+    scenario_dir = Path(scenario_dir)
+    if not scenario_dir.is_dir():
+        return None
+
+    groups: Dict[str, List[Tuple[str, Path]]] = {}
+    for fp in sorted(scenario_dir.glob("*.parquet")):
+        groups.setdefault(_group_for(fp.stem), []).append((fp.name, fp))
+
+    generation = f"{time.time_ns():x}"
+    tables: Dict[str, Dict[str, Any]] = {}
+    bundles: Dict[str, str] = {}
+    for group, files in groups.items():
+        bundle_name = BUNDLE_TEMPLATE.format(group=group, generation=generation)
+        tmp = scenario_dir / f".{bundle_name}.tmp"
+        offset = 0
+        entries: Dict[str, Dict[str, Any]] = {}
+        with open(tmp, "wb") as out:
+            for name, fp in files:
+                sig = _source_sig(fp)
+                try:
+                    table = pq.read_table(fp)
+                    payload = _ipc_bytes(table)
+                except Exception as e:  # noqa: BLE001
+                    log.warning(f"[artifact_store] {name} をバンドルに含めません: {e}")
+                    continue
+                out.write(payload)
+                pad = -payload.size % _ALIGNMENT
+                if pad:
+                    out.write(b"\0" * pad)
+                entries[name] = {
+                    "bundle": bundle_name,
+                    "offset": offset,
+                    "length": payload.size,
+                    "rows": table.num_rows,
+                    "columns": table.num_columns,
+                    "source_size": sig[0] if sig else None,
+                    "source_mtime_ns": sig[1] if sig else None,
+                }
+                offset += payload.size + pad
+        if entries:
+            os.replace(tmp, scenario_dir / bundle_name)
+            bundles[group] = bundle_name
+            tables.update(entries)
+        else:
+            tmp.unlink(missing_ok=True)
+
+    manifest = {
+        "version": STORE_VERSION,
+        "bundles": bundles,
+        "tables": tables,
+    }
+    manifest_fp = scenario_dir / MANIFEST_FILE
+    tmp = scenario_dir / f".{MANIFEST_FILE}.tmp"
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, default=str), encoding="utf-8")
+    os.replace(tmp, manifest_fp)
+
+    live = set(bundles.values())
+    for old in scenario_dir.glob(BUNDLE_GLOB):
+        if old.name not in live:
+            try:
+                old.unlink()
+            except OSError:  # Windows ではマップ中のファイルを消せない → 次回に削除
+                pass
+    log.info(
+        f"[artifact_store] packed {len(tables)} tables into {len(bundles)} bundles: {scenario_dir}"
+    )
+    return manifest_fp
+
+
+class ScenarioArtifactStore:
+    """マニフェストとメモリマップしたバンドルからテーブルを返す"""
+
+    def __init__(self, scenario_dir: Path | str):
+        self.scenario_dir = Path(scenario_dir)
+        manifest = json.loads((self.scenario_dir / MANIFEST_FILE).read_text(encoding="utf-8"))
+        if manifest.get("version") != STORE_VERSION:
+            raise ValueError(f"unsupported artifact store version: {manifest.get('version')}")
+        self.manifest = manifest
+        self._tables_meta: Dict[str, Dict[str, Any]] = manifest.get("tables", {})
+        self._buffers: Dict[str, pa.Buffer] = {}
+        self._tables: Dict[str, pa.Table] = {}
+        self._lock = threading.Lock()
+
+    # ---- 参照 API -----------------------------------------------------------
+    def names(self) -> List[str]:
+        return list(self._tables_meta)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tables_meta
+
+    def is_fresh(self, name: str) -> bool:
+        """元ファイルが packing 時から変わっていなければ True"""
+        meta = self._tables_meta.get(name)
+        if meta is None:
+            return False
+        sig = _source_sig(self.scenario_dir / name)
+        return sig is not None and sig == (meta["source_size"], meta["source_mtime_ns"])
+
+    def _bundle(self, bundle_name: str) -> pa.Buffer:
+        buf = self._buffers.get(bundle_name)
+        if buf is None:
+            buf = pa.memory_map(str(self.scenario_dir / bundle_name), "r").read_buffer()
+            self._buffers[bundle_name] = buf
+        return buf
+
+    def table(self, name: str) -> pa.Table:
+        """``name`` (例: ``heat_ALL.parquet``) の Arrow テーブル。未登録なら KeyError"""
+        with self._lock:
+            table = self._tables.get(name)
+            if table is None:
+                meta = self._tables_meta[name]
+                buf = self._bundle(meta["bundle"]).slice(meta["offset"], meta["length"])
+                table = ipc.open_file(buf).read_all()
+                self._tables[name] = table
+            return table
+
+    def frame(self, name: str) -> pd.DataFrame:
+        """読み取り専用の DataFrame (数値列はマップ上のメモリを直接参照)"""
+        return self.table(name).to_pandas(split_blocks=True)
+
+
+# ─────────────────────────── cache ───────────────────────────
+_CACHE: "OrderedDict[Tuple[str, int], ScenarioArtifactStore]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+
+def open_artifact_store(scenario_dir: Path | str | None) -> ScenarioArtifactStore | None:
+    """
+    ``scenario_dir`` のストア (マニフェストが無ければ None)。
+    マニフェストのパスと mtime をキーにプロセス内で使い回す。
+    """
+    if scenario_dir is None:
+        return None
+    fp = Path(scenario_dir) / MANIFEST_FILE
+    try:
+        cache_key = (str(fp.resolve()), fp.stat().st_mtime_ns)
+    except OSError:
+        return None
+    with _CACHE_LOCK:
+        store = _CACHE.get(cache_key)
+        if store is not None:
+            _CACHE.move_to_end(cache_key)
+            return store
+    try:
+        store = ScenarioArtifactStore(scenario_dir)
+    except Exception as e:  # noqa: BLE001
+        log.warning(f"[artifact_store] manifest を開けません {fp}: {e}")
+        return None
+    with _CACHE_LOCK:
+        _CACHE[cache_key] = store
+        while len(_CACHE) > MAX_OPEN_STORES:
+            _CACHE.popitem(last=False)
+    return store
+
+
+def read_artifact(fp: Path | str, **kwargs) -> pd.DataFrame:
+    """
+    ``pd.read_parquet`` の置き換え。同じディレクトリのストアに最新のエントリが
+    あればメモリマップから返し、無ければ parquet を読む (返り値は読み取り専用の場合がある)。
+    """
+    fp = Path(fp)
+    if not kwargs and fp.suffix == ".parquet":
+        store = open_artifact_store(fp.parent)
+        if store is not None and store.is_fresh(fp.name):
+            try:
+                return store.frame(fp.name)
+            except Exception as e:  # noqa: BLE001
+                log.debug(f"[artifact_store] fallback to parquet for {fp}: {e}")
+    return pd.read_parquet(fp, **kwargs)
+
+
+def clear_artifact_store_cache() -> None:
+    with _CACHE_LOCK:
+        _CACHE.clear()
+
+
+__all__ = [
+    "MANIFEST_FILE",
+    "ScenarioArtifactStore",
+    "clear_artifact_store_cache",
+    "open_artifact_store",
+    "pack_scenario_artifacts",
+    "read_artifact",
+]
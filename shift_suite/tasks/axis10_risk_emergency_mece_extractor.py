@@ -16,6 +16,7 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional, Tuple
 from collections import defaultdict, Counter
 import json
+from .staff_index import staff_partition
 
 log = logging.getLogger(__name__)
 
@@ -226,8 +227,8 @@ class RiskEmergencyMECEFactExtractor:
                 # 連続勤務による疲労蓄積リスク
                 high_risk_staff = []
                 
-                for staff_id in long_df['staff'].unique():
-                    staff_dates = pd.to_datetime(long_df[long_df['staff'] == staff_id]['ds']).sort_values()
+                for staff_id, staff_rows in staff_partition(long_df).items():
+                    staff_dates = pd.to_datetime(staff_rows['ds']).sort_values()
                     
                     if len(staff_dates) > 1:
                         # 連続勤務期間の計算
@@ -24,6 +24,7 @@ import numpy as np
 import json
 
 from .constants import SLOT_HOURS, STATISTICAL_THRESHOLDS
+from .staff_index import staff_partition
 
 log = logging.getLogger(__name__)
 
@@ -111,7 +112,7 @@ class StaffMECEFactExtractor:
         }
         
         for staff in eligible_staff:
-            staff_df = long_df[(long_df['staff'] == staff) & (long_df['parsed_slots_count'] > 0)]
+            staff_df = staff_partition(long_df).active().get(staff)
             
             if len(staff_df) < self.sample_size_minimum:
                 continue
@@ -180,7 +181,7 @@ class StaffMECEFactExtractor:
             return facts
             
         for staff in eligible_staff:
-            staff_df = long_df[(long_df['staff'] == staff) & (long_df['parsed_slots_count'] > 0)]
+            staff_df = staff_partition(long_df).active().get(staff)
             
             if len(staff_df) < self.sample_size_minimum:
                 continue
@@ -226,7 +227,7 @@ class StaffMECEFactExtractor:
         }
         
         for staff in eligible_staff:
-            staff_df = long_df[(long_df['staff'] == staff) & (long_df['parsed_slots_count'] > 0)]
+            staff_df = staff_partition(long_df).active().get(staff)
             
             if len(staff_df) < self.sample_size_minimum:
                 continue
@@ -287,7 +288,7 @@ class StaffMECEFactExtractor:
         }
         
         for staff in eligible_staff:
-            staff_df = long_df[(long_df['staff'] == staff) & (long_df['parsed_slots_count'] > 0)]
+            staff_df = staff_partition(long_df).active().get(staff)
             
             if len(staff_df) < self.sample_size_minimum:
                 continue
@@ -413,7 +414,7 @@ class StaffMECEFactExtractor:
         }
         
         for staff in eligible_staff:
-            staff_df = long_df[(long_df['staff'] == staff) & (long_df['parsed_slots_count'] > 0)]
+            staff_df = staff_partition(long_df).active().get(staff)
             
             if len(staff_df) < self.sample_size_minimum:
                 continue
@@ -455,7 +456,7 @@ class StaffMECEFactExtractor:
         }
         
         for staff in eligible_staff:
-            staff_df = long_df[(long_df['staff'] == staff) & (long_df['parsed_slots_count'] > 0)]
+            staff_df = staff_partition(long_df).active().get(staff)
             
             if len(staff_df) < self.sample_size_minimum:
                 continue
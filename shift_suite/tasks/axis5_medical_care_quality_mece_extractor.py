@@ -15,6 +15,7 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional, Tuple
 from collections import defaultdict, Counter
 import json
+from .staff_index import staff_partition
 
 log = logging.getLogger(__name__)
 
@@ -107,8 +108,8 @@ class MedicalCareQualityMECEFactExtractor:
                 if not medical_staff.empty:
                     # 医療資格者の連続勤務パターン
                     if 'ds' in medical_staff.columns and 'staff' in medical_staff.columns:
-                        for staff_id in medical_staff['staff'].unique():
-                            staff_shifts = medical_staff[medical_staff['staff'] == staff_id]['ds'].sort_values()
+                        for staff_id, staff_rows in staff_partition(medical_staff).items():
+                            staff_shifts = staff_rows['ds'].sort_values()
                             if len(staff_shifts) > 1:
                                 # 連続勤務日数の計算
                                 consecutive_days = self._calculate_consecutive_workdays(staff_shifts)
@@ -161,7 +162,7 @@ class MedicalCareQualityMECEFactExtractor:
                 
                 # 勤務間隔の分析
                 for staff_id in regular_staff.index[:5]:  # 上位5名を分析
-                    staff_dates = pd.to_datetime(long_df[long_df['staff'] == staff_id]['ds']).sort_values()
+                    staff_dates = pd.to_datetime(staff_partition(long_df).get(staff_id)['ds']).sort_values()
                     if len(staff_dates) > 1:
                         intervals = staff_dates.diff().dt.days.dropna()
                         avg_interval = intervals.mean()
@@ -628,8 +629,8 @@ class MedicalCareQualityMECEFactExtractor:
                 # 同一スタッフの連続勤務での振り返り機会
                 reflection_opportunities = 0
                 
-                for staff_id in long_df['staff'].unique():
-                    staff_dates = pd.to_datetime(long_df[long_df['staff'] == staff_id]['ds']).sort_values()
+                for staff_id, staff_rows in staff_partition(long_df).items():
+                    staff_dates = pd.to_datetime(staff_rows['ds']).sort_values()
                     if len(staff_dates) > 1:
                         consecutive_periods = self._find_consecutive_work_periods(staff_dates)
                         reflection_opportunities += len([p for p in consecutive_periods if p >= 3])  # 3日以上連続
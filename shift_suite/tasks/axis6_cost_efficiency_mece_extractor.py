@@ -15,6 +15,7 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional, Tuple
 from collections import defaultdict, Counter
 import json
+from .staff_index import staff_partition
 
 log = logging.getLogger(__name__)
 
@@ -325,8 +326,8 @@ class CostEfficiencyMECEFactExtractor:
             if 'staff' in long_df.columns and 'ds' in long_df.columns:
                 overtime_risks = []
                 
-                for staff_id in long_df['staff'].unique():
-                    staff_dates = pd.to_datetime(long_df[long_df['staff'] == staff_id]['ds']).sort_values()
+                for staff_id, staff_rows in staff_partition(long_df).items():
+                    staff_dates = pd.to_datetime(staff_rows['ds']).sort_values()
                     
                     if len(staff_dates) > 1:
                         # 連続勤務日数
@@ -370,8 +371,7 @@ class CostEfficiencyMECEFactExtractor:
                 long_df['week'] = pd.to_datetime(long_df['ds']).dt.isocalendar().week
                 
                 weekly_overtime_staff = []
-                for staff_id in long_df['staff'].unique():
-                    staff_data = long_df[long_df['staff'] == staff_id]
+                for staff_id, staff_data in staff_partition(long_df).items():
                     weekly_hours = staff_data.groupby('week').size()
                     
                     # 1週5日以上を超過勤務とみなす（8時間×5日=40時間）
@@ -606,8 +606,8 @@ class CostEfficiencyMECEFactExtractor:
             if 'staff' in long_df.columns and 'ds' in long_df.columns:
                 # スタッフの勤務パターン分析
                 staff_patterns = {}
-                for staff_id in long_df['staff'].unique():
-                    staff_dates = pd.to_datetime(long_df[long_df['staff'] == staff_id]['ds'])
+                for staff_id, staff_rows in staff_partition(long_df).items():
+                    staff_dates = pd.to_datetime(staff_rows['ds'])
                     if len(staff_dates) > 1:
                         # 勤務間隔の標準偏差（規則性の指標）
                         intervals = staff_dates.sort_values().diff().dt.days.dropna()
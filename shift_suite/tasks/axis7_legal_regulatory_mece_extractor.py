@@ -16,6 +16,7 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional, Tuple
 from collections import defaultdict, Counter
 import json
+from .staff_index import staff_partition
 
 log = logging.getLogger(__name__)
 
@@ -102,8 +103,7 @@ class LegalRegulatoryMECEFactExtractor:
                 
                 # 週次労働時間分析
                 weekly_violations = []
-                for staff_id in long_df['staff'].unique():
-                    staff_data = long_df[long_df['staff'] == staff_id]
+                for staff_id, staff_data in staff_partition(long_df).items():
                     weekly_hours = staff_data.groupby(['year', 'week']).size()
                     
                     # 週40時間超過の検出（1日8時間想定）
@@ -172,8 +172,7 @@ class LegalRegulatoryMECEFactExtractor:
                 
                 # 週7日連続勤務の検出
                 weekly_violations = []
-                for staff_id in long_df['staff'].unique():
-                    staff_data = long_df[long_df['staff'] == staff_id]
+                for staff_id, staff_data in staff_partition(long_df).items():
                     weekly_workdays = staff_data.groupby(['year', 'week']).size()
                     
                     # 週7日勤務（週休なし）の検出
@@ -193,8 +192,8 @@ class LegalRegulatoryMECEFactExtractor:
                 # 連続勤務日の分析
                 interval_violations = []
                 
-                for staff_id in long_df['staff'].unique():
-                    staff_dates = pd.to_datetime(long_df[long_df['staff'] == staff_id]['ds']).sort_values()
+                for staff_id, staff_rows in staff_partition(long_df).items():
+                    staff_dates = pd.to_datetime(staff_rows['ds']).sort_values()
                     
                     if len(staff_dates) > 1:
                         # 連続勤務の検出
@@ -246,8 +245,8 @@ class LegalRegulatoryMECEFactExtractor:
                 
                 # 各スタッフの勤務率から有給使用を推定
                 staff_attendance_rates = {}
-                for staff_id in long_df['staff'].unique():
-                    staff_workdays = long_df[long_df['staff'] == staff_id]['ds'].dt.date.nunique()
+                for staff_id, staff_rows in staff_partition(long_df).items():
+                    staff_workdays = staff_rows['ds'].dt.date.nunique()
                     attendance_rate = staff_workdays / total_days
                     staff_attendance_rates[staff_id] = attendance_rate
                 
@@ -798,8 +797,8 @@ class LegalRegulatoryMECEFactExtractor:
                 for emp_type in long_df['employment'].unique():
                     if any(pt_keyword in emp_type for pt_keyword in part_time_keywords):
                         pt_staff_data = long_df[long_df['employment'] == emp_type]
-                        for staff_id in pt_staff_data['staff'].unique():
-                            staff_workdays = pt_staff_data[pt_staff_data['staff'] == staff_id].shape[0]
+                        for staff_id, staff_rows in staff_partition(pt_staff_data).items():
+                            staff_workdays = staff_rows.shape[0]
                             part_time_staff.append((staff_id, staff_workdays))
                 
                 if part_time_staff:
@@ -16,6 +16,7 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional, Tuple
 from collections import defaultdict, Counter
 import json
+from .staff_index import staff_partition
 
 log = logging.getLogger(__name__)
 
@@ -403,8 +404,8 @@ class StaffSatisfactionMECEFactExtractor:
         """連続勤務日数の分析"""
         try:
             consecutive_work = {}
-            for staff in long_df['staff'].unique():
-                staff_data = long_df[long_df['staff'] == staff].copy()
+            for staff, staff_data in staff_partition(long_df).items():
+                staff_data = staff_data.copy()
                 staff_data['ds'] = pd.to_datetime(staff_data['ds'])
                 staff_data = staff_data.sort_values('ds')
                 
@@ -428,8 +429,8 @@ class StaffSatisfactionMECEFactExtractor:
         """休日間隔の分析"""
         try:
             rest_intervals = []
-            for staff in long_df['staff'].unique():
-                staff_data = long_df[long_df['staff'] == staff].copy()
+            for staff, staff_data in staff_partition(long_df).items():
+                staff_data = staff_data.copy()
                 staff_data['ds'] = pd.to_datetime(staff_data['ds'])
                 staff_data = staff_data.sort_values('ds')
                 
@@ -769,8 +770,7 @@ class StaffSatisfactionMECEFactExtractor:
             # スタッフの勤務パターンの一貫性から希望反映度を推定
             staff_worktype_consistency = {}
             
-            for staff in long_df['staff'].unique():
-                staff_data = long_df[long_df['staff'] == staff]
+            for staff, staff_data in staff_partition(long_df).items():
                 if 'worktype' in staff_data.columns:
                     worktype_counts = staff_data['worktype'].value_counts()
                     consistency = worktype_counts.max() / len(staff_data) if len(staff_data) > 0 else 0
@@ -862,8 +862,7 @@ class StaffSatisfactionMECEFactExtractor:
             
             # スタッフ別勤務時間計算
             staff_hours = {}
-            for staff in long_df['staff'].unique():
-                staff_data = long_df[long_df['staff'] == staff]
+            for staff, staff_data in staff_partition(long_df).items():
                 total_hours = 0
                 for _, row in staff_data.iterrows():
                     hours = worktype_hours.get(row['worktype'], 8)
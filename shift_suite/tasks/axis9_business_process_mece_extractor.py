@@ -16,6 +16,7 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional, Tuple
 from collections import defaultdict, Counter
 import json
+from .staff_index import staff_partition
 
 log = logging.getLogger(__name__)
 
@@ -504,7 +505,7 @@ class BusinessProcessMECEFactExtractor:
                 if len(high_efficiency_staff) > 0:
                     high_patterns = []
                     for staff in high_efficiency_staff[:3]:  # 上位3名
-                        staff_worktypes = long_df[long_df['staff'] == staff]['worktype'].unique()
+                        staff_worktypes = staff_partition(long_df).get(staff)['worktype'].unique()
                         high_patterns.append(f"{staff}: {len(staff_worktypes)}種類の業務")
                     efficiency_data['high_efficiency_patterns'] = high_patterns
             
@@ -603,8 +604,7 @@ class BusinessProcessMECEFactExtractor:
             handover_opportunities = 0
             total_shifts = 0
             
-            for staff in long_df_sorted['staff'].unique():
-                staff_data = long_df_sorted[long_df_sorted['staff'] == staff]
+            for staff, staff_data in staff_partition(long_df_sorted).items():
                 staff_dates = pd.to_datetime(staff_data['ds']).sort_values()
                 
                 for i in range(1, len(staff_dates)):
@@ -818,8 +818,8 @@ class BusinessProcessMECEFactExtractor:
             # スタッフの勤務間隔規則性
             compliance_scores = []
             
-            for staff in long_df['staff'].unique():
-                staff_data = long_df[long_df['staff'] == staff].copy()
+            for staff, staff_data in staff_partition(long_df).items():
+                staff_data = staff_data.copy()
                 staff_data['ds'] = pd.to_datetime(staff_data['ds'])
                 staff_data = staff_data.sort_values('ds')
                 
@@ -896,8 +896,8 @@ class BusinessProcessMECEFactExtractor:
             interval_sum = 0
             interval_count = 0
             
-            for staff in long_df_copy['staff'].unique():
-                staff_data = long_df_copy[long_df_copy['staff'] == staff].sort_values('ds')
+            for staff, staff_data in staff_partition(long_df_copy).items():
+                staff_data = staff_data.sort_values('ds')
                 
                 for i in range(1, len(staff_data)):
                     total_handover_opportunities += 1
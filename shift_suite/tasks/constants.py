@@ -3,6 +3,10 @@
 プロジェクト全体で使用する共通の定数を定義します。
 """
 
+import datetime as dt
+import os
+from pathlib import Path
+
 # ヒートマップや各種集計で使用される集計列のリスト
 SUMMARY5 = ["need", "upper", "staff", "lack", "excess"]
 
@@ -12,12 +16,20 @@ SUMMARY5 = ["need", "upper", "staff", "lack", "excess"]
 # NIGHT_START_TIME = dt.time(22, 0)
 # NIGHT_END_TIME = dt.time(5, 59)
 
+# 実行時データ (学習済みモデルなど) の保存先。リポジトリ内には書かず、ユーザーのデータディレクトリ
+# (SHIFT_SUITE_DATA_DIR → $XDG_DATA_HOME/shift_suite → ~/.local/share/shift_suite) を使う
+DATA_DIR = Path(
+    os.environ.get("SHIFT_SUITE_DATA_DIR")
+    or Path(os.environ.get("XDG_DATA_HOME") or Path.home() / ".local" / "share") / "shift_suite"
+)
+# 学習済みモデルの保存先（環境変数で個別に変更可）
+MODEL_DIR = Path(os.environ.get("SHIFT_SUITE_MODEL_DIR") or DATA_DIR / "models")
+
 # スロット時間の定義
 DEFAULT_SLOT_MINUTES = 30
 SLOT_HOURS = DEFAULT_SLOT_MINUTES / 60.0  # スロットを時間に変換する係数
 
 # 時間帯定義の統一
-import datetime as dt
 NIGHT_START_TIME = dt.time(22, 0)  # 夜勤開始時刻 22:00
 NIGHT_END_TIME = dt.time(5, 59)    # 夜勤終了時刻 05:59
 NIGHT_START_HOUR = 22              # 夜勤開始時（時のみ）
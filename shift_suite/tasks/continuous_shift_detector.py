@@ -1,20 +1,25 @@
 # shift_suite/tasks/continuous_shift_detector.py
 # 連続勤務検出・管理ユーティリティ
 # v1.0.0 - 夜勤→明け番連続勤務対応
+# v1.1.0 - shift_runs のラン列で日単位フラグを一括計算し、重複判定は (日付, 時刻) 索引で参照
 
 from __future__ import annotations
 
-import datetime as dt
 import logging
 from typing import Dict, List, Tuple, Set, Optional
 from dataclasses import dataclass
+import numpy as np
 import pandas as pd
 
 from ..logger_config import configure_logging
+from .shift_runs import ShiftRuns, build_shift_runs, day_to_str, sec_to_hhmm
 
 configure_logging()
 log = logging.getLogger(__name__)
 
+_NIGHT_FROM_SEC = 16 * 3600     # 夜勤: 16:00以降に勤務がある
+_MORNING_UNTIL_SEC = 10 * 3600  # 明け番: 10:00以前に勤務がある
+
 
 @dataclass
 class ContinuousShift:
@@ -44,6 +49,8 @@ class ContinuousShiftDetector:
         self.overnight_codes = {'夜', '明', 'アケ', 'ake', '明け', 'AKE', '夜勤', 'NIGHT'}
         self.night_shift_codes = {'夜', '夜勤', 'NIGHT'}
         self.morning_shift_codes = {'明', 'アケ', 'ake', '明け', 'AKE'}
+        self._index: Dict[str, Dict[str, Set[str]]] = {}
+        self._index_key: Optional[Tuple] = None
     
     def detect_continuous_shifts(self, long_df: pd.DataFrame) -> List[ContinuousShift]:
         """
@@ -59,156 +66,90 @@ class ContinuousShiftDetector:
             return []
         
         log.info("連続勤務検出を開始します")
-        continuous_shifts = []
-        
-        # 職員ごとに処理
-        for staff in long_df['staff'].unique():
-            staff_data = long_df[long_df['staff'] == staff].copy()
-            staff_data['date'] = pd.to_datetime(staff_data['ds']).dt.date
-            staff_data['time'] = pd.to_datetime(staff_data['ds']).dt.time
-            staff_data = staff_data.sort_values('ds')
-            
-            # 日付ごとの勤務パターンを分析
-            daily_patterns = self._analyze_daily_patterns(staff_data)
-            
-            # 連続勤務を検出
-            continuous_patterns = self._detect_overnight_patterns(daily_patterns, staff)
-            continuous_shifts.extend(continuous_patterns)
+        # 'code'カラムがない場合は'task'カラムを使用
+        code_col = 'code' if 'code' in long_df.columns else ('task' if 'task' in long_df.columns else None)
+        runs = build_shift_runs(long_df, code_col=code_col)
+        continuous_shifts = self._detect_from_runs(runs) if len(runs) else []
         
         self.continuous_shifts = continuous_shifts
         log.info(f"連続勤務検出完了: {len(continuous_shifts)}件")
         
         return continuous_shifts
     
-    def _analyze_daily_patterns(self, staff_data: pd.DataFrame) -> Dict[str, Dict]:
-        """職員の日別勤務パターンを分析"""
-        daily_patterns = {}
-        
-        for date, group in staff_data.groupby('date'):
-            date_str = date.strftime('%Y-%m-%d')
-            times = [t.strftime('%H:%M') for t in group['time']]
-            # 'code'カラムがない場合は'task'カラムを使用
-            if 'code' in group.columns:
-                codes = group['code'].unique()
-            elif 'task' in group.columns:
-                codes = group['task'].unique()
-            else:
-                codes = []
-            
-            # 夜勤パターンの検出（16:00以降にシフトが開始）
-            has_night_shift = any(
-                t >= dt.time(16, 0) for t in group['time']
-            ) and any(code in self.night_shift_codes for code in codes)
-            
-            # 明け番パターンの検出（6:00以前にシフトが終了）
-            has_morning_shift = any(
-                t <= dt.time(10, 0) for t in group['time']
-            ) and any(code in self.morning_shift_codes for code in codes)
-            
-            daily_patterns[date_str] = {
-                'times': sorted(times),
-                'codes': list(codes),
-                'has_night_shift': has_night_shift,
-                'has_morning_shift': has_morning_shift,
-                'data': group
-            }
+    def _detect_from_runs(self, runs: ShiftRuns) -> List[ContinuousShift]:
+        """
+        日単位に集約したフラグを翌日分とずらして比較し、夜勤→明け番を検出
+        (夜勤: 16:00以降の勤務 + 夜勤コード / 明け番: 10:00以前の勤務 + 明けコード)
+        """
+        seg = runs.day_starts
+        day_min = np.minimum.reduceat(runs.start_sec, seg)
+        day_max = np.maximum.reduceat(runs.end_sec, seg)
+        night_run = np.isin(runs.code, runs.code_ids(self.night_shift_codes))
+        morning_run = np.isin(runs.code, runs.code_ids(self.morning_shift_codes))
+        has_night = (day_max >= _NIGHT_FROM_SEC) & np.logical_or.reduceat(night_run, seg)
+        has_morning = (day_min <= _MORNING_UNTIL_SEC) & np.logical_or.reduceat(morning_run, seg)
+        
+        # 日内で最初に現れる夜勤/明けコードのラン (無ければその日の先頭ラン)
+        pos = np.arange(len(runs))
+        first_night = np.minimum.reduceat(np.where(night_run, pos, len(runs)), seg)
+        first_morning = np.minimum.reduceat(np.where(morning_run, pos, len(runs)), seg)
+        start_run = np.where(first_night < len(runs), first_night, seg)
+        end_run = np.where(first_morning < len(runs), first_morning, seg)
+        
+        day_staff = runs.staff[seg]
+        day_num = runs.day[seg]
+        hits = np.flatnonzero(
+            (day_staff[1:] == day_staff[:-1])
+            & (day_num[1:] - day_num[:-1] == 1)
+            & has_night[:-1]
+            & has_morning[1:]
+        )
+        if not len(hits):
+            return []
         
-        return daily_patterns
-    
-    def _detect_overnight_patterns(self, daily_patterns: Dict, staff: str) -> List[ContinuousShift]:
-        """日跨ぎ連続勤務パターンを検出"""
-        continuous_shifts = []
-        dates = sorted(daily_patterns.keys())
+        # 総勤務時間は従来どおり分単位 (HH:MM) の開始/終了時刻から計算
+        nxt = hits + 1
+        start_min = day_min[hits] // 60
+        end_min = day_max[nxt] // 60
+        durations = ((day_num[nxt] - day_num[hits]) * 1440 + end_min - start_min) / 60
+        dates = day_to_str(day_num)
+        code_names = np.asarray(runs.code_names, dtype=object)
         
-        for i in range(len(dates) - 1):
-            current_date = dates[i]
-            next_date = dates[i + 1]
-            
-            current_pattern = daily_patterns[current_date]
-            next_pattern = daily_patterns[next_date]
-            
-            # 夜勤→明け番パターンの検出
-            if (current_pattern['has_night_shift'] and 
-                next_pattern['has_morning_shift'] and
-                self._is_consecutive_dates(current_date, next_date)):
-                
-                # 連続勤務の詳細分析
-                continuous_shift = self._create_continuous_shift(
-                    staff, current_date, next_date, 
-                    current_pattern, next_pattern
-                )
-                
-                if continuous_shift:
-                    continuous_shifts.append(continuous_shift)
-                    log.debug(f"連続勤務検出: {staff} {current_date}→{next_date}")
+        def code_at(run: int):
+            c = runs.code[run]
+            return code_names[c] if c >= 0 else np.nan
         
-        return continuous_shifts
-    
-    def _is_consecutive_dates(self, date1: str, date2: str) -> bool:
-        """2つの日付が連続しているかチェック"""
-        try:
-            d1 = dt.datetime.strptime(date1, '%Y-%m-%d').date()
-            d2 = dt.datetime.strptime(date2, '%Y-%m-%d').date()
-            return (d2 - d1).days == 1
-        except:
-            return False
-    
-    def _create_continuous_shift(self, staff: str, start_date: str, end_date: str,
-                               start_pattern: Dict, end_pattern: Dict) -> Optional[ContinuousShift]:
-        """連続勤務オブジェクトを作成"""
-        try:
-            # 開始時刻と終了時刻を特定
-            start_times = start_pattern['times']
-            end_times = end_pattern['times']
-            
-            if not start_times or not end_times:
-                return None
-            
-            # 夜勤の開始時刻（最も早い時刻）
-            start_time = min(start_times)
-            
-            # 明け番の終了時刻（最も遅い時刻）
-            end_time = max(end_times)
-            
-            # 勤務コードを特定
-            start_codes = [c for c in start_pattern['codes'] if c in self.night_shift_codes]
-            end_codes = [c for c in end_pattern['codes'] if c in self.morning_shift_codes]
-            
-            start_code = start_codes[0] if start_codes else start_pattern['codes'][0]
-            end_code = end_codes[0] if end_codes else end_pattern['codes'][0]
-            
-            # 総勤務時間を計算
-            total_duration = self._calculate_total_duration(
-                start_date, start_time, end_date, end_time
-            )
-            
-            return ContinuousShift(
+        continuous_shifts = []
+        for k, (i, j) in enumerate(zip(hits, nxt)):
+            staff = runs.staff_names[day_staff[i]]
+            continuous_shifts.append(ContinuousShift(
                 staff=staff,
-                start_date=start_date,
-                end_date=end_date,
-                start_time=start_time,
-                end_time=end_time,
-                start_code=start_code,
-                end_code=end_code,
-                total_duration_hours=total_duration,
+                start_date=dates[i],
+                end_date=dates[j],
+                start_time=sec_to_hhmm(day_min[i]),
+                end_time=sec_to_hhmm(day_max[j]),
+                start_code=code_at(start_run[i]),
+                end_code=code_at(end_run[j]),
+                total_duration_hours=float(durations[k]),
                 is_overnight=True
-            )
-            
-        except Exception as e:
-            log.warning(f"連続勤務作成エラー: {staff} {start_date}→{end_date}: {e}")
-            return None
+            ))
+            log.debug(f"連続勤務検出: {staff} {dates[i]}→{dates[j]}")
+        
+        return continuous_shifts
     
-    def _calculate_total_duration(self, start_date: str, start_time: str, 
-                                end_date: str, end_time: str) -> float:
-        """総勤務時間を計算（時間単位）"""
-        try:
-            start_dt = dt.datetime.strptime(f"{start_date} {start_time}", "%Y-%m-%d %H:%M")
-            end_dt = dt.datetime.strptime(f"{end_date} {end_time}", "%Y-%m-%d %H:%M")
-            
-            duration = end_dt - start_dt
-            return duration.total_seconds() / 3600
-        except:
-            return 0.0
+    def _overlap_index(self) -> Dict[str, Dict[str, Set[str]]]:
+        """終了日 → 重複時刻 → 継続勤務者。continuous_shifts の内容が変わったら作り直す"""
+        # リストの同一性ではなく内容で判定する (同じリストへの追加・書き換えも検出する)
+        key = tuple((s.staff, s.end_date, s.is_overnight) for s in self.continuous_shifts)
+        if self._index_key != key:
+            index: Dict[str, Dict[str, Set[str]]] = {}
+            for shift in self.continuous_shifts:
+                slots = index.setdefault(shift.end_date, {})
+                for overlap_time in shift.get_overlap_times():
+                    slots.setdefault(overlap_time, set()).add(shift.staff)
+            self._index = index
+            self._index_key = key
+        return self._index
     
     def get_duplicate_time_slots(self, target_date: str) -> Set[Tuple[str, str]]:
         """
@@ -217,15 +158,9 @@ class ContinuousShiftDetector:
         Returns:
             Set of (staff, time) tuples that should be deduplicated
         """
-        duplicates = set()
-        
-        for shift in self.continuous_shifts:
-            if shift.end_date == target_date:
-                # 翌日0:00は前日夜勤の継続として重複カウント対象
-                for overlap_time in shift.get_overlap_times():
-                    duplicates.add((shift.staff, overlap_time))
-        
-        return duplicates
+        # 翌日0:00は前日夜勤の継続として重複カウント対象
+        slots = self._overlap_index().get(target_date, {})
+        return {(staff, t) for t, staff_set in slots.items() for staff in staff_set}
     
     def should_adjust_need(self, time_slot: str, date: str) -> Tuple[bool, int]:
         """
@@ -237,13 +172,9 @@ class ContinuousShiftDetector:
         if not time_slot.startswith('00:'):
             return False, 0
         
-        # 当日0:00時点で前日からの継続勤務者数を計算
-        continuing_staff = set()
-        for shift in self.continuous_shifts:
-            if shift.end_date == date and "00:00" in shift.get_overlap_times():
-                continuing_staff.add(shift.staff)
-        
-        return len(continuing_staff) > 0, len(continuing_staff)
+        # 当日0:00時点で前日からの継続勤務者数
+        count = len(self._overlap_index().get(date, {}).get("00:00", ()))
+        return count > 0, count
     
     def get_continuous_shift_summary(self) -> Dict:
         """連続勤務の統計サマリーを取得"""
@@ -3,6 +3,7 @@ cost_benefit.py ── “採用 / 派遣 / 漏れ (罰金)” コストを試
 -------------------------------------------------------------------
 入力 : shortage_role.xlsx（不足 h）   hire_plan.xlsx（hire_need または hire_fte）
 出力 : cost_benefit.xlsx（シナリオ別比較表）
+       cost_simulation.parquet（モンテカルロによるポリシー別コスト分布, cost_simulation 参照）
 呼出 : analyze_cost_benefit(out_dir            = Path,
                             wage_direct        = 1500,
                             wage_temp          = 2200,
@@ -116,4 +117,14 @@ def analyze_cost_benefit(
     except Exception as e:  # noqa: BLE001
         log.warning("Failed to write summary %s: %s", summary_fp, e)
 
+    # 需要変動・欠勤・採用リードタイムを考慮したコスト分布 (cost_simulation.parquet)
+    try:
+        from .cost_simulation import write_cost_simulation
+
+        write_cost_simulation(
+            out_dir, wage_direct, wage_temp, hiring_cost_once, penalty_per_lack_h
+        )
+    except Exception as e:  # noqa: BLE001
+        log.warning("Failed to write cost simulation: %s", e)
+
     return df
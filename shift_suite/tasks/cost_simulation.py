@@ -0,0 +1,383 @@
+"""
+shift_suite.tasks.cost_simulation v1.0.0 – 採用 / 残業 / 派遣ポリシーのモンテカルロ費用試算
+────────────────────────────────────────────────────────────────
+* ``cost_benefit.analyze_cost_benefit`` は不足時間と採用必要数の合計から
+  4 つの固定シナリオを決定論的に計算するだけで、需要の振れや欠勤率、
+  採用までのリードタイムによるコストのばらつきが見えなかった。
+* 本モジュールは職種ごとに
+    - 需要変動 (不足時間への乗数, 対数正規)
+    - 欠勤率 (ベータ分布。既存職員の稼働減と採用者の稼働率の両方に効く)
+    - 採用リードタイム (ガンマ分布。期間内の稼働割合を決める)
+  を NumPy 配列でサンプリングし、ポリシー (採用割合 × 残業充当割合 ×
+  派遣充当割合) と掛け合わせた (ポリシー × シナリオ × 職種) の配列で
+  コストを一括計算する。ループは無く、1 万ポリシー×シナリオの評価は数十 ms。
+* コストの内訳は 採用一時費用 + 採用者人件費 + 残業代 + 派遣費 + 未充足ペナルティ。
+  不足は 採用者 → 残業 (既存職員の稼働時間 × 上限割合まで) → 派遣 の順に埋める。
+* ``summarize_cost_simulation`` がポリシー × 職種 (と全体) ごとの平均と
+  パーセンタイルを返し、``write_cost_simulation`` が ``cost_simulation.parquet`` に保存する。
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .constants import COST_PARAMETERS, WAGE_RATES
+from .utils import log
+
+SIMULATION_FILE = "cost_simulation.parquet"
+ALL_ROLES = "全体"
+DEFAULT_PERCENTILES: Tuple[float, ...] = (5.0, 50.0, 95.0)
+_DAYS_PER_MONTH = 30.0
+
+# cost_benefit の固定シナリオに対応するポリシー (採用割合, 残業割合, 派遣割合)
+LEGACY_POLICIES: Dict[str, Tuple[float, float, float]] = {
+    "StatusQuo": (0.0, 0.0, 0.0),
+    "FullTemp": (0.0, 0.0, 1.0),
+    "Hire": (1.0, 0.0, 0.0),
+    "Hybrid50": (0.5, 0.0, 1.0),
+}
+
+
+@dataclass
+class SimulationConfig:
+    """
+    サンプリングとコストのパラメータ。
+
+    ``horizon_days`` は評価期間 (日)。分析期間の不足・稼働が同じ水準で続くとみなして
+    換算する (None は分析期間そのもの)。採用の一時費用とリードタイムは評価期間に対して効く。
+    """
+
+    n_scenarios: int = 2000
+    demand_cv: float = 0.15
+    absence_rate: float = 0.05
+    absence_sd: float = 0.02
+    baseline_absence_rate: Optional[float] = None
+    lead_time_days: float = 30.0
+    lead_time_cv: float = 0.5
+    overtime_cap_ratio: float = 0.10
+    overtime_multiplier: float = WAGE_RATES["overtime_multiplier"]
+    monthly_hours_fte: float = COST_PARAMETERS["monthly_hours_fte"]
+    horizon_days: Optional[float] = 365.0
+    seed: Optional[int] = 0
+
+
+@dataclass
+class RoleInputs:
+    """職種別の入力 (長さ R の配列)。period_days は分析対象期間の日数"""
+
+    roles: List[str]
+    lack_h: np.ndarray
+    staff_h: np.ndarray
+    hire_need: np.ndarray
+    period_days: float
+
+    def __len__(self) -> int:
+        return len(self.roles)
+
+
+@dataclass
+class Scenarios:
+    """(S × R) のサンプル"""
+
+    demand: np.ndarray
+    absence: np.ndarray
+    lead_time: np.ndarray
+
+    def __len__(self) -> int:
+        return self.demand.shape[0]
+
+
+@dataclass
+class CostSimulationResult:
+    """(P × S × R) の総コストと未充足時間"""
+
+    policies: pd.DataFrame
+    inputs: RoleInputs
+    cost: np.ndarray
+    unmet_h: np.ndarray
+    components: Dict[str, np.ndarray] = field(default_factory=dict)
+
+
+# ─────────────────────────── inputs ───────────────────────────
+def load_role_inputs(out_dir: Path | str, monthly_hours_fte: float = COST_PARAMETERS["monthly_hours_fte"]) -> Optional[RoleInputs]:
+    """
+    ``shortage_role_summary.parquet`` (と、あれば ``hire_plan.parquet``) から職種別入力を作る。
+    hire_plan が無い職種は 不足時間 ÷ 期間の常勤換算時間 を採用必要数とする。
+    """
+    out_dir = Path(out_dir)
+    kpi_fp = out_dir / "shortage_role_summary.parquet"
+    if not kpi_fp.exists():
+        return None
+    kpi = pd.read_parquet(kpi_fp)
+    if kpi.empty or not {"role", "lack_h"}.issubset(kpi.columns):
+        return None
+    kpi = kpi[kpi["role"].astype(str) != ALL_ROLES]
+    # 合計行 (role が空 / 'total' 等) は含めない
+    kpi = kpi[~kpi["role"].astype(str).str.lower().isin(["", "total", "all", "合計"])]
+    if kpi.empty:
+        return None
+
+    period_days = _DAYS_PER_MONTH
+    if "working_days_considered" in kpi.columns:
+        days = pd.to_numeric(kpi["working_days_considered"], errors="coerce").max()
+        if pd.notna(days) and days > 0:
+            period_days = float(days)
+    fte_hours = monthly_hours_fte * period_days / _DAYS_PER_MONTH
+
+    roles = kpi["role"].astype(str).tolist()
+    lack_h = pd.to_numeric(kpi["lack_h"], errors="coerce").fillna(0).clip(lower=0).to_numpy(dtype=float)
+    staff_h = (
+        pd.to_numeric(kpi["staff_h"], errors="coerce").fillna(0).to_numpy(dtype=float)
+        if "staff_h" in kpi.columns
+        else np.zeros(len(roles))
+    )
+    hire_need = lack_h / max(fte_hours, 1e-9)
+
+    hire_fp = out_dir / "hire_plan.parquet"
+    if hire_fp.exists():
+        try:
+            plan = pd.read_parquet(hire_fp)
+            col = "hire_need" if "hire_need" in plan.columns else "hire_fte" if "hire_fte" in plan.columns else None
+            if col and "role" in plan.columns:
+                planned = plan.groupby(plan["role"].astype(str))[col].sum()
+                hire_need = np.array(
+                    [float(planned.get(r, h)) for r, h in zip(roles, hire_need)]
+                )
+        except Exception as e:  # noqa: BLE001
+            log.warning(f"[cost_simulation] hire_plan.parquet を読めません: {e}")
+
+    return RoleInputs(roles, lack_h, staff_h, hire_need, period_days)
+
+
+def policy_grid(
+    hire_fracs: Iterable[float] = np.linspace(0.0, 1.5, 16),
+    overtime_fracs: Iterable[float] = np.linspace(0.0, 1.0, 6),
+    temp_fracs: Iterable[float] = np.linspace(0.0, 1.0, 6),
+    *,
+    include_legacy: bool = True,
+) -> pd.DataFrame:
+    """
+    ポリシーの直積 [policy, hire_frac, overtime_frac, temp_frac]。
+    hire_frac は採用必要数に対する採用割合、overtime_frac / temp_frac は
+    採用後に残る不足のうち残業 / 派遣で埋める割合。
+    """
+    h, o, t = np.meshgrid(
+        np.asarray(list(hire_fracs), dtype=float),
+        np.asarray(list(overtime_fracs), dtype=float),
+        np.asarray(list(temp_fracs), dtype=float),
+        indexing="ij",
+    )
+    grid = pd.DataFrame({"hire_frac": h.ravel(), "overtime_frac": o.ravel(), "temp_frac": t.ravel()})
+    grid.insert(
+        0,
+        "policy",
+        [f"H{a:.2f}/OT{b:.2f}/T{c:.2f}" for a, b, c in grid.itertuples(index=False)],
+    )
+    if include_legacy:
+        legacy = pd.DataFrame(
+            [(name, *v) for name, v in LEGACY_POLICIES.items()],
+            columns=["policy", "hire_frac", "overtime_frac", "temp_frac"],
+        )
+        grid = pd.concat([legacy, grid], ignore_index=True)
+    return grid
+
+
+# ─────────────────────────── sampling ───────────────────────────
+def sample_scenarios(n_roles: int, config: SimulationConfig, rng: Optional[np.random.Generator] = None) -> Scenarios:
+    """需要乗数・欠勤率・リードタイム (日) を (n_scenarios × n_roles) で生成する"""
+    rng = rng or np.random.default_rng(config.seed)
+    shape = (int(config.n_scenarios), int(n_roles))
+
+    sigma = np.sqrt(np.log1p(config.demand_cv ** 2))
+    demand = rng.lognormal(-0.5 * sigma ** 2, sigma, size=shape) if sigma > 0 else np.ones(shape)
+
+    mean, sd = float(config.absence_rate), float(config.absence_sd)
+    if sd > 0 and 0 < mean < 1 and sd ** 2 < mean * (1 - mean):
+        k = mean * (1 - mean) / sd ** 2 - 1
+        absence = rng.beta(mean * k, (1 - mean) * k, size=shape)
+    else:
+        absence = np.full(shape, mean)
+
+    if config.lead_time_cv > 0 and config.lead_time_days > 0:
+        k = 1.0 / config.lead_time_cv ** 2
+        lead_time = rng.gamma(k, config.lead_time_days / k, size=shape)
+    else:
+        lead_time = np.full(shape, float(config.lead_time_days))
+    return Scenarios(demand=demand, absence=absence, lead_time=lead_time)
+
+
+# ─────────────────────────── evaluation ───────────────────────────
+def simulate_costs(
+    inputs: RoleInputs,
+    policies: pd.DataFrame,
+    scenarios: Scenarios,
+    config: SimulationConfig,
+    *,
+    wage_direct: float = WAGE_RATES["regular_staff"],
+    wage_temp: float = WAGE_RATES["temporary_staff"],
+    hiring_cost_once: float = COST_PARAMETERS["hiring_cost_once"],
+    penalty_per_lack_h: float = COST_PARAMETERS["penalty_per_shortage_hour"],
+    keep_components: bool = False,
+) -> CostSimulationResult:
+    """全ポリシー × シナリオ × 職種のコストをブロードキャストで計算する"""
+    hire = policies["hire_frac"].to_numpy(dtype=float)[:, None, None]
+    overtime = policies["overtime_frac"].to_numpy(dtype=float)[:, None, None]
+    temp = policies["temp_frac"].to_numpy(dtype=float)[:, None, None]
+
+    baseline_absence = (
+        config.absence_rate if config.baseline_absence_rate is None else config.baseline_absence_rate
+    )
+    horizon = float(config.horizon_days or inputs.period_days)
+    scale = horizon / max(inputs.period_days, 1e-9)
+    lack_h, staff_h = inputs.lack_h * scale, inputs.staff_h * scale
+    fte_hours = config.monthly_hours_fte * horizon / _DAYS_PER_MONTH
+    absence = scenarios.absence[None]
+    # 実績の不足には基準欠勤率が織り込み済みなので、差分だけ既存職員の稼働を増減させる
+    lack = np.maximum(
+        lack_h * scenarios.demand + staff_h * (scenarios.absence - baseline_absence), 0.0
+    )[None]
+    productive = np.clip(1.0 - scenarios.lead_time / max(horizon, 1e-9), 0.0, 1.0)[None]
+
+    hires = hire * inputs.hire_need
+    paid_h = hires * fte_hours * productive
+    remaining = np.maximum(lack - paid_h * (1.0 - absence), 0.0)
+    overtime_h = np.minimum(overtime * remaining, config.overtime_cap_ratio * staff_h * (1.0 - absence))
+    remaining = remaining - overtime_h
+    temp_h = temp * remaining
+    unmet_h = remaining - temp_h
+
+    hiring = hires * hiring_cost_once
+    direct = paid_h * wage_direct
+    overtime_cost = overtime_h * wage_direct * config.overtime_multiplier
+    temp_cost = temp_h * wage_temp
+    penalty = unmet_h * penalty_per_lack_h
+    cost = hiring + direct + overtime_cost + temp_cost + penalty
+
+    components: Dict[str, np.ndarray] = {}
+    if keep_components:
+        shape = cost.shape
+        components = {
+            "hiring": np.broadcast_to(hiring, shape),
+            "direct": np.broadcast_to(direct, shape),
+            "overtime": overtime_cost,
+            "temp": temp_cost,
+            "penalty": penalty,
+        }
+    return CostSimulationResult(policies.reset_index(drop=True), inputs, cost, unmet_h, components)
+
+
+def summarize_cost_simulation(
+    result: CostSimulationResult,
+    percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+    *,
+    include_total: bool = True,
+) -> pd.DataFrame:
+    """
+    ポリシー × 職種ごとのコスト分布の要約。
+    列は policy / hire_frac / overtime_frac / temp_frac / role / cost_mean /
+    cost_p<q> / cost_std / unmet_h_mean / unmet_h_p<最大q>。
+    ``include_total`` の場合、シナリオごとに職種を合計した分布を role='全体' として加える。
+    """
+    cost, unmet = result.cost, result.unmet_h
+    roles = list(result.inputs.roles)
+    if include_total and len(roles) > 1:
+        cost = np.concatenate([cost, cost.sum(axis=2, keepdims=True)], axis=2)
+        unmet = np.concatenate([unmet, unmet.sum(axis=2, keepdims=True)], axis=2)
+        roles = roles + [ALL_ROLES]
+
+    P, _, R = cost.shape
+    q = np.asarray(percentiles, dtype=float)
+    cost_q = np.percentile(cost, q, axis=1)
+    top_q = float(q.max()) if q.size else 95.0
+
+    out = pd.DataFrame(
+        {
+            "policy": np.repeat(result.policies["policy"].to_numpy(), R),
+            "hire_frac": np.repeat(result.policies["hire_frac"].to_numpy(), R),
+            "overtime_frac": np.repeat(result.policies["overtime_frac"].to_numpy(), R),
+            "temp_frac": np.repeat(result.policies["temp_frac"].to_numpy(), R),
+            "role": np.tile(roles, P),
+            "cost_mean": cost.mean(axis=1).ravel(),
+        }
+    )
+    for i, p in enumerate(q):
+        out[f"cost_p{p:g}"] = cost_q[i].ravel()
+    out["cost_std"] = cost.std(axis=1).ravel()
+    out["unmet_h_mean"] = unmet.mean(axis=1).ravel()
+    out[f"unmet_h_p{top_q:g}"] = np.percentile(unmet, top_q, axis=1).ravel()
+    return out
+
+
+def best_policies(summary: pd.DataFrame, *, role: str = ALL_ROLES, by: str = "cost_p95", n: int = 10) -> pd.DataFrame:
+    """指定した統計量 (既定は 95 パーセンタイル) が小さい順のポリシー"""
+    part = summary[summary["role"] == role]
+    if part.empty:
+        part = summary
+    return part.nsmallest(n, by).reset_index(drop=True)
+
+
+def simulate_cost_benefit(
+    out_dir: Path | str,
+    wage_direct: float = WAGE_RATES["regular_staff"],
+    wage_temp: float = WAGE_RATES["temporary_staff"],
+    hiring_cost_once: float = COST_PARAMETERS["hiring_cost_once"],
+    penalty_per_lack_h: float = COST_PARAMETERS["penalty_per_shortage_hour"],
+    *,
+    config: Optional[SimulationConfig] = None,
+    policies: Optional[pd.DataFrame] = None,
+    percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+) -> Optional[pd.DataFrame]:
+    """``out_dir`` の成果物から入力を読み、シミュレーションの要約を返す (入力が無ければ None)"""
+    config = config or SimulationConfig()
+    inputs = load_role_inputs(out_dir, config.monthly_hours_fte)
+    if inputs is None:
+        log.warning("[cost_simulation] shortage_role_summary.parquet が無いため試算できません")
+        return None
+    policies = policy_grid() if policies is None else policies
+    scenarios = sample_scenarios(len(inputs), config)
+    result = simulate_costs(
+        inputs,
+        policies,
+        scenarios,
+        config,
+        wage_direct=wage_direct,
+        wage_temp=wage_temp,
+        hiring_cost_once=hiring_cost_once,
+        penalty_per_lack_h=penalty_per_lack_h,
+    )
+    return summarize_cost_simulation(result, percentiles)
+
+
+def write_cost_simulation(out_dir: Path | str, *args, **kwargs) -> Optional[Path]:
+    """``simulate_cost_benefit`` の結果を ``cost_simulation.parquet`` に保存する"""
+    summary = simulate_cost_benefit(out_dir, *args, **kwargs)
+    if summary is None:
+        return None
+    fp = Path(out_dir) / SIMULATION_FILE
+    summary.to_parquet(fp, index=False)
+    log.info(f"[cost_simulation] {len(summary)} rows -> {fp}")
+    return fp
+
+
+__all__ = [
+    "ALL_ROLES",
+    "CostSimulationResult",
+    "LEGACY_POLICIES",
+    "RoleInputs",
+    "SIMULATION_FILE",
+    "Scenarios",
+    "SimulationConfig",
+    "best_policies",
+    "load_role_inputs",
+    "policy_grid",
+    "sample_scenarios",
+    "simulate_cost_benefit",
+    "simulate_costs",
+    "summarize_cost_simulation",
+    "write_cost_simulation",
+]
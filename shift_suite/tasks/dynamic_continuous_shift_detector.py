@@ -1,6 +1,7 @@
 # shift_suite/tasks/dynamic_continuous_shift_detector.py
 # 動的連続勤務検出システム - 完全に汎用的なデータ対応
 # v2.0.0 - 設定ベース動的検出対応
+# v2.1.0 - shift_runs のラン列で主パターン・ルール照合を一括計算し、重複スロットは索引で参照
 
 from __future__ import annotations
 
@@ -10,14 +11,21 @@ import json
 from typing import Dict, List, Tuple, Set, Optional, Any
 from dataclasses import dataclass, field
 from pathlib import Path
+import numpy as np
 import pandas as pd
 
 from ..logger_config import configure_logging
+from .shift_runs import SECONDS_PER_DAY, ShiftRuns, build_shift_runs, day_to_str, sec_to_hhmm
 
 configure_logging()
 log = logging.getLogger(__name__)
 
 
+def _sec_to_time(seconds: int) -> dt.time:
+    seconds = int(seconds)
+    return dt.time(seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+
 @dataclass
 class ShiftPattern:
     """勤務パターン定義"""
@@ -113,6 +121,8 @@ class DynamicContinuousShiftDetector:
         self.shift_patterns: Dict[str, ShiftPattern] = {}
         self.continuous_shift_rules: List[ContinuousShiftRule] = []
         self.detected_shifts: List[DynamicContinuousShift] = []
+        self._indexes: Dict[int, Dict[str, Dict[str, Tuple[Set[str], List[str]]]]] = {}
+        self._index_key: Optional[Tuple] = None
         
         # 設定の読み込み
         if config_path and config_path.exists():
@@ -172,8 +182,9 @@ class DynamicContinuousShiftDetector:
         self.continuous_shift_rules = default_rules
         log.info("デフォルト設定を生成しました")
     
-    def auto_detect_patterns_from_data(self, long_df: pd.DataFrame, wt_df: pd.DataFrame = None):
-        """データから動的にシフトパターンを検出・学習"""
+    def auto_detect_patterns_from_data(self, long_df: pd.DataFrame, wt_df: pd.DataFrame = None,
+                                       runs: Optional[ShiftRuns] = None):
+        """データから動的にシフトパターンを検出・学習 (runs は構築済みのラン列があれば再利用)"""
         if long_df.empty:
             return
         
@@ -182,14 +193,13 @@ class DynamicContinuousShiftDetector:
         # 既存パターンと競合しない新しいパターンを検出
         detected_patterns = {}
         
-        # wt_dfがある場合は勤務区分定義を優先使用
+        # wt_dfがある場合は勤務区分定義を優先使用 (数十行なので列を zip で走査)
         if wt_df is not None and not wt_df.empty:
-            for _, row in wt_df.iterrows():
-                code = row.get('code', '')
-                start = row.get('start_parsed', '')
-                end = row.get('end_parsed', '')
-                remarks = row.get('remarks', '')
-                
+            cols = [
+                wt_df[c] if c in wt_df.columns else pd.Series('', index=wt_df.index)
+                for c in ('code', 'start_parsed', 'end_parsed', 'remarks')
+            ]
+            for code, start, end, remarks in zip(*cols):
                 if code and start and end:
                     # 日跨ぎ判定
                     try:
@@ -212,44 +222,25 @@ class DynamicContinuousShiftDetector:
                     except Exception as e:
                         log.warning(f"勤務区分解析エラー {code}: {e}")
         
-        # long_dfから実際の使用パターンを検出
-        code_time_pairs = []
-        for _, row in long_df.iterrows():
-            code = row.get('code', '')
-            ds = row.get('ds')
-            if code and ds:
-                time_obj = pd.to_datetime(ds).time()
-                code_time_pairs.append((code, time_obj))
-        
-        # コードごとの時間範囲を分析
-        code_time_ranges = {}
-        for code, time_obj in code_time_pairs:
-            if code not in code_time_ranges:
-                code_time_ranges[code] = {'times': [], 'min_time': None, 'max_time': None}
-            
-            code_time_ranges[code]['times'].append(time_obj)
-        
-        # 各コードの時間範囲を計算
-        for code, data in code_time_ranges.items():
+        # long_dfから実際の使用パターンを検出 (コードごとの時刻統計を一括集計)
+        for code, stats in self._code_time_stats(long_df).iterrows():
             if code in detected_patterns:
                 continue  # 既に勤務区分で定義済み
             
-            times = sorted(data['times'])
-            if len(times) < 2:
+            count = int(stats['count'])
+            if count < 2:
                 continue
             
-            min_time = min(times)
-            max_time = max(times)
+            min_time = _sec_to_time(stats['min_sec'])
+            max_time = _sec_to_time(stats['max_sec'])
             
             # 日跨ぎ判定（深夜帯と夕方帯が混在する場合）
-            morning_times = [t for t in times if t.hour < 12]
-            evening_times = [t for t in times if t.hour >= 16]
-            is_overnight = len(morning_times) > 0 and len(evening_times) > 0
+            is_overnight = bool(stats['morning_max'] >= 0 and stats['evening_min'] < SECONDS_PER_DAY)
             
             if is_overnight:
                 # 夜勤パターンの場合
-                start_time = min(evening_times).strftime("%H:%M")
-                end_time = max(morning_times).strftime("%H:%M")
+                start_time = sec_to_hhmm(stats['evening_min'])
+                end_time = sec_to_hhmm(stats['morning_max'])
             else:
                 start_time = min_time.strftime("%H:%M")
                 end_time = max_time.strftime("%H:%M")
@@ -258,7 +249,7 @@ class DynamicContinuousShiftDetector:
                 code=code,
                 start_time=start_time,
                 end_time=end_time,
-                description=f"自動検出パターン ({len(times)}回出現)",
+                description=f"自動検出パターン ({count}回出現)",
                 is_overnight=is_overnight,
                 priority=self._calculate_priority(min_time, max_time, is_overnight)
             )
@@ -270,7 +261,36 @@ class DynamicContinuousShiftDetector:
         self.shift_patterns.update(detected_patterns)
         
         # 連続勤務ルールの自動生成
-        self._auto_generate_continuous_rules(long_df)
+        self._auto_generate_continuous_rules(long_df, runs)
+    
+    @staticmethod
+    def _code_time_stats(long_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        コード別の出現回数と時刻統計 (秒)。行は long_df での初出順。
+        morning_max: 12時前の最遅時刻 (無ければ -1) / evening_min: 16時以降の最早時刻
+        """
+        if 'code' not in long_df.columns or 'ds' not in long_df.columns:
+            return pd.DataFrame(columns=['count', 'min_sec', 'max_sec', 'morning_max', 'evening_min'])
+        
+        codes = long_df['code']
+        ts = pd.to_datetime(long_df['ds'], errors='coerce')
+        valid = codes.notna() & codes.astype(bool) & ts.notna()
+        ts = ts[valid]
+        sec = (ts - ts.dt.normalize()).dt.total_seconds().astype(np.int64)
+        frame = pd.DataFrame({
+            'code': codes[valid],
+            'sec': sec,
+            'morning': sec.where(sec < 12 * 3600, -1),
+            'evening': sec.where(sec >= 16 * 3600, SECONDS_PER_DAY),
+        })
+        stats = frame.groupby('code', sort=False).agg(
+            count=('sec', 'size'),
+            min_sec=('sec', 'min'),
+            max_sec=('sec', 'max'),
+            morning_max=('morning', 'max'),
+            evening_min=('evening', 'min'),
+        )
+        return stats
     
     def _calculate_priority(self, start_time: dt.time, end_time: dt.time, is_overnight: bool) -> int:
         """時間帯に基づいて優先度を計算"""
@@ -285,210 +305,197 @@ class DynamicContinuousShiftDetector:
         else:
             return 3   # 日中
     
-    def _auto_generate_continuous_rules(self, long_df: pd.DataFrame):
+    def _auto_generate_continuous_rules(self, long_df: pd.DataFrame, runs: Optional[ShiftRuns] = None):
         """実データから連続勤務ルールを自動生成"""
-        # 職員ごとの連続するコードパターンを分析
-        continuous_patterns = {}
-        
-        for staff in long_df['staff'].unique():
-            staff_data = long_df[long_df['staff'] == staff].copy()
-            staff_data['date'] = pd.to_datetime(staff_data['ds']).dt.date
-            staff_data = staff_data.sort_values('ds')
-            
-            # 連続する日付のコード変遷を追跡
-            prev_date = None
-            prev_codes = set()
-            
-            for date, group in staff_data.groupby('date'):
-                current_codes = set(group['code'].unique())
-                
-                if prev_date and (date - prev_date).days == 1:
-                    # 連続する日付での組み合わせを記録
-                    for prev_code in prev_codes:
-                        for current_code in current_codes:
-                            pattern_key = f"{prev_code}→{current_code}"
-                            if pattern_key not in continuous_patterns:
-                                continuous_patterns[pattern_key] = 0
-                            continuous_patterns[pattern_key] += 1
-                
-                prev_date = date
-                prev_codes = current_codes
+        if runs is None:
+            runs = build_shift_runs(long_df, code_col='code')
+        
+        # 職員 × 日付 × コード の組を作り、翌日の組と突き合わせてコード変遷を数える
+        day_codes = pd.DataFrame({
+            'staff': runs.staff, 'day': runs.day, 'code': runs.code
+        })
+        day_codes = day_codes[day_codes['code'] >= 0].drop_duplicates()
+        next_day = day_codes.assign(day=day_codes['day'] - 1)
+        transitions = day_codes.merge(next_day, on=['staff', 'day'], suffixes=('_from', '_to'))
+        continuous_patterns = transitions.groupby(['code_from', 'code_to'], sort=False).size()
         
         # 頻度の高いパターンから連続勤務ルールを生成
         threshold = 2  # 最低2回以上出現したパターンのみ
-        for pattern, count in continuous_patterns.items():
-            if count >= threshold:
-                from_code, to_code = pattern.split('→')
-                
-                # 既存ルールと重複チェック
-                exists = any(
-                    rule for rule in self.continuous_shift_rules
-                    if from_code in rule.from_patterns and to_code in rule.to_patterns
+        code_names = runs.code_names
+        for (from_id, to_id), count in continuous_patterns[continuous_patterns >= threshold].items():
+            from_code, to_code = str(code_names[from_id]), str(code_names[to_id])
+            pattern = f"{from_code}→{to_code}"
+            
+            # 既存ルールと重複チェック
+            exists = any(
+                rule for rule in self.continuous_shift_rules
+                if from_code in rule.from_patterns and to_code in rule.to_patterns
+            )
+            
+            if not exists:
+                rule = ContinuousShiftRule(
+                    name=f"自動検出: {pattern}",
+                    from_patterns=[from_code],
+                    to_patterns=[to_code],
+                    max_gap_hours=2.0,  # 動的に調整可能
+                    overlap_tolerance_minutes=30,
+                    description=f"データから検出 (出現回数: {int(count)})"
                 )
-                
-                if not exists:
-                    rule = ContinuousShiftRule(
-                        name=f"自動検出: {pattern}",
-                        from_patterns=[from_code],
-                        to_patterns=[to_code],
-                        max_gap_hours=2.0,  # 動的に調整可能
-                        overlap_tolerance_minutes=30,
-                        description=f"データから検出 (出現回数: {count})"
-                    )
-                    self.continuous_shift_rules.append(rule)
-                    log.info(f"連続勤務ルール自動生成: {pattern} (出現{count}回)")
+                self.continuous_shift_rules.append(rule)
+                log.info(f"連続勤務ルール自動生成: {pattern} (出現{count}回)")
     
     def detect_continuous_shifts(self, long_df: pd.DataFrame, wt_df: pd.DataFrame = None) -> List[DynamicContinuousShift]:
         """動的な連続勤務検出"""
         if long_df.empty:
             return []
         
+        runs = build_shift_runs(long_df, code_col='code')
+        
         # パターンの自動学習
-        self.auto_detect_patterns_from_data(long_df, wt_df)
+        self.auto_detect_patterns_from_data(long_df, wt_df, runs=runs)
         
         log.info(f"動的連続勤務検出開始: {len(self.shift_patterns)}パターン, {len(self.continuous_shift_rules)}ルール")
         
-        continuous_shifts = []
-        
-        # 職員ごとに処理
-        for staff in long_df['staff'].unique():
-            staff_data = long_df[long_df['staff'] == staff].copy()
-            staff_data['date'] = pd.to_datetime(staff_data['ds']).dt.date
-            staff_data['time'] = pd.to_datetime(staff_data['ds']).dt.time
-            staff_data = staff_data.sort_values('ds')
-            
-            # 日別パターン分析
-            daily_shifts = self._analyze_daily_shifts(staff_data)
-            
-            # 連続勤務検出
-            staff_continuous = self._detect_staff_continuous_shifts(daily_shifts, staff)
-            continuous_shifts.extend(staff_continuous)
+        continuous_shifts = self._detect_from_runs(runs) if len(runs) else []
         
         self.detected_shifts = continuous_shifts
         log.info(f"動的連続勤務検出完了: {len(continuous_shifts)}件")
         
         return continuous_shifts
     
-    def _analyze_daily_shifts(self, staff_data: pd.DataFrame) -> Dict[str, Dict]:
-        """職員の日別勤務を分析"""
-        daily_shifts = {}
-        
-        for date, group in staff_data.groupby('date'):
-            date_str = date.strftime('%Y-%m-%d')
-            codes = group['code'].unique()
-            times = [t for t in group['time']]
-            
-            # この日の勤務パターンを特定
-            detected_patterns = []
-            for code in codes:
-                if code in self.shift_patterns:
-                    pattern = self.shift_patterns[code]
-                    
-                    # 実際の時間がパターンと合致するかチェック
-                    matching_times = [
-                        t for t in times 
-                        if pattern.is_in_timerange(t)
-                    ]
-                    
-                    if matching_times:
-                        detected_patterns.append({
-                            'pattern': pattern,
-                            'matching_times': matching_times,
-                            'start_time': min(matching_times),
-                            'end_time': max(matching_times)
-                        })
-            
-            # 優先度でソート
-            detected_patterns.sort(key=lambda x: x['pattern'].priority, reverse=True)
-            
-            daily_shifts[date_str] = {
-                'date': date,
-                'codes': list(codes),
-                'times': times,
-                'patterns': detected_patterns,
-                'primary_pattern': detected_patterns[0] if detected_patterns else None
-            }
-        
-        return daily_shifts
-    
-    def _detect_staff_continuous_shifts(self, daily_shifts: Dict, staff: str) -> List[DynamicContinuousShift]:
-        """職員の連続勤務を検出"""
-        continuous_shifts = []
-        dates = sorted(daily_shifts.keys())
-        
-        for i in range(len(dates) - 1):
-            current_date = dates[i]
-            next_date = dates[i + 1]
+    def _primary_patterns(self, runs: ShiftRuns) -> Tuple[List[ShiftPattern], np.ndarray, np.ndarray, np.ndarray]:
+        """
+        日ごとの主パターンとその開始/終了時刻 (秒)。
+        
+        その日に現れたコードのうち、日内のいずれかの時刻がパターンの時間帯に
+        入るものを候補とし、優先度が最も高いもの (同順位は日内で先に現れたもの)
+        を主パターンとする。主パターンが無い日は添字 -1。
+        """
+        seg = runs.day_starts
+        n_days = len(seg)
+        day_id = np.repeat(np.arange(n_days), np.diff(np.r_[seg, len(runs)]))
+        none = len(runs)
+        
+        patterns: List[ShiftPattern] = []
+        best = np.full(n_days, -1, dtype=np.intp)
+        best_priority = np.zeros(n_days, dtype=np.int64)
+        best_pos = np.full(n_days, none, dtype=np.int64)
+        best_start = np.zeros(n_days, dtype=np.int64)
+        best_end = np.zeros(n_days, dtype=np.int64)
+        
+        for code_id, code in enumerate(runs.code_names):
+            pattern = self.shift_patterns.get(code)
+            if pattern is None:
+                continue
+            where = np.flatnonzero(runs.code == code_id)
+            first_pos = np.full(n_days, none, dtype=np.int64)
+            np.minimum.at(first_pos, day_id[where], where)
             
-            current_shift = daily_shifts[current_date]
-            next_shift = daily_shifts[next_date]
+            start_sec = pattern.start_time_obj.hour * 3600 + pattern.start_time_obj.minute * 60
+            end_sec = pattern.end_time_obj.hour * 3600 + pattern.end_time_obj.minute * 60
+            if pattern.is_overnight:
+                ranges = [(start_sec, SECONDS_PER_DAY - 1), (0, end_sec)]
+            else:
+                ranges = [(start_sec, end_sec)]
+            first = np.full(len(runs), SECONDS_PER_DAY, dtype=np.int64)
+            last = np.full(len(runs), -1, dtype=np.int64)
+            for lo, hi in ranges:
+                f, l = runs.match_times(lo, hi)
+                first = np.where(f >= 0, np.minimum(first, f), first)
+                last = np.maximum(last, l)
+            day_first = np.minimum.reduceat(first, seg)
+            day_last = np.maximum.reduceat(last, seg)
             
-            # 連続する日付かチェック
-            if not self._is_consecutive_dates(current_date, next_date):
+            candidate = (first_pos < none) & (day_last >= 0)
+            better = candidate & (
+                (best < 0)
+                | (pattern.priority > best_priority)
+                | ((pattern.priority == best_priority) & (first_pos < best_pos))
+            )
+            if not better.any():
                 continue
-            
-            # 各ルールとの照合
-            for rule in self.continuous_shift_rules:
-                continuous_shift = self._check_rule_match(
-                    current_shift, next_shift, rule, staff
-                )
-                if continuous_shift:
-                    continuous_shifts.append(continuous_shift)
-                    log.debug(f"連続勤務検出: {staff} {current_date}→{next_date} ({rule.name})")
-        
-        return continuous_shifts
+            best[better] = len(patterns)
+            best_priority[better] = pattern.priority
+            best_pos[better] = first_pos[better]
+            best_start[better] = day_first[better]
+            best_end[better] = day_last[better]
+            patterns.append(pattern)
+        
+        return patterns, best, best_start, best_end
     
-    def _check_rule_match(self, current_shift: Dict, next_shift: Dict, 
-                         rule: ContinuousShiftRule, staff: str) -> Optional[DynamicContinuousShift]:
-        """連続勤務ルールとの照合"""
-        current_pattern = current_shift.get('primary_pattern')
-        next_pattern = next_shift.get('primary_pattern')
-        
-        if not current_pattern or not next_pattern:
-            return None
-        
-        current_code = current_pattern['pattern'].code
-        next_code = next_pattern['pattern'].code
-        
-        if not rule.matches(current_code, next_code):
-            return None
-        
-        # 時間的な連続性をチェック
-        current_end = current_pattern['end_time']
-        next_start = next_pattern['start_time']
-        
-        # 日跨ぎを考慮した時間差計算
-        if current_pattern['pattern'].is_overnight and next_pattern['pattern'].is_overnight:
-            # 両方日跨ぎの場合は特別処理
-            gap_hours = self._calculate_overnight_gap(current_end, next_start)
-        else:
-            # 通常の時間差計算
-            gap_hours = self._calculate_time_gap(current_end, next_start)
-        
-        if gap_hours > rule.max_gap_hours:
-            return None
+    def _detect_from_runs(self, runs: ShiftRuns) -> List[DynamicContinuousShift]:
+        """主パターンを翌日分とずらして比較し、各ルールとの一致を一括判定"""
+        patterns, primary, start_sec, end_sec = self._primary_patterns(runs)
+        if not patterns:
+            return []
         
-        # 重複時間の計算
-        overlap_times = self._calculate_overlap_times(
-            current_pattern['pattern'], next_pattern['pattern'], rule
+        seg = runs.day_starts
+        day_staff = runs.staff[seg]
+        day_num = runs.day[seg]
+        pairs = np.flatnonzero(
+            (day_staff[1:] == day_staff[:-1])
+            & (day_num[1:] - day_num[:-1] == 1)
+            & (primary[:-1] >= 0)
+            & (primary[1:] >= 0)
         )
+        if not len(pairs):
+            return []
         
-        # 総勤務時間の計算
-        total_duration = self._calculate_total_duration(
-            current_shift['date'], current_pattern,
-            next_shift['date'], next_pattern
-        )
+        cur, nxt = primary[pairs], primary[pairs + 1]
+        cur_end, next_start = end_sec[pairs], start_sec[pairs + 1]
+        overnight = np.array([p.is_overnight for p in patterns])
+        
+        # 日跨ぎを考慮した時間差 (時間)
+        both_overnight = overnight[cur] & overnight[nxt]
+        plain_gap = next_start - cur_end
+        plain_gap = np.where(plain_gap < 0, plain_gap + SECONDS_PER_DAY, plain_gap)
+        overnight_gap = np.abs(next_start + SECONDS_PER_DAY - cur_end)
+        gap_hours = np.where(both_overnight, overnight_gap, plain_gap) / 3600
+        
+        hit_pairs, hit_rules = [], []
+        codes = [p.code for p in patterns]
+        for r, rule in enumerate(self.continuous_shift_rules):
+            from_ok = np.array([c in rule.from_patterns for c in codes])
+            to_ok = np.array([c in rule.to_patterns for c in codes])
+            matched = np.flatnonzero(from_ok[cur] & to_ok[nxt] & (gap_hours <= rule.max_gap_hours))
+            hit_pairs.append(matched)
+            hit_rules.append(np.full(len(matched), r))
+        hit_pairs = np.concatenate(hit_pairs)
+        hit_rules = np.concatenate(hit_rules)
+        order = np.lexsort((hit_rules, hit_pairs))
+        hit_pairs, hit_rules = hit_pairs[order], hit_rules[order]
+        
+        # 総勤務時間 (終了が開始より前なら翌日扱い)
+        i = pairs[hit_pairs]
+        start_abs = day_num[i] * SECONDS_PER_DAY + start_sec[i]
+        end_abs = day_num[i + 1] * SECONDS_PER_DAY + end_sec[i + 1]
+        end_abs = np.where(end_abs < start_abs, end_abs + SECONDS_PER_DAY, end_abs)
+        durations = (end_abs - start_abs) / 3600
+        
+        dates = day_to_str(day_num)
+        overlap_cache: Dict[Tuple[int, int, int], List[str]] = {}
+        continuous_shifts = []
+        for k, (p, r) in enumerate(zip(hit_pairs, hit_rules)):
+            d = pairs[p]
+            rule = self.continuous_shift_rules[r]
+            current_pattern, next_pattern = patterns[cur[p]], patterns[nxt[p]]
+            key = (cur[p], nxt[p], r)
+            if key not in overlap_cache:
+                overlap_cache[key] = self._calculate_overlap_times(current_pattern, next_pattern, rule)
+            staff = runs.staff_names[day_staff[d]]
+            continuous_shifts.append(DynamicContinuousShift(
+                staff=staff,
+                start_date=dates[d],
+                end_date=dates[d + 1],
+                start_pattern=current_pattern,
+                end_pattern=next_pattern,
+                rule=rule,
+                total_duration_hours=float(durations[k]),
+                overlap_times=list(overlap_cache[key])
+            ))
+            log.debug(f"連続勤務検出: {staff} {dates[d]}→{dates[d + 1]} ({rule.name})")
         
-        return DynamicContinuousShift(
-            staff=staff,
-            start_date=current_shift['date'].strftime('%Y-%m-%d'),
-            end_date=next_shift['date'].strftime('%Y-%m-%d'),
-            start_pattern=current_pattern['pattern'],
-            end_pattern=next_pattern['pattern'],
-            rule=rule,
-            total_duration_hours=total_duration,
-            overlap_times=overlap_times
-        )
+        return continuous_shifts
     
     def _calculate_overlap_times(self, pattern1: ShiftPattern, pattern2: ShiftPattern,
                                rule: ContinuousShiftRule) -> List[str]:
@@ -510,66 +517,47 @@ class DynamicContinuousShiftDetector:
         
         return overlap_times
     
-    def _calculate_overnight_gap(self, end_time: dt.time, start_time: dt.time) -> float:
-        """日跨ぎを考慮した時間差計算"""
-        end_dt = dt.datetime.combine(dt.date.today(), end_time)
-        start_dt = dt.datetime.combine(dt.date.today() + dt.timedelta(days=1), start_time)
-        gap = start_dt - end_dt
-        return abs(gap.total_seconds()) / 3600
-    
-    def _calculate_time_gap(self, end_time: dt.time, start_time: dt.time) -> float:
-        """通常の時間差計算"""
-        end_dt = dt.datetime.combine(dt.date.today(), end_time)
-        start_dt = dt.datetime.combine(dt.date.today(), start_time)
-        if start_dt < end_dt:
-            start_dt += dt.timedelta(days=1)
-        gap = start_dt - end_dt
-        return gap.total_seconds() / 3600
-    
-    def _calculate_total_duration(self, start_date: dt.date, start_pattern: Dict,
-                                end_date: dt.date, end_pattern: Dict) -> float:
-        """総勤務時間の計算"""
-        start_dt = dt.datetime.combine(start_date, start_pattern['start_time'])
-        end_dt = dt.datetime.combine(end_date, end_pattern['end_time'])
-        
-        if end_dt < start_dt:
-            end_dt += dt.timedelta(days=1)
-        
-        duration = end_dt - start_dt
-        return duration.total_seconds() / 3600
-    
-    def _is_consecutive_dates(self, date1: str, date2: str) -> bool:
-        """連続する日付かチェック"""
-        try:
-            d1 = dt.datetime.strptime(date1, '%Y-%m-%d').date()
-            d2 = dt.datetime.strptime(date2, '%Y-%m-%d').date()
-            return (d2 - d1).days == 1
-        except:
-            return False
+    def _slot_index(self, slot_minutes: int) -> Dict[str, Dict[str, Tuple[Set[str], List[str]]]]:
+        """
+        終了日 → 重複スロット → (継続勤務者, 該当ルール名) の索引。
+        slot_minutes ごとに作り、detected_shifts の内容が変わったら破棄する。
+        """
+        # リストの同一性ではなく内容で判定する (同じリストへの追加・書き換えも検出する)
+        key = tuple(
+            (s.staff, s.end_date, tuple(s.overlap_times), s.rule.name, s.rule.overlap_tolerance_minutes)
+            for s in self.detected_shifts
+        )
+        if self._index_key != key:
+            self._indexes = {}
+            self._index_key = key
+        index = self._indexes.get(slot_minutes)
+        if index is None:
+            index = {}
+            slots_cache: Dict[Tuple[Tuple[str, ...], int], List[str]] = {}
+            for shift in self.detected_shifts:
+                cache_key = (tuple(shift.overlap_times), shift.rule.overlap_tolerance_minutes)
+                if cache_key not in slots_cache:
+                    slots_cache[cache_key] = shift.get_overlap_time_slots(slot_minutes)
+                by_slot = index.setdefault(shift.end_date, {})
+                for time_slot in slots_cache[cache_key]:
+                    staff_set, rules = by_slot.setdefault(time_slot, (set(), []))
+                    staff_set.add(shift.staff)
+                    rules.append(shift.rule.name)
+            self._indexes[slot_minutes] = index
+        return index
     
     def get_dynamic_duplicate_time_slots(self, target_date: str, slot_minutes: int = 15) -> Set[Tuple[str, str]]:
         """動的重複時刻スロットの取得"""
-        duplicates = set()
-        
-        for shift in self.detected_shifts:
-            if shift.end_date == target_date:
-                overlap_slots = shift.get_overlap_time_slots(slot_minutes)
-                for time_slot in overlap_slots:
-                    duplicates.add((shift.staff, time_slot))
-        
-        return duplicates
+        by_slot = self._slot_index(slot_minutes).get(target_date, {})
+        return {
+            (staff, time_slot)
+            for time_slot, (staff_set, _) in by_slot.items()
+            for staff in staff_set
+        }
     
     def should_adjust_need_dynamic(self, time_slot: str, date: str) -> Tuple[bool, int, str]:
         """動的Need値調整判定"""
-        continuing_staff = set()
-        applicable_rules = []
-        
-        for shift in self.detected_shifts:
-            if shift.end_date == date:
-                overlap_slots = shift.get_overlap_time_slots()
-                if time_slot in overlap_slots:
-                    continuing_staff.add(shift.staff)
-                    applicable_rules.append(shift.rule.name)
+        continuing_staff, applicable_rules = self._slot_index(15).get(date, {}).get(time_slot, ((), []))
         
         rule_summary = ", ".join(set(applicable_rules)) if applicable_rules else "なし"
         
@@ -584,8 +572,8 @@ class DynamicContinuousShiftDetector:
                     "start_time": pattern.start_time,
                     "end_time": pattern.end_time,
                     "description": pattern.description,
-                    "is_overnight": pattern.is_overnight,
-                    "priority": pattern.priority
+                    "is_overnight": bool(pattern.is_overnight),
+                    "priority": int(pattern.priority)
                 }
                 for pattern in self.shift_patterns.values()
             ],
@@ -594,8 +582,8 @@ class DynamicContinuousShiftDetector:
                     "name": rule.name,
                     "from_patterns": rule.from_patterns,
                     "to_patterns": rule.to_patterns,
-                    "max_gap_hours": rule.max_gap_hours,
-                    "overlap_tolerance_minutes": rule.overlap_tolerance_minutes,
+                    "max_gap_hours": float(rule.max_gap_hours),
+                    "overlap_tolerance_minutes": int(rule.overlap_tolerance_minutes),
                     "description": rule.description
                 }
                 for rule in self.continuous_shift_rules
@@ -9,7 +9,7 @@ from .analyzers.rest_time import RestTimeAnalyzer
 
 # PyTorch LSTM疲労予測モデルのインポート（利用可能な場合）
 try:
-    from .pytorch_fatigue_predictor import PyTorchFatiguePredictor
+    from .pytorch_fatigue_predictor import load_or_train_predictor
     _HAS_PYTORCH = True
     log.info("[fatigue] PyTorch LSTM model available for advanced fatigue prediction")
 except ImportError:
@@ -17,6 +17,10 @@ except ImportError:
     log.info("[fatigue] Using statistical fatigue model (PyTorch not available)")
 
 
+TIME_CATEGORIES = np.array(["day", "late", "night", "other"])  # mode() の同数時は先頭（辞書順）
+_NIGHT_CATEGORY = 2
+
+
 def _get_time_category(code_str: str) -> str:
     """勤務コードから時間帯カテゴリを判定"""
     if pd.isna(code_str):
@@ -41,59 +45,69 @@ def _get_time_category(code_str: str) -> str:
     return "other"
 
 
+def _time_category_codes(codes: pd.Series) -> np.ndarray:
+    """勤務コード列を時間帯カテゴリ番号（TIME_CATEGORIES の添字）に変換
+
+    判定はユニークなコードに対してのみ行い、結果を参照配列で全行に展開する。
+    """
+    code_idx, uniques = pd.factorize(codes, use_na_sentinel=True)
+    lookup = np.array(
+        [int(np.searchsorted(TIME_CATEGORIES, _get_time_category(u))) for u in uniques] + [3],
+        dtype=np.int8,
+    )
+    return lookup[code_idx]  # NaN (-1) は末尾の "other"
+
+
+def _work_day_runs(staff: np.ndarray, day_ordinal: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(staff, 日) でソート済みの一意な勤務日から連続勤務ランを求める
+
+    Returns
+    -------
+    (run_staff, run_length)
+        各ランの所属スタッフ（staff の値）とラン長。
+    """
+    if len(day_ordinal) == 0:
+        return staff[:0], np.zeros(0, dtype=np.int64)
+    new_run = np.ones(len(day_ordinal), dtype=bool)
+    new_run[1:] = (staff[1:] != staff[:-1]) | (np.diff(day_ordinal) != 1)
+    starts = np.flatnonzero(new_run)
+    lengths = np.diff(np.append(starts, len(day_ordinal)))
+    return staff[starts], lengths
+
+
 def _analyze_consecutive_days(long_df: pd.DataFrame) -> list:
-    """連続勤務日数の分析"""
-    consecutive_metrics = []
-    
-    # スタッフごとの連続勤務を分析
-    for staff in long_df["staff"].unique():
-        staff_df = long_df[long_df["staff"] == staff].copy()
-        staff_df["date"] = pd.to_datetime(staff_df["ds"]).dt.date
-        work_dates = sorted(staff_df["date"].unique())
-        
-        if len(work_dates) < 2:
-            consecutive_metrics.append({
-                "staff": staff,
-                "consec3_ratio": 0,
-                "consec4_ratio": 0,
-                "consec5_ratio": 0
-            })
-            continue
-        
-        # 連続勤務パターンの検出
-        consecutive_groups = []
-        current_group = [work_dates[0]]
-        
-        for i in range(1, len(work_dates)):
-            prev_date = work_dates[i-1]
-            curr_date = work_dates[i]
-            
-            # 1日の差があるかチェック
-            if (curr_date - prev_date).days == 1:
-                current_group.append(curr_date)
-            else:
-                if len(current_group) >= 3:  # 3日以上の連勤のみ記録
-                    consecutive_groups.append(len(current_group))
-                current_group = [curr_date]
-        
-        # 最後のグループもチェック
-        if len(current_group) >= 3:
-            consecutive_groups.append(len(current_group))
-        
-        # 連勤パターンの比率計算
-        total_work_days = len(work_dates)
-        consec3_days = sum(1 for x in consecutive_groups if x >= 3)
-        consec4_days = sum(1 for x in consecutive_groups if x >= 4)
-        consec5_days = sum(1 for x in consecutive_groups if x >= 5)
-        
-        consecutive_metrics.append({
+    """連続勤務日数の分析（スタッフごとのランレングス符号化）"""
+    if long_df.empty:
+        return []
+    # スタッフ・日付が欠損した行は除く (factorize の -1 や NaT の整数化で bincount が壊れる)
+    keyed = pd.DataFrame({
+        "staff": long_df["staff"].to_numpy(),
+        "day": pd.to_datetime(long_df["ds"]).dt.normalize().to_numpy(),
+    }).dropna()
+    if keyed.empty:
+        return []
+    days = keyed.assign(
+        day=keyed["day"].to_numpy().astype("datetime64[D]").astype(np.int64)
+    ).drop_duplicates().sort_values(["staff", "day"], kind="stable")
+    staff_codes, staff_names = pd.factorize(days["staff"], sort=False)
+    run_staff, run_length = _work_day_runs(staff_codes, days["day"].to_numpy())
+    
+    n_staff = len(staff_names)
+    total_work_days = np.maximum(np.bincount(staff_codes, minlength=n_staff), 1)
+    # 3日以上の連勤ランのみ数える
+    consec3 = np.bincount(run_staff, weights=run_length >= 3, minlength=n_staff)
+    consec4 = np.bincount(run_staff, weights=run_length >= 4, minlength=n_staff)
+    consec5 = np.bincount(run_staff, weights=run_length >= 5, minlength=n_staff)
+    
+    return [
+        {
             "staff": staff,
-            "consec3_ratio": consec3_days / max(total_work_days, 1),
-            "consec4_ratio": consec4_days / max(total_work_days, 1),
-            "consec5_ratio": consec5_days / max(total_work_days, 1)
-        })
-    
-    return consecutive_metrics
+            "consec3_ratio": consec3[i] / total_work_days[i],
+            "consec4_ratio": consec4[i] / total_work_days[i],
+            "consec5_ratio": consec5[i] / total_work_days[i],
+        }
+        for i, staff in enumerate(staff_names)
+    ]
 
 
 def _features(long_df: pd.DataFrame, slot_minutes: int = 30) -> pd.DataFrame:
@@ -108,6 +122,8 @@ def _features(long_df: pd.DataFrame, slot_minutes: int = 30) -> pd.DataFrame:
     
     # 日付と時間の処理
     work_df["date"] = pd.to_datetime(work_df["ds"]).dt.date
+    # groupby(...).ngroup() は欠損キーに -1 を返し bincount が失敗するため、キー欠損行は除く
+    work_df = work_df.dropna(subset=["staff", "date"])
     
     # start_time列のチェック
     if "start_time" in work_df.columns:
@@ -117,27 +133,24 @@ def _features(long_df: pd.DataFrame, slot_minutes: int = 30) -> pd.DataFrame:
         work_df["start_hour"] = 9  # デフォルト値
     
     work_df["slots"] = work_df["parsed_slots_count"]
-    work_df["time_category"] = work_df["code"].apply(_get_time_category)
+    category = _time_category_codes(work_df["code"])
     
     # 日次データの生成
-    daily = (
-        work_df.groupby(["staff", "date"])
-        .agg({
-            "start_hour": "mean",
-            "slots": "sum",
-            "time_category": lambda x: x.mode().iloc[0] if not x.empty else "other"
-        })
-        .reset_index()
-    )
+    day_group = work_df.groupby(["staff", "date"], sort=True)
+    daily = day_group.agg(start_hour=("start_hour", "mean"), slots=("slots", "sum")).reset_index()
+    # 日ごとの最頻カテゴリ（同数なら TIME_CATEGORIES の先頭側）
+    day_idx = day_group.ngroup().to_numpy()
+    category_counts = np.bincount(
+        day_idx * len(TIME_CATEGORIES) + category, minlength=len(daily) * len(TIME_CATEGORIES)
+    ).reshape(len(daily), len(TIME_CATEGORIES))
+    daily_category = category_counts.argmax(axis=1) if len(daily) else np.zeros(0, dtype=np.int64)
+    daily["time_category"] = TIME_CATEGORIES[daily_category]
     
     # 基本メトリクス
-    basic = (
-        daily.groupby("staff")
-        .agg({
-            "date": "count",  # total_days
-            "time_category": lambda x: sum(1 for cat in x if cat == "night")  # night_days
-        })
-        .rename(columns={"date": "total_days", "time_category": "night_days"})
+    daily["is_night"] = daily_category == _NIGHT_CATEGORY
+    basic = daily.groupby("staff").agg(
+        total_days=("date", "count"),
+        night_days=("is_night", "sum"),
     )
     
     # ① 勤務開始時刻のばらつき
@@ -165,7 +178,9 @@ def _features(long_df: pd.DataFrame, slot_minutes: int = 30) -> pd.DataFrame:
     
     # ⑤ 連続勤務日数
     consec_metrics = _analyze_consecutive_days(work_df)
-    consec_df = pd.DataFrame(consec_metrics).set_index("staff")
+    consec_df = pd.DataFrame(
+        consec_metrics, columns=["staff", "consec3_ratio", "consec4_ratio", "consec5_ratio"]
+    ).set_index("staff")
     
     # ⑥ 夜勤比率（調整済み）
     basic["night_ratio"] = (basic["night_days"] / basic["total_days"].replace(0, pd.NA)).fillna(0)
@@ -184,7 +199,8 @@ def _features(long_df: pd.DataFrame, slot_minutes: int = 30) -> pd.DataFrame:
     return feats
 
 
-def train_fatigue(long_df: pd.DataFrame, out_dir: Path, weights: dict = None, slot_minutes: int = 30, use_pytorch: bool = None):
+def train_fatigue(long_df: pd.DataFrame, out_dir: Path, weights: dict = None, slot_minutes: int = 30, use_pytorch: bool = None,
+                  facility_id: str = None):
     """疲労分析を実行し、結果を保存
     
     Parameters
@@ -199,6 +215,8 @@ def train_fatigue(long_df: pd.DataFrame, out_dir: Path, weights: dict = None, sl
         時間スロット（分）
     use_pytorch : bool, optional
         PyTorchモデルを使用するか（None = 自動判定）
+    facility_id : str, optional
+        学習済みモデルを施設ごとに保存するためのキー（None = スタッフ集合から作成）
     """
     
     # PyTorchモデルの使用判定
@@ -207,27 +225,26 @@ def train_fatigue(long_df: pd.DataFrame, out_dir: Path, weights: dict = None, sl
     
     if use_pytorch and _HAS_PYTORCH:
         log.info("[fatigue] Using PyTorch LSTM model for advanced fatigue prediction")
-        return _train_fatigue_pytorch(long_df, out_dir)
+        return _train_fatigue_pytorch(long_df, out_dir, facility_id)
     else:
         log.info("[fatigue] Using statistical model for fatigue analysis")
         return _train_fatigue_statistical(long_df, out_dir, weights, slot_minutes)
 
 
-def _train_fatigue_pytorch(long_df: pd.DataFrame, out_dir: Path):
+def _train_fatigue_pytorch(long_df: pd.DataFrame, out_dir: Path, facility_id: str = None):
     """PyTorch LSTMモデルによる疲労分析"""
     
     # データ準備
     df = long_df.copy()
     df['date'] = pd.to_datetime(df['ds'])
     df['work_hours'] = df.get('work_hours', 8)  # デフォルト8時間
-    df['is_night_shift'] = df['code'].apply(lambda x: 1 if _get_time_category(x) == 'night' else 0)
+    df['is_night_shift'] = (_time_category_codes(df['code']) == _NIGHT_CATEGORY).astype(int)
     df['is_weekend'] = df['date'].dt.dayofweek.isin([5, 6]).astype(int)
     
-    # PyTorchモデル初期化と訓練
-    predictor = PyTorchFatiguePredictor(sequence_length=7)  # 7日間の履歴使用
-    
-    # モデル訓練
-    training_results = predictor.train_model(df, epochs=50, batch_size=16)
+    # 施設の学習済みモデルを再利用し、無い・古い・データがずれた場合だけ訓練して保存（7日間の履歴使用）
+    predictor, training_results = load_or_train_predictor(
+        df, facility_id=facility_id, sequence_length=7, epochs=50, batch_size=16
+    )
     
     # 予測実行
     predicted_df = predictor.predict_fatigue(df)
@@ -292,10 +309,26 @@ def _normalize_robust(series: pd.Series, use_iqr_clipping: bool = True) -> pd.Se
     return pd.Series(0, index=series.index)
 
 
-def _train_fatigue_statistical(long_df: pd.DataFrame, out_dir: Path, weights: dict = None, slot_minutes: int = 30):
-    """従来の統計的疲労分析（後方互換性）"""
-    
-    X = _features(long_df, slot_minutes)
+FATIGUE_OUTPUT_COLUMNS = [
+    "fatigue_score", "work_start_variance", "work_diversity",
+    "work_duration_variance", "short_rest_frequency",
+    "consecutive_work_days", "night_shift_ratio"
+]
+
+# 勤務頻度による調整係数（月間標準勤務日数 20 日で 1.0 となる区分線形）
+_FREQUENCY_FACTOR_DAYS = np.array([0, 3, 5, 10, 15, 20], dtype=float)
+_FREQUENCY_FACTOR_VALUES = np.array([0.05, 0.2, 0.35, 0.65, 0.85, 1.0])
+
+
+def score_fatigue(X: pd.DataFrame, weights: dict = None, *, warn_extreme: bool = True) -> pd.DataFrame:
+    """``_features`` の特徴量から疲労スコアを計算する（全スタッフを一括処理）
+
+    Returns
+    -------
+    pd.DataFrame
+        ``FATIGUE_OUTPUT_COLUMNS`` の列を持つスタッフ別スコア。
+    """
+    X = X.copy()
     
     # デフォルト重み（夜勤の重みを強化）
     weights_default = {
@@ -349,58 +382,27 @@ def _train_fatigue_statistical(long_df: pd.DataFrame, out_dir: Path, weights: di
     if total_w > 0:
         X["fatigue_score"] = X["fatigue_score"] / total_w * 100
     
-    # 勤務頻度による調整（月間想定勤務日数を20日として計算）
-    # total_daysは_features()から取得済み
-    expected_monthly_days = 20  # 月間標準勤務日数
-    
-    # 頻度調整係数を計算（シグモイド関数で滑らかな調整）
-    # - 連続的な減衰で不連続性を回避
-    # - 極端に少ない勤務（3日未満）のみ強く減衰
-    import numpy as np
-    
-    def smooth_frequency_factor(days):
-        """滑らかな頻度調整係数を計算（最終調整版）"""
-        if days >= expected_monthly_days:
-            return 1.0
-        elif days >= 15:
-            # 15-19日: ほぼ正社員レベル（0.85-1.0）
-            return 0.85 + 0.15 * (days - 15) / 5
-        elif days >= 10:
-            # 10-14日: 中間層（0.65-0.85）
-            return 0.65 + 0.20 * (days - 10) / 5
-        elif days >= 5:
-            # 5-9日: パートレベル（0.35-0.65）
-            return 0.35 + 0.30 * (days - 5) / 5
-        elif days >= 3:
-            # 3-4日: 低頻度（0.2-0.35）
-            return 0.2 + 0.15 * (days - 3) / 2
-        else:
-            # 3日未満: 超低頻度（0.05-0.2）
-            return 0.05 + 0.15 * days / 3
-    
-    frequency_factor = X["total_days"].apply(smooth_frequency_factor)
+    # 勤務頻度による調整（区分線形で滑らかに減衰、3日未満のみ強く減衰）
+    total_days = X["total_days"].to_numpy(dtype=float)
+    frequency_factor = pd.Series(
+        np.interp(total_days, _FREQUENCY_FACTOR_DAYS, _FREQUENCY_FACTOR_VALUES), index=X.index
+    )
     
     # 頻度調整を適用
     X["fatigue_score_raw"] = X["fatigue_score"]  # 調整前の値を保存
-    X["fatigue_score"] = X["fatigue_score"] * frequency_factor
+    score = X["fatigue_score"].to_numpy(dtype=float) * frequency_factor.to_numpy()
     
     # 最小スコア保証（正社員レベルの勤務者）
-    for idx in X.index:
-        total_days = X.loc[idx, "total_days"]
-        # night_ratio_adjが正しい列名（0-1に正規化済み）
-        night_ratio = X.loc[idx, "night_ratio_adj"] if "night_ratio_adj" in X.columns else 0
-        
-        # 18日以上勤務かつ夜勤がある場合、最小30点を保証（閾値を緩和）
-        if total_days >= 18 and night_ratio >= 0.15:
-            X.loc[idx, "fatigue_score"] = max(X.loc[idx, "fatigue_score"], 30)
-        
-        # 23日以上勤務かつ夜勤率40%以上の場合、最小70点を保証（閾値を緩和）
-        if total_days >= 23 and night_ratio >= 0.4:
-            X.loc[idx, "fatigue_score"] = max(X.loc[idx, "fatigue_score"], 70)
-        
-        # 25日以上勤務の場合、夜勤率に関わらず最小60点を保証
-        if total_days >= 25:
-            X.loc[idx, "fatigue_score"] = max(X.loc[idx, "fatigue_score"], 60)
+    night_ratio = (
+        X["night_ratio_adj"].to_numpy(dtype=float) if "night_ratio_adj" in X.columns else np.zeros(len(X))
+    )
+    # 18日以上勤務かつ夜勤がある場合、最小30点を保証（閾値を緩和）
+    score = np.where((total_days >= 18) & (night_ratio >= 0.15), np.maximum(score, 30), score)
+    # 23日以上勤務かつ夜勤率40%以上の場合、最小70点を保証（閾値を緩和）
+    score = np.where((total_days >= 23) & (night_ratio >= 0.4), np.maximum(score, 70), score)
+    # 25日以上勤務の場合、夜勤率に関わらず最小60点を保証
+    score = np.where(total_days >= 25, np.maximum(score, 60), score)
+    X["fatigue_score"] = score
     
     # 100点を超える場合は警告フラグを立てる（クリップはしない）
     X["is_extreme_fatigue"] = X["fatigue_score"] > 100
@@ -415,8 +417,8 @@ def _train_fatigue_statistical(long_df: pd.DataFrame, out_dir: Path, weights: di
     X["fatigue_score_display"] = X["fatigue_score"].round(2)
     
     # 互換性のため、fatigue_scoreは100でクリップ（警告付き）
-    if (X["fatigue_score"] > 100).any():
-        extreme_staff = X[X["fatigue_score"] > 100].index.tolist()
+    if warn_extreme and X["is_extreme_fatigue"].any():
+        extreme_staff = X[X["is_extreme_fatigue"]].index.tolist()
         log.warning(f"⚠️ 疲労度が100を超えるスタッフ: {extreme_staff}")
         log.warning(f"  実際の値: {X.loc[extreme_staff, 'fatigue_score_display'].to_dict()}")
     
@@ -426,26 +428,78 @@ def _train_fatigue_statistical(long_df: pd.DataFrame, out_dir: Path, weights: di
     X["frequency_factor"] = frequency_factor.round(3)
     
     # ダッシュボード用の列名に変換
-    output_df = X.copy()
-    output_df.rename(columns={
+    output_df = X.rename(columns={
         "start_std": "work_start_variance",
         "code_diversity": "work_diversity", 
         "worktime_std": "work_duration_variance",
         "rest_penalty": "short_rest_frequency",
         "night_ratio_adj": "night_shift_ratio"
-    }, inplace=True)
+    })
     
     # 連続勤務の合成スコア
     output_df["consecutive_work_days"] = consec_score
     
-    # 必要な列のみを保存
-    cols_to_save = [
-        "fatigue_score", "work_start_variance", "work_diversity",
-        "work_duration_variance", "short_rest_frequency", 
-        "consecutive_work_days", "night_shift_ratio"
+    # 必要な列のみを返す
+    available_cols = [col for col in FATIGUE_OUTPUT_COLUMNS if col in output_df.columns]
+    return output_df[available_cols]
+
+
+def score_fatigue_batch(
+    rosters: dict[str, pd.DataFrame] | list[pd.DataFrame],
+    weights: dict = None,
+    slot_minutes: int = 30,
+) -> pd.DataFrame:
+    """複数ロスター（what-if シナリオ等）の疲労スコアを一括計算する
+
+    全ロスターを 1 つの long_df に連結して特徴量を 1 回で計算し、
+    正規化はロスターごとに行う。
+
+    Parameters
+    ----------
+    rosters : dict[str, pd.DataFrame] | list[pd.DataFrame]
+        シナリオ名 → long_df（list の場合は連番をシナリオ名とする）
+
+    Returns
+    -------
+    pd.DataFrame
+        index = (scenario, staff) の MultiIndex、列は ``score_fatigue`` と同じ。
+    """
+    if not isinstance(rosters, dict):
+        rosters = {str(i): df for i, df in enumerate(rosters)}
+    rosters = {name: df for name, df in rosters.items() if df is not None and not df.empty}
+    if not rosters:
+        return pd.DataFrame(
+            columns=FATIGUE_OUTPUT_COLUMNS,
+            index=pd.MultiIndex.from_arrays([[], []], names=["scenario", "staff"]),
+        )
+    
+    combined = pd.concat(rosters, names=["scenario", None]).reset_index(level=0)
+    groupby_col = "name" if "name" in combined.columns else "staff"
+    combined = combined.rename(columns={groupby_col: "_orig_staff"})
+    # シナリオ × スタッフを 1 つのキーにして特徴量を一括計算
+    combined["staff"] = pd.MultiIndex.from_arrays(
+        [combined["scenario"], combined["_orig_staff"]]
+    ).to_flat_index()
+    
+    X = _features(combined, slot_minutes)
+    X.index = pd.MultiIndex.from_tuples(X.index, names=["scenario", "staff"])
+    
+    scored = [
+        score_fatigue(group.droplevel("scenario"), weights, warn_extreme=False)
+        .assign(scenario=name)
+        .set_index("scenario", append=True)
+        .reorder_levels(["scenario", "staff"])
+        for name, group in X.groupby(level="scenario", sort=False)
     ]
-    available_cols = [col for col in cols_to_save if col in output_df.columns]
-    final_df = output_df[available_cols]
+    return pd.concat(scored)
+
+
+def _train_fatigue_statistical(long_df: pd.DataFrame, out_dir: Path, weights: dict = None, slot_minutes: int = 30):
+    """従来の統計的疲労分析（後方互換性）"""
+    
+    X = _features(long_df, slot_minutes)
+    final_df = score_fatigue(X, weights)
+    available_cols = list(final_df.columns)
     
     # 両形式で保存（互換性確保）
     save_df_xlsx(final_df, out_dir / "fatigue_score.xlsx", "fatigue", index=True)
@@ -453,4 +507,4 @@ def _train_fatigue_statistical(long_df: pd.DataFrame, out_dir: Path, weights: di
     save_df_parquet(final_df, result_path, index=True)
     
     log.info(f"fatigue: comprehensive analysis completed, saved {len(available_cols)} features for {len(final_df)} staff")
-    return result_path
\ No newline at end of file
+    return result_path
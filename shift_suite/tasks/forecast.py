@@ -10,6 +10,9 @@ shift_suite.tasks.forecast  v1.5.0 – 休暇・履歴対応
   6. forecast_need() 実行履歴を ``forecast_history.csv`` に追記
   7. 直近の履歴 MAPE が閾値を超える場合はモデル選択と
      seasonal パラメータを自動調整
+■ v1.5.1
+  - heat_ALL.parquet に保存された日付軸メタデータがあれば列ラベルの
+    年推定をせずにそのまま使う。年推定のパース結果はメモ化
 """
 
 from __future__ import annotations
@@ -18,6 +21,7 @@ import datetime as dt
 import logging
 import re
 import warnings
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Dict, Optional, Sequence
 
@@ -27,7 +31,7 @@ import statsmodels.api as sm
 
 from shift_suite.config import get as get_config
 
-from .utils import log, save_df_parquet, write_meta
+from .utils import log, read_date_axis, save_df_parquet, write_meta
 
 # ────────────────── pmdarima (optional) ──────────────────
 try:
@@ -60,6 +64,7 @@ def _excel_serial_to_date(num: int | float) -> Optional[dt.date]:
         return None
 
 
+@lru_cache(maxsize=4096)
 def _parse_date_label(label: Any, base_year: int) -> Optional[dt.date]:
     """列ラベルを date に解釈（年は補完）"""
     s = str(label).strip()
@@ -92,16 +97,27 @@ def _parse_date_label(label: Any, base_year: int) -> Optional[dt.date]:
 
 
 def _extract_date_columns(
-    df: pd.DataFrame, *, today: dt.date | None = None
+    df: pd.DataFrame,
+    *,
+    today: dt.date | None = None,
+    date_axis: Dict[str, dt.date] | None = None,
 ) -> Dict[dt.date, str]:
-    """heat_ALL.xlsx の列ラベル → {date: column_name}"""
+    """heat_ALL.xlsx の列ラベル → {date: column_name}
+
+    ``date_axis`` (parquet に保存された 列ラベル → 日付) にある列は年推定しない。
+    """
     today = today or dt.date.today()
     year_guess = today.year
+    date_axis = date_axis or {}
     date_map: Dict[dt.date, str] = {}
 
     for col in df.columns:
         if str(col).lower() in _SUMMARY_COLS:
             continue
+        known = date_axis.get(str(col))
+        if known is not None:
+            date_map[known] = col
+            continue
         for y in (year_guess, year_guess - 1, year_guess + 1):
             d = _parse_date_label(col, y)
             if d:
@@ -141,12 +157,17 @@ def build_demand_series(
     """
     log.info("[forecast] build_demand_series start")
     # heat_xlsx が .xlsx で終わる場合と .parquet で終わる場合の両方に対応
+    date_axis: Dict[str, dt.date] = {}
     if str(heat_xlsx).endswith(".xlsx"):
         heat = pd.read_excel(heat_xlsx, index_col=0)
     else:
         heat = pd.read_parquet(heat_xlsx)
+        try:
+            date_axis = read_date_axis(heat_xlsx)
+        except Exception as e:  # noqa: BLE001
+            log.debug(f"[forecast] date axis metadata unavailable: {e}")
 
-    date_map = _extract_date_columns(heat)
+    date_map = _extract_date_columns(heat, date_axis=date_axis)
     if not date_map:
         msg = "有効な日付列が 1 つも見つかりません"
         if raise_on_empty:
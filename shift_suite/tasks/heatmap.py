@@ -1,8 +1,17 @@
 # shift_suite / tasks / heatmap.py
 # v1.8.1 (日曜日Need計算修正版)
+# v1.9.0 build_heatmap(return_result=True) で HeatmapResult を返し、
+#        shortage_and_brief が Excel を再読込せずに済むようにした
+# v1.9.1 heat / need parquet は save_df_parquet で日付軸メタデータ付きで保存
+# v1.10.0 heat_*.parquet ごとに多段解像度ピラミッド (pyramid_*.parquet) を作成
+# v1.10.1 calculate_pattern_based_need の統計量をスロット単位のループから
+#         slot_need_stats.SortedSamples による一括計算に置き換え
+# v1.10.2 月次統合パターンを need_baseline_engine による (月, 曜日) 単位の
+#         一括集計に置き換え (月ごと・曜日ごと・時間帯ごとの列探索を廃止)
 from __future__ import annotations
 
 import datetime as dt
+from dataclasses import dataclass, field
 from datetime import time
 from pathlib import Path
 from typing import List, Set
@@ -16,15 +25,19 @@ from openpyxl.styles import PatternFill
 from openpyxl.utils import get_column_letter
 
 from .constants import SUMMARY5, DEFAULT_SLOT_MINUTES
+from .need_baseline_engine import DateSlotMatrix, grouped_slot_stats
+from .slot_need_stats import SortedSamples, stat_quantile
 from shift_suite.i18n import translate as _
 
 # 'log' という名前でロガーを取得 (utils.pyからインポートされるlogと同じ)
 from .utils import (
     _parse_as_date,
+    date_columns,
     derive_max_staff,
     gen_labels,
     log,
     safe_sheet,
+    save_df_parquet,
     save_df_xlsx,
     write_meta,
     validate_need_calculation,
@@ -33,6 +46,43 @@ from .utils import (
 analysis_logger = logging.getLogger('analysis')
 
 
+@dataclass
+class HeatmapFrame:
+    """職種別 / 雇用形態別ヒートマップ 1 枚分 (heat_<name>.xlsx と同じ内容)"""
+
+    name: str
+    heat: pd.DataFrame  # 日付列 + SUMMARY5 (need / upper / staff / lack / excess)
+    need: pd.DataFrame  # need_per_date_slot_*.parquet と同じ日付 × スロットの Need
+
+    @property
+    def staff(self) -> pd.DataFrame:
+        return self.heat.drop(columns=SUMMARY5, errors="ignore")
+
+    @property
+    def upper(self) -> pd.Series:
+        return self.heat["upper"]
+
+
+@dataclass
+class HeatmapResult:
+    """
+    build_heatmap の出力をメモリ上で受け渡すための構造体。
+
+    ディスク上のファイル (heat_*.xlsx / *.parquet / heatmap.meta.json) は
+    従来どおり書き出され、同一プロセス内の後続処理はこちらを参照する。
+    roles / employments のキーはファイル名に使われる safe_sheet 済みの名前。
+    """
+
+    out_dir: Path
+    slot_minutes: int
+    heat_all: pd.DataFrame
+    need_per_date_slot: pd.DataFrame
+    roles: dict[str, HeatmapFrame] = field(default_factory=dict)
+    employments: dict[str, HeatmapFrame] = field(default_factory=dict)
+    estimated_holidays: set[dt.date] = field(default_factory=set)
+    dow_need_pattern: pd.DataFrame = field(default_factory=pd.DataFrame)
+
+
 def apply_business_hours_constraint(need_df: pd.DataFrame, business_start: time = time(8, 0), business_end: time = time(17, 30)) -> pd.DataFrame:
     """
     営業時間制約を適用（現実性確保）
@@ -105,68 +155,42 @@ def calculate_integrated_monthly_pattern_need(
     期間に関係なく一貫した結果を保証する数学的解決策
     """
     log.info(f"[INTEGRATED_PATTERN] 月次統合パターン方式開始: {ref_start_date} - {ref_end_date}")
-    
-    # 期間を月別に分割
-    monthly_data = {}
-    current_date = ref_start_date
-    
-    while current_date <= ref_end_date:
-        month_key = current_date.strftime('%Y-%m')
-        if month_key not in monthly_data:
-            monthly_data[month_key] = {
-                'dates': [],
-                'start_date': current_date,
-                'end_date': current_date
-            }
-        
-        monthly_data[month_key]['dates'].append(current_date)
-        monthly_data[month_key]['end_date'] = current_date
-        current_date += dt.timedelta(days=1)
-    
-    log.info(f"[INTEGRATED_PATTERN] 検出月数: {len(monthly_data)}")
-    
-    # Step 1: 各月の基準パターンを作成
-    monthly_patterns = []
-    
-    for month_key, month_info in monthly_data.items():
-        log.info(f"[INTEGRATED_PATTERN] === {month_key} パターン作成 ===")
-        
-        # 該当月のデータ抽出
-        month_columns = []
-        for date_obj in month_info['dates']:
-            for col in actual_staff_by_slot_and_date.columns:
-                if isinstance(col, dt.date) and col == date_obj:
-                    month_columns.append(col)
-                elif isinstance(col, str):
-                    try:
-                        col_date = pd.to_datetime(col).date()
-                        if col_date == date_obj:
-                            month_columns.append(col)
-                    except:
-                        continue
-        
-        if not month_columns:
-            log.warning(f"[INTEGRATED_PATTERN] {month_key}: データなし、スキップ")
-            continue
-        
-        # 月次パターン作成（統計処理最小限）
-        month_pattern = create_monthly_dow_pattern(
-            actual_staff_by_slot_and_date[month_columns],
-            month_info['dates'],
-            slot_minutes_for_empty,
-            holidays or set(),
-            include_zero_days
-        )
-        
-        if not month_pattern.empty:
-            monthly_patterns.append(month_pattern)
-            log.info(f"[INTEGRATED_PATTERN] {month_key}: パターン作成完了")
-        else:
-            log.warning(f"[INTEGRATED_PATTERN] {month_key}: パターン作成失敗")
-    
+
+    holidays = set(holidays or ())
+    time_index_labels = pd.Index(gen_labels(slot_minutes_for_empty), name="time")
+    n_calendar_months = (
+        (ref_end_date.year - ref_start_date.year) * 12 + ref_end_date.month - ref_start_date.month + 1
+    )
+    log.info(f"[INTEGRATED_PATTERN] 検出月数: {max(n_calendar_months, 0)}")
+
+    # 期間内に列のある月 (祝日のみの月も全 0 パターンとして統合対象に含める)
+    data_months = sorted(
+        {
+            (d.year, d.month)
+            for d in date_columns(actual_staff_by_slot_and_date.columns).values()
+            if ref_start_date <= d <= ref_end_date
+        }
+    )
+
+    # Step 1: 全月の (月, 曜日) × 時間帯パターンを一括作成
+    matrix = DateSlotMatrix.from_frame(
+        actual_staff_by_slot_and_date,
+        slots=time_index_labels,
+        holidays=holidays,
+        start=ref_start_date,
+        end=ref_end_date,
+    )
+    month_pos = {key: i for i, key in enumerate(data_months)}
+    month_idx = np.array([month_pos[(d.year, d.month)] for d in matrix.dates], dtype=np.int64)
+    patterns = _dow_patterns(matrix, month_idx * 7 + matrix.weekdays, len(data_months))
+    monthly_patterns = [
+        pd.DataFrame(patterns[i], index=time_index_labels, columns=range(7)) for i in range(len(data_months))
+    ]
+    for year, month in data_months:
+        log.info(f"[INTEGRATED_PATTERN] {year:04d}-{month:02d}: パターン作成完了")
+
     if not monthly_patterns:
         log.error("[INTEGRATED_PATTERN] 有効な月次パターンなし")
-        time_index_labels = pd.Index(gen_labels(slot_minutes_for_empty), name="time")
         return pd.DataFrame(0, index=time_index_labels, columns=range(7))
     
     log.info(f"[INTEGRATED_PATTERN] 有効月次パターン数: {len(monthly_patterns)}")
@@ -206,57 +230,28 @@ def create_monthly_dow_pattern(
     統計処理を最小限に抑制
     """
     time_index_labels = pd.Index(gen_labels(slot_minutes), name="time")
-    pattern = pd.DataFrame(0.0, index=time_index_labels, columns=range(7))
-    
-    # 各曜日×時間帯の代表値を計算
-    for dow in range(7):  # 0=月曜 ～ 6=日曜
-        # 該当曜日の日付を抽出
-        dow_dates = [d for d in month_dates if d.weekday() == dow and d not in holidays]
-        
-        if not dow_dates:
-            log.info(f"[PATTERN_CREATE] 曜日{dow}: 該当日なし")
-            continue
-        
-        # 該当曜日のデータ列を抽出
-        dow_columns = []
-        for col in month_data.columns:
-            if isinstance(col, dt.date) and col.weekday() == dow and col not in holidays:
-                dow_columns.append(col)
-            elif isinstance(col, str):
-                try:
-                    col_date = pd.to_datetime(col).date()
-                    if col_date.weekday() == dow and col_date not in holidays:
-                        dow_columns.append(col)
-                except:
-                    continue
-        
-        if not dow_columns:
-            continue
-        
-        dow_data = month_data[dow_columns]
-        
-        # 各時間帯の代表値を計算
-        for time_slot in time_index_labels:
-            if time_slot not in dow_data.index:
-                continue
-            
-            values = dow_data.loc[time_slot].values
-            values = [float(v) for v in values if not pd.isna(v)]
-            
-            if not values:
-                representative_value = 0.0
-            elif len(values) == 1:
-                representative_value = values[0]
-            elif len(values) <= 3:
-                # 少数データ: 平均値使用
-                representative_value = np.mean(values)
-            else:
-                # 十分なデータ: 中央値使用（外れ値に頑健）
-                representative_value = np.median(values)
-            
-            pattern.loc[time_slot, dow] = max(0, representative_value)
-    
-    return pattern
+    matrix = DateSlotMatrix.from_frame(month_data, slots=time_index_labels, holidays=holidays)
+    for dow in sorted({d.weekday() for d in month_dates if d not in holidays} - set(matrix.weekdays.tolist())):
+        log.info(f"[PATTERN_CREATE] 曜日{dow}: 該当日なし")
+    pattern = _dow_patterns(matrix, matrix.weekdays, 1)[0]
+    return pd.DataFrame(pattern, index=time_index_labels, columns=range(7))
+
+
+def _dow_patterns(matrix: DateSlotMatrix, group_ids: np.ndarray, n_blocks: int) -> np.ndarray:
+    """
+    ``group_ids`` = ブロック番号 × 7 + 曜日 ごとの代表値 (ブロック × 時間帯 × 曜日)。
+    標本 1 件はその値、3 件以下は平均、それ以上は中央値 (外れ値に頑健)。
+    該当日の無い曜日・欠損のみの時間帯は 0。
+    """
+    out = np.zeros((n_blocks * 7, len(matrix.slots)))
+    keys, values = grouped_slot_stats(matrix, group_ids, 0.5, mean_below=3)
+    if len(keys):
+        out[keys] = np.nan_to_num(values, nan=0.0)
+    return np.maximum(out, 0.0).reshape(n_blocks, 7, -1).transpose(0, 2, 1)
+
+
+# 月次パターン統合で使う分位点 (それ以外の手法は平均値)
+_INTEGRATION_QUANTILES = {"中央値": 0.50, "25パーセンタイル": 0.25, "75パーセンタイル": 0.75}
 
 
 def create_integrated_pattern(monthly_patterns: list[pd.DataFrame], statistic_method: str) -> pd.DataFrame:
@@ -270,10 +265,7 @@ def create_integrated_pattern(monthly_patterns: list[pd.DataFrame], statistic_me
     if not monthly_patterns:
         raise ValueError("月次パターンが空です")
     
-    # 統合パターンの初期化
-    base_pattern = monthly_patterns[0].copy()
-    integrated = base_pattern.copy()
-    integrated.iloc[:, :] = 0.0
+    base_pattern = monthly_patterns[0]
     
     log.info(f"[PATTERN_INTEGRATION] 統合対象パターン数: {len(monthly_patterns)} (固定)")
     
@@ -282,36 +274,26 @@ def create_integrated_pattern(monthly_patterns: list[pd.DataFrame], statistic_me
     realistic_max_staff = np.median(max_values_per_month) if max_values_per_month else 10
     log.info(f"[PATTERN_INTEGRATION] 現実的最大スタッフ数基準: {realistic_max_staff}")
     
-    # 各セル（時間帯×曜日）ごとに統計処理
-    for time_slot in base_pattern.index:
-        for dow in base_pattern.columns:
-            # 各月からの値を収集
-            values = []
-            for pattern in monthly_patterns:
-                if time_slot in pattern.index and dow in pattern.columns:
-                    value = pattern.loc[time_slot, dow]
-                    if not pd.isna(value):
-                        values.append(float(value))
-            
-            if not values:
-                integrated_value = 0.0
-            elif len(values) == 1:
-                integrated_value = values[0]
-            else:
-                # 統計手法適用（サンプル数固定）
-                if statistic_method == "中央値":
-                    raw_value = np.median(values)
-                elif statistic_method == "25パーセンタイル":
-                    raw_value = np.percentile(values, 25)
-                elif statistic_method == "75パーセンタイル":
-                    raw_value = np.percentile(values, 75)
-                else:  # 平均値（デフォルト）
-                    raw_value = np.mean(values)
-                
-                # 🔧 重要修正: 現実的範囲への制限
-                integrated_value = min(raw_value, realistic_max_staff * 1.2)  # 20%マージン
-            
-            integrated.loc[time_slot, dow] = max(0, round(integrated_value))
+    # 各セル（時間帯×曜日）の月間統計を (月 × セル) 配列の 1 回のソートで求める
+    stacked = np.stack(
+        [
+            pattern.reindex(index=base_pattern.index, columns=base_pattern.columns).to_numpy(dtype=float)
+            for pattern in monthly_patterns
+        ]
+    )
+    samples = SortedSamples(stacked.reshape(len(monthly_patterns), -1))
+    # 統計手法適用（サンプル数固定）。未知の手法は平均値
+    raw_value = samples.stat(_INTEGRATION_QUANTILES.get(statistic_method))
+    # 🔧 重要修正: 現実的範囲への制限（20%マージン）。1 か月分のみのセルはそのまま
+    integrated_value = np.where(
+        samples.count == 1, samples.quantile(0.0), np.minimum(raw_value, realistic_max_staff * 1.2)
+    )
+    integrated_value = np.where(samples.count == 0, 0.0, integrated_value)
+    integrated = pd.DataFrame(
+        np.maximum(0, np.round(integrated_value)).reshape(stacked.shape[1:]),
+        index=base_pattern.index,
+        columns=base_pattern.columns,
+    )
     
     log.info(f"[PATTERN_INTEGRATION] 統合完了 (手法: {statistic_method})")
     
@@ -712,106 +694,43 @@ def calculate_pattern_based_need(
         else:
             current_statistic_method = statistic_method
 
-        for time_slot_val, row_series_data in data_for_dow_calc.iterrows():
-            if include_zero_days:
-                values_at_slot_current = [0.0 if pd.isna(v) else float(v) for v in row_series_data]
-            else:
-                values_at_slot_current = row_series_data.dropna().astype(float).tolist()
-            analysis_logger.info(
-                f"[DEBUG_NEED_DETAIL] 処理中の時間帯: {time_slot_val} ({dow_name}), 元データ ({len(values_at_slot_current)}点): {values_at_slot_current}"
+        # (日付 × スロット) を 1 回ソートし、全スロットの統計量をまとめて求める
+        values = data_for_dow_calc.to_numpy(dtype=float).T
+        if include_zero_days:
+            values = np.nan_to_num(values, nan=0.0)
+        samples = SortedSamples(values)
+        n_values = samples.n_valid
+        median_all = samples.median()
+        max_all = np.nan_to_num(samples.max(), nan=0.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            zero_ratio = np.where(
+                n_values > 0, np.count_nonzero(values == 0, axis=0) / np.maximum(n_values, 1), 1.0
             )
+        if remove_outliers:
+            samples.restrict_iqr(iqr_multiplier, min_samples=4)
+        need_values = samples.stat(stat_quantile(current_statistic_method))
 
-            if not values_at_slot_current:
-                dow_need_df_calculated.loc[time_slot_val, day_of_week_idx] = 0
-                continue
-            values_for_stat_calc = values_at_slot_current
-            if day_of_week_idx == 6 and time_slot_val in ["09:00", "12:00", "15:00"]:
-                log.info(f"[SUNDAY_DETAIL] {time_slot_val} 時間帯:")
-                log.info(f"[SUNDAY_DETAIL]   元データ: {values_at_slot_current}")
-            # 統計値の計算前にデバッグ情報を出力
-            if day_of_week_idx == 6 or (day_of_week_idx == 1 and time_slot_val == "09:00"):
-                log.info(f"\n  [統計計算デバッグ] {dow_name} {time_slot_val}")
-                log.info(f"    元データ: {values_at_slot_current}")
-                log.info(f"    データ数: {len(values_at_slot_current)}")
-
-            if remove_outliers and len(values_at_slot_current) >= 4:
-                q1_val = np.percentile(values_at_slot_current, 25)
-                q3_val = np.percentile(values_at_slot_current, 75)
-                iqr_val = q3_val - q1_val
-                lower_bound_val = q1_val - iqr_multiplier * iqr_val
-                upper_bound_val = q3_val + iqr_multiplier * iqr_val
-                values_filtered_outlier = [
-                    x_val
-                    for x_val in values_at_slot_current
-                    if lower_bound_val <= x_val <= upper_bound_val
-                ]
-                # デバッグ: 外れ値除去の詳細
-                if day_of_week_idx == 6 and time_slot_val in ["09:00", "12:00", "15:00"]:
-                    log.info(f"[SUNDAY_DETAIL]   外れ値除去後: {values_filtered_outlier}")
-
-                analysis_logger.info(
-                    f"[DEBUG_NEED_DETAIL] 外れ値除去実行前 (Q1:{q1_val:.1f}, Q3:{q3_val:.1f}, IQR:{iqr_val:.1f}), フィルタリング後 ({len(values_filtered_outlier)}点): {values_filtered_outlier}"
-                )
-
-                if not values_filtered_outlier:
-                    log.debug(
-                        f"  曜日 {day_of_week_idx}, 時間帯 {time_slot_val}: 外れ値除去後データなし。元のリストで計算します。"
-                    )
-                else:
-                    values_for_stat_calc = values_filtered_outlier
-            need_calculated_val = 0.0
-            if values_for_stat_calc:
-                # 決定された統計手法に基づいて計算
-                if current_statistic_method == "10パーセンタイル":
-                    need_calculated_val = np.percentile(values_for_stat_calc, 10)
-                elif current_statistic_method == "25パーセンタイル":
-                    need_calculated_val = np.percentile(values_for_stat_calc, 25)
-                elif current_statistic_method == "中央値":
-                    need_calculated_val = np.median(values_for_stat_calc)
-                elif current_statistic_method == "75パーセンタイル":
-                    need_calculated_val = np.percentile(values_for_stat_calc, 75)
-                elif current_statistic_method == "90パーセンタイル":
-                    need_calculated_val = np.percentile(values_for_stat_calc, 90)
-                else:  # 平均値
-                    need_calculated_val = np.mean(values_for_stat_calc)
-            analysis_logger.info(
-                f"[DEBUG_NEED_DETAIL] 統計手法({current_statistic_method})適用後のNeed仮値: {need_calculated_val:.2f}"
-            )
+        # データの中央値が小さい場合はNeedを上限2.0に制限
+        capped = (n_values > 0) & (median_all < 2.0)
+        need_values = np.where(capped, np.minimum(need_values, 2.0), need_values)
 
-            # データの中央値が小さい場合はNeedを上限2.0に制限
-            if values_at_slot_current and np.median(values_at_slot_current) < 2.0:
-                need_calculated_val = min(need_calculated_val, 2.0)
-                analysis_logger.info(
-                    f"  [NEED_CAP] 曜日 {day_of_week_idx}, 時間帯 {time_slot_val}: "
-                    f"実績中央値が2未満のためNeedを {need_calculated_val:.1f} に制限しました。"
-                )
-                analysis_logger.info(
-                    f"[DEBUG_NEED_DETAIL] Need上限適用判定: 元データ中央値={np.median(values_at_slot_current):.1f}。制限後Need={need_calculated_val:.2f}"
-                )
+        # 調整係数の適用
+        need_values = need_values * adjustment_factor
 
-            # 調整係数の適用
-            need_calculated_val *= adjustment_factor
-            
-            # 実データが少ない場合の特殊処理
-            if is_significant_holiday:
-                # データが少ない場合は、実際の最大値を上限として設定
-                max_actual_val = max(values_at_slot_current) if values_at_slot_current else 0
-                if need_calculated_val > max_actual_val * 1.5:  # 実際の最大値の1.5倍を上限
-                    original_need = need_calculated_val
-                    need_calculated_val = max_actual_val * 1.5
-                    log.info(f"[STATS_FIX] {dow_name} {time_slot_val}: Need値を {original_need:.2f} → {need_calculated_val:.2f} に制限（実データ考慮）")
-                
-                # さらに、0が多いデータでは0により近い値に調整
-                zero_ratio = values_at_slot_current.count(0) / len(values_at_slot_current) if values_at_slot_current else 1
-                if zero_ratio > 0.5:  # 50%以上が0の場合
-                    need_calculated_val *= (1 - zero_ratio * 0.5)  # 0の比率に応じて減算
-                    log.info(f"[STATS_FIX] {dow_name} {time_slot_val}: 0データ比率{zero_ratio:.2f}により調整 → {need_calculated_val:.2f}")
-            
-            final_need = round(need_calculated_val) if not pd.isna(need_calculated_val) else 0
-            dow_need_df_calculated.loc[time_slot_val, day_of_week_idx] = final_need
-            log.debug(
-                f"  曜日 {day_of_week_idx}, 時間帯 {time_slot_val}: 元データ長 {len(row_series_data.dropna())} -> 外れ値除去後 {len(values_for_stat_calc)} -> Need {dow_need_df_calculated.loc[time_slot_val, day_of_week_idx]}"
-            )
+        # 実データが少ない場合の特殊処理
+        if is_significant_holiday:
+            # データが少ない場合は、実際の最大値の1.5倍を上限として設定
+            need_values = np.where(need_values > max_all * 1.5, max_all * 1.5, need_values)
+            # さらに、0が多いデータ (50%以上が0) では0の比率に応じて減算
+            need_values = np.where(zero_ratio > 0.5, need_values * (1 - zero_ratio * 0.5), need_values)
+
+        final_need = np.round(np.nan_to_num(need_values, nan=0.0))
+        dow_need_df_calculated[day_of_week_idx] = final_need
+        analysis_logger.info(
+            f"[DEBUG_NEED_DETAIL] {dow_name}: 手法={current_statistic_method}, "
+            f"上限2.0適用={int(capped.sum())}スロット, 外れ値除去={'有' if remove_outliers else '無'}, "
+            f"Need合計={final_need.sum():.0f}"
+        )
 
     # 全曜日の計算完了後、サマリーを出力
     log.info("[NEED_DEBUG] ========== Need計算完了サマリー ==========")
@@ -885,8 +804,18 @@ def build_heatmap(
     min_method: str = "p25",
     max_method: str = "p75",
     holidays: set[dt.date] | None = None,
-) -> None:
+    return_result: bool = False,
+) -> HeatmapResult | None:
+    """
+    勤務実績からヒートマップと日付 × スロットの Need を生成して ``out_dir`` に保存する。
+
+    ``return_result=True`` の場合、書き出した内容を :class:`HeatmapResult`
+    としても返す (``shortage_and_brief(heatmap_result=...)`` に渡せば
+    ヒートマップの再読込が不要になる)。入力が空などで生成しなかった場合は None。
+    """
     holidays_set = set(holidays or [])
+    role_frames: dict[str, HeatmapFrame] = {}
+    employment_frames: dict[str, HeatmapFrame] = {}
 
     if long_df.empty:
         log.warning("[heatmap.build_heatmap] 入力DataFrame (long_df) が空です。")
@@ -1021,7 +950,7 @@ def build_heatmap(
             empty_pivot[col_name_ep_loop] = 0
         fp_all_empty_path = out_dir_path / "heat_ALL.parquet"
         try:
-            empty_pivot.to_parquet(fp_all_empty_path)
+            save_df_parquet(empty_pivot, fp_all_empty_path)
         except Exception as e_empty_write:
             log.error(f"空のheat_ALL.parquetの書き込みに失敗: {e_empty_write}")
         all_unique_roles_val = (
@@ -1223,8 +1152,8 @@ def build_heatmap(
                 )
 
     # 詳細なNeedデータをParquetファイルとして保存
-    need_all_final_for_summary.to_parquet(
-        out_dir_path / "need_per_date_slot.parquet"
+    save_df_parquet(
+        need_all_final_for_summary, out_dir_path / "need_per_date_slot.parquet"
     )
     log.info("Need per date/slot data saved to need_per_date_slot.parquet.")
 
@@ -1283,7 +1212,7 @@ def build_heatmap(
 
     fp_all_path = out_dir_path / "heat_ALL.parquet"
     try:
-        pivot_to_excel_all.to_parquet(fp_all_path)
+        save_df_parquet(pivot_to_excel_all, fp_all_path)
         log.info(
             "[heatmap.build_heatmap] 全体ヒートマップ (heat_ALL.parquet) 作成完了。"
         )
@@ -1423,7 +1352,8 @@ def build_heatmap(
                     need_df_role_final[date_str_col_map] = 0
 
         # 職種別の詳細Needデータを保存
-        need_df_role_final.to_parquet(
+        save_df_parquet(
+            need_df_role_final,
             out_dir_path / f"need_per_date_slot_role_{role_safe_name_final_loop}.parquet"
         )
         log.info(f"Role-specific need data saved to need_per_date_slot_role_{role_safe_name_final_loop}.parquet")
@@ -1469,9 +1399,15 @@ def build_heatmap(
         ):
             pivot_to_excel_role[col] = data
 
+        role_frames[role_safe_name_final_loop] = HeatmapFrame(
+            name=str(role_item_final_loop),
+            heat=pivot_to_excel_role,
+            need=need_df_role_final,
+        )
+
         fp_role = out_dir_path / f"heat_{role_safe_name_final_loop}.parquet"
         try:
-            pivot_to_excel_role.to_parquet(fp_role)
+            save_df_parquet(pivot_to_excel_role, fp_role)
             log.info(f"職種 '{role_item_final_loop}' ヒートマップ作成完了。")
         except Exception as e_role_write:
             log.error(
@@ -1617,7 +1553,8 @@ def build_heatmap(
                     need_df_emp_final[date_str_col_map] = 0
 
         # 雇用形態別の詳細Needデータを保存
-        need_df_emp_final.to_parquet(
+        save_df_parquet(
+            need_df_emp_final,
             out_dir_path / f"need_per_date_slot_emp_{emp_safe_name_final_loop}.parquet"
         )
         log.info(f"Employment-specific need data saved to need_per_date_slot_emp_{emp_safe_name_final_loop}.parquet")
@@ -1650,9 +1587,15 @@ def build_heatmap(
         ):
             pivot_to_excel_emp[col] = data
 
+        employment_frames[emp_safe_name_final_loop] = HeatmapFrame(
+            name=str(emp_item_final_loop),
+            heat=pivot_to_excel_emp,
+            need=need_df_emp_final,
+        )
+
         fp_emp = out_dir_path / f"heat_emp_{emp_safe_name_final_loop}.parquet"
         try:
-            pivot_to_excel_emp.to_parquet(fp_emp)
+            save_df_parquet(pivot_to_excel_emp, fp_emp)
             log.info(f"雇用形態 '{emp_item_final_loop}' ヒートマップ作成完了。")
         except Exception as e_emp_write:
             log.error(
@@ -1817,4 +1760,28 @@ def build_heatmap(
     except Exception as e:
         log.error(f"[heatmap] タイムスタンプ付きログ生成エラー: {e}")
     
+    # 長期間表示用のピラミッド (時×日 / スロット×週 / 時×月)
+    try:
+        from .heatmap_pyramid import write_heatmap_pyramids
+
+        pyramid_sources = {"heat_ALL": pivot_to_excel_all}
+        pyramid_sources.update({f"heat_{k}": f.heat for k, f in role_frames.items()})
+        pyramid_sources.update({f"heat_emp_{k}": f.heat for k, f in employment_frames.items()})
+        write_heatmap_pyramids(pyramid_sources, out_dir_path)
+    except Exception as e_pyramid:
+        log.warning(f"[heatmap] ピラミッド作成エラー: {e_pyramid}")
+
     log.info("[heatmap.build_heatmap] ヒートマップ生成処理完了。")
+
+    if not return_result:
+        return None
+    return HeatmapResult(
+        out_dir=out_dir_path,
+        slot_minutes=slot_minutes,
+        heat_all=pivot_to_excel_all,
+        need_per_date_slot=need_all_final_for_summary,
+        roles=role_frames,
+        employments=employment_frames,
+        estimated_holidays=set(holidays or set()),
+        dow_need_pattern=overall_dow_need_pattern_df,
+    )
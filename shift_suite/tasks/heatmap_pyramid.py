@@ -0,0 +1,404 @@
+"""
+shift_suite.tasks.heatmap_pyramid v1.0.0 – ヒートマップの多段解像度ピラミッド
+────────────────────────────────────────────────────────────────
+* 1 年分のヒートマップは 48 スロット × 365 日 ≒ 1.7 万セルになり、表示側では
+  直近 60 日への切り詰めや N 行/N 列おきの間引きで描画していたため、
+  長期間の分析ではピークが表示から消えていた。
+* ``build_heatmap_pyramid`` は heat_*.parquet 相当の表 (行 = 時刻ラベル、
+  列 = 日付) から次の階層を sum / mean / max で事前集計する。
+    - ``slot_day``   : スロット × 日 (元データそのまま、stat は ``value``)
+    - ``hour_day``   : 時 × 日
+    - ``slot_week``  : スロット × 週 (月曜始まり)
+    - ``hour_month`` : 時 × 月
+  どの階層も間引きは行わないため、max を選べばピークは必ず残る。
+* 集計結果は ``pyramid_<heat ファイル名>.parquet`` に縦持ちで保存する
+  (``build_heatmap`` の最後に 1 回だけ作成)。
+* ``HeatmapPyramid.view`` は表示範囲 (日付) と最大セル数から、範囲内に収まる
+  最も細かい階層を選んで返す。Dash の図はズームのたびにより細かい階層を取りに行く。
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .utils import date_columns, log, save_df_parquet
+
+PYRAMID_PREFIX = "pyramid_"
+STATS: Tuple[str, ...] = ("sum", "mean", "max")
+BASE_STAT = "value"
+DEFAULT_STAT = "max"
+DEFAULT_MAX_CELLS = 15_000
+PYRAMID_COLUMNS = ["level", "stat", "row", "row_order", "col", "value"]
+MAX_CACHED_PYRAMIDS = 16
+
+_TIME_LABEL = re.compile(r"^\s*(\d{1,2}):(\d{2})")
+
+
+@dataclass(frozen=True)
+class PyramidLevel:
+    name: str
+    row: str  # "slot" | "hour"
+    col: str  # "day" | "week" | "month"
+
+
+# 細かい順。view() は範囲内のセル数が上限以下になる最初の階層を使う
+LEVELS: Tuple[PyramidLevel, ...] = (
+    PyramidLevel("slot_day", "slot", "day"),
+    PyramidLevel("hour_day", "hour", "day"),
+    PyramidLevel("slot_week", "slot", "week"),
+    PyramidLevel("hour_month", "hour", "month"),
+)
+_LEVELS_BY_NAME = {lv.name: lv for lv in LEVELS}
+
+
+# ─────────────────────────── build ───────────────────────────
+def heat_grid(heat_df: pd.DataFrame) -> pd.DataFrame:
+    """heat 表から日付列だけを日付順に取り出す (列は Timestamp、値は float)"""
+    if heat_df is None or heat_df.empty:
+        return pd.DataFrame()
+    axis = date_columns(heat_df.columns)
+    if not axis:
+        return pd.DataFrame()
+    labels = sorted(axis, key=lambda c: axis[c])
+    grid = heat_df[labels].apply(pd.to_numeric, errors="coerce").astype(float)
+    grid.columns = pd.DatetimeIndex([pd.Timestamp(axis[c]) for c in labels])
+    grid.index = [str(i) for i in heat_df.index]
+    return grid
+
+
+def _row_hours(row_labels: Iterable[str]) -> Optional[np.ndarray]:
+    """'HH:MM' ラベル → 時。解釈できない行があれば None (時単位の階層は作らない)"""
+    hours = []
+    for label in row_labels:
+        m = _TIME_LABEL.match(label)
+        if m is None:
+            return None
+        hours.append(int(m.group(1)))
+    return np.asarray(hours, dtype=np.int64)
+
+
+def _period_starts(days: pd.DatetimeIndex, col: str) -> pd.DatetimeIndex:
+    if col == "week":
+        return (days - pd.to_timedelta(days.weekday, unit="D")).normalize()
+    if col == "month":
+        return days.to_period("M").to_timestamp()
+    return days.normalize()
+
+
+def _period_end(starts: pd.DatetimeIndex, col: str) -> pd.DatetimeIndex:
+    """各期間の最終日"""
+    if col == "week":
+        return starts + pd.Timedelta(days=6)
+    if col == "month":
+        return starts + pd.offsets.MonthEnd(0)
+    return starts
+
+
+def build_heatmap_pyramid(
+    heat_df: pd.DataFrame,
+    stats: Iterable[str] = STATS,
+) -> pd.DataFrame:
+    """全階層を縦持ち (``PYRAMID_COLUMNS``) で返す。日付列が無ければ空の表"""
+    grid = heat_grid(heat_df)
+    if grid.empty:
+        return pd.DataFrame(columns=PYRAMID_COLUMNS)
+    stats = list(stats)
+    n_rows, n_cols = grid.shape
+    values = grid.to_numpy(dtype=float).ravel()
+    row_pos = np.repeat(np.arange(n_rows), n_cols)
+    days = pd.DatetimeIndex(np.tile(grid.columns.to_numpy(), n_rows))
+    hours = _row_hours(grid.index)
+    row_labels = np.asarray(grid.index, dtype=object)
+
+    frames: List[pd.DataFrame] = []
+    for level in LEVELS:
+        if level.row == "hour" and hours is None:
+            continue
+        if level.name == "slot_day":
+            frames.append(
+                pd.DataFrame(
+                    {
+                        "level": level.name,
+                        "stat": BASE_STAT,
+                        "row": row_labels[row_pos],
+                        "row_order": row_pos,
+                        "col": days,
+                        "value": values,
+                    }
+                )
+            )
+            continue
+        row_key = hours[row_pos] if level.row == "hour" else row_pos
+        col_key = _period_starts(days, level.col)
+        agg = (
+            pd.DataFrame({"r": row_key, "c": col_key, "v": values})
+            .groupby(["r", "c"], sort=True)["v"]
+            .agg(stats)
+        )
+        r = agg.index.get_level_values("r").to_numpy()
+        labels = (
+            np.asarray([f"{h:02d}:00" for h in r], dtype=object)
+            if level.row == "hour"
+            else row_labels[r]
+        )
+        for stat in stats:
+            frames.append(
+                pd.DataFrame(
+                    {
+                        "level": level.name,
+                        "stat": stat,
+                        "row": labels,
+                        "row_order": r,
+                        "col": agg.index.get_level_values("c"),
+                        "value": agg[stat].to_numpy(dtype=float),
+                    }
+                )
+            )
+    pyramid = pd.concat(frames, ignore_index=True)
+    pyramid["level"] = pyramid["level"].astype("category")
+    pyramid["stat"] = pyramid["stat"].astype("category")
+    pyramid["row_order"] = pyramid["row_order"].astype(np.int32)
+    return pyramid[PYRAMID_COLUMNS]
+
+
+def pyramid_path(heat_fp: Path | str) -> Path:
+    heat_fp = Path(heat_fp)
+    return heat_fp.with_name(f"{PYRAMID_PREFIX}{heat_fp.stem}.parquet")
+
+
+def write_heatmap_pyramids(
+    heat_frames: Mapping[str, pd.DataFrame],
+    out_dir: Path | str,
+) -> List[Path]:
+    """``{heat ファイルの stem: heat 表}`` からピラミッドを書き出す"""
+    out_dir = Path(out_dir)
+    written: List[Path] = []
+    for stem, heat_df in heat_frames.items():
+        try:
+            pyramid = build_heatmap_pyramid(heat_df)
+            if pyramid.empty:
+                continue
+            fp = pyramid_path(out_dir / f"{stem}.parquet")
+            save_df_parquet(pyramid, fp, index=False)
+            written.append(fp)
+        except Exception as e:  # noqa: BLE001
+            log.warning(f"[heatmap_pyramid] {stem} のピラミッド作成に失敗: {e}")
+    log.info(f"[heatmap_pyramid] {len(written)} 件のピラミッドを作成: {out_dir}")
+    return written
+
+
+# ─────────────────────────── read ───────────────────────────
+class HeatmapPyramid:
+    """縦持ちのピラミッドから階層ごとの横持ち表を取り出す"""
+
+    def __init__(self, frame: pd.DataFrame):
+        self.frame = frame
+        self._wide: Dict[Tuple[str, str], pd.DataFrame] = {}
+        self._lock = threading.Lock()
+        present = set(frame["level"].astype(str).unique()) if not frame.empty else set()
+        self.levels: List[str] = [lv.name for lv in LEVELS if lv.name in present]
+
+    @classmethod
+    def from_heat(cls, heat_df: pd.DataFrame) -> "HeatmapPyramid":
+        return cls(build_heatmap_pyramid(heat_df))
+
+    @property
+    def empty(self) -> bool:
+        return not self.levels
+
+    def level(self, name: str, stat: str = DEFAULT_STAT) -> pd.DataFrame:
+        """階層 ``name`` の全期間 (行 = 時刻、列 = 期間の開始日)"""
+        if name not in self.levels:
+            raise KeyError(name)
+        key_stat = BASE_STAT if name == "slot_day" else stat
+        with self._lock:
+            wide = self._wide.get((name, key_stat))
+            if wide is None:
+                sub = self.frame[
+                    (self.frame["level"] == name) & (self.frame["stat"] == key_stat)
+                ]
+                if sub.empty:
+                    raise KeyError(f"{name}/{stat}")
+                row_ids, row_pos = np.unique(sub["row_order"].to_numpy(), return_inverse=True)
+                cols, col_pos = np.unique(sub["col"].to_numpy(dtype="datetime64[ns]"), return_inverse=True)
+                values = np.full((len(row_ids), len(cols)), np.nan)
+                values[row_pos, col_pos] = sub["value"].to_numpy(dtype=float)
+                labels = np.empty(len(row_ids), dtype=object)
+                labels[row_pos] = sub["row"].to_numpy(dtype=object)
+                wide = pd.DataFrame(values, index=labels, columns=pd.DatetimeIndex(cols))
+                self._wide[(name, key_stat)] = wide
+            return wide
+
+    def slice(
+        self,
+        name: str,
+        stat: str = DEFAULT_STAT,
+        start: Any = None,
+        end: Any = None,
+    ) -> pd.DataFrame:
+        """``[start, end]`` に一部でも重なる期間の列だけを返す"""
+        wide = self.level(name, stat)
+        if start is None and end is None:
+            return wide
+        col = _LEVELS_BY_NAME[name].col
+        starts = pd.DatetimeIndex(wide.columns)
+        ends = _period_end(starts, col)
+        mask = np.ones(len(starts), dtype=bool)
+        if start is not None:
+            mask &= ends >= pd.Timestamp(start).normalize()
+        if end is not None:
+            mask &= starts <= pd.Timestamp(end)
+        return wide.loc[:, mask]
+
+    def choose_level(
+        self,
+        start: Any = None,
+        end: Any = None,
+        max_cells: int = DEFAULT_MAX_CELLS,
+    ) -> str:
+        """範囲内のセル数が ``max_cells`` 以下になる最も細かい階層"""
+        if self.empty:
+            raise KeyError("empty pyramid")
+        for name in self.levels:
+            stat = BASE_STAT if name == "slot_day" else DEFAULT_STAT
+            if self.slice(name, stat, start, end).size <= max_cells:
+                return name
+        return self.levels[-1]
+
+    def view(
+        self,
+        start: Any = None,
+        end: Any = None,
+        stat: str = DEFAULT_STAT,
+        max_cells: int = DEFAULT_MAX_CELLS,
+    ) -> Tuple[str, pd.DataFrame]:
+        """表示範囲に合わせて (階層名, 表) を返す"""
+        name = self.choose_level(start, end, max_cells)
+        return name, self.slice(name, stat, start, end)
+
+
+def period_labels(level: str, columns: Iterable[Any]) -> List[str]:
+    """列 (期間の開始日) の表示ラベル"""
+    col = _LEVELS_BY_NAME[level].col
+    stamps = pd.DatetimeIndex(list(columns))
+    if col == "week":
+        return [f"{d:%Y-%m-%d}週" for d in stamps]
+    if col == "month":
+        return [f"{d:%Y年%m月}" for d in stamps]
+    return [f"{d:%Y-%m-%d}" for d in stamps]
+
+
+def downsample_heatmap(
+    df: pd.DataFrame,
+    max_cells: int = DEFAULT_MAX_CELLS,
+    stat: str = DEFAULT_STAT,
+) -> Tuple[str, pd.DataFrame]:
+    """
+    表示用の表 (行 = 時刻、列 = 日付) を ``max_cells`` に収まる階層へ集計する。
+    列は期間ラベルの文字列。日付列が無い場合は (``""``, df) をそのまま返す。
+    """
+    if df.empty or df.shape[0] * df.shape[1] <= max_cells:
+        return "slot_day", df
+    pyramid = HeatmapPyramid.from_heat(df)
+    if pyramid.empty:
+        return "", df
+    name, view = pyramid.view(stat=stat, max_cells=max_cells)
+    view = view.copy()
+    view.columns = period_labels(name, view.columns)
+    return name, view
+
+
+def parse_visible_range(relayout_data: Optional[Mapping[str, Any]]) -> Tuple[bool, Any, Any]:
+    """
+    Plotly の relayoutData から x 軸の表示範囲を読む。
+    戻り値は (範囲が変わったか, 開始, 終了)。自動範囲に戻った場合は (True, None, None)。
+    """
+    if not relayout_data:
+        return False, None, None
+    if relayout_data.get("xaxis.autorange"):
+        return True, None, None
+    lo = relayout_data.get("xaxis.range[0]")
+    hi = relayout_data.get("xaxis.range[1]")
+    if lo is None and isinstance(relayout_data.get("xaxis.range"), (list, tuple)):
+        lo, hi = relayout_data["xaxis.range"][:2]
+    if lo is None or hi is None:
+        return False, None, None
+    try:
+        return True, pd.Timestamp(lo), pd.Timestamp(hi)
+    except (TypeError, ValueError):
+        return False, None, None
+
+
+# ─────────────────────────── cache ───────────────────────────
+_CACHE: "OrderedDict[Tuple[str, int], HeatmapPyramid]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+
+def load_heatmap_pyramid(heat_fp: Path | str) -> Optional[HeatmapPyramid]:
+    """
+    heat ファイルに対応するピラミッド。保存済みのものが古い / 無い場合は
+    heat 表から作る。(パス, mtime) をキーにプロセス内で使い回す。
+    """
+    from .artifact_store import read_artifact
+
+    heat_fp = Path(heat_fp)
+    try:
+        heat_mtime = heat_fp.stat().st_mtime_ns
+    except OSError:
+        return None
+    cache_key = (str(heat_fp.resolve()), heat_mtime)
+    with _CACHE_LOCK:
+        pyramid = _CACHE.get(cache_key)
+        if pyramid is not None:
+            _CACHE.move_to_end(cache_key)
+            return pyramid
+
+    fp = pyramid_path(heat_fp)
+    pyramid = None
+    try:
+        if fp.exists() and fp.stat().st_mtime_ns >= heat_mtime:
+            pyramid = HeatmapPyramid(read_artifact(fp))
+    except Exception as e:  # noqa: BLE001
+        log.debug(f"[heatmap_pyramid] {fp.name} を読めないため再作成: {e}")
+    if pyramid is None or pyramid.empty:
+        try:
+            pyramid = HeatmapPyramid.from_heat(read_artifact(heat_fp))
+        except Exception as e:  # noqa: BLE001
+            log.warning(f"[heatmap_pyramid] {heat_fp.name} からの作成に失敗: {e}")
+            return None
+
+    with _CACHE_LOCK:
+        _CACHE[cache_key] = pyramid
+        while len(_CACHE) > MAX_CACHED_PYRAMIDS:
+            _CACHE.popitem(last=False)
+    return pyramid
+
+
+def clear_pyramid_cache() -> None:
+    with _CACHE_LOCK:
+        _CACHE.clear()
+
+
+__all__ = [
+    "DEFAULT_MAX_CELLS",
+    "DEFAULT_STAT",
+    "HeatmapPyramid",
+    "LEVELS",
+    "PYRAMID_PREFIX",
+    "build_heatmap_pyramid",
+    "clear_pyramid_cache",
+    "downsample_heatmap",
+    "load_heatmap_pyramid",
+    "parse_visible_range",
+    "period_labels",
+    "pyramid_path",
+    "write_heatmap_pyramids",
+]
@@ -1,5 +1,7 @@
 # shift_suite / tasks / heatmap_v2.py
 # v2.0.0 (動的データ対応・汎用Need計算システム)
+# v2.0.1 calculate_dynamic_need を時間帯ごとのループから一括計算に置き換え、
+#        rolling_window で対象日ごとの直近窓 Need を need_baseline_engine から算出
 
 from __future__ import annotations
 
@@ -14,6 +16,8 @@ import pandas as pd
 import logging
 
 from .constants import SUMMARY5
+from .need_baseline_engine import DateSlotMatrix, RollingDowSlotStats
+from .slot_need_stats import SortedSamples
 from shift_suite.i18n import translate as _
 from .utils import (
     _parse_as_date,
@@ -32,13 +36,20 @@ from .utils import (
 
 # Temporary replacement classes for missing core modules
 class AdaptiveStatisticsEngine:
+    quantile = 0.75
+    confidence = 0.75
+    method = "p75_fallback"
+
     def calculate_need(self, historical_data, target_confidence=0.75):
         import numpy as np
         values = np.array(historical_data)
-        need_value = float(np.percentile(values, 75)) if len(values) > 0 else 0.0
-        confidence = 0.75
-        method = "p75_fallback"
-        return need_value, confidence, method
+        need_value = float(np.percentile(values, self.quantile * 100)) if len(values) > 0 else 0.0
+        return need_value, self.confidence, self.method
+
+    def calculate_need_matrix(self, values: np.ndarray, target_confidence=0.75):
+        """(時間帯 × 日付) の各時間帯の Need を一括計算 (欠損は除外、データなしは NaN)"""
+        samples = SortedSamples(np.asarray(values, dtype=float).T)
+        return samples.quantile(self.quantile), samples.count, self.confidence, self.method
 
 class NeedCalculationResult:
     def __init__(self, date, time_slot, need_count, confidence, calculation_method, data_points, raw_data):
@@ -70,7 +81,8 @@ class UniversalNeedCalculator:
         self,
         historical_data_df: pd.DataFrame,
         target_date_columns: List[str],
-        confidence_target: float = 0.75
+        confidence_target: float = 0.75,
+        rolling_window: Optional[int] = None,
     ) -> pd.DataFrame:
         """
         動的データに基づくNeed計算
@@ -79,60 +91,61 @@ class UniversalNeedCalculator:
             historical_data_df: 実績データ（時間帯×日付）
             target_date_columns: 対象日付列
             confidence_target: 目標信頼度
+            rolling_window: 指定すると各対象日の Need をその日より前の直近
+                ``rolling_window`` 日分の実績から求める (履歴の無い日は全期間の値)
             
         Returns:
             Need計算結果DataFrame（時間帯×日付）
         """
         log.info(f"汎用Need計算開始: 対象日付数={len(target_date_columns)}")
         
-        result_df = pd.DataFrame(
-            index=historical_data_df.index,
-            columns=target_date_columns,
-            dtype=float
+        target_df = historical_data_df[target_date_columns].apply(pd.to_numeric, errors="coerce")
+        values = target_df.to_numpy(dtype=float)
+        need_values, counts, confidence, method = self.stats_engine.calculate_need_matrix(
+            values, target_confidence=confidence_target
         )
-        
-        # 時間帯ごとに処理
-        for time_slot in historical_data_df.index:
-            log.debug(f"時間帯 {time_slot} の処理開始")
-            
-            # 対象日付の実績データを取得
-            slot_data = historical_data_df.loc[time_slot, target_date_columns]
-            historical_values = slot_data.dropna().tolist()
-            
-            if not historical_values:
+
+        # 結果を記録
+        today = dt.date.today()  # 計算日
+        for time_slot, need_value, n_points, row in zip(historical_data_df.index, need_values, counts, values):
+            if n_points == 0:
                 log.warning(f"時間帯 {time_slot}: データなし")
-                result_df.loc[time_slot] = 0.0
                 continue
-            
-            # 汎用統計エンジンでNeed計算
-            need_value, confidence, method = self.stats_engine.calculate_need(
-                historical_data=historical_values,
-                target_confidence=confidence_target
-            )
-            
-            # 結果を記録
-            calculation_result = NeedCalculationResult(
-                date=dt.date.today(),  # 計算日
-                time_slot=time_slot,
-                need_count=need_value,
-                confidence=confidence,
-                calculation_method=method,
-                data_points=len(historical_values),
-                raw_data=historical_values
-            )
-            self.calculation_log.append(calculation_result)
-            
-            # 全対象日付に同じNeed値を適用
-            result_df.loc[time_slot] = need_value
-            
-            log.debug(
-                f"時間帯 {time_slot}: Need={need_value:.2f}, "
-                f"信頼度={confidence:.2f}, 手法={method}"
+            self.calculation_log.append(
+                NeedCalculationResult(
+                    date=today,
+                    time_slot=time_slot,
+                    need_count=float(need_value),
+                    confidence=confidence,
+                    calculation_method=method,
+                    data_points=int(n_points),
+                    raw_data=row[~np.isnan(row)].tolist(),
+                )
             )
+
+        # 全対象日付に同じNeed値を適用
+        need_matrix = np.repeat(np.nan_to_num(need_values, nan=0.0)[:, None], len(target_date_columns), axis=1)
+        if rolling_window is not None and len(target_date_columns):
+            need_matrix = self._rolling_need(target_df, need_matrix, int(rolling_window))
+
+        result_df = pd.DataFrame(need_matrix, index=historical_data_df.index, columns=target_date_columns)
         
         log.info("汎用Need計算完了")
         return result_df.fillna(0.0)
     
+    def _rolling_need(self, target_df: pd.DataFrame, fallback: np.ndarray, window: int) -> np.ndarray:
+        """各対象日の直前 ``window`` 日分の分位点 (日付として解釈できない列・履歴なしは fallback)"""
+        matrix = DateSlotMatrix.from_frame(target_df)
+        rolling = RollingDowSlotStats(matrix, by_dow=False).quantile(self.stats_engine.quantile, window)
+        pos = {d: i for i, d in enumerate(matrix.dates)}
+        out = fallback.copy()
+        for j, col in enumerate(target_df.columns):
+            d = _parse_as_date(col)
+            if d in pos:
+                col_need = rolling[pos[d]]
+                out[:, j] = np.where(np.isnan(col_need), out[:, j], col_need)
+        return out
+
     def get_calculation_summary(self) -> Dict:
         """計算サマリーの取得"""
         if not self.calculation_log:
@@ -180,7 +193,8 @@ def calculate_universal_need(
     need_df = calculator.calculate_dynamic_need(
         historical_data_df=df_for_calc,
         target_date_columns=date_columns,
-        confidence_target=confidence_target
+        confidence_target=confidence_target,
+        rolling_window=kwargs.get("rolling_window"),
     )
     
     # 計算サマリーをログ出力
@@ -0,0 +1,488 @@
+"""
+shift_suite.tasks.hire_optimizer v1.0.0 – 勤務パターン被覆による採用ミックス最適化
+────────────────────────────────────────────────────────────────
+* 勤務区分 (``optimal_hire_plan._get_shift_pattern_hours``) をスロット被覆行列
+  A (スロット × パターン) の列とみなし、職種 × 曜日ごとに
+    min  c·x + w·r   s.t.  A x + r ≥ d,  x ∈ ℤ≥0,  r ≥ 0
+  を解く。d は ``ShortageCube`` の曜日 × スロット平均不足を切り上げた必要人数、
+  x は曜日あたりの各パターンの勤務回数、r は残存不足。
+* ``shortage_penalty=None`` (既定) では被覆可能なスロットの不足はすべて埋め、
+  どのパターンも被覆しないスロットだけが残存不足になる。値を与えると
+  不足 1 人時あたりのペナルティとの重み付き被覆になり、割に合わない
+  スロットは残存不足として残す。
+* ソルバーは OR-Tools (pywraplp) → scipy.optimize.milp → LP 緩和 + 丸め → 貪欲法
+  の順に利用可能なものを使う。貪欲解は常に計算して暫定解とし、
+  LP 緩和の目的値を下界として gap を報告する。
+* 曜日あたりの勤務回数は ``workdays_per_week`` で割って採用人数に換算する
+  (同じ曜日に同じパターンを x 回使うなら最低 x 人)。
+"""
+
+from __future__ import annotations
+
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .utils import log
+
+try:
+    from ortools.linear_solver import pywraplp
+    _HAS_ORTOOLS = True
+except ImportError:  # pragma: no cover - optional dependency
+    pywraplp = None  # type: ignore
+    _HAS_ORTOOLS = False
+
+try:
+    from scipy.optimize import Bounds, LinearConstraint, linprog, milp
+    _HAS_SCIPY = True
+except ImportError:  # pragma: no cover - optional dependency
+    Bounds = LinearConstraint = linprog = milp = None  # type: ignore
+    _HAS_SCIPY = False
+
+METHODS = ("auto", "ortools", "milp", "lp", "greedy")
+WEEKDAY_LABELS = ["月曜日", "火曜日", "水曜日", "木曜日", "金曜日", "土曜日", "日曜日"]
+DEFAULT_TIME_LIMIT = 10.0
+MIP_REL_GAP = 1e-3
+_MINUTES_PER_DAY = 24 * 60
+_EPS = 1e-9
+
+
+# ─────────────────────────── coverage matrix ───────────────────────────
+def _to_minutes(label: str) -> Optional[int]:
+    try:
+        hh, mm = str(label).strip().split(":")[:2]
+        return (int(hh) * 60 + int(mm[:2])) % _MINUTES_PER_DAY
+    except (ValueError, TypeError):
+        return None
+
+
+def _pattern_minute_mask(labels: Iterable[str], default_step: int) -> np.ndarray:
+    """
+    パターンのスロット表記 ("HH:MM" または "HH:MM-HH:MM") を 1 日 1440 分の
+    被覆マスクにする。"HH:MM" のみの表記はパターン内の最小間隔 (無ければ
+    ``default_step``) 分の区間とみなす。
+    """
+    mask = np.zeros(_MINUTES_PER_DAY, dtype=bool)
+    starts: List[int] = []
+    for label in labels:
+        text = str(label)
+        if "-" in text:
+            st_text, ed_text = text.split("-", 1)
+            st, ed = _to_minutes(st_text), _to_minutes(ed_text)
+            if st is None or ed is None:
+                continue
+            length = (ed - st) % _MINUTES_PER_DAY or _MINUTES_PER_DAY
+            mask[(st + np.arange(length)) % _MINUTES_PER_DAY] = True
+        else:
+            st = _to_minutes(text)
+            if st is not None:
+                starts.append(st)
+    if starts:
+        uniq = np.unique(starts)
+        gaps = np.diff(uniq)
+        step = int(gaps[gaps > 0].min()) if (gaps > 0).any() else int(default_step)
+        for st in uniq:
+            mask[(st + np.arange(step)) % _MINUTES_PER_DAY] = True
+    return mask
+
+
+def build_coverage_matrix(
+    patterns: Mapping[str, Iterable[str]],
+    slots: List[str],
+    slot_minutes: int = 30,
+) -> Tuple[np.ndarray, List[str], np.ndarray]:
+    """
+    被覆行列を返す。
+
+    Returns
+    -------
+    (A, names, hours)
+        A は (len(slots) × パターン数) の bool 行列で、スロット開始時刻が
+        パターンの勤務時間内なら True。hours は各パターンの勤務時間 (h)。
+        1 スロットも被覆しないパターン (休暇コードなど) は除外する。
+    """
+    slot_min = np.array([_to_minutes(s) for s in slots], dtype=float)
+    valid = ~np.isnan(slot_min)
+    slot_idx = np.where(valid, slot_min, 0).astype(int)
+
+    columns: List[np.ndarray] = []
+    names: List[str] = []
+    hours: List[float] = []
+    for name, labels in patterns.items():
+        mask = _pattern_minute_mask(labels, slot_minutes)
+        col = mask[slot_idx] & valid
+        if not col.any():
+            continue
+        columns.append(col)
+        names.append(str(name))
+        hours.append(mask.sum() / 60.0)
+    if not columns:
+        return np.zeros((len(slots), 0), dtype=bool), [], np.zeros(0)
+    return np.column_stack(columns), names, np.asarray(hours)
+
+
+# ─────────────────────────── solvers ───────────────────────────
+@dataclass
+class CoverSolution:
+    """1 つの被覆問題の解"""
+
+    x: np.ndarray
+    residual: np.ndarray
+    objective: float
+    method: str
+    lower_bound: float = float("nan")
+
+    @property
+    def gap(self) -> float:
+        if not np.isfinite(self.lower_bound) or self.objective <= _EPS:
+            return 0.0 if self.objective <= _EPS else float("nan")
+        return max(0.0, (self.objective - self.lower_bound) / self.objective)
+
+
+def _objective(A: np.ndarray, d: np.ndarray, c: np.ndarray, w: np.ndarray, x: np.ndarray) -> Tuple[float, np.ndarray]:
+    residual = np.maximum(d - A @ x, 0)
+    return float(c @ x + w @ residual), residual
+
+
+def _greedy(A: np.ndarray, d: np.ndarray, c: np.ndarray, w: np.ndarray) -> np.ndarray:
+    """
+    残り不足に対する (被覆価値 / コスト) が最大のパターンを 1 回ずつ追加する。
+    価値がコストを下回ったら終了。最後に不要な勤務を取り除く。
+    """
+    Af = A.astype(float)
+    x = np.zeros(A.shape[1])
+    remaining = d.astype(float).copy()
+    max_iter = int(d.sum()) + 1
+    for _ in range(max_iter):
+        gain = (w * (remaining > _EPS)) @ Af
+        ratio = np.where(c > 0, gain / np.maximum(c, _EPS), gain)
+        best = int(np.argmax(ratio)) if ratio.size else -1
+        if best < 0 or gain[best] <= c[best] + _EPS:
+            break
+        x[best] += 1
+        remaining -= Af[:, best]
+    return _prune(A, d, c, w, x)
+
+
+def _prune(A: np.ndarray, d: np.ndarray, c: np.ndarray, w: np.ndarray, x: np.ndarray) -> np.ndarray:
+    """1 回減らしても目的値が悪化しない勤務を高コスト順に取り除く"""
+    x = x.copy()
+    current, _ = _objective(A, d, c, w, x)
+    for p in np.argsort(-c):
+        while x[p] > 0:
+            x[p] -= 1
+            trial, _ = _objective(A, d, c, w, x)
+            if trial <= current + _EPS:
+                current = trial
+            else:
+                x[p] += 1
+                break
+    return x
+
+
+def _lp_relaxation(A: np.ndarray, d: np.ndarray, c: np.ndarray, w: np.ndarray) -> Tuple[Optional[np.ndarray], float]:
+    """LP 緩和の解と目的値 (下界)。scipy が無ければ (None, nan)"""
+    if not _HAS_SCIPY:
+        return None, float("nan")
+    S, P = A.shape
+    obj = np.concatenate([c, w])
+    A_ub = -np.hstack([A.astype(float), np.eye(S)])
+    res = linprog(obj, A_ub=A_ub, b_ub=-d, bounds=(0, None), method="highs")
+    if res.status != 0:
+        return None, float("nan")
+    return res.x[:P], float(res.fun)
+
+
+def _round_lp(A: np.ndarray, d: np.ndarray, c: np.ndarray, w: np.ndarray, x_lp: np.ndarray) -> np.ndarray:
+    """LP 解を切り下げ、残りを貪欲法で埋めてから不要な勤務を除く"""
+    x = np.floor(x_lp + 1e-6)
+    remaining = np.maximum(d - A @ x, 0)
+    x = x + _greedy(A, remaining, c, w)
+    return _prune(A, d, c, w, x)
+
+
+def _solve_milp(A: np.ndarray, d: np.ndarray, c: np.ndarray, w: np.ndarray, time_limit: float) -> Optional[np.ndarray]:
+    S, P = A.shape
+    obj = np.concatenate([c, w])
+    cons = LinearConstraint(np.hstack([A.astype(float), np.eye(S)]), lb=d, ub=np.inf)
+    integrality = np.concatenate([np.ones(P), np.zeros(S)])
+    res = milp(
+        obj,
+        constraints=cons,
+        integrality=integrality,
+        bounds=Bounds(0, np.inf),
+        options={"time_limit": time_limit, "mip_rel_gap": MIP_REL_GAP},
+    )
+    if res.x is None:
+        return None
+    return np.round(res.x[:P])
+
+
+def _solve_ortools(A: np.ndarray, d: np.ndarray, c: np.ndarray, w: np.ndarray, time_limit: float) -> Optional[np.ndarray]:
+    solver = pywraplp.Solver.CreateSolver("SCIP") or pywraplp.Solver.CreateSolver("CBC")
+    if solver is None:
+        return None
+    S, P = A.shape
+    upper = float(max(d.max(initial=0.0), 0.0)) + 1
+    x = [solver.IntVar(0, upper, f"x_{p}") for p in range(P)]
+    r = [solver.NumVar(0, solver.infinity(), f"r_{s}") for s in range(S)]
+    for s in range(S):
+        if d[s] <= _EPS:
+            continue
+        cols = np.flatnonzero(A[s])
+        solver.Add(solver.Sum([x[p] for p in cols]) + r[s] >= float(d[s]))
+    solver.Minimize(
+        solver.Sum([float(c[p]) * x[p] for p in range(P)])
+        + solver.Sum([float(w[s]) * r[s] for s in range(S)])
+    )
+    solver.SetTimeLimit(int(time_limit * 1000))
+    status = solver.Solve()
+    if status not in (pywraplp.Solver.OPTIMAL, pywraplp.Solver.FEASIBLE):
+        return None
+    return np.round([v.solution_value() for v in x])
+
+
+def solve_cover(
+    A: np.ndarray,
+    demand: np.ndarray,
+    cost: np.ndarray,
+    weight: np.ndarray,
+    *,
+    method: str = "auto",
+    time_limit: float = DEFAULT_TIME_LIMIT,
+) -> CoverSolution:
+    """
+    ``min cost·x + weight·r  s.t.  A x + r ≥ demand`` を解く。
+
+    ``method='auto'`` は OR-Tools → scipy.milp → LP 緩和 + 丸め の順に利用可能な
+    ものを使い、貪欲解より悪い場合は貪欲解を返す。
+    """
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}: {method!r}")
+    A = np.asarray(A, dtype=bool)
+    d = np.maximum(np.asarray(demand, dtype=float), 0)
+    c = np.asarray(cost, dtype=float)
+    w = np.asarray(weight, dtype=float)
+    if A.shape[1] == 0 or (d * w > 0).sum() == 0:
+        x = np.zeros(A.shape[1])
+        obj, residual = _objective(A, d, c, w, x)
+        return CoverSolution(x, residual, obj, "trivial", obj)
+
+    x_greedy = _greedy(A, d, c, w)
+    best_obj, best_res = _objective(A, d, c, w, x_greedy)
+    best = CoverSolution(x_greedy, best_res, best_obj, "greedy")
+    if method == "greedy":
+        return best
+
+    x_lp, lower = (None, float("nan"))
+    if method in ("auto", "lp", "milp"):
+        x_lp, lower = _lp_relaxation(A, d, c, w)
+    best.lower_bound = lower
+
+    candidates: List[Tuple[str, Optional[np.ndarray]]] = []
+    if method in ("auto", "ortools") and _HAS_ORTOOLS:
+        candidates.append(("ortools", _solve_ortools(A, d, c, w, time_limit)))
+    elif method in ("auto", "milp") and _HAS_SCIPY:
+        candidates.append(("milp", _solve_milp(A, d, c, w, time_limit)))
+    if x_lp is not None and (method == "lp" or not any(x is not None for _, x in candidates)):
+        candidates.append(("lp", _round_lp(A, d, c, w, x_lp)))
+    if method in ("ortools", "milp") and not candidates:
+        log.warning(f"[hire_optimizer] {method} が利用できないため貪欲法の解を使います")
+
+    for name, x in candidates:
+        if x is None:
+            continue
+        obj, residual = _objective(A, d, c, w, x)
+        if obj < best.objective - _EPS:
+            best = CoverSolution(x, residual, obj, name, lower)
+    return best
+
+
+# ─────────────────────────── hire plan ───────────────────────────
+@dataclass
+class HireMixResult:
+    """職種 × 曜日の被覆問題をまとめた結果"""
+
+    mix: pd.DataFrame
+    residual: pd.DataFrame
+    summary: pd.DataFrame
+    stats: Dict[str, object] = field(default_factory=dict)
+
+
+def required_staff(lack: np.ndarray, lack_tolerance: float = 0.0) -> np.ndarray:
+    """平均不足人数を必要人数 (整数) にする。小数部が ``lack_tolerance`` 以下なら切り捨て"""
+    return np.ceil(np.maximum(np.asarray(lack, dtype=float) - lack_tolerance, 0) - _EPS).clip(min=0)
+
+
+def demand_from_cube(cube, roles: Optional[List[str]] = None) -> pd.DataFrame:
+    """``ShortageCube`` から [role, weekday, slot, lack] (曜日平均不足) を作る"""
+    frames = []
+    for role in roles if roles is not None else cube.keys("role"):
+        part = cube.query("lack", by="weekday", scope="role", key=role, agg="mean")
+        if part.empty:
+            continue
+        frames.append(part.rename(columns={"value": "lack"}).assign(role=role))
+    if not frames:
+        return pd.DataFrame(columns=["role", "weekday", "slot", "lack"])
+    return pd.concat(frames, ignore_index=True)[["role", "weekday", "slot", "lack"]]
+
+
+def optimize_hire_mix(
+    demand: pd.DataFrame,
+    patterns: Mapping[str, Iterable[str]],
+    *,
+    slot_minutes: int = 30,
+    pattern_costs: Optional[Mapping[str, float]] = None,
+    hourly_cost: float | Mapping[str, float] = 1.0,
+    shortage_penalty: Optional[float] = None,
+    lack_tolerance: float = 0.0,
+    workdays_per_week: float = 5.0,
+    method: str = "auto",
+    time_limit: float = DEFAULT_TIME_LIMIT,
+) -> HireMixResult:
+    """
+    職種 × 曜日 × スロットの不足から最小コストの採用ミックスを求める。
+
+    Parameters
+    ----------
+    demand : [role, weekday, slot, lack] の DataFrame (lack は曜日平均不足人数)
+    patterns : 勤務コード → スロット表記の集合
+    pattern_costs : 勤務コード → 1 回あたりのコスト。未指定は勤務時間 × hourly_cost
+    hourly_cost : 時給 (職種別の辞書も可)。既定 1.0 でコストは人時
+    shortage_penalty : 不足 1 人時あたりのペナルティ (時給比)。None は被覆可能な不足をすべて埋める
+    lack_tolerance : 平均不足の小数部がこれ以下なら必要人数に含めない
+    workdays_per_week : 1 人あたりの週勤務日数 (採用人数への換算)
+    """
+    t0 = time.perf_counter()
+    slots = sorted(demand["slot"].astype(str).unique(), key=lambda s: _to_minutes(s) or 0)
+    A, names, hours = build_coverage_matrix(patterns, slots, slot_minutes)
+    slot_hours = slot_minutes / 60.0
+    coverable = A.any(axis=1)
+    slot_pos = {s: i for i, s in enumerate(slots)}
+
+    mix_rows: List[Dict[str, object]] = []
+    residual_rows: List[pd.DataFrame] = []
+    summary_rows: List[Dict[str, object]] = []
+    methods: Dict[str, int] = {}
+    total_cost = 0.0
+    total_objective = 0.0
+    total_lower = 0.0
+
+    for role, role_df in demand.groupby("role", sort=True):
+        rate = hourly_cost.get(role, 1.0) if isinstance(hourly_cost, Mapping) else float(hourly_cost)
+        cost = np.array(
+            [
+                float(pattern_costs[n]) if pattern_costs and n in pattern_costs else h * rate
+                for n, h in zip(names, hours)
+            ]
+        )
+        if shortage_penalty is None:
+            # 被覆可能なスロットは必ず埋まるよう、どの勤務より高いペナルティにする
+            penalty = (cost.sum() + 1.0) * np.ones(len(slots))
+        else:
+            penalty = float(shortage_penalty) * rate * slot_hours * np.ones(len(slots))
+        weight = np.where(coverable, penalty, 0.0)
+
+        shifts = np.zeros((len(WEEKDAY_LABELS), len(names)))
+        for wd_idx, weekday in enumerate(WEEKDAY_LABELS):
+            part = role_df[role_df["weekday"] == weekday]
+            lack = np.zeros(len(slots))
+            if not part.empty:
+                idx = part["slot"].astype(str).map(slot_pos).to_numpy()
+                lack[idx] = part["lack"].to_numpy(dtype=float)
+            need = required_staff(lack, lack_tolerance)
+            sol = solve_cover(A, need, cost, weight, method=method, time_limit=time_limit)
+            methods[sol.method] = methods.get(sol.method, 0) + 1
+            shifts[wd_idx] = sol.x
+            covered = A.astype(float) @ sol.x
+            residual = np.maximum(need - covered, 0)
+            total_cost += float(cost @ sol.x)
+            total_objective += sol.objective
+            total_lower += sol.lower_bound
+            residual_rows.append(
+                pd.DataFrame(
+                    {
+                        "role": role,
+                        "weekday": weekday,
+                        "slot": slots,
+                        "lack": lack,
+                        "required": need,
+                        "covered": covered,
+                        "residual": residual,
+                    }
+                )
+            )
+            for p in np.flatnonzero(sol.x):
+                mix_rows.append(
+                    {
+                        "role": role,
+                        "weekday": weekday,
+                        "pattern": names[p],
+                        "shifts": int(sol.x[p]),
+                        "hours": float(hours[p]),
+                        "cost": float(cost[p] * sol.x[p]),
+                    }
+                )
+
+        residual_df = residual_rows[-len(WEEKDAY_LABELS):]
+        role_residual_h = float(sum(r["residual"].sum() for r in residual_df) * slot_hours)
+        role_required_h = float(sum(r["required"].sum() for r in residual_df) * slot_hours)
+        for p in np.flatnonzero(shifts.sum(axis=0)):
+            weekly = float(shifts[:, p].sum())
+            headcount = max(weekly / max(workdays_per_week, _EPS), float(shifts[:, p].max()))
+            summary_rows.append(
+                {
+                    "role": role,
+                    "pattern": names[p],
+                    "weekly_shifts": weekly,
+                    "hours": float(hours[p]),
+                    "hires": int(math.ceil(headcount - _EPS)),
+                    "fte": round(headcount, 2),
+                    "weekdays": [WEEKDAY_LABELS[i] for i in np.flatnonzero(shifts[:, p])],
+                    "role_required_hours": role_required_h,
+                    "role_residual_hours": role_residual_h,
+                }
+            )
+
+    residual_all = (
+        pd.concat(residual_rows, ignore_index=True)
+        if residual_rows
+        else pd.DataFrame(columns=["role", "weekday", "slot", "lack", "required", "covered", "residual"])
+    )
+    stats = {
+        "methods": methods,
+        "patterns": names,
+        "total_cost": round(total_cost, 3),
+        "objective": round(total_objective, 3),
+        "lower_bound": round(total_lower, 3) if np.isfinite(total_lower) else None,
+        "required_hours": float(residual_all["required"].sum() * slot_hours) if len(residual_all) else 0.0,
+        "residual_hours": float(residual_all["residual"].sum() * slot_hours) if len(residual_all) else 0.0,
+        "uncoverable_slots": [s for s, ok in zip(slots, coverable) if not ok],
+        "elapsed_sec": round(time.perf_counter() - t0, 3),
+    }
+    log.info(
+        f"[hire_optimizer] {demand['role'].nunique()} roles, {len(names)} patterns: "
+        f"cost={stats['total_cost']} residual={stats['residual_hours']:.1f}h "
+        f"methods={methods} ({stats['elapsed_sec']}s)"
+    )
+    return HireMixResult(
+        mix=pd.DataFrame(mix_rows, columns=["role", "weekday", "pattern", "shifts", "hours", "cost"]),
+        residual=residual_all,
+        summary=pd.DataFrame(summary_rows),
+        stats=stats,
+    )
+
+
+__all__ = [
+    "CoverSolution",
+    "HireMixResult",
+    "build_coverage_matrix",
+    "demand_from_cube",
+    "optimize_hire_mix",
+    "required_staff",
+    "solve_cover",
+]
@@ -1,5 +1,6 @@
 # shift_suite / tasks / io_excel.py
 # v2.8.0 (休暇コード明示的処理対応版)
+# v2.9.0 シート読み込みを workbook_cache 経由にし、同じファイルの再解析を省く
 # =============================================================================
 # (中略：目的、主要修正などは適宜更新)
 # =============================================================================
@@ -16,6 +17,7 @@ import pandas as pd
 
 from ..logger_config import configure_logging
 from .utils import _parse_as_date
+from .workbook_cache import open_workbook
 
 configure_logging()
 log = logging.getLogger(__name__)
@@ -178,7 +180,7 @@ def load_shift_patterns(
     # (v2.7.1案のロジックを流用)
     log.info(f"勤務区分シート読み込み開始: {sheet_name}")
     try:
-        raw = pd.read_excel(xlsx, sheet_name=sheet_name, dtype=str).fillna("")
+        raw = open_workbook(xlsx).read_sheet(sheet_name, dtype=str).fillna("")
     except FileNotFoundError as e:
         log.error("Excel file not found: %s", e)
         raise
@@ -349,16 +351,7 @@ def ingest_excel(
             if rc is None:
                 raise ValueError(f"Invalid cell: {year_month_cell_location}")
             row, col = rc
-            ym_df = pd.read_excel(
-                excel_path,
-                sheet_name=shift_sheets[0],
-                header=None,
-                skiprows=row,
-                nrows=1,
-                usecols=[col],
-                dtype=str,
-            )
-            ym_raw = str(ym_df.iloc[0, 0])
+            ym_raw = open_workbook(excel_path).cell_text(shift_sheets[0], row, col)
             log.debug(f"読み込んだ年月セルの生データ: '{ym_raw}'")
             m = re.search(r"(\d{4})年(\d{1,2})月", ym_raw)
             if m:
@@ -396,9 +389,8 @@ def ingest_excel(
     for sheet_name_actual in shift_sheets:
         try:
             log.info(f"シート処理開始: {sheet_name_actual}")
-            df_sheet = pd.read_excel(
-                excel_path,
-                sheet_name=sheet_name_actual,
+            df_sheet = open_workbook(excel_path).read_sheet(
+                sheet_name_actual,
                 header=header_row,
                 dtype=str,
             ).fillna("")
@@ -0,0 +1,440 @@
+"""
+shift_suite.tasks.need_backtest v1.0.0 – Need 算出手法のバックテスト
+────────────────────────────────────────────────────────────────
+* どの Need 算出方法 (``need_calc_method`` / ``need_stat_method`` の組み合わせ) が
+  実際の配置人数をよく予測するかを、Streamlit のパイプラインを組み合わせごとに
+  流し直さずに比較する。
+* ``ActualPivotCache`` は long_df から (時間帯 × 日付) の実績人数ピボットを 1 回だけ
+  作り、学習期間ごとの切り出しと ``need_baseline_engine`` のローリング統計を
+  全手法で共有する。
+* ``rolling_splits`` で学習期間 / 評価期間を日付軸に沿ってずらしながら分割し、
+  各分割で全手法の曜日 × 時間帯パターンを学習期間から求め、評価期間の実績と比べる。
+  休業日 (``holidays``) は build_heatmap と同じく Need 0 とし、評価から除く。
+* 分割ごとにスレッド (既定) またはプロセスで並列に評価する。プロセスの場合も
+  ピボットは initializer でワーカーごとに 1 回だけ渡す。
+* 出力: 分割 × 手法ごとの誤差 (MAE / RMSE / バイアス / WAPE / 過不足判定率) と
+  所要時間、および手法ごとの集計 (MAE 順)。
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Set
+
+import numpy as np
+import pandas as pd
+
+from .constants import DEFAULT_SLOT_MINUTES
+from .need_baseline_engine import DateSlotMatrix, RollingDowSlotStats
+from .slot_need_stats import stat_quantile
+from .utils import gen_labels, log, save_df_parquet
+
+METHOD_KINDS = ("pattern", "monthly", "manual", "adaptive", "rolling")
+METRIC_COLUMNS = ["mae", "rmse", "bias", "wape", "under_ratio", "over_ratio"]
+
+
+@dataclass(frozen=True)
+class NeedMethodSpec:
+    """
+    バックテスト対象の Need 算出方法。
+
+    kind:
+        pattern  – heatmap.calculate_pattern_based_need (曜日別パターン)
+        monthly  – heatmap.calculate_integrated_monthly_pattern_need (月次統合)
+        manual   – 人員配置基準 (``manual_values``: 人数または {時間帯: 人数})
+        adaptive – heatmap_v2.UniversalNeedCalculator (曜日に依存しない p75)
+        rolling  – 同じ曜日の直近 ``window`` 回の統計量 (need_baseline_engine)
+    """
+
+    name: str
+    kind: str = "pattern"
+    statistic_method: str = "中央値"
+    remove_outliers: bool = False
+    iqr_multiplier: float = 1.5
+    adjustment_factor: float = 1.0
+    business_hours_only: bool = True
+    window: Optional[int] = None
+    manual_values: Optional[object] = None
+
+    def __post_init__(self):
+        if self.kind not in METHOD_KINDS:
+            raise ValueError(f"unknown need method kind: {self.kind}")
+
+
+def default_method_specs(manual_values: Optional[object] = None) -> List[NeedMethodSpec]:
+    """UI で選べる組み合わせを中心にした既定の手法群"""
+    specs = [
+        NeedMethodSpec(f"pattern_{stat}{'_iqr' if outliers else ''}", "pattern", stat, remove_outliers=outliers)
+        for stat in ("中央値", "平均値", "25パーセンタイル", "10パーセンタイル")
+        for outliers in (False, True)
+    ]
+    specs += [
+        NeedMethodSpec("monthly_中央値", "monthly", "中央値"),
+        NeedMethodSpec("monthly_平均値", "monthly", "平均値"),
+        NeedMethodSpec("adaptive_p75", "adaptive"),
+        NeedMethodSpec("rolling8_中央値", "rolling", "中央値", window=8),
+    ]
+    if manual_values is not None:
+        specs.append(NeedMethodSpec("manual", "manual", manual_values=manual_values))
+    return specs
+
+
+@dataclass(frozen=True)
+class BacktestSplit:
+    """学習期間 [train_start, train_end] と評価期間 [test_start, test_end]"""
+
+    train_start: dt.date
+    train_end: dt.date
+    test_start: dt.date
+    test_end: dt.date
+
+
+def rolling_splits(
+    dates: Sequence[dt.date],
+    train_days: int = 90,
+    test_days: int = 28,
+    step_days: Optional[int] = None,
+    *,
+    expanding: bool = False,
+) -> List[BacktestSplit]:
+    """
+    日付範囲を学習 ``train_days`` 日 → 評価 ``test_days`` 日で ``step_days`` 日ずつ
+    ずらして分割する (既定は評価期間が重ならない幅)。``expanding=True`` なら
+    学習期間の開始を固定する。
+    """
+    if not dates:
+        return []
+    first, last = min(dates), max(dates)
+    step = dt.timedelta(days=step_days or test_days)
+    splits: List[BacktestSplit] = []
+    train_start = first
+    test_start = first + dt.timedelta(days=train_days)
+    while test_start <= last:
+        test_end = min(test_start + dt.timedelta(days=test_days - 1), last)
+        splits.append(
+            BacktestSplit(
+                first if expanding else train_start,
+                test_start - dt.timedelta(days=1),
+                test_start,
+                test_end,
+            )
+        )
+        train_start += step
+        test_start += step
+    return splits
+
+
+# ─────────────────────────── shared cache ───────────────────────────
+class ActualPivotCache:
+    """
+    (時間帯 × 日付) の実績人数ピボットと、そこから派生する中間結果の共有キャッシュ。
+    列は期間内の全日付 (dt.date)、勤務の無い日は 0。
+    """
+
+    def __init__(self, pivot: pd.DataFrame, slot_minutes: int, holidays: Optional[Set[dt.date]] = None):
+        self.pivot = pivot
+        self.slot_minutes = int(slot_minutes)
+        self.holidays: Set[dt.date] = set(holidays or ())
+        self.dates: List[dt.date] = list(pivot.columns)
+        self._date_pos = {d: i for i, d in enumerate(self.dates)}
+        self._rolling: Optional[RollingDowSlotStats] = None
+        self._rolling_stats: Dict[tuple, np.ndarray] = {}
+
+    @classmethod
+    def from_long_df(
+        cls,
+        long_df: pd.DataFrame,
+        slot_minutes: int = DEFAULT_SLOT_MINUTES,
+        holidays: Optional[Set[dt.date]] = None,
+    ) -> "ActualPivotCache":
+        """build_heatmap と同じく通常勤務のレコードから、日付 × 時間帯ごとの実人数を数える"""
+        from .heatmap import _filter_work_records
+
+        work = _filter_work_records(long_df)
+        ds = pd.to_datetime(work["ds"], errors="coerce")
+        ok = ds.notna() & work["staff"].notna()
+        frame = pd.DataFrame(
+            {
+                "date": ds[ok].dt.date,
+                "time": ds[ok].dt.strftime("%H:%M"),
+                "staff": work.loc[ok, "staff"],
+            }
+        )
+        all_ds = pd.to_datetime(long_df["ds"], errors="coerce").dropna()
+        labels = gen_labels(slot_minutes)
+        if all_ds.empty:
+            return cls(pd.DataFrame(index=pd.Index(labels, name="time")), slot_minutes, holidays)
+        first, last = all_ds.min().date(), all_ds.max().date()
+        all_dates = [first + dt.timedelta(days=i) for i in range((last - first).days + 1)]
+        pivot = (
+            frame.drop_duplicates()
+            .groupby(["time", "date"])["staff"]
+            .size()
+            .unstack("date", fill_value=0)
+            .reindex(index=labels, columns=all_dates, fill_value=0)
+            .astype(float)
+        )
+        pivot.index.name = "time"
+        return cls(pivot, slot_minutes, holidays)
+
+    def train_frame(self, split: BacktestSplit) -> pd.DataFrame:
+        return self.pivot.loc[:, self._period(split.train_start, split.train_end)]
+
+    def test_frame(self, split: BacktestSplit) -> pd.DataFrame:
+        return self.pivot.loc[:, self._period(split.test_start, split.test_end)]
+
+    def _period(self, start: dt.date, end: dt.date) -> List[dt.date]:
+        return [d for d in self.dates if start <= d <= end]
+
+    def rolling_stat(self, q: Optional[float], window: Optional[int]) -> np.ndarray:
+        """全日付について、それより前の同じ曜日の統計量 (日付 × 時間帯)。1 回だけ計算"""
+        key = (q, window)
+        if key not in self._rolling_stats:
+            if self._rolling is None:
+                # 休業日は標本に含めない (共有の pivot を書き換えないようコピーに NaN を入れる)
+                values = self.pivot.to_numpy(dtype=float, copy=True).T
+                matrix = DateSlotMatrix(values, self.dates, list(self.pivot.index))
+                holiday_rows = [self._date_pos[d] for d in self.holidays if d in self._date_pos]
+                matrix.values[holiday_rows] = np.nan
+                self._rolling = RollingDowSlotStats(matrix)
+            self._rolling_stats[key] = self._rolling.stat(q, window)
+        return self._rolling_stats[key]
+
+
+# ─────────────────────────── methods ───────────────────────────
+def _dow_pattern(spec: NeedMethodSpec, cache: ActualPivotCache, split: BacktestSplit) -> pd.DataFrame:
+    """学習期間から (時間帯 × 曜日 0-6) の Need パターンを求める"""
+    from .heatmap import calculate_integrated_monthly_pattern_need, calculate_pattern_based_need
+    from .heatmap_v2 import UniversalNeedCalculator
+
+    index = cache.pivot.index
+    if spec.kind == "pattern":
+        return calculate_pattern_based_need(
+            cache.train_frame(split),
+            split.train_start,
+            split.train_end,
+            spec.statistic_method,
+            spec.remove_outliers,
+            spec.iqr_multiplier,
+            slot_minutes_for_empty=cache.slot_minutes,
+            holidays=cache.holidays,
+            adjustment_factor=spec.adjustment_factor,
+        )
+    if spec.kind == "monthly":
+        return calculate_integrated_monthly_pattern_need(
+            cache.train_frame(split),
+            split.train_start,
+            split.train_end,
+            spec.statistic_method,
+            spec.remove_outliers,
+            spec.iqr_multiplier,
+            slot_minutes_for_empty=cache.slot_minutes,
+            holidays=cache.holidays,
+            adjustment_factor=spec.adjustment_factor,
+            business_hours_only=spec.business_hours_only,
+        )
+    if spec.kind == "adaptive":
+        train = cache.train_frame(split).drop(columns=[d for d in cache.holidays if d in cache.pivot.columns], errors="ignore")
+        need = UniversalNeedCalculator().calculate_dynamic_need(train, list(train.columns))
+        per_slot = need.iloc[:, 0] if need.shape[1] else pd.Series(0.0, index=index)
+        return pd.DataFrame({dow: per_slot.to_numpy() for dow in range(7)}, index=index)
+    if spec.kind == "manual":
+        values = spec.manual_values
+        if isinstance(values, dict):
+            per_slot = pd.Series(values, dtype=float).reindex(index).fillna(0.0).to_numpy()
+        else:
+            per_slot = np.full(len(index), float(values or 0.0))
+        return pd.DataFrame({dow: per_slot for dow in range(7)}, index=index)
+
+    # rolling: 各曜日の評価期間最初の日の値 = 学習期間末尾の同じ曜日 window 回分
+    stat = cache.rolling_stat(stat_quantile(spec.statistic_method), spec.window)
+    pattern = pd.DataFrame(0.0, index=index, columns=range(7))
+    for d in cache._period(split.test_start, min(split.test_end, split.test_start + dt.timedelta(days=6))):
+        values = stat[cache._date_pos[d]] * spec.adjustment_factor
+        pattern[d.weekday()] = np.round(np.nan_to_num(values, nan=0.0))
+    return pattern
+
+
+def _error_metrics(pred: np.ndarray, actual: np.ndarray) -> Dict[str, float]:
+    if pred.size == 0:
+        return {name: np.nan for name in METRIC_COLUMNS}
+    err = pred - actual
+    total = actual.sum()
+    return {
+        "mae": float(np.abs(err).mean()),
+        "rmse": float(np.sqrt((err ** 2).mean())),
+        "bias": float(err.mean()),
+        "wape": float(np.abs(err).sum() / total) if total > 0 else np.nan,
+        # Need > 実績 (不足と判定される) / Need < 実績 (過剰と判定される) セルの割合
+        "under_ratio": float((err > 0).mean()),
+        "over_ratio": float((err < 0).mean()),
+    }
+
+
+def _evaluate_split(
+    cache: ActualPivotCache, split: BacktestSplit, specs: Sequence[NeedMethodSpec]
+) -> List[dict]:
+    test = cache.test_frame(split)
+    test = test.loc[:, [d for d in test.columns if d not in cache.holidays]]
+    actual = test.to_numpy(dtype=float)
+    test_dows = np.array([d.weekday() for d in test.columns], dtype=np.int64)
+    rows = []
+    for spec in specs:
+        started = time.perf_counter()
+        error = ""
+        try:
+            pattern = _dow_pattern(spec, cache, split)
+            pattern = pattern.reindex(index=cache.pivot.index, columns=range(7)).fillna(0.0)
+            pred = pattern.to_numpy(dtype=float)[:, test_dows]
+            metrics = _error_metrics(pred, actual)
+        except Exception as e:  # 1 手法の失敗で全体を止めない
+            log.warning(f"[need_backtest] {spec.name} {split.test_start}: {e}")
+            metrics = {name: np.nan for name in METRIC_COLUMNS}
+            error = str(e)
+        rows.append(
+            {
+                "method": spec.name,
+                "kind": spec.kind,
+                "train_start": split.train_start,
+                "train_end": split.train_end,
+                "test_start": split.test_start,
+                "test_end": split.test_end,
+                "test_days": int(actual.shape[1]),
+                **metrics,
+                "runtime_sec": time.perf_counter() - started,
+                "error": error,
+            }
+        )
+    return rows
+
+
+# プロセス並列時にワーカーごとに 1 回だけ受け取るキャッシュ
+_WORKER_CACHE: Optional[ActualPivotCache] = None
+
+
+def _init_worker(cache: ActualPivotCache) -> None:
+    global _WORKER_CACHE
+    _WORKER_CACHE = cache
+    logging.getLogger().setLevel(logging.WARNING)
+
+
+def _evaluate_split_in_worker(split: BacktestSplit, specs: Sequence[NeedMethodSpec]) -> List[dict]:
+    return _evaluate_split(_WORKER_CACHE, split, specs)
+
+
+def _resolve_n_jobs(n_jobs: Optional[int]) -> int:
+    cpus = os.cpu_count() or 1
+    if n_jobs is None or n_jobs == 0:
+        return 1
+    if n_jobs < 0:
+        return max(1, cpus + 1 + n_jobs)
+    return min(n_jobs, cpus)
+
+
+# ─────────────────────────── run ───────────────────────────
+@dataclass
+class NeedBacktestResult:
+    metrics: pd.DataFrame
+    summary: pd.DataFrame
+    splits: List[BacktestSplit] = field(default_factory=list)
+    elapsed_sec: float = 0.0
+
+
+def summarize_backtest(metrics: pd.DataFrame) -> pd.DataFrame:
+    """手法ごとの平均誤差と合計所要時間 (MAE の小さい順)"""
+    if metrics.empty:
+        return pd.DataFrame(columns=["method", "kind", *METRIC_COLUMNS, "runtime_sec", "n_splits", "n_failed"])
+    grouped = metrics.groupby(["method", "kind"], sort=False)
+    summary = grouped[METRIC_COLUMNS].mean()
+    summary["runtime_sec"] = grouped["runtime_sec"].sum()
+    summary["n_splits"] = grouped.size()
+    summary["n_failed"] = grouped["error"].agg(lambda s: int((s != "").sum()))
+    summary = summary.reset_index().sort_values("mae", na_position="last").reset_index(drop=True)
+    summary.insert(0, "rank", np.arange(1, len(summary) + 1))
+    return summary
+
+
+def run_need_backtest(
+    long_df: Optional[pd.DataFrame] = None,
+    *,
+    slot_minutes: int = DEFAULT_SLOT_MINUTES,
+    cache: Optional[ActualPivotCache] = None,
+    methods: Optional[Sequence[NeedMethodSpec]] = None,
+    train_days: int = 90,
+    test_days: int = 28,
+    step_days: Optional[int] = None,
+    expanding: bool = False,
+    holidays: Optional[Set[dt.date]] = None,
+    n_jobs: Optional[int] = -1,
+    use_processes: bool = False,
+    out_dir: Optional[str | Path] = None,
+) -> NeedBacktestResult:
+    """
+    全手法 × 全分割のバックテストを行う。``cache`` を渡した場合は long_df は不要。
+    ``out_dir`` を渡すと need_backtest.parquet / need_backtest_summary.parquet を書き出す。
+    """
+    started = time.perf_counter()
+    if cache is None:
+        if long_df is None:
+            raise ValueError("long_df or cache is required")
+        cache = ActualPivotCache.from_long_df(long_df, slot_minutes, holidays)
+    specs = list(methods) if methods is not None else default_method_specs()
+    splits = rolling_splits(cache.dates, train_days, test_days, step_days, expanding=expanding)
+    log.info(f"[need_backtest] 手法数={len(specs)}, 分割数={len(splits)}, 日数={len(cache.dates)}")
+
+    if any(spec.kind == "rolling" for spec in specs):
+        # 共有するローリング統計はワーカーに渡す前に作っておく
+        for spec in specs:
+            if spec.kind == "rolling":
+                cache.rolling_stat(stat_quantile(spec.statistic_method), spec.window)
+
+    workers = min(_resolve_n_jobs(n_jobs), max(len(splits), 1))
+    rows: List[dict] = []
+    if workers <= 1:
+        for split in splits:
+            rows.extend(_evaluate_split(cache, split, specs))
+    elif use_processes:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cache,)) as pool:
+            for part in pool.map(_evaluate_split_in_worker, splits, [specs] * len(splits)):
+                rows.extend(part)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for part in pool.map(lambda split: _evaluate_split(cache, split, specs), splits):
+                rows.extend(part)
+
+    metrics = pd.DataFrame(rows)
+    result = NeedBacktestResult(metrics, summarize_backtest(metrics), splits, time.perf_counter() - started)
+    log.info(f"[need_backtest] 完了: {result.elapsed_sec:.1f}s")
+    if out_dir is not None:
+        write_need_backtest(result, out_dir)
+    return result
+
+
+def write_need_backtest(result: NeedBacktestResult, out_dir: str | Path) -> Path:
+    out_path = Path(out_dir)
+    metrics = result.metrics.copy()
+    for col in ("train_start", "train_end", "test_start", "test_end"):
+        if col in metrics:
+            metrics[col] = pd.to_datetime(metrics[col])
+    save_df_parquet(metrics, out_path / "need_backtest.parquet", index=False)
+    return save_df_parquet(result.summary, out_path / "need_backtest_summary.parquet", index=False)
+
+
+__all__ = [
+    "ActualPivotCache",
+    "BacktestSplit",
+    "METHOD_KINDS",
+    "NeedBacktestResult",
+    "NeedMethodSpec",
+    "default_method_specs",
+    "rolling_splits",
+    "run_need_backtest",
+    "summarize_backtest",
+    "write_need_backtest",
+]
@@ -0,0 +1,292 @@
+"""
+shift_suite.tasks.need_baseline_engine v1.0.0 – 日付軸に沿ったローリング / 拡張統計
+────────────────────────────────────────────────────────────────
+* 月次統合パターン (``heatmap.calculate_integrated_monthly_pattern_need``) や
+  ``heatmap_v2.UniversalNeedCalculator`` は月・日付・スロットごとに列を探し直し、
+  その都度統計量を計算していた。対象日ごとに Need を出すと日数に比例して
+  全体を再計算することになる。
+* ``DateSlotMatrix`` は (スロット × 日付) の横持ち表を日付昇順の (日付 × スロット)
+  配列にする (欠損は NaN)。
+* ``RollingDowSlotStats`` は日付を (曜日, 日付) 順に並べ替え、曜日ごとの系列が
+  連続するようにしたうえで
+    - 累積和 / 累積二乗和 / 累積件数 → 任意の窓の平均・標準偏差を O(1)
+    - 整数値なら累積ヒストグラム → 任意の窓の分位点を値域の走査だけで
+      (整数でない場合は窓をまとめて 1 回ソート)
+  を前計算する。全対象日の「その日より前の同じ曜日 (直近 window 回分 / 全期間)」の
+  統計量が 1 回の走査で得られるので、1 年分の日付で Need をバックテストしても
+  1 日分を計算するのとほぼ同じコストで済む。
+* ``grouped_slot_stats`` は (月, 曜日) などのグループごとの統計量を
+  パディングした配列の 1 回のソートで求める。
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Sequence, Set
+
+import numpy as np
+import pandas as pd
+
+from .slot_need_stats import SortedSamples
+from .utils import date_columns
+
+# ヒストグラム方式を使う値域の上限 (これを超える整数値はソート方式)
+MAX_HISTOGRAM_BINS = 512
+
+
+@dataclass
+class DateSlotMatrix:
+    """日付昇順の (日付 × スロット) 値。欠損は NaN"""
+
+    values: np.ndarray
+    dates: List[dt.date]
+    slots: List
+
+    @classmethod
+    def from_frame(
+        cls,
+        df: pd.DataFrame,
+        *,
+        slots: Optional[Sequence] = None,
+        holidays: Optional[Set[dt.date]] = None,
+        all_dates: Optional[Iterable[dt.date]] = None,
+        start: Optional[dt.date] = None,
+        end: Optional[dt.date] = None,
+    ) -> "DateSlotMatrix":
+        """
+        (スロット × 日付列) の表から作る。日付として解釈できない列は無視し、
+        ``holidays`` の日付と [start, end] 外の日付は除く。``all_dates`` を渡すと
+        実績列の無い日付を 0 の列として補う。
+        """
+        holidays = set(holidays or ())
+        col_dates = {
+            col: d
+            for col, d in date_columns(df.columns).items()
+            if d not in holidays and (start is None or d >= start) and (end is None or d <= end)
+        }
+        by_date = {}
+        for col, d in col_dates.items():
+            by_date.setdefault(d, col)
+        if all_dates is not None:
+            for d in all_dates:
+                if isinstance(d, dt.date) and d not in holidays and (start is None or d >= start) and (end is None or d <= end):
+                    by_date.setdefault(d, None)
+        dates = sorted(by_date)
+        frame = df if slots is None else df.reindex(list(slots))
+        values = np.zeros((len(dates), len(frame.index)))
+        for i, d in enumerate(dates):
+            col = by_date[d]
+            if col is not None:
+                values[i] = pd.to_numeric(frame[col], errors="coerce").to_numpy(dtype=float)
+        return cls(values, dates, list(frame.index))
+
+    @property
+    def weekdays(self) -> np.ndarray:
+        return np.array([d.weekday() for d in self.dates], dtype=np.int64)
+
+    @property
+    def month_keys(self) -> np.ndarray:
+        return np.array([d.year * 12 + d.month - 1 for d in self.dates], dtype=np.int64)
+
+    def frame(self, values: np.ndarray) -> pd.DataFrame:
+        """(日付 × スロット) の配列を (スロット × 日付) の DataFrame にする"""
+        return pd.DataFrame(np.asarray(values).T, index=self.slots, columns=self.dates)
+
+
+# ─────────────────────────── grouped ───────────────────────────
+def _padded_groups(values: np.ndarray, group_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(日付 × スロット) をグループごとに (最大件数 × (グループ × スロット)) へ NaN 埋めで並べる"""
+    uniq, inverse = np.unique(group_ids, return_inverse=True)
+    order = np.argsort(inverse, kind="stable")
+    sizes = np.bincount(inverse, minlength=len(uniq))
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    rank = np.arange(len(order)) - np.repeat(starts, sizes)
+    n_slots = values.shape[1]
+    padded = np.full((int(sizes.max(initial=0)), len(uniq), n_slots), np.nan)
+    padded[rank, inverse[order]] = values[order]
+    return uniq, padded.reshape(padded.shape[0], -1)
+
+
+def grouped_slot_stats(
+    matrix: DateSlotMatrix,
+    group_ids: np.ndarray,
+    stat: Optional[float] = 0.5,
+    *,
+    mean_below: int = 0,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    グループごと × スロットの統計量 (欠損は標本に含めない)。
+
+    stat が None なら平均、数値ならその分位点。``mean_below`` 以下の標本数の
+    セルは平均を使う (少数データでは中央値より平均を使う月次パターンの規則)。
+
+    Returns
+    -------
+    (group_keys, values)
+        values は (グループ数 × スロット数)、標本の無いセルは NaN
+    """
+    n_slots = matrix.values.shape[1]
+    if matrix.values.shape[0] == 0:
+        return np.array([], dtype=np.int64), np.zeros((0, n_slots))
+    keys, padded = _padded_groups(matrix.values, np.asarray(group_ids))
+    samples = SortedSamples(padded)
+    out = samples.stat(stat)
+    if mean_below > 0 and stat is not None:
+        out = np.where(samples.count <= mean_below, samples.mean(), out)
+    return keys, out.reshape(len(keys), n_slots)
+
+
+# ─────────────────────────── rolling / expanding ───────────────────────────
+class RollingDowSlotStats:
+    """
+    対象日ごとに「それより前の同じ曜日」(``by_dow=False`` なら全日付) の
+    スロット別統計量を返す。``window`` は直近の観測回数 (None は全期間 = 拡張窓)。
+    ``include_current=True`` なら対象日自身も窓に含める。
+    """
+
+    def __init__(self, matrix: DateSlotMatrix, *, by_dow: bool = True):
+        self.matrix = matrix
+        n = len(matrix.dates)
+        keys = matrix.weekdays if by_dow else np.zeros(n, dtype=np.int64)
+        # (曜日, 日付) 順。同じ曜日の系列が連続する
+        self.order = np.lexsort((np.arange(n), keys))
+        self.inverse = np.empty(n, dtype=np.int64)
+        self.inverse[self.order] = np.arange(n)
+        sorted_keys = keys[self.order]
+        change = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]] if n else np.array([], dtype=bool)
+        self.group_start = np.maximum.accumulate(np.where(change, np.arange(n), 0)) if n else np.array([], dtype=np.int64)
+
+        self.sorted_values = matrix.values[self.order]
+        valid = ~np.isnan(self.sorted_values)
+        filled = np.where(valid, self.sorted_values, 0.0)
+        zeros = np.zeros((1, self.sorted_values.shape[1]))
+        self._count = np.vstack([zeros, np.cumsum(valid, axis=0)])
+        self._sum = np.vstack([zeros, np.cumsum(filled, axis=0)])
+        self._sumsq = np.vstack([zeros, np.cumsum(filled * filled, axis=0)])
+        self._hist: Optional[np.ndarray] = None
+        self._hist_ready = False
+
+    # ---- 窓 ------------------------------------------------------------------
+    def bounds(self, window: Optional[int] = None, *, include_current: bool = False) -> tuple[np.ndarray, np.ndarray]:
+        """並べ替え後の位置での各対象日の窓 [lo, hi)"""
+        pos = np.arange(len(self.order))
+        hi = pos + 1 if include_current else pos
+        lo = self.group_start.copy()
+        if window is not None:
+            lo = np.maximum(lo, hi - int(window))
+        return lo, hi
+
+    def _to_dates(self, values: np.ndarray) -> np.ndarray:
+        return values[self.inverse]
+
+    def count(self, window: Optional[int] = None, *, include_current: bool = False) -> np.ndarray:
+        lo, hi = self.bounds(window, include_current=include_current)
+        return self._to_dates(self._count[hi] - self._count[lo])
+
+    def mean(self, window: Optional[int] = None, *, include_current: bool = False, min_periods: int = 1) -> np.ndarray:
+        lo, hi = self.bounds(window, include_current=include_current)
+        n = self._count[hi] - self._count[lo]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out = (self._sum[hi] - self._sum[lo]) / n
+        return self._to_dates(np.where(n >= max(min_periods, 1), out, np.nan))
+
+    def std(self, window: Optional[int] = None, *, include_current: bool = False, ddof: int = 1, min_periods: int = 2) -> np.ndarray:
+        lo, hi = self.bounds(window, include_current=include_current)
+        n = self._count[hi] - self._count[lo]
+        s = self._sum[hi] - self._sum[lo]
+        ss = self._sumsq[hi] - self._sumsq[lo]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            var = np.maximum(ss - s * s / n, 0.0) / (n - ddof)
+        return self._to_dates(np.where(n >= max(min_periods, ddof + 1), np.sqrt(var), np.nan))
+
+    # ---- 分位点 -------------------------------------------------------------
+    def _histogram(self) -> Optional[np.ndarray]:
+        """値が 0 以上の整数で値域が小さければ累積ヒストグラム (n+1, スロット, 値域)"""
+        if self._hist_ready:
+            return self._hist
+        self._hist_ready = True
+        vals = self.sorted_values
+        finite = vals[~np.isnan(vals)]
+        if finite.size == 0 or finite.min() < 0 or not np.all(finite == np.round(finite)):
+            return None
+        n_bins = int(finite.max()) + 1
+        if n_bins > MAX_HISTOGRAM_BINS:
+            return None
+        n, n_slots = vals.shape
+        onehot = np.zeros((n, n_slots, n_bins), dtype=np.int32)
+        rows, cols = np.nonzero(~np.isnan(vals))
+        onehot[rows, cols, vals[rows, cols].astype(np.int64)] = 1
+        self._hist = np.concatenate(
+            [np.zeros((1, n_slots, n_bins), dtype=np.int32), np.cumsum(onehot, axis=0, dtype=np.int32)]
+        )
+        return self._hist
+
+    def quantile(
+        self,
+        q: float,
+        window: Optional[int] = None,
+        *,
+        include_current: bool = False,
+        min_periods: int = 1,
+    ) -> np.ndarray:
+        """各対象日の窓の分位点 (linear 補間)。(日付 × スロット)"""
+        lo, hi = self.bounds(window, include_current=include_current)
+        n = self._count[hi] - self._count[lo]
+        hist = self._histogram()
+        if hist is not None:
+            window_hist = hist[hi] - hist[lo]
+            cum = np.cumsum(window_hist, axis=2)
+            pos = q * np.maximum(n - 1, 0)
+            r_lo = np.floor(pos)
+            r_hi = np.minimum(r_lo + 1, np.maximum(n - 1, 0))
+            v_lo = (cum <= r_lo[..., None]).sum(axis=2)
+            v_hi = (cum <= r_hi[..., None]).sum(axis=2)
+            out = v_lo + (v_hi - v_lo) * (pos - r_lo)
+        else:
+            out = self._quantile_sorted(q, lo, hi)
+        return self._to_dates(np.where(n >= max(min_periods, 1), out, np.nan))
+
+    def _quantile_sorted(self, q: float, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+        """窓を NaN 埋めで並べ、まとめて 1 回ソートする"""
+        n_dates, n_slots = self.sorted_values.shape
+        width = int((hi - lo).max(initial=0))
+        if width == 0:
+            return np.full((n_dates, n_slots), np.nan)
+        idx = lo[:, None] + np.arange(width)[None, :]
+        inside = idx < hi[:, None]
+        gathered = self.sorted_values[np.where(inside, idx, 0)]
+        gathered[~inside] = np.nan
+        samples = SortedSamples(gathered.transpose(1, 0, 2).reshape(width, -1))
+        return samples.quantile(q).reshape(n_dates, n_slots)
+
+    def stat(self, q: Optional[float], window: Optional[int] = None, **kwargs) -> np.ndarray:
+        return self.mean(window, **kwargs) if q is None else self.quantile(q, window, **kwargs)
+
+
+def rolling_need(
+    df: pd.DataFrame,
+    q: Optional[float] = 0.5,
+    window: Optional[int] = None,
+    *,
+    by_dow: bool = True,
+    include_current: bool = False,
+    min_periods: int = 1,
+    holidays: Optional[Set[dt.date]] = None,
+    all_dates: Optional[Iterable[dt.date]] = None,
+) -> pd.DataFrame:
+    """
+    (スロット × 日付) の実績から、各日付の「それ以前の同じ曜日」に基づく Need を
+    (スロット × 日付) で返す。窓に標本が無い日は NaN。
+    """
+    matrix = DateSlotMatrix.from_frame(df, holidays=holidays, all_dates=all_dates)
+    engine = RollingDowSlotStats(matrix, by_dow=by_dow)
+    return matrix.frame(engine.stat(q, window, include_current=include_current, min_periods=min_periods))
+
+
+__all__ = [
+    "DateSlotMatrix",
+    "RollingDowSlotStats",
+    "grouped_slot_stats",
+    "rolling_need",
+]
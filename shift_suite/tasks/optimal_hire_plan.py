@@ -1,5 +1,7 @@
 from __future__ import annotations
+import json
 from pathlib import Path
+import numpy as np
 import pandas as pd
 import logging
 from ..logger_config import configure_logging
@@ -137,20 +139,11 @@ def _extract_patterns_from_data(out_dir: Path) -> dict[str, set[str]] | None:
         return None
 
 
-def create_optimal_hire_plan(
-    out_dir: Path,
-    original_excel_path: Path | None = None,
-    top_n_shortages: int = 5,
-) -> Path | None:
-    """不足分析の結果と勤務区分マスターを突き合わせ、最適な採用計画を生成する。"""
-    log.info("最適採用計画の生成を開始します。")
+def _demand_from_summary(out_dir: Path) -> pd.DataFrame | None:
+    """キューブが無い場合: 全体の曜日 × 時間帯平均不足を最も不足している職種に割り当てる"""
     shortage_summary_fp = out_dir / "shortage_weekday_timeslot_summary.parquet"
     shortage_role_fp = out_dir / "shortage_role_summary.parquet"
-
     if not shortage_summary_fp.exists() or not shortage_role_fp.exists():
-        log.warning(
-            "不足分析のサマリーファイルが見つからないため、最適採用計画を生成できません。"
-        )
         return None
 
     role_shortage = pd.read_parquet(shortage_role_fp)
@@ -164,40 +157,114 @@ def create_optimal_hire_plan(
     most_lacking_role = role_shortage.loc[role_shortage["lack_h"].idxmax()]["role"]
 
     df = pd.read_parquet(shortage_summary_fp)
-    top_shortages = df.nlargest(top_n_shortages, "avg_count")
+    return pd.DataFrame(
+        {
+            "role": most_lacking_role,
+            "weekday": df["weekday"].astype(str),
+            "slot": df["timeslot"].astype(str),
+            "lack": pd.to_numeric(df["avg_count"], errors="coerce").fillna(0).clip(lower=0),
+        }
+    )
+
+
+def create_optimal_hire_plan(
+    out_dir: Path,
+    original_excel_path: Path | None = None,
+    top_n_shortages: int = 5,
+    *,
+    shortage_penalty: float | None = None,
+    workdays_per_week: float = 5.0,
+    method: str = "auto",
+) -> Path | None:
+    """不足分析の結果と勤務区分マスターを突き合わせ、最適な採用計画を生成する。
+
+    職種 × 曜日 × スロットの不足を勤務パターンの組み合わせで被覆する
+    最小コスト問題として解き (``hire_optimizer.optimize_hire_mix``)、
+    勤務パターンごとの推奨採用人数を ``optimal_hire_plan.parquet`` に、
+    曜日別の勤務回数を ``optimal_hire_mix.parquet`` に、
+    採用後も残る不足を ``optimal_hire_residual.parquet`` に保存する。
+    ``top_n_shortages`` は各パターンの「主な不足時間帯」に挙げるスロット数。
+    """
+    from .hire_optimizer import build_coverage_matrix, demand_from_cube, optimize_hire_mix
+    from .shortage_cube import load_shortage_cube
+
+    log.info("最適採用計画の生成を開始します。")
+    cube = load_shortage_cube(out_dir)
+    if cube is not None and cube.keys("role"):
+        demand = demand_from_cube(cube)
+        slot_minutes = cube.slot_minutes
+    else:
+        demand = _demand_from_summary(out_dir)
+        from .constants import DEFAULT_SLOT_MINUTES
+
+        slot_minutes = DEFAULT_SLOT_MINUTES
+    if demand is None or demand.empty:
+        log.warning(
+            "不足分析のサマリーファイルが見つからないため、最適採用計画を生成できません。"
+        )
+        return None
 
     shift_patterns = _get_shift_pattern_hours(original_excel_path, out_dir=out_dir)
     if not shift_patterns:
         log.warning("勤務区分の定義が読み込めませんでした。")
         return None
 
-    recommendations = []
-    for _, row in top_shortages.iterrows():
-        shortage_slot = row["timeslot"]
-        best_pattern_name = None
-        for pattern_name, pattern_slots in shift_patterns.items():
-            if shortage_slot in pattern_slots:
-                best_pattern_name = pattern_name
-                break
-        if best_pattern_name:
-            recommendations.append(
-                {
-                    "推奨職種": most_lacking_role,
-                    "推奨勤務区分": best_pattern_name,
-                    "主な不足曜日": row["weekday"],
-                    "主な不足時間帯": shortage_slot,
-                    "平均不足人数": round(row["avg_count"], 1),
-                    "推奨採用人数": int(-(-row["avg_count"] // 1)),
-                }
-            )
-
-    if not recommendations:
+    result = optimize_hire_mix(
+        demand,
+        shift_patterns,
+        slot_minutes=slot_minutes,
+        shortage_penalty=shortage_penalty,
+        workdays_per_week=workdays_per_week,
+        method=method,
+    )
+    if result.summary.empty:
         log.info("具体的な採用推奨事項は見つかりませんでした。")
         return None
 
-    result_df = pd.DataFrame(recommendations).drop_duplicates().reset_index(drop=True)
+    mix = result.mix
+    residual = result.residual
+    # 「主な不足時間帯」は各パターン自身の被覆列 A[:, p] に含まれるスロットに限る
+    # (covered > 0 は他パターンの被覆も含むため、夜勤に日中スロットが混ざる)
+    slots = list(dict.fromkeys(residual["slot"].astype(str)))
+    A, names, _ = build_coverage_matrix(shift_patterns, slots, slot_minutes)
+    pattern_slot_sets = {
+        name: {slots[i] for i in np.flatnonzero(A[:, p])} for p, name in enumerate(names)
+    }
+    recommendations = []
+    for row in result.summary.itertuples(index=False):
+        used = mix[(mix["role"] == row.role) & (mix["pattern"] == row.pattern)]
+        covered = residual[
+            (residual["role"] == row.role)
+            & residual["weekday"].isin(used["weekday"])
+            & residual["slot"].astype(str).isin(pattern_slot_sets.get(row.pattern, set()))
+            & (residual["lack"] > 0)
+        ]
+        pattern_slots = covered.groupby("slot")["lack"].mean().nlargest(top_n_shortages)
+        recommendations.append(
+            {
+                "推奨職種": row.role,
+                "推奨勤務区分": row.pattern,
+                "主な不足曜日": "・".join(row.weekdays),
+                "主な不足時間帯": "・".join(sorted(pattern_slots.index)),
+                "平均不足人数": round(float(covered["lack"].mean()), 1) if not covered.empty else 0.0,
+                "推奨採用人数": int(row.hires),
+                "週あたり勤務回数": int(row.weekly_shifts),
+                "勤務時間(h)": round(float(row.hours), 2),
+                "採用後残存不足時間(h)": round(float(row.role_residual_hours), 1),
+            }
+        )
+
+    result_df = pd.DataFrame(recommendations).reset_index(drop=True)
     out_fp = out_dir / "optimal_hire_plan.parquet"
     result_df.to_parquet(out_fp, index=False)
-    log.info(f"最適採用計画を {out_fp} に保存しました。")
+    mix.to_parquet(out_dir / "optimal_hire_mix.parquet", index=False)
+    residual.to_parquet(out_dir / "optimal_hire_residual.parquet", index=False)
+    (out_dir / "optimal_hire_plan.meta.json").write_text(
+        json.dumps(result.stats, ensure_ascii=False, indent=2, default=str), encoding="utf-8"
+    )
+    log.info(
+        f"最適採用計画を {out_fp} に保存しました。"
+        f" (採用 {int(result_df['推奨採用人数'].sum())} 人, 残存不足 {result.stats['residual_hours']:.1f}h)"
+    )
 
     return out_fp
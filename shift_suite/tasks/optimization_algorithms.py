@@ -10,8 +10,202 @@ import math
 import random
 from typing import Dict, List, Any, Optional, Tuple
 import warnings
+
+import numpy as np
+
 warnings.filterwarnings('ignore')
 
+REGULAR_HOURS = 40
+MAX_OVERTIME_HOURS = 20
+COST_BASELINE = 10000
+
+
+class FitnessModel:
+    """配列表現の解に対する適応度モデル
+
+    解はベクトル ``[hours(n_staff), satisfaction(n_staff), coverage(n_demand)]`` で表し、
+    目的関数の各成分（コスト・カバレッジ・残業・満足度・ペナルティ）の合計値を
+    キャッシュする。1 遺伝子だけを変える近傍移動は ``delta`` で O(1) 評価でき、
+    GA / PSO の集団は ``evaluate_batch`` で一括評価する。
+    """
+
+    def __init__(self, staff_data: List[Dict], demand_data: List[Dict], objectives: Dict[str, float]):
+        self.staff_ids = [staff['id'] for staff in staff_data]
+        self.time_slots = [demand['time_slot'] for demand in demand_data]
+        self.n_staff = len(staff_data)
+        self.n_demand = len(demand_data)
+        self.size = 2 * self.n_staff + self.n_demand
+
+        self.hourly_rate = np.array([staff['hourly_rate'] for staff in staff_data], dtype=float)
+        self.overtime_multiplier = np.array(
+            [staff.get('overtime_multiplier', 1.25) for staff in staff_data], dtype=float
+        )
+        self.max_hours = np.array([staff.get('max_hours_per_week', 40) for staff in staff_data], dtype=float)
+        self.satisfaction_weight = np.array(
+            [staff.get('satisfaction_weight', 1.0) for staff in staff_data], dtype=float
+        )
+        self.required_staff = np.array([demand['required_staff'] for demand in demand_data], dtype=float)
+        self.demand_intensity = np.array(
+            [demand.get('demand_intensity', 1.0) for demand in demand_data], dtype=float
+        )
+
+        self.hours_slice = slice(0, self.n_staff)
+        self.satisfaction_slice = slice(self.n_staff, 2 * self.n_staff)
+        self.coverage_slice = slice(2 * self.n_staff, self.size)
+
+        # 遺伝子ごとの種別（0: hours, 1: satisfaction, 2: coverage）
+        self.gene_kind = np.concatenate([
+            np.zeros(self.n_staff, dtype=np.int8),
+            np.ones(self.n_staff, dtype=np.int8),
+            np.full(self.n_demand, 2, dtype=np.int8),
+        ])
+        self.lower = np.zeros(self.size)
+        self.upper = np.concatenate([
+            self.max_hours * 1.5,
+            np.ones(self.n_staff),
+            self.required_staff * 2,
+        ])
+
+        self.weights = np.array([
+            objectives['minimize_cost'],
+            objectives['maximize_coverage'],
+            objectives['minimize_overtime'],
+            objectives['maximize_satisfaction'],
+        ])
+        self.total_intensity = float(self.demand_intensity.sum())
+        self.total_satisfaction_weight = float(self.satisfaction_weight.sum())
+        self.max_possible_overtime = MAX_OVERTIME_HOURS * self.n_staff
+
+    # ---- 符号化 ----
+    def encode(self, solution: Dict) -> np.ndarray:
+        """dict 形式の解をベクトルに変換"""
+        vec = np.zeros(self.size)
+        for i, staff_id in enumerate(self.staff_ids):
+            vec[i] = solution.get(f"{staff_id}_hours", 0)
+            vec[self.n_staff + i] = solution.get(f"{staff_id}_satisfaction", 0.7)
+        for j, time_slot in enumerate(self.time_slots):
+            vec[2 * self.n_staff + j] = solution.get(f"coverage_{time_slot}", 0)
+        return vec
+
+    def decode(self, vec: np.ndarray) -> Dict:
+        """ベクトルを dict 形式の解に戻す"""
+        solution = {}
+        for i, staff_id in enumerate(self.staff_ids):
+            solution[f"{staff_id}_hours"] = float(vec[i])
+            solution[f"{staff_id}_satisfaction"] = float(vec[self.n_staff + i])
+        for j, time_slot in enumerate(self.time_slots):
+            solution[f"coverage_{time_slot}"] = float(vec[2 * self.n_staff + j])
+        return solution
+
+    # ---- 成分計算 ----
+    def _staff_cost(self, hours: np.ndarray, idx: Any = slice(None)) -> np.ndarray:
+        regular = np.minimum(hours, REGULAR_HOURS)
+        overtime = np.maximum(0, hours - REGULAR_HOURS)
+        return regular * self.hourly_rate[idx] + overtime * self.hourly_rate[idx] * self.overtime_multiplier[idx]
+
+    def _coverage_ratio(self, coverage: np.ndarray, idx: Any = slice(None)) -> np.ndarray:
+        required = self.required_staff[idx]
+        safe_required = np.where(required > 0, required, 1.0)
+        return np.where(required > 0, np.minimum(1.0, coverage / safe_required), 1.0)
+
+    def component_sums(self, population: np.ndarray) -> np.ndarray:
+        """解（または解の集団）の成分合計を返す
+
+        列は ``[total_cost, weighted_coverage, total_overtime, weighted_satisfaction,
+        hours_penalty, coverage_penalty]``。
+        """
+        pop = np.atleast_2d(population)
+        hours = pop[:, self.hours_slice]
+        satisfaction = pop[:, self.satisfaction_slice]
+        coverage = pop[:, self.coverage_slice]
+        return np.column_stack([
+            self._staff_cost(hours).sum(axis=1),
+            (self._coverage_ratio(coverage) * self.demand_intensity).sum(axis=1),
+            np.maximum(0, hours - REGULAR_HOURS).sum(axis=1),
+            (satisfaction * self.satisfaction_weight).sum(axis=1),
+            (np.maximum(0, hours - self.max_hours) * 0.1).sum(axis=1),
+            (np.maximum(0, self.required_staff - coverage) * 0.2).sum(axis=1),
+        ])
+
+    def fitness_from_sums(self, sums: np.ndarray) -> np.ndarray:
+        """成分合計から適応度を計算"""
+        sums = np.atleast_2d(sums)
+        cost_score = np.maximum(0, COST_BASELINE - sums[:, 0]) / COST_BASELINE
+        coverage_score = sums[:, 1] / self.total_intensity if self.total_intensity > 0 else np.zeros(len(sums))
+        if self.max_possible_overtime > 0:
+            overtime_score = np.maximum(0, 1.0 - sums[:, 2] / self.max_possible_overtime)
+        else:
+            overtime_score = np.ones(len(sums))
+        if self.total_satisfaction_weight > 0:
+            satisfaction_score = sums[:, 3] / self.total_satisfaction_weight
+        else:
+            satisfaction_score = np.zeros(len(sums))
+        scores = np.column_stack([cost_score, coverage_score, overtime_score, satisfaction_score])
+        return np.maximum(0, scores @ self.weights - sums[:, 4] - sums[:, 5])
+
+    def evaluate_batch(self, population: np.ndarray) -> np.ndarray:
+        """集団 (P × L) の適応度を一括評価"""
+        return self.fitness_from_sums(self.component_sums(population))
+
+    # ---- 差分評価 ----
+    def gene_contributions(self, vec: np.ndarray) -> np.ndarray:
+        """各遺伝子の成分合計への寄与 (size × 6)。行の和が ``component_sums(vec)``"""
+        contrib = np.zeros((self.size, 6))
+        hours = vec[self.hours_slice]
+        coverage = vec[self.coverage_slice]
+        contrib[self.hours_slice, 0] = self._staff_cost(hours)
+        contrib[self.hours_slice, 2] = np.maximum(0, hours - REGULAR_HOURS)
+        contrib[self.hours_slice, 4] = np.maximum(0, hours - self.max_hours) * 0.1
+        contrib[self.satisfaction_slice, 3] = vec[self.satisfaction_slice] * self.satisfaction_weight
+        contrib[self.coverage_slice, 1] = self._coverage_ratio(coverage) * self.demand_intensity
+        contrib[self.coverage_slice, 5] = np.maximum(0, self.required_staff - coverage) * 0.2
+        return contrib
+
+    def gene_contribution(self, k: int, value: float) -> np.ndarray:
+        """遺伝子 k が値 value のときの成分合計への寄与"""
+        contrib = np.zeros(6)
+        kind = self.gene_kind[k]
+        if kind == 0:
+            i = k
+            contrib[0] = self._staff_cost(np.array([value]), [i])[0]
+            contrib[2] = max(0.0, value - REGULAR_HOURS)
+            contrib[4] = max(0.0, value - self.max_hours[i]) * 0.1
+        elif kind == 1:
+            i = k - self.n_staff
+            contrib[3] = value * self.satisfaction_weight[i]
+        else:
+            j = k - 2 * self.n_staff
+            contrib[1] = self._coverage_ratio(np.array([value]), [j])[0] * self.demand_intensity[j]
+            contrib[5] = max(0.0, self.required_staff[j] - value) * 0.2
+        return contrib
+
+    def delta(self, vec: np.ndarray, sums: np.ndarray, k: int, value: float) -> Tuple[np.ndarray, float]:
+        """遺伝子 k を value に変えたときの新しい成分合計と適応度"""
+        new_sums = sums - self.gene_contribution(k, vec[k]) + self.gene_contribution(k, value)
+        return new_sums, float(self.fitness_from_sums(new_sums)[0])
+
+    def mutate_values(self, vec: np.ndarray, k: int, noise: float) -> float:
+        """突然変異後の遺伝子値（``_mutate`` と同じ範囲・クリップ）"""
+        kind = self.gene_kind[k]
+        if kind == 0:
+            return max(0.0, vec[k] + noise * 5)
+        if kind == 1:
+            return max(0.0, min(1.0, vec[k] + noise * 0.1))
+        return max(0.0, vec[k] + noise * 2)
+
+    def random_population(self, size: int, rng: np.random.Generator) -> np.ndarray:
+        """初期集団（労働時間は上限まで・満足度 0.5〜1.0・カバレッジは必要人数の 1.2 倍までの一様乱数）"""
+        return np.column_stack([
+            rng.uniform(0, self.max_hours, size=(size, self.n_staff)),
+            rng.uniform(0.5, 1.0, size=(size, self.n_staff)),
+            rng.uniform(0, self.required_staff * 1.2, size=(size, self.n_demand)),
+        ]) if self.size else np.zeros((size, 0))
+
+    def enforce(self, population: np.ndarray) -> np.ndarray:
+        """制約の強制（労働時間は上限の 1.5 倍・満足度は 0〜1・カバレッジは必要人数の 2 倍まで）"""
+        return np.clip(population, self.lower, self.upper)
+
+
 class OptimizationAlgorithm:
     """最適化アルゴリズムクラス"""
     
@@ -153,51 +347,77 @@ class OptimizationAlgorithm:
         
         return processed
     
+    def _get_fitness_model(self, staff_data: List[Dict], demand_data: List[Dict]) -> FitnessModel:
+        """同じ入力に対する FitnessModel を再利用
+
+        渡されるのは前処理済みのコピーや呼び出しごとに作るサンプルで、作成後に
+        書き換えられないため、同じリストなら内容キーの再計算を省く。別のリストは
+        内容 (JSON) で比較する。
+        """
+        objectives = tuple(sorted(self.objectives.items()))
+        cached_inputs = getattr(self, '_fitness_model_inputs', None)
+        if cached_inputs is not None and cached_inputs[0] is staff_data \
+                and cached_inputs[1] is demand_data and cached_inputs[2] == objectives:
+            return self._fitness_model
+        key = json.dumps([staff_data, demand_data, self.objectives], sort_keys=True, default=str)
+        if getattr(self, '_fitness_model_key', None) != key:
+            self._fitness_model = FitnessModel(staff_data, demand_data, self.objectives)
+            self._fitness_model_key = key
+        # リストへの参照を保持するので id が別のオブジェクトに再利用されることはない
+        self._fitness_model_inputs = (staff_data, demand_data, objectives)
+        return self._fitness_model
+    
     def _genetic_algorithm_optimization(self, staff_data: List[Dict], demand_data: List[Dict]) -> Dict:
-        """遺伝的アルゴリズムによる最適化"""
+        """遺伝的アルゴリズムによる最適化（集団を配列で一括評価）"""
         print("🧬 遺伝的アルゴリズム最適化実行中...")
         
+        model = self._get_fitness_model(staff_data, demand_data)
+        rng = np.random.default_rng(random.getrandbits(32))
         population_size = self.optimization_params['population_size']
         generations = self.optimization_params['generations']
+        elite_size = int(population_size * self.optimization_params['elite_ratio'])
+        n_children = population_size - elite_size
+        n_pairs = (n_children + 1) // 2
         
         # 初期集団生成
-        population = self._generate_initial_population(staff_data, demand_data, population_size)
+        population = model.random_population(population_size, rng)
         
         best_fitness_history = []
+        evaluated = 0
         
         for generation in range(generations):
-            # 適応度評価
-            fitness_scores = [self._evaluate_fitness(individual, staff_data, demand_data) for individual in population]
+            # 適応度評価（集団一括）
+            fitness_scores = model.evaluate_batch(population)
+            evaluated += len(population)
             
             # エリート選択
-            elite_size = int(population_size * self.optimization_params['elite_ratio'])
-            elite_indices = sorted(range(len(fitness_scores)), key=lambda i: fitness_scores[i], reverse=True)[:elite_size]
-            elite_population = [population[i] for i in elite_indices]
-            
-            # 新世代生成
-            new_population = elite_population.copy()
-            
-            while len(new_population) < population_size:
-                # 選択
-                parent1 = self._tournament_selection(population, fitness_scores)
-                parent2 = self._tournament_selection(population, fitness_scores)
-                
-                # 交叉
-                if random.random() < self.optimization_params['crossover_rate']:
-                    child1, child2 = self._crossover(parent1, parent2)
-                else:
-                    child1, child2 = parent1.copy(), parent2.copy()
-                
-                # 突然変異
-                if random.random() < self.optimization_params['mutation_rate']:
-                    child1 = self._mutate(child1, staff_data, demand_data)
-                if random.random() < self.optimization_params['mutation_rate']:
-                    child2 = self._mutate(child2, staff_data, demand_data)
-                
-                new_population.extend([child1, child2])
-            
-            population = new_population[:population_size]
-            best_fitness = max(fitness_scores)
+            elite_indices = np.argsort(-fitness_scores, kind='stable')[:elite_size]
+            
+            # トーナメント選択（3 個体）
+            tournament = rng.integers(0, population_size, size=(2 * n_pairs, 3))
+            winners = tournament[np.arange(2 * n_pairs), np.argmax(fitness_scores[tournament], axis=1)]
+            parents1 = population[winners[0::2]]
+            parents2 = population[winners[1::2]]
+            
+            # 単点交叉
+            do_cross = rng.random(n_pairs) < self.optimization_params['crossover_rate']
+            points = rng.integers(0, max(model.size, 1), size=n_pairs)
+            swap = (np.arange(model.size)[None, :] >= points[:, None]) & do_cross[:, None]
+            child1 = np.where(swap, parents2, parents1)
+            child2 = np.where(swap, parents1, parents2)
+            children = np.empty((2 * n_pairs, model.size))
+            children[0::2] = child1
+            children[1::2] = child2
+            
+            # 突然変異（1 遺伝子）
+            if model.size:
+                mutate_rows = np.nonzero(rng.random(len(children)) < self.optimization_params['mutation_rate'])[0]
+                for row in mutate_rows:
+                    k = int(rng.integers(model.size))
+                    children[row, k] = model.mutate_values(children[row], k, rng.uniform(-1, 1))
+            
+            population = np.vstack([population[elite_indices], children[:n_children]])
+            best_fitness = float(fitness_scores.max())
             best_fitness_history.append(best_fitness)
             
             # 収束判定
@@ -205,28 +425,33 @@ class OptimizationAlgorithm:
                 break
         
         # 最適解取得
-        final_fitness_scores = [self._evaluate_fitness(individual, staff_data, demand_data) for individual in population]
-        best_individual_index = final_fitness_scores.index(max(final_fitness_scores))
-        best_solution = population[best_individual_index]
+        final_fitness_scores = model.evaluate_batch(population)
+        evaluated += len(population)
+        best_individual_index = int(np.argmax(final_fitness_scores))
         
         return {
             'algorithm': 'genetic_algorithm',
-            'solution': best_solution,
-            'fitness_score': max(final_fitness_scores),
+            'solution': model.decode(population[best_individual_index]),
+            'fitness_score': float(final_fitness_scores[best_individual_index]),
             'generations_run': generation + 1,
             'convergence_history': best_fitness_history,
-            'final_population_size': len(population)
+            'final_population_size': len(population),
+            'candidates_evaluated': evaluated
         }
     
     def _simulated_annealing_optimization(self, staff_data: List[Dict], demand_data: List[Dict]) -> Dict:
-        """シミュレーテッドアニーリングによる最適化"""
+        """シミュレーテッドアニーリングによる最適化（近傍解は差分評価）"""
         print("🌡️ シミュレーテッドアニーリング最適化実行中...")
         
+        model = self._get_fitness_model(staff_data, demand_data)
+        rng = np.random.default_rng(random.getrandbits(32))
+        
         # 初期解生成
-        current_solution = self._generate_initial_solution(staff_data, demand_data)
-        current_fitness = self._evaluate_fitness(current_solution, staff_data, demand_data)
+        current = model.random_population(1, rng)[0]
+        current_sums = model.component_sums(current)[0]
+        current_fitness = float(model.fitness_from_sums(current_sums)[0])
         
-        best_solution = current_solution.copy()
+        best_solution = current.copy()
         best_fitness = current_fitness
         
         # 冷却スケジュール
@@ -238,26 +463,21 @@ class OptimizationAlgorithm:
         iteration = 0
         fitness_history = [current_fitness]
         
-        while temperature > final_temperature and iteration < self.optimization_params['max_iterations']:
-            # 近傍解生成
-            neighbor_solution = self._generate_neighbor_solution(current_solution, staff_data, demand_data)
-            neighbor_fitness = self._evaluate_fitness(neighbor_solution, staff_data, demand_data)
+        while model.size and temperature > final_temperature and iteration < self.optimization_params['max_iterations']:
+            # 近傍解生成（1 遺伝子の変更を差分評価）
+            k = int(rng.integers(model.size))
+            value = model.mutate_values(current, k, rng.uniform(-1, 1))
+            neighbor_sums, neighbor_fitness = model.delta(current, current_sums, k, value)
             
-            # 受諾判定
-            if neighbor_fitness > current_fitness:
-                # 改善解の場合は受諾
-                current_solution = neighbor_solution
+            # 受諾判定（悪化解は確率的に受諾）
+            if neighbor_fitness > current_fitness or rng.random() < math.exp((neighbor_fitness - current_fitness) / temperature):
+                current[k] = value
+                current_sums = neighbor_sums
                 current_fitness = neighbor_fitness
-            else:
-                # 悪化解の場合は確率的に受諾
-                probability = math.exp((neighbor_fitness - current_fitness) / temperature)
-                if random.random() < probability:
-                    current_solution = neighbor_solution
-                    current_fitness = neighbor_fitness
             
             # 最良解更新
             if current_fitness > best_fitness:
-                best_solution = current_solution.copy()
+                best_solution = current.copy()
                 best_fitness = current_fitness
             
             # 温度降下
@@ -267,7 +487,7 @@ class OptimizationAlgorithm:
         
         return {
             'algorithm': 'simulated_annealing',
-            'solution': best_solution,
+            'solution': model.decode(best_solution),
             'fitness_score': best_fitness,
             'iterations_run': iteration,
             'final_temperature': temperature,
@@ -278,28 +498,27 @@ class OptimizationAlgorithm:
         """勾配降下法による最適化"""
         print("📈 勾配降下法最適化実行中...")
         
+        model = self._get_fitness_model(staff_data, demand_data)
+        rng = np.random.default_rng(random.getrandbits(32))
+        
         # 初期解
-        current_solution = self._generate_initial_solution(staff_data, demand_data)
+        current = model.random_population(1, rng)[0]
         learning_rate = self.optimization_params['learning_rate']
         momentum = self.optimization_params['momentum']
         
-        velocity = {key: 0 for key in current_solution.keys()}
+        velocity = np.zeros(model.size)
         fitness_history = []
         
         for iteration in range(self.optimization_params['max_iterations']):
-            current_fitness = self._evaluate_fitness(current_solution, staff_data, demand_data)
+            current_fitness = float(model.evaluate_batch(current)[0])
             fitness_history.append(current_fitness)
             
             # 勾配計算（数値微分）
-            gradients = self._calculate_gradients(current_solution, staff_data, demand_data)
+            gradients = self._calculate_gradient_vector(model, current, current_fitness)
             
             # パラメータ更新（モメンタム付き）
-            for key in current_solution.keys():
-                velocity[key] = momentum * velocity[key] + learning_rate * gradients[key]
-                current_solution[key] = self._apply_gradient_update(current_solution[key], velocity[key])
-            
-            # 制約違反チェックと修正
-            current_solution = self._enforce_constraints(current_solution, staff_data, demand_data)
+            velocity = momentum * velocity + learning_rate * gradients
+            current = model.enforce(current + velocity)
             
             # 収束判定
             if iteration > 10:
@@ -307,11 +526,11 @@ class OptimizationAlgorithm:
                 if recent_improvement < self.optimization_params['convergence_tolerance']:
                     break
         
-        final_fitness = self._evaluate_fitness(current_solution, staff_data, demand_data)
+        final_fitness = float(model.evaluate_batch(current)[0])
         
         return {
             'algorithm': 'gradient_descent',
-            'solution': current_solution,
+            'solution': model.decode(current),
             'fitness_score': final_fitness,
             'iterations_run': iteration + 1,
             'fitness_history': fitness_history,
@@ -319,29 +538,24 @@ class OptimizationAlgorithm:
         }
     
     def _particle_swarm_optimization(self, staff_data: List[Dict], demand_data: List[Dict]) -> Dict:
-        """パーティクルスウォーム最適化"""
+        """パーティクルスウォーム最適化（群全体を配列で更新・評価）"""
         print("🐝 パーティクルスウォーム最適化実行中...")
         
+        model = self._get_fitness_model(staff_data, demand_data)
+        rng = np.random.default_rng(random.getrandbits(32))
         swarm_size = min(30, self.optimization_params['population_size'])
         max_iterations = self.optimization_params['max_iterations']
         
         # パーティクル初期化
-        particles = []
-        velocities = []
-        personal_best = []
-        personal_best_fitness = []
-        
-        for _ in range(swarm_size):
-            particle = self._generate_initial_solution(staff_data, demand_data)
-            particles.append(particle)
-            velocities.append({key: random.uniform(-1, 1) for key in particle.keys()})
-            personal_best.append(particle.copy())
-            personal_best_fitness.append(self._evaluate_fitness(particle, staff_data, demand_data))
+        particles = model.random_population(swarm_size, rng)
+        velocities = rng.uniform(-1, 1, size=particles.shape)
+        personal_best = particles.copy()
+        personal_best_fitness = model.evaluate_batch(particles)
         
         # グローバルベスト初期化
-        global_best_index = personal_best_fitness.index(max(personal_best_fitness))
+        global_best_index = int(np.argmax(personal_best_fitness))
         global_best = personal_best[global_best_index].copy()
-        global_best_fitness = personal_best_fitness[global_best_index]
+        global_best_fitness = float(personal_best_fitness[global_best_index])
         
         fitness_history = [global_best_fitness]
         
@@ -351,33 +565,29 @@ class OptimizationAlgorithm:
         c2 = 1.5  # 社会記憶係数
         
         for iteration in range(max_iterations):
-            for i in range(swarm_size):
-                # 速度更新
-                for key in particles[i].keys():
-                    r1, r2 = random.random(), random.random()
-                    velocities[i][key] = (w * velocities[i][key] + 
-                                        c1 * r1 * (personal_best[i][key] - particles[i][key]) +
-                                        c2 * r2 * (global_best[key] - particles[i][key]))
-                
-                # 位置更新
-                for key in particles[i].keys():
-                    particles[i][key] = self._apply_gradient_update(particles[i][key], velocities[i][key])
-                
-                # 制約適用
-                particles[i] = self._enforce_constraints(particles[i], staff_data, demand_data)
-                
-                # 適応度評価
-                fitness = self._evaluate_fitness(particles[i], staff_data, demand_data)
-                
-                # パーソナルベスト更新
-                if fitness > personal_best_fitness[i]:
-                    personal_best[i] = particles[i].copy()
-                    personal_best_fitness[i] = fitness
-                
-                # グローバルベスト更新
-                if fitness > global_best_fitness:
-                    global_best = particles[i].copy()
-                    global_best_fitness = fitness
+            # 速度・位置更新
+            r1 = rng.random(particles.shape)
+            r2 = rng.random(particles.shape)
+            velocities = (w * velocities +
+                          c1 * r1 * (personal_best - particles) +
+                          c2 * r2 * (global_best[None, :] - particles))
+            
+            # 制約適用
+            particles = model.enforce(particles + velocities)
+            
+            # 適応度評価（群一括）
+            fitness = model.evaluate_batch(particles)
+            
+            # パーソナルベスト更新
+            improved = fitness > personal_best_fitness
+            personal_best[improved] = particles[improved]
+            personal_best_fitness[improved] = fitness[improved]
+            
+            # グローバルベスト更新
+            best_index = int(np.argmax(fitness))
+            if fitness[best_index] > global_best_fitness:
+                global_best = particles[best_index].copy()
+                global_best_fitness = float(fitness[best_index])
             
             fitness_history.append(global_best_fitness)
             
@@ -387,7 +597,7 @@ class OptimizationAlgorithm:
         
         return {
             'algorithm': 'particle_swarm',
-            'solution': global_best,
+            'solution': model.decode(global_best),
             'fitness_score': global_best_fitness,
             'iterations_run': iteration + 1,
             'swarm_size': swarm_size,
@@ -422,170 +632,15 @@ class OptimizationAlgorithm:
         }
     
     def _evaluate_fitness(self, solution: Dict, staff_data: List[Dict], demand_data: List[Dict]) -> float:
-        """適応度評価"""
-        # 各目標の評価
-        cost_score = self._evaluate_cost_objective(solution, staff_data)
-        coverage_score = self._evaluate_coverage_objective(solution, demand_data)
-        overtime_score = self._evaluate_overtime_objective(solution, staff_data)
-        satisfaction_score = self._evaluate_satisfaction_objective(solution, staff_data)
-        
-        # 制約違反ペナルティ
-        constraint_penalty = self._calculate_constraint_penalty(solution, staff_data, demand_data)
-        
-        # 重み付き総合評価
-        total_fitness = (
-            self.objectives['minimize_cost'] * cost_score +
-            self.objectives['maximize_coverage'] * coverage_score +
-            self.objectives['minimize_overtime'] * overtime_score +
-            self.objectives['maximize_satisfaction'] * satisfaction_score
-        ) - constraint_penalty
-        
-        return max(0, total_fitness)  # 負の値を避ける
-    
-    def _evaluate_cost_objective(self, solution: Dict, staff_data: List[Dict]) -> float:
-        """コスト目標の評価"""
-        total_cost = 0
-        baseline_cost = 10000  # ベースライン
-        
-        for staff in staff_data:
-            staff_id = staff['id']
-            if staff_id in solution:
-                hours = solution.get(f"{staff_id}_hours", 0)
-                hourly_rate = staff['hourly_rate']
-                
-                regular_hours = min(hours, 40)
-                overtime_hours = max(0, hours - 40)
-                
-                total_cost += regular_hours * hourly_rate
-                total_cost += overtime_hours * hourly_rate * staff.get('overtime_multiplier', 1.25)
-        
-        # コストが低いほど高スコア
-        cost_efficiency = max(0, baseline_cost - total_cost) / baseline_cost
-        return cost_efficiency
-    
-    def _evaluate_coverage_objective(self, solution: Dict, demand_data: List[Dict]) -> float:
-        """カバレッジ目標の評価"""
-        total_coverage = 0
-        total_demand = 0
-        
-        for demand in demand_data:
-            required_staff = demand['required_staff']
-            time_slot = demand['time_slot']
-            
-            # 当該時間帯の配置スタッフ数を計算（簡略化）
-            assigned_staff = solution.get(f"coverage_{time_slot}", 0)
-            coverage_ratio = min(1.0, assigned_staff / required_staff) if required_staff > 0 else 1.0
-            
-            total_coverage += coverage_ratio * demand.get('demand_intensity', 1.0)
-            total_demand += demand.get('demand_intensity', 1.0)
-        
-        return total_coverage / total_demand if total_demand > 0 else 0
-    
-    def _evaluate_overtime_objective(self, solution: Dict, staff_data: List[Dict]) -> float:
-        """残業時間目標の評価"""
-        total_overtime = 0
-        max_possible_overtime = 0
-        
-        for staff in staff_data:
-            staff_id = staff['id']
-            hours = solution.get(f"{staff_id}_hours", 0)
-            overtime = max(0, hours - 40)
-            
-            total_overtime += overtime
-            max_possible_overtime += 20  # 最大20時間残業と仮定
-        
-        # 残業が少ないほど高スコア
-        overtime_efficiency = 1.0 - (total_overtime / max_possible_overtime) if max_possible_overtime > 0 else 1.0
-        return max(0, overtime_efficiency)
-    
-    def _evaluate_satisfaction_objective(self, solution: Dict, staff_data: List[Dict]) -> float:
-        """満足度目標の評価"""
-        total_satisfaction = 0
-        total_weight = 0
-        
-        for staff in staff_data:
-            staff_id = staff['id']
-            satisfaction_weight = staff.get('satisfaction_weight', 1.0)
-            
-            # 希望シフトとの一致度などから満足度を計算（簡略化）
-            assigned_satisfaction = solution.get(f"{staff_id}_satisfaction", 0.7)
-            
-            total_satisfaction += assigned_satisfaction * satisfaction_weight
-            total_weight += satisfaction_weight
-        
-        return total_satisfaction / total_weight if total_weight > 0 else 0
-    
-    def _calculate_constraint_penalty(self, solution: Dict, staff_data: List[Dict], demand_data: List[Dict]) -> float:
-        """制約違反ペナルティ計算"""
-        penalty = 0
-        
-        # スタッフ制約チェック
-        for staff in staff_data:
-            staff_id = staff['id']
-            hours = solution.get(f"{staff_id}_hours", 0)
-            max_hours = staff.get('max_hours_per_week', 40)
-            
-            # 最大労働時間違反
-            if hours > max_hours:
-                penalty += (hours - max_hours) * 0.1
-        
-        # 需要制約チェック
-        for demand in demand_data:
-            time_slot = demand['time_slot']
-            required_staff = demand['required_staff']
-            assigned_staff = solution.get(f"coverage_{time_slot}", 0)
-            
-            # カバレッジ不足
-            if assigned_staff < required_staff:
-                penalty += (required_staff - assigned_staff) * 0.2
-        
-        return penalty
+        """適応度評価（dict 形式の解）
+
+        各目標の重み付き総合評価から制約違反ペナルティを引いた値。
+        計算は FitnessModel に委譲し、配列化した解を一括評価する。
+        """
+        model = self._get_fitness_model(staff_data, demand_data)
+        return float(model.evaluate_batch(model.encode(solution))[0])
     
     # ヘルパーメソッド群
-    def _generate_initial_population(self, staff_data: List[Dict], demand_data: List[Dict], size: int) -> List[Dict]:
-        """初期集団生成"""
-        return [self._generate_initial_solution(staff_data, demand_data) for _ in range(size)]
-    
-    def _generate_initial_solution(self, staff_data: List[Dict], demand_data: List[Dict]) -> Dict:
-        """初期解生成"""
-        solution = {}
-        
-        # スタッフの労働時間をランダム配置
-        for staff in staff_data:
-            staff_id = staff['id']
-            max_hours = staff.get('max_hours_per_week', 40)
-            solution[f"{staff_id}_hours"] = random.uniform(0, max_hours)
-            solution[f"{staff_id}_satisfaction"] = random.uniform(0.5, 1.0)
-        
-        # 時間帯ごとのカバレッジ
-        for demand in demand_data:
-            time_slot = demand['time_slot']
-            required_staff = demand['required_staff']
-            solution[f"coverage_{time_slot}"] = random.uniform(0, required_staff * 1.2)
-        
-        return solution
-    
-    def _tournament_selection(self, population: List[Dict], fitness_scores: List[float], tournament_size: int = 3) -> Dict:
-        """トーナメント選択"""
-        tournament_indices = random.sample(range(len(population)), min(tournament_size, len(population)))
-        tournament_fitness = [fitness_scores[i] for i in tournament_indices]
-        winner_index = tournament_indices[tournament_fitness.index(max(tournament_fitness))]
-        return population[winner_index].copy()
-    
-    def _crossover(self, parent1: Dict, parent2: Dict) -> Tuple[Dict, Dict]:
-        """交叉"""
-        child1, child2 = parent1.copy(), parent2.copy()
-        
-        # 単点交叉
-        keys = list(parent1.keys())
-        crossover_point = random.randint(0, len(keys) - 1)
-        
-        for i in range(crossover_point, len(keys)):
-            key = keys[i]
-            child1[key], child2[key] = parent2[key], parent1[key]
-        
-        return child1, child2
-    
     def _mutate(self, individual: Dict, staff_data: List[Dict], demand_data: List[Dict]) -> Dict:
         """突然変異"""
         mutated = individual.copy()
@@ -612,54 +667,12 @@ class OptimizationAlgorithm:
         """近傍解生成"""
         return self._mutate(solution, staff_data, demand_data)
     
-    def _calculate_gradients(self, solution: Dict, staff_data: List[Dict], demand_data: List[Dict]) -> Dict:
-        """勾配計算（数値微分）"""
-        gradients = {}
+    def _calculate_gradient_vector(self, model: FitnessModel, vec: np.ndarray, current_fitness: float) -> np.ndarray:
+        """全遺伝子の前進差分（各遺伝子の寄与の差分から成分合計を組み立て、O(size) メモリ）"""
         epsilon = 1e-5
-        
-        current_fitness = self._evaluate_fitness(solution, staff_data, demand_data)
-        
-        for key in solution.keys():
-            # 数値微分による勾配計算
-            solution_plus = solution.copy()
-            solution_plus[key] += epsilon
-            fitness_plus = self._evaluate_fitness(solution_plus, staff_data, demand_data)
-            
-            gradients[key] = (fitness_plus - current_fitness) / epsilon
-        
-        return gradients
-    
-    def _apply_gradient_update(self, current_value: float, update: float) -> float:
-        """勾配更新適用"""
-        return current_value + update
-    
-    def _enforce_constraints(self, solution: Dict, staff_data: List[Dict], demand_data: List[Dict]) -> Dict:
-        """制約条件の強制"""
-        constrained_solution = solution.copy()
-        
-        # スタッフ制約の適用
-        for staff in staff_data:
-            staff_id = staff['id']
-            hours_key = f"{staff_id}_hours"
-            
-            if hours_key in constrained_solution:
-                max_hours = staff.get('max_hours_per_week', 40)
-                constrained_solution[hours_key] = max(0, min(constrained_solution[hours_key], max_hours * 1.5))
-            
-            satisfaction_key = f"{staff_id}_satisfaction"
-            if satisfaction_key in constrained_solution:
-                constrained_solution[satisfaction_key] = max(0, min(1, constrained_solution[satisfaction_key]))
-        
-        # カバレッジ制約の適用
-        for demand in demand_data:
-            time_slot = demand['time_slot']
-            coverage_key = f"coverage_{time_slot}"
-            
-            if coverage_key in constrained_solution:
-                required_staff = demand['required_staff']
-                constrained_solution[coverage_key] = max(0, min(constrained_solution[coverage_key], required_staff * 2))
-        
-        return constrained_solution
+        sums = model.component_sums(vec)[0]
+        step = model.gene_contributions(vec + epsilon) - model.gene_contributions(vec)
+        return (model.fitness_from_sums(sums + step) - current_fitness) / epsilon
     
     def _combine_solutions(self, solutions: Dict, fitness_scores: Dict) -> Dict:
         """解の統合"""
@@ -3,11 +3,17 @@ PyTorch LSTM-based Fatigue Prediction System
 科学的根拠に基づく深層学習疲労予測モデル
 """
 
+import copy
+import hashlib
+import re
+import time
 import torch
 import torch.nn as nn
 import torch.optim as optim
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from pathlib import Path
 from typing import Dict, List, Tuple, Optional
 import logging
 from datetime import datetime, timedelta
@@ -15,8 +21,28 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 import warnings
 
+from .constants import MODEL_DIR
+
 log = logging.getLogger(__name__)
 
+# 学習済みモデルの既定保存先（models/turnover と同じ階層。施設ごとにサブディレクトリ）
+DEFAULT_MODEL_CACHE_DIR = MODEL_DIR / "fatigue"
+# キャッシュ済みモデルを再学習する条件: 学習からの経過日数 / 特徴量平均のずれ（標準偏差単位）
+DEFAULT_MAX_MODEL_AGE_DAYS = 30
+DEFAULT_DRIFT_THRESHOLD = 0.5
+
+
+def facility_key(df: pd.DataFrame) -> str:
+    """施設 ID が無いときの既定キー（在籍スタッフの集合から作る）"""
+    staff = sorted(map(str, pd.unique(df['staff'].dropna()))) if 'staff' in df.columns else []
+    return "staff-" + hashlib.sha256('|'.join(staff).encode('utf-8')).hexdigest()[:12]
+
+
+def model_cache_path(facility_id: str) -> Path:
+    """施設ごとの学習済みモデルの保存先"""
+    safe = re.sub(r'[^0-9A-Za-z._-]+', '_', str(facility_id)).strip('._') or 'default'
+    return DEFAULT_MODEL_CACHE_DIR / safe / "fatigue_lstm.pt"
+
 
 class FatigueLSTMModel(nn.Module):
     """LSTM-based fatigue prediction model"""
@@ -71,10 +97,16 @@ class FatigueLSTMModel(nn.Module):
 class PyTorchFatiguePredictor:
     """PyTorch based fatigue prediction system with LSTM and attention"""
     
-    def __init__(self, sequence_length: int = 14, device: str = None):
+    def __init__(self, sequence_length: int = 14, device: str = None,
+                 num_threads: Optional[int] = None, inference_batch_size: int = 1024):
         self.sequence_length = sequence_length  # 14日間の履歴を使用
         self.device = device or ('cuda' if torch.cuda.is_available() else 'cpu')
+        self.inference_batch_size = inference_batch_size
+        if num_threads is not None and self.device == 'cpu':
+            # CPU インスタンスではワーカー数に合わせて intra-op スレッドを絞る
+            torch.set_num_threads(max(1, int(num_threads)))
         self.model = None
+        self.trained_at: Optional[float] = None
         self.scaler = StandardScaler()
         self.feature_columns = [
             'work_hours', 'is_night_shift', 'consecutive_days',
@@ -102,59 +134,42 @@ class PyTorchFatiguePredictor:
         result_df['is_night_shift'] = result_df.get('is_night_shift', 0)
         result_df['is_weekend'] = result_df.get('is_weekend', 0)
         
-        # 連続勤務日数の計算
-        result_df['consecutive_days'] = 0
-        for staff in result_df['staff'].unique():
-            staff_mask = result_df['staff'] == staff
-            staff_data = result_df[staff_mask].sort_values('date')
-            consecutive = 0
-            consecutive_list = []
-            
-            for _, row in staff_data.iterrows():
-                if row['work_hours'] > 0:
-                    consecutive += 1
-                else:
-                    consecutive = 0
-                consecutive_list.append(consecutive)
-            
-            result_df.loc[staff_mask, 'consecutive_days'] = consecutive_list
-        
-        # 週間労働時間の計算
-        result_df['weekly_total_hours'] = 0
-        for staff in result_df['staff'].unique():
-            staff_mask = result_df['staff'] == staff
-            staff_data = result_df[staff_mask].sort_values('date')
-            
-            weekly_hours = []
-            for i in range(len(staff_data)):
-                start_idx = max(0, i - 6)
-                week_hours = staff_data.iloc[start_idx:i+1]['work_hours'].sum()
-                weekly_hours.append(week_hours)
-            
-            result_df.loc[staff_mask, 'weekly_total_hours'] = weekly_hours
-        
-        # シフト不規則性スコア
-        result_df['shift_irregularity_score'] = 0
-        for staff in result_df['staff'].unique():
-            staff_mask = result_df['staff'] == staff
-            staff_data = result_df[staff_mask].sort_values('date')
-            
-            irregularity_scores = []
-            for i in range(len(staff_data)):
-                if i < 4:
-                    irregularity_scores.append(0)
-                else:
-                    # 過去4日間の勤務開始時間の分散
-                    past_4_days = staff_data.iloc[i-3:i+1]
-                    work_days = past_4_days[past_4_days['work_hours'] > 0]
-                    if len(work_days) >= 2:
-                        # 簡易的な不規則性スコア（実際には開始時間データが必要）
-                        night_shift_variance = work_days['is_night_shift'].var()
-                        irregularity_scores.append(min(1.0, night_shift_variance * 2))
-                    else:
-                        irregularity_scores.append(0)
-            
-            result_df.loc[staff_mask, 'shift_irregularity_score'] = irregularity_scores
+        # スタッフ内を日付順に並べた位置で系列特徴量を計算し、元の行位置に戻す
+        ordered = result_df.reset_index(drop=True).sort_values(['staff', 'date'], kind='stable')
+        order = ordered.index.to_numpy()
+        staff_key = ordered['staff'].to_numpy()
+        work_hours = ordered['work_hours'].astype(float)
+        is_work = (work_hours > 0).astype(float)
+        
+        def _to_original(values) -> np.ndarray:
+            restored = np.empty(len(order), dtype=float)
+            restored[order] = np.asarray(values, dtype=float)
+            return restored
+        
+        def _rolling_sum(series: pd.Series, window: int) -> np.ndarray:
+            return series.groupby(staff_key, sort=False).rolling(window, min_periods=1).sum() \
+                .droplevel(0).reindex(series.index).to_numpy()
+        
+        # 連続勤務日数の計算（休みで区切られたランごとの累積）
+        run_id = (is_work == 0).groupby(staff_key).cumsum()
+        consecutive = is_work.groupby([staff_key, run_id.to_numpy()]).cumsum()
+        result_df['consecutive_days'] = _to_original(consecutive).astype(int)
+        
+        # 週間労働時間の計算（直近7行）
+        result_df['weekly_total_hours'] = _to_original(_rolling_sum(work_hours, 7))
+        
+        # シフト不規則性スコア（直近4行のうち勤務日の夜勤フラグ分散）
+        night = ordered['is_night_shift'].astype(float) * is_work
+        rolling_n = _rolling_sum(is_work, 4)
+        rolling_s1 = _rolling_sum(night, 4)
+        rolling_s2 = _rolling_sum(night ** 2, 4)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variance = (rolling_s2 - rolling_s1 ** 2 / rolling_n) / (rolling_n - 1)
+        position = ordered.groupby(staff_key, sort=False).cumcount().to_numpy()
+        irregularity = np.where(
+            (position >= 4) & (rolling_n >= 2), np.minimum(1.0, np.clip(variance, 0, None) * 2), 0.0
+        )
+        result_df['shift_irregularity_score'] = _to_original(irregularity)
         
         # 追加特徴量（推定値）
         result_df['workload_intensity'] = np.where(
@@ -174,54 +189,57 @@ class PyTorchFatiguePredictor:
         return result_df
     
     def create_sequences(self, data: np.ndarray, target: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
-        """時系列データをLSTM用のシーケンスに変換"""
-        X, y = [], []
-        
-        for i in range(self.sequence_length, len(data)):
-            X.append(data[i-self.sequence_length:i])
-            y.append(target[i])
-        
-        return np.array(X), np.array(y)
+        """時系列データをLSTM用のシーケンスに変換
+
+        ``X[k] = data[k:k+L]`` / ``y[k] = target[k+L]``。X はコピーを伴わないストライドビュー。
+        """
+        n_windows = len(data) - self.sequence_length
+        if n_windows <= 0:
+            return (np.empty((0, self.sequence_length) + data.shape[1:], dtype=data.dtype),
+                    np.empty((0,) + target.shape[1:], dtype=target.dtype))
+        windows = self._sliding_windows(data)[:n_windows]
+        return windows, target[self.sequence_length:]
+    
+    def _sliding_windows(self, data: np.ndarray) -> np.ndarray:
+        """(N, F) → (N-L+1, L, F) のゼロコピー窓"""
+        return sliding_window_view(data, self.sequence_length, axis=0).swapaxes(1, 2)
     
     def calculate_scientific_fatigue_target(self, df: pd.DataFrame) -> np.ndarray:
         """科学的根拠に基づく疲労度ターゲット値の計算"""
-        fatigue_scores = []
+        # 科学的疲労モデル（improved_fatigue_prediction.pyベース）
+        
+        # 連続勤務による疲労（指数的増加）
+        consecutive_days = df['consecutive_days'].to_numpy(dtype=float)
+        consecutive_fatigue = np.where(
+            consecutive_days <= 2,
+            consecutive_days * 0.1,
+            np.minimum(1.0, 0.2 + np.clip(consecutive_days - 2, 0, None) ** 1.5 * 0.15),
+        )
         
-        for _, row in df.iterrows():
-            # 科学的疲労モデル（improved_fatigue_prediction.pyベース）
-            
-            # 連続勤務による疲労（指数的増加）
-            consecutive_days = row['consecutive_days']
-            if consecutive_days <= 2:
-                consecutive_fatigue = consecutive_days * 0.1
-            else:
-                consecutive_fatigue = min(1.0, 0.2 + (consecutive_days - 2) ** 1.5 * 0.15)
-            
-            # 夜勤による疲労
-            night_fatigue = row['is_night_shift'] * 0.4
-            
-            # 週間労働時間による疲労
-            weekly_hours = row['weekly_total_hours']
-            if weekly_hours <= 40:
-                weekly_fatigue = weekly_hours / 40 * 0.3
-            else:
-                excess_hours = weekly_hours - 40
-                weekly_fatigue = min(1.0, 0.3 + (excess_hours / 10) ** 1.3 * 0.4)
-            
-            # シフト不規則性による疲労
-            irregularity_fatigue = row['shift_irregularity_score'] * 0.25
-            
-            # 重み付き合計（産業医学基準）
-            total_fatigue = (
-                consecutive_fatigue * 0.40 +
-                night_fatigue * 0.30 +
-                weekly_fatigue * 0.20 +
-                irregularity_fatigue * 0.10
-            )
-            
-            fatigue_scores.append(min(1.0, total_fatigue))
+        # 夜勤による疲労
+        night_fatigue = df['is_night_shift'].to_numpy(dtype=float) * 0.4
+        
+        # 週間労働時間による疲労
+        weekly_hours = df['weekly_total_hours'].to_numpy(dtype=float)
+        excess_hours = np.clip(weekly_hours - 40, 0, None)
+        weekly_fatigue = np.where(
+            weekly_hours <= 40,
+            weekly_hours / 40 * 0.3,
+            np.minimum(1.0, 0.3 + (excess_hours / 10) ** 1.3 * 0.4),
+        )
+        
+        # シフト不規則性による疲労
+        irregularity_fatigue = df['shift_irregularity_score'].to_numpy(dtype=float) * 0.25
+        
+        # 重み付き合計（産業医学基準）
+        total_fatigue = (
+            consecutive_fatigue * 0.40 +
+            night_fatigue * 0.30 +
+            weekly_fatigue * 0.20 +
+            irregularity_fatigue * 0.10
+        )
         
-        return np.array(fatigue_scores)
+        return np.minimum(1.0, total_fatigue)
     
     def train_model(self, df: pd.DataFrame, epochs: int = 100, batch_size: int = 32, 
                    learning_rate: float = 0.001) -> Dict:
@@ -267,6 +285,7 @@ class PyTorchFatiguePredictor:
         # 訓練ループ
         train_losses, val_losses = [], []
         best_val_loss = float('inf')
+        best_state = None
         patience_counter = 0
         
         for epoch in range(epochs):
@@ -296,8 +315,8 @@ class PyTorchFatiguePredictor:
             if val_loss < best_val_loss:
                 best_val_loss = val_loss
                 patience_counter = 0
-                # モデル保存
-                torch.save(self.model.state_dict(), 'best_fatigue_model.pth')
+                # 最良モデルをメモリ上に保持
+                best_state = copy.deepcopy(self.model.state_dict())
             else:
                 patience_counter += 1
                 if patience_counter > 20:
@@ -308,7 +327,8 @@ class PyTorchFatiguePredictor:
                 log.info(f"Epoch {epoch}: Train Loss: {train_loss:.4f}, Val Loss: {val_loss:.4f}")
         
         # 最良モデルをロード
-        self.model.load_state_dict(torch.load('best_fatigue_model.pth'))
+        if best_state is not None:
+            self.model.load_state_dict(best_state)
         
         # 性能評価
         self.model.eval()
@@ -329,15 +349,20 @@ class PyTorchFatiguePredictor:
             'train_losses': train_losses,
             'val_losses': val_losses,
             'total_epochs': len(train_losses),
-            'best_val_loss': best_val_loss
+            'best_val_loss': float(best_val_loss)
         }
         
+        self.trained_at = time.time()
         log.info(f"[PyTorchFatiguePredictor] Training completed. MSE: {mse:.4f}, MAE: {mae:.4f}, Correlation: {correlation:.4f}")
         
         return training_results
     
     def predict_fatigue(self, df: pd.DataFrame) -> pd.DataFrame:
-        """疲労度予測"""
+        """疲労度予測
+
+        スタッフごとのストライド窓をまとめ、``inference_batch_size`` 件ずつ
+        推論モードで一括実行する（DataLoader は使わない）。
+        """
         if self.model is None:
             raise ValueError("モデルが訓練されていません。train_model()を先に実行してください。")
         
@@ -346,41 +371,151 @@ class PyTorchFatiguePredictor:
         
         # 特徴量正規化
         feature_data = processed_df[self.feature_columns].values
-        feature_data_scaled = self.scaler.transform(feature_data)
-        
-        predictions = []
+        feature_data_scaled = self.scaler.transform(feature_data).astype(np.float32)
+        
+        # 初期期間は科学的計算による代替（全行を一括計算しておく）
+        predictions = self._scientific_fallback_scores(processed_df)
+        
+        # スタッフごとの窓（元の行順）を収集
+        window_blocks, target_rows = [], []
+        staff_positions = pd.Series(np.arange(len(processed_df))).groupby(
+            processed_df['staff'].to_numpy(), sort=False
+        ).indices
+        for positions in staff_positions.values():
+            if len(positions) <= self.sequence_length:
+                continue
+            staff_data = feature_data_scaled[positions]
+            window_blocks.append(self._sliding_windows(staff_data)[:len(positions) - self.sequence_length])
+            target_rows.append(positions[self.sequence_length:])
         
-        # スタッフごとに予測
-        for staff in processed_df['staff'].unique():
-            staff_mask = processed_df['staff'] == staff
-            staff_data = feature_data_scaled[staff_mask]
-            
-            staff_predictions = []
-            
-            for i in range(len(staff_data)):
-                if i < self.sequence_length:
-                    # 初期期間は科学的計算による代替
-                    row = processed_df[staff_mask].iloc[i]
-                    scientific_score = self._calculate_scientific_fallback(row)
-                    staff_predictions.append(scientific_score)
-                else:
-                    # LSTM予測
-                    sequence = staff_data[i-self.sequence_length:i]
-                    sequence_tensor = torch.FloatTensor(sequence).unsqueeze(0).to(self.device)
-                    
-                    self.model.eval()
-                    with torch.no_grad():
-                        pred = self.model(sequence_tensor).item()
-                    
-                    staff_predictions.append(pred)
-            
-            predictions.extend(staff_predictions)
+        if window_blocks:
+            windows = np.concatenate(window_blocks)
+            predictions[np.concatenate(target_rows)] = self._predict_windows(windows)
         
         result_df['fatigue_score'] = predictions
-        result_df['risk_level'] = result_df['fatigue_score'].apply(self._classify_risk_level)
+        result_df['risk_level'] = self._classify_risk_levels(predictions)
         
         return result_df
     
+    def _predict_windows(self, windows: np.ndarray) -> np.ndarray:
+        """(B, L, F) の窓をバッチ推論"""
+        self.model.eval()
+        outputs = []
+        with torch.inference_mode():
+            for start in range(0, len(windows), self.inference_batch_size):
+                batch = torch.from_numpy(
+                    np.ascontiguousarray(windows[start:start + self.inference_batch_size], dtype=np.float32)
+                ).to(self.device)
+                outputs.append(self.model(batch).reshape(-1).cpu().numpy())
+        return np.concatenate(outputs) if outputs else np.empty(0, dtype=np.float32)
+    
+    def _scientific_fallback_scores(self, df: pd.DataFrame) -> np.ndarray:
+        """``_calculate_scientific_fallback`` の全行一括版"""
+        consecutive_fatigue = np.minimum(1.0, df['consecutive_days'].to_numpy(dtype=float) * 0.15)
+        night_fatigue = df['is_night_shift'].to_numpy(dtype=float) * 0.4
+        weekly_fatigue = np.minimum(1.0, df['weekly_total_hours'].to_numpy(dtype=float) / 40 * 0.3)
+        irregularity_fatigue = df['shift_irregularity_score'].to_numpy(dtype=float) * 0.25
+        return np.minimum(1.0,
+                          consecutive_fatigue * 0.40 +
+                          night_fatigue * 0.30 +
+                          weekly_fatigue * 0.20 +
+                          irregularity_fatigue * 0.10)
+    
+    def _classify_risk_levels(self, scores: np.ndarray) -> np.ndarray:
+        """``_classify_risk_level`` の配列版"""
+        bins = [self.fatigue_thresholds['normal'], self.fatigue_thresholds['caution'],
+                self.fatigue_thresholds['warning']]
+        labels = np.array(['normal', 'caution', 'warning', 'danger'])
+        return labels[np.digitize(scores, bins, right=False)]
+    
+    # ------------------------------------------------------------------
+    # 永続化・エクスポート
+    # ------------------------------------------------------------------
+    def schema_hash(self) -> str:
+        """特徴量構成とシーケンス長から互換性キーを作る"""
+        key = f"{self.sequence_length}|{'|'.join(self.feature_columns)}"
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+    
+    def model_age_days(self) -> float:
+        """学習からの経過日数（不明なら inf）"""
+        if self.trained_at is None:
+            return float('inf')
+        return (time.time() - self.trained_at) / 86400
+    
+    def feature_drift(self, df: pd.DataFrame) -> float:
+        """学習時のスケーラー平均に対する特徴量平均のずれの最大値（標準偏差単位）"""
+        features = self.prepare_features(df)[self.feature_columns].to_numpy(dtype=float)
+        if len(features) == 0:
+            return 0.0
+        shift = np.abs(np.nanmean(features, axis=0) - self.scaler.mean_) / self.scaler.scale_
+        return float(np.nanmax(shift))
+    
+    def save_model(self, path: Path) -> Path:
+        """学習済みモデルとスケーラーを保存（再学習せずに予測するため）"""
+        if self.model is None:
+            raise ValueError("モデルが訓練されていません。")
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        torch.save({
+            'schema_hash': self.schema_hash(),
+            'trained_at': self.trained_at if self.trained_at is not None else time.time(),
+            'sequence_length': self.sequence_length,
+            'feature_columns': list(self.feature_columns),
+            'input_size': len(self.feature_columns),
+            'hidden_size': self.model.hidden_size,
+            'num_layers': self.model.num_layers,
+            'scaler_mean': torch.as_tensor(self.scaler.mean_),
+            'scaler_scale': torch.as_tensor(self.scaler.scale_),
+            'state_dict': self.model.state_dict(),
+        }, path)
+        log.info(f"[PyTorchFatiguePredictor] Model saved → {path}")
+        return path
+    
+    def load_model(self, path: Path) -> bool:
+        """保存済みモデルを読み込む。特徴量構成・シーケンス長が違う・存在しない場合は False"""
+        path = Path(path)
+        if not path.exists():
+            return False
+        try:
+            checkpoint = torch.load(path, map_location=self.device, weights_only=True)
+        except Exception as e:
+            log.warning(f"[PyTorchFatiguePredictor] Failed to load cached model {path}: {e}")
+            return False
+        if checkpoint.get('schema_hash') != self.schema_hash():
+            log.info(f"[PyTorchFatiguePredictor] Cached model schema mismatch, ignoring {path}")
+            return False
+        model = FatigueLSTMModel(
+            checkpoint['input_size'],
+            hidden_size=checkpoint['hidden_size'],
+            num_layers=checkpoint['num_layers'],
+        ).to(self.device)
+        model.load_state_dict(checkpoint['state_dict'])
+        model.eval()
+        self.model = model
+        self.scaler.mean_ = checkpoint['scaler_mean'].numpy()
+        self.scaler.scale_ = checkpoint['scaler_scale'].numpy()
+        self.scaler.var_ = self.scaler.scale_ ** 2
+        self.scaler.n_features_in_ = len(self.feature_columns)
+        self.trained_at = checkpoint.get('trained_at')
+        log.info(f"[PyTorchFatiguePredictor] Loaded cached model ← {path}")
+        return True
+    
+    def export_model(self, path: Path, quantize: bool = False) -> Path:
+        """TorchScript 形式でエクスポート（``quantize=True`` で LSTM/Linear を動的量子化）"""
+        if self.model is None:
+            raise ValueError("モデルが訓練されていません。")
+        model = copy.deepcopy(self.model).cpu().eval()
+        if quantize:
+            model = torch.quantization.quantize_dynamic(model, {nn.LSTM, nn.Linear}, dtype=torch.qint8)
+        example = torch.zeros(1, self.sequence_length, len(self.feature_columns))
+        with torch.inference_mode():
+            scripted = torch.jit.trace(model, example)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        scripted.save(str(path))
+        log.info(f"[PyTorchFatiguePredictor] TorchScript model exported → {path} (quantized={quantize})")
+        return path
+    
     def _calculate_scientific_fallback(self, row: pd.Series) -> float:
         """初期期間用の科学的疲労度計算"""
         consecutive_fatigue = min(1.0, row['consecutive_days'] * 0.15)
@@ -479,6 +614,51 @@ def create_pytorch_fatigue_predictor(sequence_length: int = 14) -> PyTorchFatigu
     return PyTorchFatiguePredictor(sequence_length=sequence_length)
 
 
+def load_or_train_predictor(
+    df: pd.DataFrame,
+    facility_id: Optional[str] = None,
+    cache_path: Optional[Path] = None,
+    sequence_length: int = 7,
+    num_threads: Optional[int] = None,
+    retrain: bool = False,
+    max_age_days: float = DEFAULT_MAX_MODEL_AGE_DAYS,
+    drift_threshold: float = DEFAULT_DRIFT_THRESHOLD,
+    **train_kwargs,
+) -> Tuple[PyTorchFatiguePredictor, Dict]:
+    """施設のキャッシュ済みモデルを使い、古い・データがずれた場合だけ再学習する
+
+    キャッシュは特徴量構成とシーケンス長で互換性を判定し、施設ごと
+    (``facility_id``、省略時はスタッフ集合から作るキー) に保存する。
+    学習から ``max_age_days`` 日を超えたか、特徴量平均が学習時から
+    ``drift_threshold`` 標準偏差を超えてずれたときに再学習する。
+
+    Returns
+    -------
+    (predictor, training_results)
+        キャッシュを使った場合 ``training_results`` は
+        ``{'cached': True, 'age_days': ..., 'drift': ...}``。
+    """
+    if cache_path is None:
+        cache_path = model_cache_path(facility_id or facility_key(df))
+    predictor = PyTorchFatiguePredictor(sequence_length=sequence_length, num_threads=num_threads)
+    if not retrain and predictor.load_model(cache_path):
+        age_days = predictor.model_age_days()
+        drift = predictor.feature_drift(df)
+        if age_days > max_age_days:
+            log.info(f"[PyTorchFatiguePredictor] Cached model is {age_days:.0f} days old, retraining")
+        elif drift > drift_threshold:
+            log.info(f"[PyTorchFatiguePredictor] Feature drift {drift:.2f} > {drift_threshold}, retraining")
+        else:
+            return predictor, {'cached': True, 'age_days': age_days, 'drift': drift}
+        predictor = PyTorchFatiguePredictor(sequence_length=sequence_length, num_threads=num_threads)
+    training_results = predictor.train_model(df, **train_kwargs)
+    try:
+        predictor.save_model(cache_path)
+    except OSError as e:
+        log.warning(f"[PyTorchFatiguePredictor] Could not persist model cache: {e}")
+    return predictor, training_results
+
+
 if __name__ == "__main__":
     # テスト用のサンプルデータ
     import random
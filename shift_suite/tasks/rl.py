@@ -1,8 +1,11 @@
 """
-shift_suite.tasks.rl  v0.3.2 – PPO によるシフト生成（stub）
+shift_suite.tasks.rl  v0.4.0 – 局所探索によるロスター生成
 ────────────────────────────────────────────────────────
 * 需要系列 CSV → ロスター最適化
 * 2025-05-01 : `need` ⇆ `y` フォールバック、meta 出力などを復元
+* v0.4.0 : PPO stub を roster_optimizer (NumPy 焼きなまし法) に置き換え。
+  long_df / wt_df / need_per_date_slot が渡された場合は staff × day の
+  勤務コード表を最適化して出力する。関数名・引数は後方互換のまま。
 """
 
 from __future__ import annotations
@@ -14,6 +17,7 @@ from pathlib import Path
 import numpy as np
 import pandas as pd
 
+from .roster_optimizer import build_roster_problem, optimize_roster, roster_to_frame
 from .utils import log, save_df_xlsx, write_meta
 
 
@@ -23,17 +27,51 @@ def learn_roster(
     excel_out: Path,
     *,
     horizon: int = 14,
+    long_df: pd.DataFrame | None = None,
+    wt_df: pd.DataFrame | None = None,
+    need_per_date_slot: pd.DataFrame | Path | None = None,
+    slot_minutes: int = 30,
+    time_limit_sec: float = 30.0,
+    max_moves: int = 200_000,
+    seed: int | None = 0,
 ) -> Path | None:
     """
-    需要 CSV（ds, need|y）を読み込み、簡易 PPO でロスターを生成する *デモ実装*。
+    ロスターを生成して Excel に保存する。
 
     実装メモ
     --------
-    - 本関数はアルゴリズム枠のみ提供。実務ロジックと置き換えて利用してください。
-    - `horizon` : 学習／予測対象期間（現 stub では未使用）。
+    - ``long_df`` / ``wt_df`` / ``need_per_date_slot`` が揃っている場合は
+      ``roster_optimizer`` で staff × day の勤務コード表を最適化する
+      (シート ``rl_roster``、目的関数の内訳は ``rl_summary``)。
+    - 揃っていない場合は従来どおり需要 CSV（ds, need|y）の日次必要人数を
+      四捨五入したものを出力する。
+    - `horizon` : 従来互換の引数 (meta に記録のみ)。
     """
     log.info("[rl] learn_roster start")
 
+    if isinstance(need_per_date_slot, (str, Path)):
+        need_fp = Path(need_per_date_slot)
+        need_per_date_slot = pd.read_parquet(need_fp) if need_fp.exists() else None
+
+    if (
+        long_df is not None
+        and wt_df is not None
+        and need_per_date_slot is not None
+        and not long_df.empty
+        and not need_per_date_slot.empty
+    ):
+        return _optimize_roster_to_excel(
+            long_df,
+            wt_df,
+            need_per_date_slot,
+            excel_out,
+            horizon=horizon,
+            slot_minutes=slot_minutes,
+            time_limit_sec=time_limit_sec,
+            max_moves=max_moves,
+            seed=seed,
+        )
+
     df = pd.read_csv(demand_csv, parse_dates=["ds"])
 
     # --- 需要列を柔軟に取得 ---------------------------
@@ -50,7 +88,7 @@ def learn_roster(
         log.warning("[rl] 需要データが不足しているため学習をスキップ")
         return None
 
-    # --- ↓ Stub 処理：必要人数を四捨五入してそのまま配置 ----------
+    # --- スタッフ情報が無い場合：必要人数を四捨五入してそのまま配置 ----------
     roster = np.round(need).astype(int)
 
     out_df = pd.DataFrame({"ds": df["ds"], "roster": roster})
@@ -59,7 +97,7 @@ def learn_roster(
     # meta
     write_meta(
         excel_out.with_suffix(".meta.json"),
-        note="stub – roster = round(need)",
+        note="no staff data – roster = round(need)",
         horizon=horizon,
         rows=len(df),
     )
@@ -68,5 +106,59 @@ def learn_roster(
     return excel_out
 
 
+def _optimize_roster_to_excel(
+    long_df: pd.DataFrame,
+    wt_df: pd.DataFrame,
+    need_per_date_slot: pd.DataFrame,
+    excel_out: Path,
+    *,
+    horizon: int,
+    slot_minutes: int,
+    time_limit_sec: float,
+    max_moves: int,
+    seed: int | None,
+) -> Path | None:
+    problem = build_roster_problem(
+        long_df, wt_df, need_per_date_slot, slot_minutes=slot_minutes
+    )
+    if not problem.staff or not problem.dates:
+        log.warning("[rl] スタッフまたは日付が無いためロスター最適化をスキップ")
+        return None
+
+    result = optimize_roster(
+        problem, max_moves=max_moves, time_limit_sec=time_limit_sec, seed=seed
+    )
+    roster_df = roster_to_frame(problem, result.roster).reset_index()
+
+    excel_out = Path(excel_out)
+    excel_out.parent.mkdir(parents=True, exist_ok=True)
+    with pd.ExcelWriter(excel_out, engine="openpyxl") as writer:
+        roster_df.to_excel(writer, sheet_name="rl_roster", index=False)
+        pd.DataFrame(
+            {
+                "component": list(result.components),
+                "initial": [result.initial_components[k] for k in result.components],
+                "optimized": list(result.components.values()),
+            }
+        ).to_excel(writer, sheet_name="rl_summary", index=False)
+
+    write_meta(
+        excel_out.with_suffix(".meta.json"),
+        note="local search (simulated annealing) – roster_optimizer",
+        horizon=horizon,
+        staff=len(problem.staff),
+        days=len(problem.dates),
+        objective_initial=round(result.initial_objective, 2),
+        objective=round(result.objective, 2),
+        components=result.components,
+        moves_evaluated=result.moves_evaluated,
+        moves_accepted=result.moves_accepted,
+        moves_per_sec=round(result.moves_per_sec, 1),
+    )
+
+    log.info(f"[rl] roster saved → {excel_out}")
+    return excel_out
+
+
 # ═════════════════ __all__ ═════════════════
 __all__ = ["learn_roster"]
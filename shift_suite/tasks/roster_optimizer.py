@@ -0,0 +1,546 @@
+"""
+shift_suite.tasks.roster_optimizer  v1.0.0 – NumPy 局所探索ロスター最適化
+────────────────────────────────────────────────────────
+* ロスターを (staff × day) の勤務コード行列として保持し、
+  焼きなまし法 (SA) による局所探索で改善する。
+* 1 手ごとの目的関数は差分 (delta) のみ再計算する。
+    - 充足: 変更日 (と夜勤の翌日分) のスロット行だけ
+    - コスト: 変更セルの時給 × 勤務時間差
+    - 連勤: 変更日に接する連勤ランのみ
+    - 勤務間インターバル: 前日・翌日とのペアのみ
+* 候補コードは全コード同時に評価する (コード × スロット行列演算)。
+* OR-Tools (assignment.py) が使えない環境での高速フォールバックを想定。
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .constants import DEFAULT_SLOT_MINUTES, WAGE_RATES
+from .utils import gen_labels, log
+
+OFF_CODE = ""  # 0 番目のコード = 休み (未配置)
+DEFAULT_HOLIDAY_TYPE = "通常勤務"
+
+DEFAULT_WEIGHTS: Dict[str, float] = {
+    "shortage": 4000.0,  # 不足 1 時間あたり (COST_PARAMETERS の penalty と同水準)
+    "excess": 300.0,  # 過剰 1 時間あたり
+    "cost": 1.0,  # 人件費 (円)
+    "consecutive": 20000.0,  # 上限超過の連勤 1 日あたり
+    "rest": 20000.0,  # インターバル違反 1 件あたり
+}
+
+
+def _hhmm_to_minutes(value: Any) -> int | None:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    text = str(value).strip()
+    if not text or text.lower() in {"nan", "none"}:
+        return None
+    try:
+        hh, mm = text.split(":")[:2]
+        return int(hh) * 60 + int(mm)
+    except ValueError:
+        return None
+
+
+@dataclass
+class RosterProblem:
+    """最適化に必要な配列を事前計算して保持する。
+
+    Attributes
+    ----------
+    staff, dates, codes:
+        行列の軸ラベル。``codes[0]`` は常に休み (``OFF_CODE``)。
+    need:
+        (day × slot) の必要人数。
+    cover_same, cover_next:
+        (code × slot) の充足ベクトル。夜勤で日付をまたぐスロットは
+        ``cover_next`` 側 (翌日の行) に計上する。
+    code_hours:
+        コードごとの勤務時間。
+    rest_violation:
+        (code × code) – 前日 a → 当日 b でインターバル不足なら 1。
+    available:
+        (staff × day) – False のセルは固定 (休暇など) で変更しない。
+    wage:
+        スタッフごとの時給。
+    """
+
+    staff: List[str]
+    dates: List[dt.date]
+    slot_labels: List[str]
+    codes: List[str]
+    need: np.ndarray
+    cover_same: np.ndarray
+    cover_next: np.ndarray
+    code_hours: np.ndarray
+    rest_violation: np.ndarray
+    available: np.ndarray
+    wage: np.ndarray
+    allowed_codes: np.ndarray
+    initial: np.ndarray
+    slot_hours: float
+    max_consecutive_days: int = 5
+    weights: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_WEIGHTS))
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return len(self.staff), len(self.dates)
+
+
+def build_roster_problem(
+    long_df: pd.DataFrame,
+    wt_df: pd.DataFrame,
+    need_per_date_slot: pd.DataFrame,
+    *,
+    slot_minutes: int = DEFAULT_SLOT_MINUTES,
+    wages: Dict[str, float] | None = None,
+    max_consecutive_days: int = 5,
+    min_rest_hours: float = 11.0,
+    weights: Dict[str, float] | None = None,
+) -> RosterProblem:
+    """long_df / wt_df / need_per_date_slot から ``RosterProblem`` を構築する。
+
+    Parameters
+    ----------
+    long_df:
+        ``ingest_excel`` の長形式データ。現行ロスター (初期解) と
+        休暇日 (変更不可セル) の取得に使う。
+    wt_df:
+        勤務区分 (``code``, ``start_parsed``, ``end_parsed``, ``holiday_type``)。
+    need_per_date_slot:
+        index = ``HH:MM`` スロット, columns = ``YYYY-MM-DD`` の必要人数。
+    wages:
+        スタッフ名 → 時給。未指定は ``WAGE_RATES['regular_staff']``。
+    """
+    slot_labels = gen_labels(slot_minutes)
+    n_slots = len(slot_labels)
+    slot_hours = slot_minutes / 60.0
+
+    # ── 日付軸と need 行列 ──
+    need_dates = pd.to_datetime(pd.Index(need_per_date_slot.columns.astype(str)), errors="coerce")
+    valid_cols = ~need_dates.isna()
+    need_frame = need_per_date_slot.loc[:, valid_cols]
+    dates = [d.date() for d in need_dates[valid_cols]]
+    need_frame = need_frame.reindex(index=slot_labels).fillna(0.0)
+    need = need_frame.to_numpy(dtype=np.float64).T.copy()  # (day × slot)
+    date_pos = {d: i for i, d in enumerate(dates)}
+
+    # ── 勤務コード (0 = 休み) ──
+    work_codes = wt_df
+    if "holiday_type" in work_codes.columns:
+        work_codes = work_codes[work_codes["holiday_type"].fillna(DEFAULT_HOLIDAY_TYPE) == DEFAULT_HOLIDAY_TYPE]
+    codes: List[str] = [OFF_CODE]
+    starts: List[int] = [0]
+    ends: List[int] = [0]
+    for row in work_codes.itertuples(index=False):
+        code = str(getattr(row, "code", "") or "")
+        st_min = _hhmm_to_minutes(getattr(row, "start_parsed", None))
+        ed_min = _hhmm_to_minutes(getattr(row, "end_parsed", None))
+        if not code or code in codes or st_min is None or ed_min is None:
+            continue
+        if ed_min <= st_min:
+            ed_min += 24 * 60
+        codes.append(code)
+        starts.append(st_min)
+        ends.append(ed_min)
+
+    n_codes = len(codes)
+    start_arr = np.asarray(starts, dtype=np.int64)
+    end_arr = np.asarray(ends, dtype=np.int64)
+    slot_start = np.arange(n_slots, dtype=np.int64) * slot_minutes
+    cover_same = np.zeros((n_codes, n_slots), dtype=np.float64)
+    cover_next = np.zeros((n_codes, n_slots), dtype=np.float64)
+    if n_codes > 1:
+        s = start_arr[1:, None]
+        e = end_arr[1:, None]
+        cover_same[1:] = (slot_start[None, :] >= s) & (slot_start[None, :] < np.minimum(e, 24 * 60))
+        cover_next[1:] = slot_start[None, :] < (e - 24 * 60)
+    code_hours = (cover_same.sum(axis=1) + cover_next.sum(axis=1)) * slot_hours
+
+    # 前日 a の終業 → 当日 b の始業 までの休息 (分)
+    rest_minutes = 24 * 60 + start_arr[None, :] - end_arr[:, None]
+    rest_violation = (rest_minutes < min_rest_hours * 60).astype(np.float64)
+    rest_violation[0, :] = 0.0
+    rest_violation[:, 0] = 0.0
+
+    # ── スタッフ軸・初期解・可用性 ──
+    code_pos = {c: i for i, c in enumerate(codes)}
+    staff_series = long_df.get("staff", pd.Series(dtype=str)).astype(str).str.strip()
+    staff = sorted(s for s in staff_series.unique() if s)
+    staff_pos = {s: i for i, s in enumerate(staff)}
+    n_staff, n_days = len(staff), len(dates)
+    initial = np.zeros((n_staff, n_days), dtype=np.int16)
+    available = np.ones((n_staff, n_days), dtype=bool)
+
+    if n_staff and n_days and not long_df.empty:
+        ds = pd.to_datetime(long_df["ds"])
+        code_col = long_df.get("code", pd.Series("", index=long_df.index)).astype(str)
+        # 夜勤の翌日側スロット (始業時刻より前) は勤務開始日に帰属させる
+        code_start = code_col.map(dict(zip(codes[1:], starts[1:])))
+        minute_of_day = ds.dt.hour * 60 + ds.dt.minute
+        carried = (code_start.notna() & (minute_of_day < code_start)).to_numpy()
+        day_df = pd.DataFrame(
+            {
+                "staff": staff_series,
+                "date": (ds.dt.normalize() - pd.to_timedelta(carried.astype(int), unit="D")).dt.date,
+                "code": code_col,
+                "holiday_type": long_df.get(
+                    "holiday_type", pd.Series(DEFAULT_HOLIDAY_TYPE, index=long_df.index)
+                ).fillna(DEFAULT_HOLIDAY_TYPE),
+            }
+        )
+        day_df = day_df[day_df["staff"].isin(staff_pos) & day_df["date"].isin(date_pos)]
+        day_df = day_df.drop_duplicates(["staff", "date"], keep="first")
+        s_idx = day_df["staff"].map(staff_pos).to_numpy()
+        d_idx = day_df["date"].map(date_pos).to_numpy()
+        c_idx = day_df["code"].map(code_pos).fillna(0).to_numpy(dtype=np.int16)
+        initial[s_idx, d_idx] = c_idx
+        leave_mask = (day_df["holiday_type"] != DEFAULT_HOLIDAY_TYPE).to_numpy()
+        available[s_idx[leave_mask], d_idx[leave_mask]] = False
+
+    wage_default = float(WAGE_RATES["regular_staff"])
+    wage = np.array([float((wages or {}).get(s, wage_default)) for s in staff], dtype=np.float64)
+
+    merged_weights = dict(DEFAULT_WEIGHTS)
+    merged_weights.update(weights or {})
+
+    log.info(
+        f"[roster_optimizer] problem: staff={n_staff}, days={n_days}, codes={n_codes - 1}, slots={n_slots}"
+    )
+    return RosterProblem(
+        staff=staff,
+        dates=dates,
+        slot_labels=slot_labels,
+        codes=codes,
+        need=need,
+        cover_same=cover_same,
+        cover_next=cover_next,
+        code_hours=code_hours,
+        rest_violation=rest_violation,
+        available=available,
+        wage=wage,
+        allowed_codes=np.arange(n_codes, dtype=np.int16),
+        initial=initial,
+        slot_hours=slot_hours,
+        max_consecutive_days=max_consecutive_days,
+        weights=merged_weights,
+    )
+
+
+class RosterState:
+    """ロスター行列と目的関数の各成分をキャッシュし、差分評価を提供する。"""
+
+    def __init__(self, problem: RosterProblem, roster: np.ndarray | None = None) -> None:
+        self.problem = problem
+        self.roster = (problem.initial if roster is None else roster).astype(np.int16, copy=True)
+        self.recompute()
+
+    # ── 全体再計算 ──
+    def recompute(self) -> None:
+        p = self.problem
+        n_staff, n_days = p.shape
+        coverage = np.zeros_like(p.need)
+        if n_staff and n_days:
+            same = p.cover_same[self.roster].sum(axis=0)  # (day × slot)
+            nxt = p.cover_next[self.roster].sum(axis=0)
+            coverage += same
+            coverage[1:] += nxt[:-1]
+        self.coverage = coverage
+        self.working = self.roster > 0
+        diff = p.need - coverage
+        self.shortage = float(np.clip(diff, 0, None).sum() * p.slot_hours)
+        self.excess = float(np.clip(-diff, 0, None).sum() * p.slot_hours)
+        self.cost = float((p.code_hours[self.roster] * p.wage[:, None]).sum())
+        self.consecutive = float(self._consecutive_excess_all())
+        if n_days > 1:
+            self.rest = float(p.rest_violation[self.roster[:, :-1], self.roster[:, 1:]].sum())
+        else:
+            self.rest = 0.0
+
+    def _consecutive_excess_all(self) -> int:
+        limit = self.problem.max_consecutive_days
+        w = self.working.astype(np.int8)
+        if w.size == 0:
+            return 0
+        padded = np.pad(w, ((0, 0), (1, 1)))
+        edges = np.diff(padded, axis=1)
+        run_starts = np.nonzero(edges == 1)
+        run_ends = np.nonzero(edges == -1)
+        lengths = run_ends[1] - run_starts[1]
+        return int(np.clip(lengths - limit, 0, None).sum())
+
+    @property
+    def components(self) -> Dict[str, float]:
+        return {
+            "shortage": self.shortage,
+            "excess": self.excess,
+            "cost": self.cost,
+            "consecutive": self.consecutive,
+            "rest": self.rest,
+        }
+
+    @property
+    def objective(self) -> float:
+        w = self.problem.weights
+        return float(sum(w[k] * v for k, v in self.components.items()))
+
+    # ── 差分評価 ──
+    def _run_lengths(self, s: int, d: int) -> tuple[int, int]:
+        row = self.working[s]
+        left_part = row[:d][::-1]
+        left = int(np.argmin(left_part)) if left_part.size and not left_part.all() else left_part.size
+        right_part = row[d + 1 :]
+        right = int(np.argmin(right_part)) if right_part.size and not right_part.all() else right_part.size
+        return left, right
+
+    def delta_all_codes(self, s: int, d: int) -> tuple[np.ndarray, np.ndarray]:
+        """セル (s, d) を各コードに変えたときの目的関数差分と成分差分を返す。
+
+        Returns
+        -------
+        (total_delta, parts)
+            ``total_delta`` は (code,) 、``parts`` は (5 × code) で
+            shortage / excess / cost / consecutive / rest の順。
+        """
+        p = self.problem
+        n_days = p.need.shape[0]
+        cur = int(self.roster[s, d])
+        parts = np.zeros((5, len(p.codes)), dtype=np.float64)
+
+        # 充足 (当日)
+        cov = self.coverage[d]
+        need = p.need[d]
+        new_cov = cov[None, :] - p.cover_same[cur][None, :] + p.cover_same
+        old_diff = need - cov
+        new_diff = need[None, :] - new_cov
+        parts[0] = np.clip(new_diff, 0, None).sum(axis=1) - np.clip(old_diff, 0, None).sum()
+        parts[1] = np.clip(-new_diff, 0, None).sum(axis=1) - np.clip(-old_diff, 0, None).sum()
+        # 充足 (翌日: 日付またぎ分)
+        if d + 1 < n_days:
+            cov_n = self.coverage[d + 1]
+            need_n = p.need[d + 1]
+            new_cov_n = cov_n[None, :] - p.cover_next[cur][None, :] + p.cover_next
+            old_diff_n = need_n - cov_n
+            new_diff_n = need_n[None, :] - new_cov_n
+            parts[0] += np.clip(new_diff_n, 0, None).sum(axis=1) - np.clip(old_diff_n, 0, None).sum()
+            parts[1] += np.clip(-new_diff_n, 0, None).sum(axis=1) - np.clip(-old_diff_n, 0, None).sum()
+        parts[0:2] *= p.slot_hours
+
+        # コスト
+        parts[2] = (p.code_hours - p.code_hours[cur]) * p.wage[s]
+
+        # 連勤: 勤務⇔休みが切り替わる候補だけ変化する
+        limit = p.max_consecutive_days
+        left, right = self._run_lengths(s, d)
+        joined = max(left + right + 1 - limit, 0)
+        split = max(left - limit, 0) + max(right - limit, 0)
+        if cur > 0:
+            parts[3, 0] = split - joined
+        else:
+            parts[3, 1:] = joined - split
+
+        # インターバル
+        if d > 0:
+            prev = int(self.roster[s, d - 1])
+            parts[4] += p.rest_violation[prev, :] - p.rest_violation[prev, cur]
+        if d + 1 < n_days:
+            nxt = int(self.roster[s, d + 1])
+            parts[4] += p.rest_violation[:, nxt] - p.rest_violation[cur, nxt]
+
+        w = p.weights
+        weight_vec = np.array([w["shortage"], w["excess"], w["cost"], w["consecutive"], w["rest"]])
+        return weight_vec @ parts, parts
+
+    def apply(self, s: int, d: int, new_code: int, parts: np.ndarray | None = None) -> None:
+        """セル (s, d) を ``new_code`` に変更し、キャッシュを差分更新する。"""
+        p = self.problem
+        cur = int(self.roster[s, d])
+        if cur == new_code:
+            return
+        if parts is None:
+            _, parts = self.delta_all_codes(s, d)
+        self.coverage[d] += p.cover_same[new_code] - p.cover_same[cur]
+        if d + 1 < p.need.shape[0]:
+            self.coverage[d + 1] += p.cover_next[new_code] - p.cover_next[cur]
+        self.shortage += float(parts[0, new_code])
+        self.excess += float(parts[1, new_code])
+        self.cost += float(parts[2, new_code])
+        self.consecutive += float(parts[3, new_code])
+        self.rest += float(parts[4, new_code])
+        self.roster[s, d] = new_code
+        self.working[s, d] = new_code > 0
+
+
+@dataclass
+class RosterSearchResult:
+    roster: np.ndarray
+    objective: float
+    initial_objective: float
+    components: Dict[str, float]
+    initial_components: Dict[str, float]
+    moves_evaluated: int
+    moves_accepted: int
+    elapsed_sec: float
+
+    @property
+    def moves_per_sec(self) -> float:
+        return self.moves_evaluated / self.elapsed_sec if self.elapsed_sec > 0 else 0.0
+
+
+def optimize_roster(
+    problem: RosterProblem,
+    *,
+    max_moves: int = 200_000,
+    time_limit_sec: float = 30.0,
+    initial_temperature: float | None = None,
+    final_temperature: float = 1.0,
+    greedy_ratio: float = 0.5,
+    seed: int | None = 0,
+    roster: np.ndarray | None = None,
+) -> RosterSearchResult:
+    """焼きなまし法でロスターを改善する。
+
+    1 手 = 変更可能なセル (s, d) を 1 つ選び、全コードの差分を同時評価して
+    新コードを選ぶ (``greedy_ratio`` の確率で最良コード、それ以外は無作為)。
+    悪化手は Metropolis 基準で受理する。
+    """
+    rng = np.random.default_rng(seed)
+    state = RosterState(problem, roster)
+    initial_objective = state.objective
+    initial_components = state.components
+
+    free_cells = np.argwhere(problem.available)
+    n_codes = len(problem.codes)
+    if free_cells.size == 0 or n_codes < 2:
+        log.warning("[roster_optimizer] 変更可能なセルまたは勤務コードが無いため最適化をスキップ")
+        return RosterSearchResult(
+            state.roster, initial_objective, initial_objective, initial_components,
+            initial_components, 0, 0, 0.0,
+        )
+
+    if initial_temperature is None:
+        # 典型的な 1 手の変化量 (1 人 × 1 勤務の人件費) を初期温度の目安にする
+        initial_temperature = float(np.median(problem.code_hours[1:]) * np.mean(problem.wage)) or 1000.0
+    final_temperature = min(final_temperature, initial_temperature)
+    cooling = (final_temperature / initial_temperature) ** (1.0 / max(max_moves, 1))
+
+    best_roster = state.roster.copy()
+    best_objective = initial_objective
+    best_components = dict(initial_components)
+    current_objective = initial_objective
+
+    # 乱数はまとめて生成しておく
+    batch = 4096
+    temperature = initial_temperature
+    evaluated = accepted = 0
+    started = time.perf_counter()
+    deadline = started + time_limit_sec
+    while evaluated < max_moves:
+        cell_idx = rng.integers(0, len(free_cells), size=batch)
+        rand_code = rng.integers(1, n_codes, size=batch)
+        greedy_draw = rng.random(batch)
+        accept_draw = rng.random(batch)
+        for i in range(min(batch, max_moves - evaluated)):
+            s, d = free_cells[cell_idx[i]]
+            cur = int(state.roster[s, d])
+            total, parts = state.delta_all_codes(s, d)
+            if greedy_draw[i] < greedy_ratio:
+                total[cur] = np.inf
+                new_code = int(np.argmin(total))
+            else:
+                new_code = (cur + int(rand_code[i])) % n_codes
+            delta = float(total[new_code])
+            evaluated += 1
+            if delta <= 0 or accept_draw[i] < math.exp(-delta / temperature):
+                state.apply(s, d, new_code, parts)
+                current_objective += delta
+                accepted += 1
+                if current_objective < best_objective - 1e-9:
+                    best_objective = current_objective
+                    best_roster = state.roster.copy()
+                    best_components = state.components
+            temperature *= cooling
+        if time.perf_counter() > deadline:
+            break
+
+    elapsed = time.perf_counter() - started
+    result = RosterSearchResult(
+        roster=best_roster,
+        objective=best_objective,
+        initial_objective=initial_objective,
+        components=best_components,
+        initial_components=initial_components,
+        moves_evaluated=evaluated,
+        moves_accepted=accepted,
+        elapsed_sec=elapsed,
+    )
+    log.info(
+        f"[roster_optimizer] objective {initial_objective:,.0f} → {best_objective:,.0f} "
+        f"({evaluated} moves, {result.moves_per_sec:,.0f} moves/s)"
+    )
+    return result
+
+
+def roster_to_frame(problem: RosterProblem, roster: np.ndarray) -> pd.DataFrame:
+    """ロスター行列を staff × 日付 (``YYYY-MM-DD``) のコード表に変換する。"""
+    codes = np.asarray(problem.codes, dtype=object)
+    return pd.DataFrame(
+        codes[roster],
+        index=pd.Index(problem.staff, name="staff"),
+        columns=[d.isoformat() for d in problem.dates],
+    )
+
+
+def coverage_to_frame(problem: RosterProblem, roster: np.ndarray) -> pd.DataFrame:
+    """ロスター行列から slot × 日付 の配置人数表を作る (need_per_date_slot と同形式)。"""
+    state = RosterState(problem, roster)
+    return pd.DataFrame(
+        state.coverage.T,
+        index=problem.slot_labels,
+        columns=[d.isoformat() for d in problem.dates],
+    )
+
+
+def solve_roster(
+    long_df: pd.DataFrame,
+    wt_df: pd.DataFrame,
+    need_per_date_slot: pd.DataFrame,
+    *,
+    slot_minutes: int = DEFAULT_SLOT_MINUTES,
+    staff_subset: Sequence[str] | None = None,
+    **search_kwargs: Any,
+) -> tuple[pd.DataFrame, RosterSearchResult]:
+    """入力データから問題を構築して最適化し、ロスター表と結果を返す。"""
+    if staff_subset is not None:
+        long_df = long_df[long_df["staff"].isin(list(staff_subset))]
+    problem_kwargs = {
+        k: search_kwargs.pop(k)
+        for k in ("wages", "max_consecutive_days", "min_rest_hours", "weights")
+        if k in search_kwargs
+    }
+    problem = build_roster_problem(
+        long_df, wt_df, need_per_date_slot, slot_minutes=slot_minutes, **problem_kwargs
+    )
+    result = optimize_roster(problem, **search_kwargs)
+    return roster_to_frame(problem, result.roster), result
+
+
+__all__ = [
+    "RosterProblem",
+    "RosterState",
+    "RosterSearchResult",
+    "build_roster_problem",
+    "optimize_roster",
+    "roster_to_frame",
+    "coverage_to_frame",
+    "solve_roster",
+]
@@ -0,0 +1,317 @@
+"""
+shift_suite.tasks.scenario_manifest v1.0.0 – シナリオ概要マニフェスト
+────────────────────────────────────────────────────────────────
+* ダッシュボードの概要タブやスロット検出は、スロット間隔・対象期間・
+  職種数・レコード数といった数値のためだけに intermediate_data.parquet や
+  各 summary parquet を丸ごと読み込んでいた。
+* ``write_scenario_manifest`` は解析の最後に 1 回だけ
+  ``scenario.manifest.json`` を書き出す。内容は
+    - slot_minutes / date_range / roles / employments / staff_count
+    - record_counts (intermediate_data の行数・勤務レコード・休暇レコード)
+    - kpis (不足・過剰時間合計、平均疲労スコア、公平性スコア)
+    - files (ディレクトリ直下の全ファイルのサイズ・mtime、parquet は行数とスキーマ)
+  parquet の行数・スキーマはフッタから読み、KPI は必要な列だけを読む。
+* UI 側は ``read_scenario_manifest`` で先にマニフェストを参照し、
+  無い場合のみ従来どおりデータファイルを読む。
+* 期間・KPI の元ファイル (``TRACKED_FILES``) が書き出し後に作り直されると
+  (サイズ・mtime がマニフェストの記録と変わると) 読み込み時に組み立て直して書き換える。
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from .utils import log
+
+SCENARIO_MANIFEST_FILE = "scenario.manifest.json"
+MANIFEST_VERSION = 1
+_LONG_COLUMNS = ("ds", "staff", "role", "employment", "parsed_slots_count", "holiday_type")
+MAX_CACHED_MANIFESTS = 32
+DEFAULT_HOLIDAY_TYPE = "通常勤務"
+
+# KPI 名 → (ファイル, 列, 集計)。dash_app.collect_dashboard_overview_kpis と同じ定義
+KPI_SOURCES: Dict[str, Tuple[str, str, str]] = {
+    "total_shortage_hours": ("shortage_role_summary.parquet", "lack_h", "sum"),
+    "total_excess_hours": ("shortage_role_summary.parquet", "excess_h", "sum"),
+    "avg_fatigue_score": ("fatigue_score.parquet", "fatigue_score", "mean"),
+    "fairness_score": ("fairness_after.parquet", "fairness_score", "mean"),
+}
+# 更新されたらマニフェストを組み立て直すファイル (期間・人数・KPI の元)
+TRACKED_FILES: Tuple[str, ...] = tuple(
+    dict.fromkeys(["intermediate_data.parquet", "heatmap.meta.json", *(f for f, _, _ in KPI_SOURCES.values())])
+)
+
+
+def _read_json(fp: Path) -> Dict[str, Any]:
+    try:
+        return json.loads(fp.read_text(encoding="utf-8"))
+    except Exception:  # noqa: BLE001
+        return {}
+
+
+def _file_inventory(scenario_dir: Path) -> Dict[str, Dict[str, Any]]:
+    """直下のファイル一覧。parquet はフッタから行数とスキーマを取る"""
+    import pyarrow.parquet as pq
+
+    files: Dict[str, Dict[str, Any]] = {}
+    for fp in sorted(scenario_dir.iterdir()):
+        if not fp.is_file() or fp.name == SCENARIO_MANIFEST_FILE or fp.name.startswith("."):
+            continue
+        st = fp.stat()
+        entry: Dict[str, Any] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        if fp.suffix == ".parquet":
+            try:
+                pf = pq.ParquetFile(fp)
+                entry["rows"] = pf.metadata.num_rows
+                entry["columns"] = {
+                    f.name: str(f.type)
+                    for f in pf.schema_arrow
+                    if not f.name.startswith("__index_level_")
+                }
+            except Exception as e:  # noqa: BLE001
+                log.debug(f"[scenario_manifest] schema unavailable for {fp.name}: {e}")
+        files[fp.name] = entry
+    return files
+
+
+def _read_columns(fp: Path, columns: List[str], schema: Dict[str, str]) -> pd.DataFrame:
+    import pyarrow.parquet as pq
+
+    present = [c for c in columns if c in schema]
+    if not present:
+        return pd.DataFrame()
+    return pq.read_table(fp, columns=present).to_pandas()
+
+
+def _long_facts(long_df: pd.DataFrame) -> Dict[str, Any]:
+    """long_df から期間・人数・レコード数を求める"""
+    facts: Dict[str, Any] = {"record_counts": {"intermediate_data": int(len(long_df))}}
+    if "ds" in long_df.columns:
+        ds = pd.to_datetime(long_df["ds"], errors="coerce").dropna()
+        if not ds.empty:
+            days = ds.dt.normalize()
+            facts["date_range"] = {
+                "start": days.min().date().isoformat(),
+                "end": days.max().date().isoformat(),
+                "days": int(days.nunique()),
+            }
+    if "staff" in long_df.columns:
+        facts["staff_count"] = int(long_df["staff"].dropna().nunique())
+    for col, key in (("role", "roles"), ("employment", "employments")):
+        if col in long_df.columns:
+            values = long_df[col].dropna().astype(str)
+            facts[key] = sorted(v for v in values.unique() if v)
+    if "parsed_slots_count" in long_df.columns:
+        slots = pd.to_numeric(long_df["parsed_slots_count"], errors="coerce").fillna(0)
+        facts["record_counts"]["work_records"] = int((slots > 0).sum())
+    if "holiday_type" in long_df.columns:
+        ht = long_df["holiday_type"].astype(str)
+        facts["record_counts"]["leave_records"] = int((~ht.isin([DEFAULT_HOLIDAY_TYPE, "nan", "None", ""])).sum())
+    return facts
+
+
+def build_scenario_manifest(
+    scenario_dir: Path | str,
+    *,
+    long_df: Optional[pd.DataFrame] = None,
+    slot_minutes: Optional[int] = None,
+) -> Dict[str, Any]:
+    """``scenario_dir`` の成果物からマニフェストの内容を組み立てる"""
+    scenario_dir = Path(scenario_dir)
+    files = _file_inventory(scenario_dir)
+    heat_meta = _read_json(scenario_dir / "heatmap.meta.json")
+
+    if long_df is None and "intermediate_data.parquet" in files:
+        try:
+            long_df = _read_columns(
+                scenario_dir / "intermediate_data.parquet",
+                list(_LONG_COLUMNS),
+                files["intermediate_data.parquet"].get("columns", {}),
+            )
+        except Exception as e:  # noqa: BLE001
+            log.warning(f"[scenario_manifest] intermediate_data の読込に失敗: {e}")
+            long_df = None
+    facts = _long_facts(long_df) if long_df is not None else {"record_counts": {}}
+    # 行数は読み込んだ列に関係なくフッタの値を使う
+    if "intermediate_data.parquet" in files and "rows" in files["intermediate_data.parquet"]:
+        facts["record_counts"]["intermediate_data"] = files["intermediate_data.parquet"]["rows"]
+
+    # 期間・職種・雇用形態はヒートマップのメタ情報を優先 (ダッシュボードの表示と揃える)
+    dates = heat_meta.get("dates") or []
+    if dates:
+        facts["date_range"] = {"start": dates[0], "end": dates[-1], "days": len(dates)}
+    for key in ("roles", "employments"):
+        if heat_meta.get(key):
+            facts[key] = list(heat_meta[key])
+
+    kpis: Dict[str, Any] = {}
+    for name, (file_name, column, how) in KPI_SOURCES.items():
+        entry = files.get(file_name)
+        if entry is None or column not in entry.get("columns", {}):
+            continue
+        try:
+            series = pd.to_numeric(
+                _read_columns(scenario_dir / file_name, [column], entry["columns"])[column],
+                errors="coerce",
+            )
+            value = series.sum() if how == "sum" else series.mean()
+            kpis[name] = None if pd.isna(value) else float(value)
+        except Exception as e:  # noqa: BLE001
+            log.debug(f"[scenario_manifest] KPI {name} skipped: {e}")
+
+    return {
+        "version": MANIFEST_VERSION,
+        "generated_at": dt.datetime.now().isoformat(timespec="seconds"),
+        "scenario": scenario_dir.name,
+        "slot_minutes": slot_minutes or heat_meta.get("slot"),
+        "date_range": facts.get("date_range"),
+        "roles": facts.get("roles", []),
+        "employments": facts.get("employments", []),
+        "staff_count": facts.get("staff_count"),
+        "record_counts": facts["record_counts"],
+        "kpis": kpis,
+        "files": files,
+    }
+
+
+def write_scenario_manifest(
+    scenario_dir: Path | str,
+    *,
+    long_df: Optional[pd.DataFrame] = None,
+    slot_minutes: Optional[int] = None,
+) -> Optional[Path]:
+    """マニフェストを組み立てて ``scenario.manifest.json`` に書き出す"""
+    scenario_dir = Path(scenario_dir)
+    if not scenario_dir.is_dir():
+        return None
+    manifest = build_scenario_manifest(scenario_dir, long_df=long_df, slot_minutes=slot_minutes)
+    fp = _write_manifest(scenario_dir, manifest)
+    log.info(f"[scenario_manifest] {fp} を作成 ({len(manifest['files'])} files)")
+    return fp
+
+
+def _write_manifest(scenario_dir: Path, manifest: Dict[str, Any]) -> Path:
+    fp = scenario_dir / SCENARIO_MANIFEST_FILE
+    tmp = scenario_dir / f".{SCENARIO_MANIFEST_FILE}.{os.getpid()}.tmp"
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+    os.replace(tmp, fp)
+    return fp
+
+
+def _tracked_signature(scenario_dir: Path) -> Tuple[Optional[Tuple[int, int]], ...]:
+    """``TRACKED_FILES`` の現在の (サイズ, mtime)。無いファイルは None"""
+    sigs = []
+    for name in TRACKED_FILES:
+        try:
+            st = (scenario_dir / name).stat()
+            sigs.append((st.st_size, st.st_mtime_ns))
+        except OSError:
+            sigs.append(None)
+    return tuple(sigs)
+
+
+def _recorded_signature(manifest: Dict[str, Any]) -> Tuple[Optional[Tuple[int, int]], ...]:
+    files = manifest.get("files") or {}
+    return tuple(
+        (files[name]["size"], files[name]["mtime_ns"]) if name in files else None for name in TRACKED_FILES
+    )
+
+
+def refresh_scenario_manifest(
+    scenario_dir: Path | str, manifest: Optional[Dict[str, Any]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    期間・KPI の元ファイルがマニフェスト作成後に書き換えられていれば組み立て直して
+    書き出す。最新ならそのまま返す。書き込めない場合も組み立て直した内容を返す。
+    """
+    scenario_dir = Path(scenario_dir)
+    if manifest is None:
+        manifest = _read_json(scenario_dir / SCENARIO_MANIFEST_FILE)
+        if manifest.get("version") != MANIFEST_VERSION:
+            return None
+    if _recorded_signature(manifest) == _tracked_signature(scenario_dir):
+        return manifest
+    manifest = build_scenario_manifest(scenario_dir, slot_minutes=manifest.get("slot_minutes"))
+    try:
+        _write_manifest(scenario_dir, manifest)
+        log.info(f"[scenario_manifest] 成果物の更新を検出したため {scenario_dir.name} のマニフェストを更新")
+    except OSError as e:
+        log.warning(f"[scenario_manifest] マニフェストを更新できません {scenario_dir}: {e}")
+    return manifest
+
+
+# ─────────────────────────── read ───────────────────────────
+_CACHE: "OrderedDict[Tuple[str, int], Dict[str, Any]]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+
+def read_scenario_manifest(scenario_dir: Path | str | None) -> Optional[Dict[str, Any]]:
+    """
+    マニフェスト (無い・読めない場合は None)。(パス, mtime, 元ファイルのバージョン) 単位で
+    使い回し、元ファイルが更新されていれば ``refresh_scenario_manifest`` で組み立て直す。
+    """
+    if scenario_dir is None:
+        return None
+    scenario_dir = Path(scenario_dir)
+    fp = scenario_dir / SCENARIO_MANIFEST_FILE
+    try:
+        cache_key = (str(fp.resolve()), fp.stat().st_mtime_ns, _tracked_signature(scenario_dir))
+    except OSError:
+        return None
+    with _CACHE_LOCK:
+        manifest = _CACHE.get(cache_key)
+        if manifest is not None:
+            _CACHE.move_to_end(cache_key)
+            return manifest
+    manifest = _read_json(fp)
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    manifest = refresh_scenario_manifest(scenario_dir, manifest)
+    try:
+        cache_key = (str(fp.resolve()), fp.stat().st_mtime_ns, _tracked_signature(scenario_dir))
+    except OSError:
+        return manifest
+    with _CACHE_LOCK:
+        _CACHE[cache_key] = manifest
+        while len(_CACHE) > MAX_CACHED_MANIFESTS:
+            _CACHE.popitem(last=False)
+    return manifest
+
+
+def basic_info_from_manifest(manifest: Dict[str, Any], scenario_dir: Path | str) -> Dict[str, Any]:
+    """ダッシュボードの基本情報 (``collect_dashboard_basic_info`` と同じキー)"""
+    info: Dict[str, Any] = {"scenario_name": Path(scenario_dir).name}
+    date_range = manifest.get("date_range")
+    if date_range and date_range.get("start") and date_range.get("end"):
+        info["date_range"] = f"{date_range['start']} ～ {date_range['end']}"
+    else:
+        info["date_range"] = "N/A"
+    info["total_roles"] = len(manifest.get("roles") or [])
+    info["total_employments"] = len(manifest.get("employments") or [])
+    parquet_mtimes = [
+        e["mtime_ns"] for n, e in (manifest.get("files") or {}).items() if n.endswith(".parquet")
+    ]
+    if parquet_mtimes:
+        info["analysis_datetime"] = time.strftime(
+            "%Y-%m-%d %H:%M:%S", time.localtime(max(parquet_mtimes) / 1e9)
+        )
+    return info
+
+
+__all__ = [
+    "SCENARIO_MANIFEST_FILE",
+    "basic_info_from_manifest",
+    "build_scenario_manifest",
+    "read_scenario_manifest",
+    "refresh_scenario_manifest",
+    "write_scenario_manifest",
+]
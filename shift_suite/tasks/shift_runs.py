@@ -0,0 +1,164 @@
+"""
+shift_suite.tasks.shift_runs v1.0.0 – 職員ごとの勤務ランレングス表現
+────────────────────────────────────────────────────────────────
+* long_df はスロット 1 行なので、1 日の勤務が十数行に展開されている。
+  連続勤務の検出ではこれを「職員 × 日付 × 勤務コード × 連続区間」に
+  まとめた方が扱いやすく、行数も 1/10 程度になる。
+* ``build_shift_runs`` は (staff, ds) で一度だけ並べ替え、同じ職員・同じ日・
+  同じコードで時刻がスロット間隔ちょうどで続く行を 1 つのランにまとめる。
+  ラン内の時刻は ``start_sec + k * step_sec`` (k < n_slots) で復元できる。
+* 職員の並びは ``long_df['staff'].unique()`` と同じ出現順、ランは時刻順。
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Iterable, List
+
+import numpy as np
+import pandas as pd
+
+SECONDS_PER_DAY = 86_400
+_NS_PER_SECOND = 1_000_000_000
+
+
+@dataclass
+class ShiftRuns:
+    """職員ごとのラン列 (すべて同じ長さの配列)"""
+
+    staff: np.ndarray       # staff_names への添字
+    day: np.ndarray         # 1970-01-01 からの日数
+    code: np.ndarray        # code_names への添字 (欠損は -1)
+    start_sec: np.ndarray   # 先頭スロットの時刻 (0:00 からの秒)
+    end_sec: np.ndarray     # 最終スロットの時刻 (0:00 からの秒)
+    n_slots: np.ndarray
+    step_sec: int           # スロット間隔 (推定できない場合は 0)
+    staff_names: pd.Index
+    code_names: pd.Index
+
+    def __len__(self) -> int:
+        return len(self.staff)
+
+    # ---- 日単位の区間 -----------------------------------------------------------
+    @property
+    def day_starts(self) -> np.ndarray:
+        """(staff, day) が切り替わるランの位置"""
+        if len(self) == 0:
+            return np.zeros(0, dtype=np.intp)
+        change = (self.staff[1:] != self.staff[:-1]) | (self.day[1:] != self.day[:-1])
+        return np.flatnonzero(np.r_[True, change])
+
+    def code_ids(self, codes: Iterable) -> np.ndarray:
+        """コード集合を code_names の添字に変換 (存在しないコードは無視)"""
+        index = self.code_names
+        return np.asarray([index.get_loc(c) for c in codes if c in index], dtype=np.intp)
+
+    def match_times(self, lo_sec: int, hi_sec: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        各ラン内で lo_sec <= t <= hi_sec を満たす最初/最後のスロット時刻。
+        該当スロットが無いランは (-1, -1)。
+        """
+        first = np.full(len(self), -1, dtype=np.int64)
+        last = np.full(len(self), -1, dtype=np.int64)
+        if len(self) == 0:
+            return first, last
+        step = self.step_sec
+        if step > 0:
+            k_lo = np.maximum(0, -((self.start_sec - lo_sec) // step))   # ceil((lo - start) / step)
+            k_hi = np.minimum(self.n_slots - 1, (hi_sec - self.start_sec) // step)
+            ok = k_lo <= k_hi
+            first[ok] = self.start_sec[ok] + k_lo[ok] * step
+            last[ok] = self.start_sec[ok] + k_hi[ok] * step
+        else:
+            ok = (self.start_sec >= lo_sec) & (self.start_sec <= hi_sec)
+            first[ok] = self.start_sec[ok]
+            last[ok] = self.start_sec[ok]
+        return first, last
+
+    def to_frame(self) -> pd.DataFrame:
+        """確認用の (staff, date, code, start_min, end_min, n_slots) 表"""
+        codes = np.full(len(self), None, dtype=object)
+        known = self.code >= 0
+        codes[known] = np.asarray(self.code_names, dtype=object)[self.code[known]]
+        return pd.DataFrame(
+            {
+                "staff": np.asarray(self.staff_names, dtype=object).take(self.staff),
+                "date": pd.to_datetime(self.day, unit="D"),
+                "code": codes,
+                "start_min": self.start_sec // 60,
+                "end_min": self.end_sec // 60,
+                "n_slots": self.n_slots,
+            }
+        )
+
+
+def day_to_str(days: np.ndarray) -> List[str]:
+    """日数配列 → 'YYYY-MM-DD' 文字列"""
+    return np.datetime_as_string(np.asarray(days, dtype="datetime64[D]"), unit="D").tolist()
+
+
+def sec_to_hhmm(seconds: int) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}"
+
+
+def build_shift_runs(
+    long_df: pd.DataFrame,
+    *,
+    code_col: str | None = "code",
+    staff_col: str = "staff",
+    time_col: str = "ds",
+) -> ShiftRuns:
+    """long_df からラン列を作る (staff / ds が欠損の行は除外)"""
+    ts = pd.to_datetime(long_df[time_col], errors="coerce")
+    if getattr(ts.dt, "tz", None) is not None:
+        ts = ts.dt.tz_localize(None)
+    staff_codes, staff_names = pd.factorize(long_df[staff_col])
+    if code_col is not None and code_col in long_df.columns:
+        code_codes, code_names = pd.factorize(long_df[code_col])
+    else:
+        code_codes, code_names = np.full(len(long_df), -1, dtype=np.intp), pd.Index([])
+
+    ns = ts.to_numpy(dtype="datetime64[ns]").view(np.int64)
+    valid = ts.notna().to_numpy() & (staff_codes >= 0)
+    order = np.flatnonzero(valid)
+    order = order[np.lexsort((ns[order], staff_codes[order]))]
+
+    s = staff_codes[order]
+    c = code_codes[order]
+    sec_total = ns[order] // _NS_PER_SECOND
+    d = sec_total // SECONDS_PER_DAY
+    t = sec_total - d * SECONDS_PER_DAY
+
+    same = (s[1:] == s[:-1]) & (d[1:] == d[:-1]) & (c[1:] == c[:-1])
+    diffs = t[1:] - t[:-1]
+    positive = diffs[same & (diffs > 0)]
+    if len(positive):
+        values, counts = np.unique(positive, return_counts=True)
+        step = int(values[np.argmax(counts)])
+    else:
+        step = 0
+    contiguous = same & (diffs == step) & (step > 0)
+
+    starts = np.flatnonzero(np.r_[True, ~contiguous]) if len(s) else np.zeros(0, dtype=np.intp)
+    ends = np.r_[starts[1:], len(s)] - 1 if len(s) else np.zeros(0, dtype=np.intp)
+    return ShiftRuns(
+        staff=s[starts],
+        day=d[starts],
+        code=c[starts],
+        start_sec=t[starts],
+        end_sec=t[ends],
+        n_slots=(ends - starts + 1).astype(np.int64),
+        step_sec=step,
+        staff_names=pd.Index(staff_names),
+        code_names=pd.Index(code_names),
+    )
+
+
+__all__ = [
+    "SECONDS_PER_DAY",
+    "ShiftRuns",
+    "build_shift_runs",
+    "day_to_str",
+    "sec_to_hhmm",
+]
@@ -4,13 +4,20 @@ shortage.py – v2.7.0 (最終修正版)
 * v2.7.0: 全体の不足計算(shortage_time)のロジックを、詳細Needファイル
           (need_per_date_slot.parquet)を最優先で利用するよう全面的に刷新。
           これにより、休日の過剰な不足計上問題を完全に解決する。
+* v2.8.0: build_heatmap の HeatmapResult を heatmap_result 引数で受け取れるようにし、
+          同一プロセス内ではヒートマップ Excel / Need parquet を再読込しない。
+* v2.9.0: 全体・職種別・雇用形態別の need / staff / lack / excess を
+          shortage_cube (スロット単位キューブ + ロールアップ) として保存し、
+          曜日別タイムスロットサマリーはキューブのロールアップから生成する。
+* v2.10.0: 日付列の判定は utils.date_columns に集約し、heat / need parquet は
+          read_df_parquet で保存済みの日付軸ごと読み込む。
 """
 
 from __future__ import annotations
 
 import datetime as dt
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Set, Tuple
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Set, Tuple
 
 import json
 
@@ -18,8 +25,19 @@ import numpy as np
 import pandas as pd
 
 from .. import config
-from .constants import SUMMARY5  # 🔧 修正: 動的値使用
-from .utils import _parse_as_date, gen_labels, log, save_df_parquet, write_meta
+from .shortage_cube import ALL_KEY, ShortageCubeBuilder
+from .utils import (
+    _parse_as_date,
+    date_columns,
+    gen_labels,
+    log,
+    read_df_parquet,
+    save_df_parquet,
+    write_meta,
+)
+
+if TYPE_CHECKING:
+    from .heatmap import HeatmapResult
 
 # 不足分析専用ログ
 try:
@@ -538,6 +556,15 @@ def detect_period_dependency_risk(period_days, total_shortage):
 
 
 
+def _load_frame(source: Path | pd.DataFrame) -> pd.DataFrame:
+    """ヒートマップ / Need のソースを DataFrame にする (メモリ上ならそのまま返す)"""
+    if isinstance(source, pd.DataFrame):
+        return source
+    if source.suffix == ".parquet":
+        return read_df_parquet(source)
+    return pd.read_excel(source, index_col=0)
+
+
 def shortage_and_brief(
     out_dir: Path | str,
     slot: int,
@@ -548,6 +575,7 @@ def shortage_and_brief(
     wage_temp: float = 0.0,
     penalty_per_lack: float = 0.0,
     auto_detect_slot: bool = True,
+    heatmap_result: "HeatmapResult | None" = None,
 ) -> Tuple[Path, Path] | None:
     """Run shortage analysis and KPI summary.
 
@@ -568,6 +596,10 @@ def shortage_and_brief(
         Penalty or opportunity cost per hour of shortage.
     auto_detect_slot:
         Enable automatic slot interval detection from data.
+    heatmap_result:
+        ``build_heatmap(..., return_result=True)`` の戻り値。渡された場合は
+        ``heat_*.xlsx`` / ``need_per_date_slot*.parquet`` / ``heatmap.meta.json``
+        を読まずにメモリ上のデータを使う。
     """
     out_dir_path = Path(out_dir)
     time_labels = gen_labels(slot)
@@ -576,10 +608,15 @@ def shortage_and_brief(
     log.info(f"[shortage] 動的スロット設定: {slot}分 = {slot_hours}時間")
 
     estimated_holidays_set: Set[dt.date] = set()
+    cube_builder = ShortageCubeBuilder(slot)
     log.info("[shortage] v2.7.0 処理開始")
 
     try:
-        heat_all_df = pd.read_parquet(out_dir_path / "heat_ALL.parquet")
+        heat_all_df = (
+            heatmap_result.heat_all
+            if heatmap_result is not None
+            else read_df_parquet(out_dir_path / "heat_ALL.parquet")
+        )
     except FileNotFoundError:
         log.error("[shortage] heat_ALL.parquet が見つかりません。処理を中断します。")
         return None
@@ -595,32 +632,45 @@ def shortage_and_brief(
     need_per_date_slot_df = pd.DataFrame()
     
     # 🔧 CRITICAL FIX: 統計手法別のNeedファイルを統合して正しく読み込む
-    need_role_files = list(out_dir_path.glob("need_per_date_slot_role_*.parquet"))
+    if heatmap_result is not None:
+        need_role_sources = {
+            f"need_per_date_slot_role_{name}.parquet": frame.need
+            for name, frame in heatmap_result.roles.items()
+        }
+    else:
+        need_role_sources = {
+            fp.name: fp for fp in out_dir_path.glob("need_per_date_slot_role_*.parquet")
+        }
     
-    if need_role_files:
-        log.info(f"[shortage] ★★★ 統計手法対応: {len(need_role_files)}個の職種別Needファイルを統合します ★★★")
+    if need_role_sources:
+        log.info(f"[shortage] ★★★ 統計手法対応: {len(need_role_sources)}個の職種別Needファイルを統合します ★★★")
         
         # 全ての職種を公平に集計（複合職種も独立した職種として扱う）
         combined_need_df = pd.DataFrame()
         
-        for need_file in need_role_files:
+        for need_name, need_source in need_role_sources.items():
             try:
-                role_need_df = pd.read_parquet(need_file)
+                role_need_df = _load_frame(need_source)
                 if combined_need_df.empty:
                     combined_need_df = role_need_df.copy()
                 else:
                     # 同じ時間帯・日付での需要を合計
                     combined_need_df = combined_need_df.add(role_need_df, fill_value=0)
-                log.debug(f"[shortage] 統合: {need_file.name} (形状: {role_need_df.shape})")
+                log.debug(f"[shortage] 統合: {need_name} (形状: {role_need_df.shape})")
             except Exception as e:
-                log.warning(f"[shortage] {need_file.name} の読み込みエラー: {e}")
+                log.warning(f"[shortage] {need_name} の読み込みエラー: {e}")
         
         need_per_date_slot_df = combined_need_df
         log.info(f"[shortage] ★★★ 統計手法対応Need統合完了: 形状 {need_per_date_slot_df.shape} ★★★")
     else:
         # フォールバック: 従来の固定ファイル
         need_per_date_slot_fp = out_dir_path / "need_per_date_slot.parquet"
-        if need_per_date_slot_fp.exists():
+        if heatmap_result is not None:
+            need_per_date_slot_df = heatmap_result.need_per_date_slot.copy()
+            log.warning(
+                "[shortage] ⚠️ 職種別Needデータが無いため、全体Needを使用 ⚠️"
+            )
+        elif need_per_date_slot_fp.exists():
             try:
                 need_per_date_slot_df = pd.read_parquet(need_per_date_slot_fp)
                 log.warning(
@@ -632,11 +682,7 @@ def shortage_and_brief(
             log.warning("[shortage] ⚠️ 利用可能なNeedファイルが見つかりません ⚠️")
 
     # heat_ALL.parquetから日付列を特定
-    date_columns_in_heat_all = [
-        str(col)
-        for col in heat_all_df.columns
-        if col not in SUMMARY5 and _parse_as_date(str(col)) is not None
-    ]
+    date_columns_in_heat_all = [str(col) for col in date_columns(heat_all_df.columns)]
     if not date_columns_in_heat_all:
         log.warning("[shortage] heat_ALL.parquet に日付データ列が見つかりませんでした。")
         # 処理を中断せずに空のファイルを生成
@@ -659,7 +705,9 @@ def shortage_and_brief(
 
     # heatmap.meta.jsonから休業日情報を取得
     meta_fp = out_dir_path / "heatmap.meta.json"
-    if meta_fp.exists():
+    if heatmap_result is not None:
+        estimated_holidays_set.update(heatmap_result.estimated_holidays)
+    elif meta_fp.exists():
         try:
             meta = json.loads(meta_fp.read_text(encoding="utf-8"))
             estimated_holidays_set.update(
@@ -689,7 +737,9 @@ def shortage_and_brief(
         # 【フォールバック】詳細Needデータがない場合、従来の曜日パターンで計算
         log.warning("[shortage] 詳細Needデータがないため、従来の曜日パターンに基づきNeedを計算します。")
         dow_need_pattern_df = pd.DataFrame()
-        if meta_fp.exists():
+        if heatmap_result is not None:
+            dow_need_pattern_df = heatmap_result.dow_need_pattern
+        elif meta_fp.exists():
             meta = json.loads(meta_fp.read_text(encoding="utf-8"))
             pattern_records = meta.get("dow_need_pattern", [])
             if pattern_records:
@@ -700,8 +750,9 @@ def shortage_and_brief(
         need_df_all = pd.DataFrame(
             index=time_labels, columns=staff_actual_data_all_df.columns, dtype=float
         )
+        all_date_axis = date_columns(staff_actual_data_all_df.columns)
         parsed_date_list_all = [
-            _parse_as_date(c) for c in staff_actual_data_all_df.columns
+            all_date_axis.get(c) for c in staff_actual_data_all_df.columns
         ]
         for col, d in zip(need_df_all.columns, parsed_date_list_all, strict=True):
             is_holiday = d in estimated_holidays_set if d else False
@@ -841,11 +892,8 @@ def shortage_and_brief(
         index=True,
     )
 
-    sunday_columns = [
-        col
-        for col in lack_count_overall_df.columns
-        if _parse_as_date(col) and _parse_as_date(col).weekday() == 6
-    ]
+    lack_date_axis = date_columns(lack_count_overall_df.columns)
+    sunday_columns = [col for col, d in lack_date_axis.items() if d.weekday() == 6]
 
     if sunday_columns:
         log.info("[SHORTAGE_DEBUG] ========== 日曜日の不足分析 ==========")
@@ -855,7 +903,7 @@ def shortage_and_brief(
             actual_sum = staff_actual_data_all_df[col].sum()
             need_sum = need_df_all[col].sum()
             lack_sum = lack_count_overall_df[col].sum()
-            is_holiday = _parse_as_date(col) in estimated_holidays_set
+            is_holiday = lack_date_axis[col] in estimated_holidays_set
 
             log.info(f"[SHORTAGE_DEBUG] {col}:")
             log.info(f"[SHORTAGE_DEBUG]   休業日={is_holiday}")
@@ -894,8 +942,9 @@ def shortage_and_brief(
             index=upper_series_overall_orig.index,
             columns=staff_actual_data_all_df.columns,
         )
+        all_date_axis = date_columns(staff_actual_data_all_df.columns)
         parsed_date_list_all = [
-            _parse_as_date(c) for c in staff_actual_data_all_df.columns
+            all_date_axis.get(c) for c in staff_actual_data_all_df.columns
         ]
         holiday_mask_all = [
             d in estimated_holidays_set if d else False for d in parsed_date_list_all
@@ -956,6 +1005,14 @@ def shortage_and_brief(
         log.warning(
             "[shortage] heat_ALL.xlsx に 'upper' 列がないため excess 分析をスキップします。"
         )
+    cube_builder.add(
+        "all",
+        ALL_KEY,
+        need=need_df_all,
+        staff=staff_actual_data_all_df,
+        lack=lack_count_overall_df,
+        excess=excess_count_overall_df if fp_excess_time else None,
+    )
 
     weights = config.get("optimization_weights", {"lack": 0.6, "excess": 0.4})
     w_lack = float(weights.get("lack", 0.6))
@@ -984,26 +1041,32 @@ def shortage_and_brief(
     monthly_role_rows: List[Dict[str, Any]] = []
     processed_role_names_list = []
 
-    for fp_role_heatmap_item in out_dir_path.glob("heat_*.xlsx"):
-        if fp_role_heatmap_item.name == "heat_ALL.xlsx":
-            continue
-        
-        # 雇用形態別ファイル(heat_emp_*)は職種別処理から除外
-        if fp_role_heatmap_item.name.startswith("heat_emp_"):
-            log.info(f"[shortage] スキップ: {fp_role_heatmap_item.name} (雇用形態別データのため職種処理から除外)")
-            continue
+    role_heat_sources: Dict[str, Path | pd.DataFrame] = {}
+    if heatmap_result is not None:
+        role_heat_sources = {name: frame.heat for name, frame in heatmap_result.roles.items()}
+    else:
+        for fp_role_heatmap_item in out_dir_path.glob("heat_*.xlsx"):
+            if fp_role_heatmap_item.name == "heat_ALL.xlsx":
+                continue
+            
+            # 雇用形態別ファイル(heat_emp_*)は職種別処理から除外
+            if fp_role_heatmap_item.name.startswith("heat_emp_"):
+                log.info(f"[shortage] スキップ: {fp_role_heatmap_item.name} (雇用形態別データのため職種処理から除外)")
+                continue
+            
+            role_heat_sources[fp_role_heatmap_item.stem.replace("heat_", "")] = fp_role_heatmap_item
 
-        role_name_current = fp_role_heatmap_item.stem.replace("heat_", "")
+    for role_name_current, role_heat_source in role_heat_sources.items():
         processed_role_names_list.append(role_name_current)
         log.debug(
             f"--- shortage_role.xlsx 計算デバッグ (職種: {role_name_current}) ---"
         )
 
         try:
-            role_heat_current_df = pd.read_excel(fp_role_heatmap_item, index_col=0)
+            role_heat_current_df = _load_frame(role_heat_source)
         except Exception as e_role_heat:
             log.warning(
-                f"[shortage] 職種別ヒートマップ '{fp_role_heatmap_item.name}' の読み込みエラー: {e_role_heat}"
+                f"[shortage] 職種別ヒートマップ 'heat_{role_name_current}' の読み込みエラー: {e_role_heat}"
             )
             role_kpi_rows.append(
                 {
@@ -1040,9 +1103,7 @@ def shortage_and_brief(
         )
 
         role_date_columns_list = [
-            str(col)
-            for col in role_heat_current_df.columns
-            if col not in SUMMARY5 and _parse_as_date(str(col)) is not None
+            str(col) for col in date_columns(role_heat_current_df.columns)
         ]
         if not role_date_columns_list:
             log.warning(
@@ -1067,8 +1128,9 @@ def shortage_and_brief(
             .fillna(0)
         )
 
+        role_date_axis = date_columns(role_staff_actual_data_df.columns)
         parsed_role_dates = [
-            _parse_as_date(c) for c in role_staff_actual_data_df.columns
+            role_date_axis.get(c) for c in role_staff_actual_data_df.columns
         ]
         holiday_mask_role = [
             d in estimated_holidays_set if d else False for d in parsed_role_dates
@@ -1080,10 +1142,18 @@ def shortage_and_brief(
         # 職種別詳細Needファイルを読み込み
         role_safe_name = role_name_current.replace(' ', '_').replace('/', '_').replace('\\', '_')
         role_need_file = out_dir_path / f"need_per_date_slot_role_{role_safe_name}.parquet"
+        if heatmap_result is not None:
+            role_need_source = (
+                heatmap_result.roles[role_name_current].need
+                if role_name_current in heatmap_result.roles
+                else None
+            )
+        else:
+            role_need_source = role_need_file if role_need_file.exists() else None
         
-        if role_need_file.exists():
+        if role_need_source is not None:
             try:
-                need_df_role = pd.read_parquet(role_need_file)
+                need_df_role = _load_frame(role_need_source)
                 # インデックスと列を適切に調整
                 need_df_role = need_df_role.reindex(index=time_labels, fill_value=0)
                 # 実績データと同じ列（日付）に調整
@@ -1140,7 +1210,7 @@ def shortage_and_brief(
             for c, is_h in zip(
                 role_staff_actual_data_df.columns, holiday_mask_role, strict=True
             )
-            if not is_h and _parse_as_date(c)
+            if not is_h and c in role_date_axis
         ]
         num_working_days_for_current_role = len(working_cols_role)
 
@@ -1227,6 +1297,15 @@ def shortage_and_brief(
                     f"[shortage] daily debug summary failed for {role_name_current}: {e_daily}"
                 )
 
+        cube_builder.add(
+            "role",
+            role_name_current,
+            need=need_df_role,
+            staff=role_staff_actual_data_df,
+            lack=role_lack_count_for_specific_role_df,
+            excess=role_excess_count_for_specific_role_df,
+        )
+
         # 月別不足h・過剰h集計
         try:
             lack_by_date = role_lack_count_for_specific_role_df.sum()
@@ -1357,17 +1436,25 @@ def shortage_and_brief(
     monthly_emp_rows: List[Dict[str, Any]] = []
     processed_emp_names_list = []
 
-    for fp_emp_heatmap_item in out_dir_path.glob("heat_emp_*.xlsx"):
-        emp_name_current = fp_emp_heatmap_item.stem.replace("heat_emp_", "")
+    if heatmap_result is not None:
+        emp_heat_sources: Dict[str, Path | pd.DataFrame] = {
+            name: frame.heat for name, frame in heatmap_result.employments.items()
+        }
+    else:
+        emp_heat_sources = {
+            fp.stem.replace("heat_emp_", ""): fp for fp in out_dir_path.glob("heat_emp_*.xlsx")
+        }
+
+    for emp_name_current, emp_heat_source in emp_heat_sources.items():
         processed_emp_names_list.append(emp_name_current)
         log.debug(
             f"--- shortage_employment.xlsx 計算デバッグ (雇用形態: {emp_name_current}) ---"
         )
         try:
-            emp_heat_current_df = pd.read_excel(fp_emp_heatmap_item, index_col=0)
+            emp_heat_current_df = _load_frame(emp_heat_source)
         except Exception as e_emp_heat:
             log.warning(
-                f"[shortage] 雇用形態別ヒートマップ '{fp_emp_heatmap_item.name}' の読み込みエラー: {e_emp_heat}"
+                f"[shortage] 雇用形態別ヒートマップ 'heat_emp_{emp_name_current}' の読み込みエラー: {e_emp_heat}"
             )
             emp_kpi_rows.append(
                 {
@@ -1403,11 +1490,7 @@ def shortage_and_brief(
             .fillna(0)
             .clip(lower=0)
         )
-        emp_date_columns = [
-            str(c)
-            for c in emp_heat_current_df.columns
-            if c not in SUMMARY5 and _parse_as_date(str(c)) is not None
-        ]
+        emp_date_columns = [str(c) for c in date_columns(emp_heat_current_df.columns)]
         if not emp_date_columns:
             log.warning(
                 f"[shortage] 雇用形態 '{emp_name_current}' のヒートマップに日付列がありません。KPI計算をスキップします。"
@@ -1430,7 +1513,8 @@ def shortage_and_brief(
             .reindex(index=time_labels)
             .fillna(0)
         )
-        parsed_emp_dates = [_parse_as_date(c) for c in emp_staff_df.columns]
+        emp_date_axis = date_columns(emp_staff_df.columns)
+        parsed_emp_dates = [emp_date_axis.get(c) for c in emp_staff_df.columns]
         holiday_mask_emp = [
             d in estimated_holidays_set if d else False for d in parsed_emp_dates
         ]
@@ -1440,10 +1524,18 @@ def shortage_and_brief(
         # 雇用形態別詳細Needファイルを読み込み
         emp_safe_name = emp_name_current.replace(' ', '_').replace('/', '_').replace('\\', '_')
         emp_need_file = out_dir_path / f"need_per_date_slot_emp_{emp_safe_name}.parquet"
+        if heatmap_result is not None:
+            emp_need_source = (
+                heatmap_result.employments[emp_name_current].need
+                if emp_name_current in heatmap_result.employments
+                else None
+            )
+        else:
+            emp_need_source = emp_need_file if emp_need_file.exists() else None
         
-        if emp_need_file.exists():
+        if emp_need_source is not None:
             try:
-                need_df_emp = pd.read_parquet(emp_need_file)
+                need_df_emp = _load_frame(emp_need_source)
                 # インデックスと列を適切に調整
                 need_df_emp = need_df_emp.reindex(index=time_labels, fill_value=0)
                 # 実績データと同じ列（日付）に調整
@@ -1491,7 +1583,7 @@ def shortage_and_brief(
         working_cols_emp = [
             c
             for c, is_h in zip(emp_staff_df.columns, holiday_mask_emp, strict=True)
-            if not is_h and _parse_as_date(c)
+            if not is_h and c in emp_date_axis
         ]
         num_working_days_for_current_emp = len(working_cols_emp)
 
@@ -1527,6 +1619,15 @@ def shortage_and_brief(
             else 0
         )
 
+        cube_builder.add(
+            "employment",
+            emp_name_current,
+            need=need_df_emp,
+            staff=emp_staff_df,
+            lack=lack_count_emp_df,
+            excess=excess_count_emp_df,
+        )
+
         try:
             lack_by_date = lack_count_emp_df.sum()
             lack_by_date.index = pd.to_datetime(lack_by_date.index)
@@ -1675,10 +1776,23 @@ def shortage_and_brief(
         + (f"excess_freq → {fp_excess_freq.name}" if fp_excess_freq else "")
     )
     
+    # 過不足キューブ (ダッシュボードのドリルダウン用)
+    shortage_cube = None
+    try:
+        shortage_cube = cube_builder.build()
+        shortage_cube.save(out_dir_path)
+    except Exception as e:
+        log.error(f"[shortage] 過不足キューブ保存エラー: {e}")
+
     # 🎯 修正: 最適採用計画に必要なサマリーファイルを生成
     try:
         # shortage_weekday_timeslot_summary.parquet を生成
-        if fp_shortage_time and fp_shortage_time.exists():
+        if shortage_cube is not None and not shortage_cube.rollups.empty:
+            weekday_summary_df = shortage_cube.period_timeslot_summary("weekday")
+            weekday_summary_path = out_dir_path / "shortage_weekday_timeslot_summary.parquet"
+            weekday_summary_df.to_parquet(weekday_summary_path, index=False)
+            log.info(f"[shortage] 曜日別タイムスロットサマリー生成 (キューブ): {weekday_summary_path.name}")
+        elif fp_shortage_time and fp_shortage_time.exists():
             weekday_summary_df = weekday_timeslot_summary(out_dir_path)
             weekday_summary_path = out_dir_path / "shortage_weekday_timeslot_summary.parquet"
             weekday_summary_df.to_parquet(weekday_summary_path, index=False)
@@ -1883,7 +1997,7 @@ def _summary_by_period(df: pd.DataFrame, *, period: str) -> pd.DataFrame:
         Aggregated average counts per time slot.
     """
 
-    date_cols = [c for c in df.columns if _parse_as_date(str(c)) is not None]
+    date_cols = list(date_columns(df.columns))
     if not date_cols:
         return pd.DataFrame(columns=[period, "timeslot", "avg_count"])
 
@@ -0,0 +1,334 @@
+"""
+shift_suite.tasks.shortage_cube v1.0.0 – スロット単位の過不足キューブ
+────────────────────────────────────────────────────────────────
+* shortage_and_brief が計算した need / staff / lack / excess を
+  (scope, key, date, slot) の縦持ち表 ``shortage_cube.parquet`` として保存する。
+  scope は ``all`` (全体) / ``role`` (職種) / ``employment`` (雇用形態)。
+  職種 × 雇用形態のクロス集計はヒートマップ側に存在しないため持たない。
+* 曜日 × スロット・月内区分 × スロット・月・日・スロット・合計のロールアップを
+  保存時に事前計算し ``shortage_cube_rollups.parquet`` に書き出す。
+* ``ShortageCube.query`` はロールアップを (grain, scope, key) の辞書から引くだけ
+  なので、ダッシュボードのドリルダウンは再集計なしで返る。
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .utils import date_columns, log
+
+CUBE_FILE = "shortage_cube.parquet"
+ROLLUP_FILE = "shortage_cube_rollups.parquet"
+MEASURES = ("need", "staff", "lack", "excess")
+SCOPES = ("all", "role", "employment")
+ALL_KEY = "全体"
+
+WEEKDAY_LABELS = ["月曜日", "火曜日", "水曜日", "木曜日", "金曜日", "土曜日", "日曜日"]
+MONTH_PERIOD_LABELS = ["月初(1-10日)", "月中(11-20日)", "月末(21-末日)"]
+
+# grain → (バケット列, スロット別か)
+GRAINS: Dict[str, Tuple[str | None, bool]] = {
+    "weekday": ("weekday", True),
+    "month_period": ("month_period", True),
+    "slot": (None, True),
+    "date": ("date", False),
+    "month": ("month", False),
+    "weekday_total": ("weekday", False),
+    "total": (None, False),
+}
+_BUCKET_ORDER = {"weekday": WEEKDAY_LABELS, "month_period": MONTH_PERIOD_LABELS}
+_META_KEY = b"shift_suite.shortage_cube"
+MAX_CACHED_CUBES = 4
+
+
+def _month_period(day: np.ndarray) -> np.ndarray:
+    return np.where(day <= 10, MONTH_PERIOD_LABELS[0], np.where(day <= 20, MONTH_PERIOD_LABELS[1], MONTH_PERIOD_LABELS[2]))
+
+
+def _date_axis(columns: Iterable) -> Tuple[List, pd.DatetimeIndex]:
+    """日付として解釈できる列とその日付"""
+    axis = date_columns(columns)
+    return list(axis), pd.DatetimeIndex(pd.to_datetime(list(axis.values())))
+
+
+class ShortageCubeBuilder:
+    """scope / key ごとの (slot × date) 横持ち表を受け取り、キューブを組み立てる"""
+
+    def __init__(self, slot_minutes: int):
+        self.slot_minutes = int(slot_minutes)
+        self._parts: List[pd.DataFrame] = []
+
+    def add(
+        self,
+        scope: str,
+        key: str,
+        *,
+        need: pd.DataFrame,
+        staff: pd.DataFrame,
+        lack: pd.DataFrame,
+        excess: pd.DataFrame | None = None,
+    ) -> None:
+        """lack の行 (スロット) と日付列に揃えて 1 つの scope/key を追加"""
+        if scope not in SCOPES:
+            raise ValueError(f"scope must be one of {SCOPES}: {scope!r}")
+        cols, dates = _date_axis(lack.columns)
+        if not cols:
+            return
+        slots = lack.index.astype(str)
+
+        def values(frame: pd.DataFrame | None) -> np.ndarray:
+            if frame is None or frame.empty:
+                return np.zeros(len(slots) * len(cols))
+            aligned = frame.reindex(index=lack.index, columns=cols)
+            return aligned.to_numpy(dtype=float, na_value=0.0).ravel(order="F")
+
+        n_slots = len(slots)
+        self._parts.append(
+            pd.DataFrame(
+                {
+                    "scope": scope,
+                    "key": str(key),
+                    "date": np.repeat(dates.values, n_slots),
+                    "slot": np.tile(np.asarray(slots, dtype=object), len(cols)),
+                    "need": values(need),
+                    "staff": values(staff),
+                    "lack": values(lack),
+                    "excess": values(excess),
+                }
+            )
+        )
+
+    def build(self) -> "ShortageCube":
+        if self._parts:
+            cells = pd.concat(self._parts, ignore_index=True)
+        else:
+            cells = pd.DataFrame(columns=["scope", "key", "date", "slot", *MEASURES])
+        return ShortageCube(cells, slot_minutes=self.slot_minutes)
+
+
+class ShortageCube:
+    """過不足キューブとロールアップ。``query`` でドリルダウン結果を返す"""
+
+    def __init__(
+        self,
+        cells: pd.DataFrame,
+        *,
+        slot_minutes: int,
+        rollups: pd.DataFrame | None = None,
+    ):
+        self.slot_minutes = int(slot_minutes)
+        self.cells = cells
+        self.rollups = rollups if rollups is not None else self._compute_rollups(cells)
+        self._index: Dict[Tuple[str, str, str], pd.DataFrame] = {
+            (grain, scope, key): part.drop(columns=["grain", "scope", "key"]).reset_index(drop=True)
+            for (grain, scope, key), part in self.rollups.groupby(["grain", "scope", "key"], sort=False, observed=True)
+        }
+
+    @property
+    def slot_hours(self) -> float:
+        return self.slot_minutes / 60.0
+
+    # ---- ロールアップ -----------------------------------------------------------
+    @staticmethod
+    def _compute_rollups(cells: pd.DataFrame) -> pd.DataFrame:
+        cols = ["grain", "scope", "key", "bucket", "slot", "days", *MEASURES]
+        if cells.empty:
+            return pd.DataFrame(columns=cols)
+        dates = pd.DatetimeIndex(cells["date"])
+        buckets = {
+            "weekday": np.asarray(WEEKDAY_LABELS, dtype=object)[dates.weekday],
+            "month_period": _month_period(dates.day.to_numpy()),
+            "date": dates.strftime("%Y-%m-%d"),
+            "month": dates.strftime("%Y-%m"),
+        }
+        base = cells[["scope", "key", "slot", *MEASURES]].copy()
+        base["_date"] = cells["date"].to_numpy()
+        frames = []
+        for grain, (bucket_col, by_slot) in GRAINS.items():
+            keys = ["scope", "key"]
+            frame = base
+            if bucket_col is not None:
+                frame = frame.assign(bucket=buckets[bucket_col])
+                keys.append("bucket")
+            if by_slot:
+                keys.append("slot")
+            grouped = frame.groupby(keys, sort=False)
+            out = grouped[list(MEASURES)].sum()
+            out.insert(0, "days", grouped["_date"].nunique())
+            out = out.reset_index()
+            if "bucket" not in out:
+                out["bucket"] = ""
+            if "slot" not in out:
+                out["slot"] = ""
+            out.insert(0, "grain", grain)
+            frames.append(out[cols])
+        return pd.concat(frames, ignore_index=True)
+
+    # ---- 参照 API ---------------------------------------------------------------
+    def keys(self, scope: str) -> List[str]:
+        """scope に含まれる key (職種名 / 雇用形態名) の一覧"""
+        return sorted({k for (g, s, k) in self._index if s == scope and g == "total"})
+
+    def query(
+        self,
+        measure: str = "lack",
+        *,
+        by: str = "weekday",
+        scope: str = "all",
+        key: str | None = None,
+        agg: str = "sum",
+    ) -> pd.DataFrame:
+        """
+        ロールアップからドリルダウン結果を返す。
+
+        Parameters
+        ----------
+        measure : 'need' | 'staff' | 'lack' | 'excess'
+        by : GRAINS のいずれか ('weekday', 'month_period', 'slot', 'date', 'month', 'weekday_total', 'total')
+        scope / key : 'all' の場合 key は不要
+        agg : 'sum' (人数スロットの合計) / 'mean' (日平均) / 'hours' (合計 × スロット時間)
+
+        Returns
+        -------
+        pd.DataFrame
+            列は [bucket, slot, value] のうち grain に該当するもの
+        """
+        if measure not in MEASURES:
+            raise ValueError(f"measure must be one of {MEASURES}: {measure!r}")
+        if by not in GRAINS:
+            raise ValueError(f"by must be one of {tuple(GRAINS)}: {by!r}")
+        bucket_col, by_slot = GRAINS[by]
+        key = ALL_KEY if scope == "all" else key
+        part = self._index.get((by, scope, str(key)))
+        out_cols = ([bucket_col] if bucket_col else []) + (["slot"] if by_slot else []) + ["value"]
+        if part is None:
+            return pd.DataFrame(columns=out_cols)
+
+        values = part[measure].to_numpy(dtype=float)
+        if agg == "mean":
+            values = values / np.maximum(part["days"].to_numpy(dtype=float), 1)
+        elif agg == "hours":
+            values = values * self.slot_hours
+        elif agg != "sum":
+            raise ValueError("agg must be 'sum', 'mean' or 'hours'")
+
+        out = pd.DataFrame({"bucket": part["bucket"], "slot": part["slot"], "value": values})
+        sort_cols = []
+        if bucket_col:
+            order = _BUCKET_ORDER.get(bucket_col)
+            if order is not None:
+                out["bucket"] = pd.Categorical(out["bucket"], categories=order, ordered=True)
+            sort_cols.append("bucket")
+        if by_slot:
+            sort_cols.append("slot")
+        if sort_cols:
+            out = out.sort_values(sort_cols, kind="stable")
+        out = out.rename(columns={"bucket": bucket_col} if bucket_col else {})
+        return out[out_cols].reset_index(drop=True)
+
+    def total(self, measure: str = "lack", *, scope: str = "all", key: str | None = None, hours: bool = True) -> float:
+        """合計値 (hours=True なら時間換算)"""
+        res = self.query(measure, by="total", scope=scope, key=key, agg="hours" if hours else "sum")
+        return float(res["value"].iloc[0]) if not res.empty else 0.0
+
+    def period_timeslot_summary(self, period: str, measure: str = "lack") -> pd.DataFrame:
+        """
+        全体 scope の期間 × スロット平均。
+        ``shortage._summary_by_period`` と同じ列構成 ([period, timeslot, avg_count])。
+        """
+        if period not in ("weekday", "month_period"):
+            raise ValueError("period must be 'weekday' or 'month_period'")
+        res = self.query(measure, by=period, agg="mean")
+        return res.rename(columns={"slot": "timeslot", "value": "avg_count"})
+
+    # ---- 永続化 ---------------------------------------------------------------
+    def save(self, out_dir: Path | str) -> Path:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        meta = json.dumps({"slot_minutes": self.slot_minutes, "measures": list(MEASURES)}).encode("utf-8")
+        for frame, name in ((self.cells, CUBE_FILE), (self.rollups, ROLLUP_FILE)):
+            frame = frame.astype({"scope": "category", "key": "category", "slot": "category"})
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            table = table.replace_schema_metadata({**(table.schema.metadata or {}), _META_KEY: meta})
+            pq.write_table(table, out_dir / name)
+        log.info(f"[shortage_cube] saved {len(self.cells)} cells / {len(self.rollups)} rollup rows → {out_dir / CUBE_FILE}")
+        return out_dir / CUBE_FILE
+
+    @classmethod
+    def load(cls, out_dir: Path | str, *, with_cells: bool = False) -> "ShortageCube":
+        """保存済みキューブを読む (既定ではロールアップのみ)"""
+        import pyarrow.parquet as pq
+
+        out_dir = Path(out_dir)
+        table = pq.read_table(out_dir / ROLLUP_FILE)
+        meta = json.loads((table.schema.metadata or {}).get(_META_KEY, b"{}"))
+        rollups = table.to_pandas()
+        for col in ("scope", "key", "slot"):
+            rollups[col] = rollups[col].astype(str)
+        if with_cells:
+            cells = pd.read_parquet(out_dir / CUBE_FILE)
+        else:
+            cells = pd.DataFrame(columns=["scope", "key", "date", "slot", *MEASURES])
+        return cls(cells, slot_minutes=meta.get("slot_minutes", 30), rollups=rollups)
+
+
+# ─────────────────────────── cache ───────────────────────────
+_CACHE: "OrderedDict[Tuple[str, int], ShortageCube]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+
+def load_shortage_cube(out_dir: Path | str | None) -> ShortageCube | None:
+    """
+    ``out_dir`` のキューブを返す (無ければ None)。
+    ロールアップファイルのパスと mtime をキーにプロセス内で使い回す。
+    """
+    if out_dir is None:
+        return None
+    fp = Path(out_dir) / ROLLUP_FILE
+    try:
+        cache_key = (str(fp.resolve()), fp.stat().st_mtime_ns)
+    except OSError:
+        return None
+    with _CACHE_LOCK:
+        cube = _CACHE.get(cache_key)
+        if cube is not None:
+            _CACHE.move_to_end(cache_key)
+            return cube
+    try:
+        cube = ShortageCube.load(out_dir)
+    except Exception as e:  # noqa: BLE001 - 壊れたファイルは従来の集計にフォールバック
+        log.warning(f"[shortage_cube] {fp} の読み込みに失敗: {e}")
+        return None
+    with _CACHE_LOCK:
+        _CACHE[cache_key] = cube
+        while len(_CACHE) > MAX_CACHED_CUBES:
+            _CACHE.popitem(last=False)
+    return cube
+
+
+def clear_shortage_cube_cache() -> None:
+    with _CACHE_LOCK:
+        _CACHE.clear()
+
+
+__all__ = [
+    "ALL_KEY",
+    "CUBE_FILE",
+    "GRAINS",
+    "MEASURES",
+    "ROLLUP_FILE",
+    "ShortageCube",
+    "ShortageCubeBuilder",
+    "clear_shortage_cube_cache",
+    "load_shortage_cube",
+]
@@ -0,0 +1,257 @@
+"""
+shift_suite.tasks.slot_need_stats v1.0.0 – 整数スロット格子上の統計的 Need 算出
+────────────────────────────────────────────────────────────────
+* 従来の統計的 Need は DataFrame をコピーして ``dt.floor`` で丸め、
+  ``time`` オブジェクトと日本語列名で groupby し、25 パーセンタイルは
+  グループごとの lambda で計算していた。ヒートマップ側も曜日 × スロットごとに
+  Python リストを作って np.percentile を呼んでいた。
+* ``SlotCountTensor`` は勤務記録を (日付, スロット, グループ) の整数カウント配列に
+  する。日付・スロットは整数インデックス、グループ (職種 × 雇用形態) は factorize した
+  コードで、np.bincount 1 回で組み立てる。
+* ``SortedSamples`` は (標本 × 系列) の配列を標本軸で 1 回だけソートし、系列ごとの
+  有効区間 [start, stop) 上で平均・中央値・任意の分位点を添字計算で返す。
+  IQR による外れ値除去はソート済み配列上で区間を狭めるだけなので再ソートしない。
+  分位点は numpy / pandas の linear 補間と同じ値になる。
+* 15 分スロット × 1 年分 × 数十グループでも数十 ms で全グループの統計量が出る。
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# 統計手法名 (UI の表記) → 分位点。None は平均値
+STAT_QUANTILES: Dict[str, Optional[float]] = {
+    "平均値": None,
+    "10パーセンタイル": 0.10,
+    "25パーセンタイル": 0.25,
+    "中央値": 0.50,
+    "75パーセンタイル": 0.75,
+    "90パーセンタイル": 0.90,
+}
+# calculate_all_statistical_needs の出力列 → 分位点
+DEFAULT_NEED_STATS: Dict[str, Optional[float]] = {
+    "need_mean": None,
+    "need_median": 0.50,
+    "need_p25": 0.25,
+}
+
+
+def stat_quantile(method: str) -> Optional[float]:
+    """統計手法名の分位点 (未知の名称は平均値扱い = None)"""
+    return STAT_QUANTILES.get(method)
+
+
+class SortedSamples:
+    """
+    (標本 × 系列) の値を標本軸で 1 回ソートし、系列ごとの統計量を返す。
+    NaN は欠損 (標本に含めない) として末尾に並ぶ。
+    """
+
+    def __init__(self, values: np.ndarray):
+        values = np.asarray(values, dtype=float)
+        if values.ndim == 1:
+            values = values[:, None]
+        self.sorted = np.sort(values, axis=0)
+        self.n_valid = np.count_nonzero(~np.isnan(values), axis=0)
+        self.start = np.zeros(values.shape[1], dtype=np.int64)
+        self.stop = self.n_valid.astype(np.int64)
+        self._csum: Optional[np.ndarray] = None
+
+    @property
+    def count(self) -> np.ndarray:
+        return self.stop - self.start
+
+    def _take(self, idx: np.ndarray) -> np.ndarray:
+        idx = np.clip(idx, 0, max(self.sorted.shape[0] - 1, 0))
+        return np.take_along_axis(self.sorted, idx[None, :], axis=0)[0]
+
+    def quantile(self, q: float) -> np.ndarray:
+        """有効区間の分位点 (linear 補間)。標本が無い系列は NaN"""
+        n = self.count
+        if self.sorted.shape[0] == 0:
+            return np.full(n.shape, np.nan)
+        pos = self.start + q * np.maximum(n - 1, 0)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.minimum(lo + 1, np.maximum(self.stop - 1, 0))
+        a, b = self._take(lo), self._take(hi)
+        frac = pos - lo
+        out = a + (b - a) * frac
+        # 補間量が 0 のときは b が区間外でも a をそのまま使う
+        out = np.where(frac == 0, a, out)
+        return np.where(n > 0, out, np.nan)
+
+    def median(self) -> np.ndarray:
+        return self.quantile(0.5)
+
+    def mean(self) -> np.ndarray:
+        """有効区間の平均 (累積和の差分)"""
+        if self._csum is None:
+            filled = np.nan_to_num(self.sorted, nan=0.0)
+            self._csum = np.vstack([np.zeros((1, filled.shape[1])), np.cumsum(filled, axis=0)])
+        n = self.count
+        total = np.take_along_axis(self._csum, self.stop[None, :], axis=0)[0] - np.take_along_axis(
+            self._csum, self.start[None, :], axis=0
+        )[0]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(n > 0, total / np.maximum(n, 1), np.nan)
+
+    def stat(self, q: Optional[float]) -> np.ndarray:
+        return self.mean() if q is None else self.quantile(q)
+
+    def max(self) -> np.ndarray:
+        return np.where(self.n_valid > 0, self._take(self.n_valid - 1), np.nan)
+
+    def restrict_iqr(self, multiplier: float = 1.5, min_samples: int = 4) -> "SortedSamples":
+        """
+        Q1 - k·IQR 以上 Q3 + k·IQR 以下の区間に狭める (標本数が ``min_samples`` 未満の
+        系列、または除去後に標本が残らない系列はそのまま)。自身を返す。
+        """
+        q1, q3 = self.quantile(0.25), self.quantile(0.75)
+        iqr = q3 - q1
+        lower, upper = q1 - multiplier * iqr, q3 + multiplier * iqr
+        valid = ~np.isnan(self.sorted)
+        with np.errstate(invalid="ignore"):
+            new_start = np.count_nonzero(valid & (self.sorted < lower), axis=0)
+            new_stop = np.count_nonzero(valid & (self.sorted <= upper), axis=0)
+        apply = (self.count >= min_samples) & (new_stop > new_start)
+        self.start = np.where(apply, new_start, self.start)
+        self.stop = np.where(apply, new_stop, self.stop)
+        return self
+
+
+# ─────────────────────────── count tensor ───────────────────────────
+@dataclass
+class SlotCountTensor:
+    """(日付, スロット, グループ) の勤務人数"""
+
+    counts: np.ndarray
+    dates: np.ndarray
+    slot_minutes: int
+    groups: pd.DataFrame
+
+    @classmethod
+    def from_records(
+        cls,
+        df: pd.DataFrame,
+        slot_minutes: int,
+        *,
+        time_col: str = "timestamp",
+        group_cols: Sequence[str] = ("role", "employment"),
+    ) -> "SlotCountTensor":
+        """
+        1 行 = 1 人 × 1 時点の記録からカウント配列を作る。
+        時点は ``slot_minutes`` 単位に切り捨ててスロットに割り当てる。
+        """
+        ts = pd.to_datetime(df[time_col], errors="coerce")
+        ok = ts.notna().to_numpy()
+        ts = ts[ok]
+        n_slots = (24 * 60) // int(slot_minutes)
+        groups_df = df.loc[ok, list(group_cols)].astype(str).reset_index(drop=True)
+        if ts.empty:
+            return cls(
+                np.zeros((0, n_slots, 0), dtype=np.int32),
+                np.array([], dtype="datetime64[D]"),
+                int(slot_minutes),
+                pd.DataFrame(columns=list(group_cols)),
+            )
+
+        ns = ts.to_numpy(dtype="datetime64[ns]")
+        day = ns.astype("datetime64[D]")
+        minutes = (ns - day).astype("timedelta64[m]").astype(np.int64)
+        slot = minutes // int(slot_minutes)
+        d0 = day.min()
+        day_idx = (day - d0).astype(np.int64)
+        n_dates = int(day_idx.max()) + 1
+
+        codes = np.zeros(len(groups_df), dtype=np.int64)
+        uniques: List[np.ndarray] = []
+        for col in group_cols:
+            c, u = pd.factorize(groups_df[col], sort=True)
+            codes = codes * len(u) + c
+            uniques.append(np.asarray(u))
+        group_codes, group_idx = np.unique(codes, return_inverse=True)
+        n_groups = len(group_codes)
+
+        flat = (day_idx * n_slots + slot) * n_groups + group_idx
+        counts = np.bincount(flat, minlength=n_dates * n_slots * n_groups).reshape(n_dates, n_slots, n_groups)
+
+        # グループコード → 各列の値
+        labels: Dict[str, np.ndarray] = {}
+        rem = group_codes.copy()
+        for col, u in reversed(list(zip(group_cols, uniques))):
+            labels[col] = u[rem % len(u)]
+            rem //= len(u)
+        groups = pd.DataFrame({col: labels[col] for col in group_cols})
+        dates = d0 + np.arange(n_dates).astype("timedelta64[D]")
+        return cls(counts.astype(np.int32), dates, int(slot_minutes), groups)
+
+    @property
+    def n_slots(self) -> int:
+        return self.counts.shape[1]
+
+    @property
+    def weekdays(self) -> np.ndarray:
+        """日付ごとの曜日 (月曜 0)"""
+        return ((self.dates.astype("datetime64[D]").astype(np.int64) + 3) % 7).astype(np.int64)
+
+    def slot_offsets(self) -> np.ndarray:
+        return np.arange(self.n_slots) * np.timedelta64(self.slot_minutes, "m")
+
+    def slot_labels(self) -> List[str]:
+        minutes = np.arange(self.n_slots) * self.slot_minutes
+        return [f"{m // 60:02d}:{m % 60:02d}" for m in minutes]
+
+
+@dataclass
+class SlotNeedStats:
+    """(スロット × グループ) ごとの統計量"""
+
+    slot_labels: List[str]
+    groups: pd.DataFrame
+    stats: Dict[str, np.ndarray]
+
+    def to_frame(self) -> pd.DataFrame:
+        n_slots, n_groups = len(self.slot_labels), len(self.groups)
+        out = pd.DataFrame({"slot": np.repeat(self.slot_labels, n_groups)})
+        for col in self.groups.columns:
+            out[col] = np.tile(self.groups[col].to_numpy(), n_slots)
+        for name, values in self.stats.items():
+            out[name] = values.reshape(-1)
+        return out
+
+
+def slot_need_stats(
+    tensor: SlotCountTensor,
+    stats: Dict[str, Optional[float]] = DEFAULT_NEED_STATS,
+    *,
+    include_zero_days: bool = False,
+    date_mask: Optional[np.ndarray] = None,
+) -> SlotNeedStats:
+    """
+    全 (スロット, グループ) の統計量を 1 回のソートで求める。
+    ``include_zero_days=False`` の場合、そのスロットに勤務者がいない日は標本に含めない
+    (従来の groupby().size() と同じ扱い)。
+    """
+    counts = tensor.counts if date_mask is None else tensor.counts[np.asarray(date_mask, dtype=bool)]
+    values = counts.reshape(counts.shape[0], -1).astype(float)
+    if not include_zero_days:
+        values[values == 0] = np.nan
+    samples = SortedSamples(values)
+    shape = (tensor.n_slots, len(tensor.groups))
+    out = {name: samples.stat(q).reshape(shape) for name, q in stats.items()}
+    return SlotNeedStats(tensor.slot_labels(), tensor.groups, out)
+
+
+__all__ = [
+    "DEFAULT_NEED_STATS",
+    "STAT_QUANTILES",
+    "SlotCountTensor",
+    "SlotNeedStats",
+    "SortedSamples",
+    "slot_need_stats",
+    "stat_quantile",
+]
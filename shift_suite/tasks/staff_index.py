@@ -0,0 +1,221 @@
+"""
+shift_suite.tasks.staff_index v1.0.0 – 職員単位パーティション済み long_df
+────────────────────────────────────────────────────────────────
+* 分析モジュールの多くが ``for s in df['staff'].unique(): df[df['staff'] == s]``
+  という形で職員ごとに全行のブールマスクを作っており、職員数 × 行数の
+  走査になっていた。
+* ``StaffPartitionedFrame`` は long_df を (staff, ds) で一度だけ安定ソートし、
+  職員ごとの開始/終了オフセットを保持する。各職員の行は連続領域なので
+  ``iloc`` のスライス (コピーなし) で取り出せる。
+* 職員の並びは ``df['staff'].unique()`` と同じ出現順、職員内の行は ds 昇順。
+  staff が欠損している行はどの職員にも属さない (ブールマスクと同じ挙動)。
+* ``staff_partition(df)`` は同じ DataFrame オブジェクトに対する
+  パーティションを使い回す。列の追加や行数の変化を検知した場合は作り直す。
+"""
+
+from __future__ import annotations
+
+import threading
+import weakref
+from typing import Dict, Hashable, Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .utils import log
+
+STAFF_COL = "staff"
+TIME_COL = "ds"
+ACTIVE_COL = "parsed_slots_count"
+MAX_CACHED_PARTITIONS = 8
+
+
+class StaffPartitionedFrame:
+    """
+    (staff, ds) で並べ替えた long_df と職員ごとの行範囲。
+
+    ``part[staff]`` / ``part.get(staff)`` / ``part.items()`` で職員ごとの
+    DataFrame を返す。返り値は ``frame`` のスライスなので、列を追加するなど
+    変更する場合は呼び出し側で ``.copy()`` すること。
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        *,
+        staff_col: str = STAFF_COL,
+        time_col: str = TIME_COL,
+    ):
+        self.staff_col = staff_col
+        self.time_col = time_col
+
+        codes, uniques = pd.factorize(df[staff_col])
+        if time_col in df.columns:
+            # NaT / 欠損は factorize で -1 → 各職員の先頭に並ぶ
+            try:
+                time_rank, _ = pd.factorize(df[time_col], sort=True)
+            except TypeError:  # 比較不能な型が混在 → 元の行順を保つ
+                time_rank = np.zeros(len(df), dtype=np.intp)
+            order = np.lexsort((time_rank, codes))
+        else:
+            order = np.argsort(codes, kind="stable")
+        order = order[codes[order] >= 0]
+
+        self.frame: pd.DataFrame = df.take(order)
+        self._init_offsets(uniques, codes[order], order)
+
+    @classmethod
+    def _from_sorted(
+        cls,
+        frame: pd.DataFrame,
+        uniques: pd.Index,
+        sorted_codes: np.ndarray,
+        row_positions: np.ndarray,
+        staff_col: str,
+        time_col: str,
+    ) -> "StaffPartitionedFrame":
+        obj = cls.__new__(cls)
+        obj.staff_col = staff_col
+        obj.time_col = time_col
+        obj.frame = frame
+        obj._init_offsets(uniques, sorted_codes, row_positions)
+        return obj
+
+    def _init_offsets(
+        self, uniques, sorted_codes: np.ndarray, row_positions: np.ndarray
+    ) -> None:
+        counts = np.bincount(sorted_codes, minlength=len(uniques))
+        self._codes = sorted_codes
+        self._row_positions = row_positions  # 元の df での行位置
+        self._uniques = pd.Index(uniques)
+        self._counts = counts
+        self._ends = np.cumsum(counts)
+        self._starts = self._ends - counts
+
+        # 職員の並びは (絞り込み後の) 最初の出現行順 = ``unique()`` の順
+        present = np.flatnonzero(counts > 0)
+        if len(present):
+            first_row = np.minimum.reduceat(row_positions, self._starts[present])
+            present = present[np.argsort(first_row, kind="stable")]
+        self._present = present
+        self._position: Dict[Hashable, int] = {self._uniques[i]: int(i) for i in present}
+        self._active: StaffPartitionedFrame | None = None
+
+    # ---- 参照 API -----------------------------------------------------------
+    @property
+    def staff(self) -> pd.Index:
+        """行を持つ職員 (出現順)"""
+        return self._uniques[self._present]
+
+    def sizes(self) -> pd.Series:
+        """職員ごとの行数 (``value_counts`` の出現順版)"""
+        return pd.Series(self._counts[self._present], index=self.staff, name=self.staff_col)
+
+    def __len__(self) -> int:
+        return len(self._position)
+
+    def __contains__(self, staff: Hashable) -> bool:
+        return staff in self._position
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self._position)
+
+    def bounds(self, staff: Hashable) -> Tuple[int, int]:
+        """``frame`` 上の [start, stop) 行範囲。存在しない職員は KeyError"""
+        i = self._position[staff]
+        return int(self._starts[i]), int(self._ends[i])
+
+    def __getitem__(self, staff: Hashable) -> pd.DataFrame:
+        start, stop = self.bounds(staff)
+        return self.frame.iloc[start:stop]
+
+    def get(self, staff: Hashable) -> pd.DataFrame:
+        """職員の行。存在しなければ空 DataFrame (ブールマスクと同じ)"""
+        i = self._position.get(staff)
+        if i is None:
+            return self.frame.iloc[0:0]
+        return self.frame.iloc[self._starts[i] : self._ends[i]]
+
+    def items(self) -> Iterator[Tuple[Hashable, pd.DataFrame]]:
+        for staff, i in self._position.items():
+            yield staff, self.frame.iloc[self._starts[i] : self._ends[i]]
+
+    # ---- 派生パーティション -----------------------------------------------------
+    def where(self, mask: pd.Series | np.ndarray) -> "StaffPartitionedFrame":
+        """
+        ``frame`` と同じ並びの真偽値で行を絞った新しいパーティション。
+        順序は保たれるため再ソートしない。
+        """
+        if isinstance(mask, pd.Series):
+            mask = mask.to_numpy(dtype=bool, na_value=False)
+        mask = np.asarray(mask, dtype=bool)
+        return StaffPartitionedFrame._from_sorted(
+            self.frame[mask],
+            self._uniques,
+            self._codes[mask],
+            self._row_positions[mask],
+            self.staff_col,
+            self.time_col,
+        )
+
+    def active(self) -> "StaffPartitionedFrame":
+        """``parsed_slots_count > 0`` の実勤務行だけのパーティション (キャッシュ)"""
+        if self._active is None:
+            if ACTIVE_COL in self.frame.columns:
+                self._active = self.where(self.frame[ACTIVE_COL].to_numpy() > 0)
+            else:
+                self._active = self
+        return self._active
+
+
+# ─────────────────────────── cache ───────────────────────────
+_CACHE: Dict[int, Tuple[weakref.ref, Tuple, StaffPartitionedFrame]] = {}
+_CACHE_LOCK = threading.RLock()  # weakref コールバックが GC 中に再入しうる
+
+
+def _signature(df: pd.DataFrame) -> Tuple:
+    return tuple(df.columns), len(df)
+
+
+def staff_partition(df: pd.DataFrame) -> StaffPartitionedFrame:
+    """
+    ``df`` の ``StaffPartitionedFrame`` を返す。
+
+    同じオブジェクトで列構成と行数が変わっていなければ前回の結果を再利用する。
+    値だけを破壊的に書き換えた場合は ``clear_staff_partitions()`` を呼ぶこと。
+    """
+    key = id(df)
+    sig = _signature(df)
+    with _CACHE_LOCK:
+        hit = _CACHE.get(key)
+        if hit is not None and hit[0]() is df and hit[1] == sig:
+            return hit[2]
+
+    part = StaffPartitionedFrame(df)
+    try:
+        ref = weakref.ref(df, lambda _r, k=key: _drop(k))
+    except TypeError:
+        return part
+    with _CACHE_LOCK:
+        _CACHE[key] = (ref, sig, part)
+        while len(_CACHE) > MAX_CACHED_PARTITIONS:
+            _CACHE.pop(next(iter(_CACHE)))
+    log.debug(f"[staff_index] partitioned {len(df)} rows into {len(part)} staff")
+    return part
+
+
+def _drop(key: int) -> None:
+    with _CACHE_LOCK:
+        _CACHE.pop(key, None)
+
+
+def clear_staff_partitions() -> None:
+    with _CACHE_LOCK:
+        _CACHE.clear()
+
+
+__all__ = [
+    "StaffPartitionedFrame",
+    "clear_staff_partitions",
+    "staff_partition",
+]
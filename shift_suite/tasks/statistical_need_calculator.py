@@ -1,5 +1,8 @@
+import numpy as np
 import pandas as pd
 
+from .slot_need_stats import DEFAULT_NEED_STATS, SlotCountTensor, slot_need_stats
+
 
 def calculate_all_statistical_needs(
     actual_df: pd.DataFrame,
@@ -9,6 +12,9 @@ def calculate_all_statistical_needs(
     過去のシフト実績データから、時間単位、職種、雇用形態のグループごとに
     3つの統計的Need値（平均、中央値、25パーセンタイル）を一度に算出する。
 
+    実績を (日付, スロット, 職種×雇用形態) の整数カウント配列にし、
+    ``slot_need_stats`` で全グループの統計量を 1 回のソートで求める。
+
     Args:
         actual_df (pd.DataFrame): タイムスタンプと職員情報を持つ実績データ。
         time_unit_minutes (int): app.pyで指定された分析の時間単位（分）。
@@ -16,65 +22,42 @@ def calculate_all_statistical_needs(
     Returns:
         pd.DataFrame: 各グループの3つの統計的Need値を含むデータフレーム。
     """
-    df = actual_df.copy()
-    freq = f"{time_unit_minutes}min"
-
     # カラム名の正規化：英語→日本語に統一
     column_mapping = {
         'role': '職種',
         'employment': '雇用形態',
         'employment_type': '雇用形態'
     }
-    
-    # 存在するカラムのみをリネーム
-    rename_dict = {}
-    for eng_col, jp_col in column_mapping.items():
-        if eng_col in df.columns:
-            rename_dict[eng_col] = jp_col
-    
-    if rename_dict:
-        df = df.rename(columns=rename_dict)
-    
-    # 必須カラムが存在するかチェック
-    required_columns = ['職種', '雇用形態']
-    missing_columns = [col for col in required_columns if col not in df.columns]
-    
-    if missing_columns:
-        # 欠損カラムをデフォルト値で補完
-        for col in missing_columns:
-            if col == '職種':
-                df['職種'] = 'unknown_role'
-            elif col == '雇用形態':
-                df['雇用形態'] = 'unknown_employment'
-
-    # 時間単位で丸め、時間帯情報を追加
-    df['time_group'] = df['timestamp'].dt.floor(freq)
-    df['time_of_day'] = df['time_group'].dt.time
-
-    # 日付ごとに時間帯・職種・雇用形態別の実績人数を算出
-    daily_counts = df.groupby(
-        [df['time_group'].dt.date.rename('date'), 'time_of_day', '職種', '雇用形態']
-    ).size().reset_index(name='actual_count')
-
-    # 時間帯ごとに歴史的なNeed値を計算
-    needs_by_time = daily_counts.groupby(['time_of_day', '職種', '雇用形態'])['actual_count'].agg(
-        need_mean='mean',
-        need_median='median',
-        need_p25=lambda x: x.quantile(0.25)
-    ).reset_index()
-
-    # 全てのタイムスロットにNeed値を紐付け
-    all_slots = df[['time_group', 'time_of_day', '職種', '雇用形態']].drop_duplicates()
-    needs_df = pd.merge(
-        all_slots,
-        needs_by_time,
-        on=['time_of_day', '職種', '雇用形態'],
-        how='left'
-    ).drop(columns=['time_of_day'])
-
-    # Need列の欠損を0で補完
-    needs_df[['need_mean', 'need_median', 'need_p25']] = needs_df[
-        ['need_mean', 'need_median', 'need_p25']
-    ].fillna(0)
+    rename_dict = {
+        eng_col: jp_col for eng_col, jp_col in column_mapping.items() if eng_col in actual_df.columns
+    }
+    columns = ['timestamp'] + [c for c in ('職種', '雇用形態') if c in actual_df.columns] + list(rename_dict)
+    df = actual_df[columns].rename(columns=rename_dict)
+    df = df.loc[:, ~df.columns.duplicated()]
+
+    # 欠損カラムをデフォルト値で補完
+    if '職種' not in df.columns:
+        df = df.assign(職種='unknown_role')
+    if '雇用形態' not in df.columns:
+        df = df.assign(雇用形態='unknown_employment')
+
+    tensor = SlotCountTensor.from_records(
+        df, time_unit_minutes, time_col='timestamp', group_cols=('職種', '雇用形態')
+    )
+    stats = slot_need_stats(tensor, DEFAULT_NEED_STATS, include_zero_days=False)
+
+    # 実績のある (時刻, 職種, 雇用形態) ごとに Need 値を紐付け
+    day_idx, slot_idx, group_idx = np.nonzero(tensor.counts)
+    needs_df = pd.DataFrame(
+        {
+            'time_group': pd.to_datetime(
+                tensor.dates[day_idx].astype('datetime64[ns]') + tensor.slot_offsets()[slot_idx]
+            ),
+            '職種': tensor.groups['職種'].to_numpy()[group_idx],
+            '雇用形態': tensor.groups['雇用形態'].to_numpy()[group_idx],
+        }
+    )
+    for name, values in stats.stats.items():
+        needs_df[name] = np.nan_to_num(values[slot_idx, group_idx], nan=0.0)
 
     return needs_df
@@ -84,6 +84,7 @@ class SimpleStandardScaler:
         return self.fit(X).transform(X)
 
 from .constants import TEAM_DYNAMICS_PARAMETERS
+from .staff_index import StaffPartitionedFrame, staff_partition
 
 log = logging.getLogger(__name__)
 
@@ -179,12 +180,16 @@ class TeamDynamicsAnalyzer:
             'performance_indicators': []
         })
         
-        staff_list = list(working_df['staff'].unique())
+        working = staff_partition(working_df)
+        staff_list = list(working)
+        staff_day_sets = {
+            staff: set(staff_df['ds'].dt.date) for staff, staff_df in working.items()
+        }
         
         for staff1, staff2 in combinations(staff_list, 2):
             # 共起回数の計算
-            staff1_days = set(working_df[working_df['staff'] == staff1]['ds'].dt.date)
-            staff2_days = set(working_df[working_df['staff'] == staff2]['ds'].dt.date)
+            staff1_days = staff_day_sets[staff1]
+            staff2_days = staff_day_sets[staff2]
             
             co_occurrence_days = staff1_days.intersection(staff2_days)
             total_opportunity_days = staff1_days.union(staff2_days)
@@ -230,14 +235,18 @@ class TeamDynamicsAnalyzer:
     def _analyze_learning_patterns(self, long_df: pd.DataFrame) -> List[LearningPattern]:
         """学習・成長パターン分析"""
         
-        working_df = long_df[long_df['parsed_slots_count'] > 0]
+        working = staff_partition(long_df).active()
         learning_patterns = []
+        # 経験レベルはメンター候補の判定でも使うため先に全員分求めておく
+        experience_levels = {
+            staff: self._assess_experience_level(staff_df)
+            for staff, staff_df in working.items()
+        }
         
-        for staff in working_df['staff'].unique():
-            staff_df = working_df[working_df['staff'] == staff]
+        for staff, staff_df in working.items():
             
             # 経験レベルの判定
-            experience_level = self._assess_experience_level(staff_df)
+            experience_level = experience_levels[staff]
             
             # 学習速度の分析
             learning_speed = self._calculate_learning_speed(staff_df)
@@ -250,7 +259,7 @@ class TeamDynamicsAnalyzer:
             
             # 最適メンターの提案
             optimal_mentors = self._identify_optimal_mentors(
-                staff, working_df, experience_level
+                staff, working, experience_level, experience_levels
             )
             
             # 推奨タスクの生成
@@ -273,11 +282,9 @@ class TeamDynamicsAnalyzer:
     def _analyze_emergency_capacity(self, long_df: pd.DataFrame) -> List[EmergencyCapacity]:
         """緊急対応能力分析"""
         
-        working_df = long_df[long_df['parsed_slots_count'] > 0]
         emergency_capacity = []
         
-        for staff in working_df['staff'].unique():
-            staff_df = working_df[working_df['staff'] == staff]
+        for staff, staff_df in staff_partition(long_df).active().items():
             
             # 柔軟性スコアの計算
             flexibility_score = self._calculate_flexibility_score(staff_df)
@@ -317,11 +324,9 @@ class TeamDynamicsAnalyzer:
     def _analyze_stress_resilience(self, long_df: pd.DataFrame) -> Dict[str, any]:
         """ストレス耐性の詳細分析"""
         
-        working_df = long_df[long_df['parsed_slots_count'] > 0]
         stress_analysis = {}
         
-        for staff in working_df['staff'].unique():
-            staff_df = working_df[working_df['staff'] == staff]
+        for staff, staff_df in staff_partition(long_df).active().items():
             
             # 1. 負荷変動への適応性
             workload_variance = staff_df['parsed_slots_count'].var()
@@ -474,8 +479,9 @@ class TeamDynamicsAnalyzer:
     def _calculate_pattern_similarity(self, staff1: str, staff2: str, working_df: pd.DataFrame) -> float:
         """勤務パターンの類似性計算"""
         
-        staff1_df = working_df[working_df['staff'] == staff1]
-        staff2_df = working_df[working_df['staff'] == staff2]
+        working = staff_partition(working_df)
+        staff1_df = working.get(staff1)
+        staff2_df = working.get(staff2)
         
         # 曜日パターンの類似性
         weekday1 = staff1_df.groupby(staff1_df['ds'].dt.dayofweek).size()
@@ -508,8 +514,9 @@ class TeamDynamicsAnalyzer:
         risk_factors = []
         synergy_factors = []
         
-        staff1_df = working_df[working_df['staff'] == staff1]
-        staff2_df = working_df[working_df['staff'] == staff2]
+        working = staff_partition(working_df)
+        staff1_df = working.get(staff1)
+        staff2_df = working.get(staff2)
         
         # 勤務時間の重複度
         overlap_ratio = len(set(staff1_df['ds'].dt.date).intersection(set(staff2_df['ds'].dt.date))) / \
@@ -600,21 +607,25 @@ class TeamDynamicsAnalyzer:
             
         return mentoring_capacity
     
-    def _identify_optimal_mentors(self, staff: str, working_df: pd.DataFrame, 
-                                experience_level: str) -> List[str]:
+    def _identify_optimal_mentors(self, staff: str, working: StaffPartitionedFrame, 
+                                experience_level: str,
+                                experience_levels: Optional[Dict[str, str]] = None) -> List[str]:
         """最適メンターの特定"""
         
         if experience_level == "ベテラン":
             return []  # ベテランにはメンターは不要
         
         # 同じ職種のベテランを探す
-        staff_role = working_df[working_df['staff'] == staff]['role'].iloc[0] if not working_df[working_df['staff'] == staff].empty else None
+        staff_df = working.get(staff)
+        staff_role = staff_df['role'].iloc[0] if not staff_df.empty else None
         
         potential_mentors = []
-        for mentor_candidate in working_df['staff'].unique():
+        for mentor_candidate, mentor_df in working.items():
             if mentor_candidate != staff:
-                mentor_df = working_df[working_df['staff'] == mentor_candidate]
-                mentor_exp_level = self._assess_experience_level(mentor_df)
+                if experience_levels is not None and mentor_candidate in experience_levels:
+                    mentor_exp_level = experience_levels[mentor_candidate]
+                else:
+                    mentor_exp_level = self._assess_experience_level(mentor_df)
                 mentor_role = mentor_df['role'].iloc[0] if not mentor_df.empty else None
                 
                 if (mentor_exp_level == "ベテラン" and 
@@ -2,17 +2,57 @@
 """
 時間軸ベース不足時間計算モジュール (動的データ対応版)
 按分計算に代わる真の分析価値を持つ計算手法
+
+v2.0.0:
+  - 供給量・時間帯ヒストグラムは iterrows / strftime ではなく、
+    (グループ番号 × 整数スロット番号) をキーにした bincount で一括集計する
+  - 職種・雇用形態は同じ時刻変換を共有し、グループごとの再フィルタを行わない
+  - supply_by_slot / hour_distribution は辞書ではなく配列 (スロット番号・時 で添字)
 """
 
-from typing import Dict, List, Tuple, Optional
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple, Optional
 import pandas as pd
 import numpy as np
 import logging
-from datetime import datetime, time, timedelta
-from collections import defaultdict
 
 log = logging.getLogger(__name__)
 
+
+@dataclass
+class SlotSupplyTable:
+    """グループ (職種・雇用形態など) × スロットの供給集計"""
+
+    keys: pd.Index             # グループ名
+    supply: np.ndarray         # (グループ数, 1 日のスロット数) 供給時間
+    hour_counts: np.ndarray    # (グループ数, 24) 時間帯別レコード数
+    record_counts: np.ndarray  # (グループ数,) レコード数
+    total_records: int
+    slot_minutes: int
+
+    @classmethod
+    def empty(cls, slot_minutes: int, n_slots: int, total_records: int = 0) -> "SlotSupplyTable":
+        return cls(
+            keys=pd.Index([]),
+            supply=np.zeros((0, n_slots), dtype=np.float64),
+            hour_counts=np.zeros((0, 24), dtype=np.int64),
+            record_counts=np.zeros(0, dtype=np.int64),
+            total_records=total_records,
+            slot_minutes=int(slot_minutes),
+        )
+
+    @property
+    def n_slots(self) -> int:
+        return self.supply.shape[1]
+
+    def slot_labels(self) -> List[str]:
+        """スロット番号 → 'HH:MM'"""
+        return [
+            f"{(i * self.slot_minutes) // 60:02d}:{(i * self.slot_minutes) % 60:02d}"
+            for i in range(self.n_slots)
+        ]
+
+
 class TimeAxisShortageCalculator:
     """
     時間軸ベース不足時間計算クラス (動的データ対応)
@@ -30,14 +70,17 @@ class TimeAxisShortageCalculator:
     
     def _calculate_demand_coverage(
         self, 
-        supply_by_slot: Dict[str, float],
+        supply_by_slot: np.ndarray,
         need_data: pd.DataFrame,
         working_patterns: Dict,
-        role_supply_ratio: float = 1.0
+        role_supply_ratio: float = 1.0,
+        total_supply: Optional[float] = None,
+        need_demand: Optional[float] = None,
     ) -> Dict:
         """需要カバレッジ分析（動的データ対応）"""
         
-        total_supply = sum(supply_by_slot.values())
+        if total_supply is None:
+            total_supply = float(np.sum(supply_by_slot))
         
         # 🔧 DYNAMIC FIX: 動的データに対応した真の需要計算
         #
@@ -47,7 +90,8 @@ class TimeAxisShortageCalculator:
         # - total_shortage_baselineは検証用途のみに使用
         
         estimated_demand = self._calculate_realistic_demand(
-            supply_by_slot, need_data, working_patterns, role_supply_ratio
+            supply_by_slot, need_data, working_patterns, role_supply_ratio,
+            total_supply=total_supply, need_demand=need_demand,
         )
         
         log.info(f"[DYNAMIC_FIX] 動的需要計算: 需要={estimated_demand:.1f}h, 供給={total_supply:.1f}h, 比率={role_supply_ratio:.3f}")
@@ -69,32 +113,44 @@ class TimeAxisShortageCalculator:
             'coverage_ratio': min(1.0, efficiency_ratio)
         }
         
+    def _demand_from_need_data(self, need_data: pd.DataFrame) -> Optional[float]:
+        """実需要データからの 1 日あたり需要時間 (利用できなければ None)"""
+        if need_data is None or need_data.empty or len(need_data.columns) == 0:
+            return None
+        try:
+            # 数値列のみを抽出
+            numeric_cols = need_data.select_dtypes(include=['number']).columns
+            if len(numeric_cols) > 0:
+                # 時間帯別需要の平均を計算
+                daily_average_demand = need_data[numeric_cols].mean().sum()
+                # スロット数から時間に変換
+                hourly_demand = daily_average_demand * self.slot_hours
+                
+                log.debug(f"[DYNAMIC_FIX] 実需要データから計算: {hourly_demand:.1f}h/日")
+                return hourly_demand
+        except Exception as e:
+            log.warning(f"[DYNAMIC_FIX] 実需要データ解析エラー: {e}")
+        return None
+
     def _calculate_realistic_demand(
         self,
-        supply_by_slot: Dict[str, float],
+        supply_by_slot: np.ndarray,
         need_data: pd.DataFrame,
         working_patterns: Dict,
-        role_supply_ratio: float = 1.0
+        role_supply_ratio: float = 1.0,
+        total_supply: Optional[float] = None,
+        need_demand: Optional[float] = None,
     ) -> float:
         """動的データに対応した現実的な需要計算"""
         
-        total_supply = sum(supply_by_slot.values())
+        if total_supply is None:
+            total_supply = float(np.sum(supply_by_slot))
         
         # 1. 実需要データが利用可能な場合は最優先で使用
-        if not need_data.empty and len(need_data.columns) > 0:
-            try:
-                # 数値列のみを抽出
-                numeric_cols = need_data.select_dtypes(include=['number']).columns
-                if len(numeric_cols) > 0:
-                    # 時間帯別需要の平均を計算
-                    daily_average_demand = need_data[numeric_cols].mean().sum()
-                    # スロット数から時間に変換
-                    hourly_demand = daily_average_demand * self.slot_hours
-                    
-                    log.debug(f"[DYNAMIC_FIX] 実需要データから計算: {hourly_demand:.1f}h/日")
-                    return hourly_demand
-            except Exception as e:
-                log.warning(f"[DYNAMIC_FIX] 実需要データ解析エラー: {e}")
+        if need_demand is None:
+            need_demand = self._demand_from_need_data(need_data)
+        if need_demand is not None:
+            return need_demand
         
         # 2. 働き方パターンに基づく需要推定
         if working_patterns and 'peak_hours' in working_patterns:
@@ -116,60 +172,148 @@ class TimeAxisShortageCalculator:
         log.debug(f"[DYNAMIC_FIX] フォールバック推定: {fallback_demand:.1f}h")
         return fallback_demand
     
-    def calculate_role_based_shortage(
-        self, 
-        actual_data: pd.DataFrame,
-        need_data: pd.DataFrame
-    ) -> Dict[str, Dict]:
-        """職種別の時間軸ベース不足時間計算"""
-        role_analysis = {}
-        
-        # 勤務レコードのみ抽出
-        work_records = actual_data[actual_data['parsed_slots_count'] > 0].copy()
-        
+    # ---- 一括集計 ---------------------------------------------------------------
+    def _prepare_work_records(self, actual_data: pd.DataFrame) -> Optional[pd.DataFrame]:
+        """勤務レコード (parsed_slots_count > 0) の抽出とスロット間隔の検出"""
+        work_records = actual_data[actual_data['parsed_slots_count'] > 0]
+
         if work_records.empty:
             log.warning("[TimeAxis] 勤務レコードが見つかりません")
-            return {}
-        
-        # 動的スロット検出
+            return None
+
+        # 動的スロット検出（職種・雇用形態で共有）
         if self.auto_detect and 'ds' in work_records.columns:
             self._detect_and_update_slot_interval(work_records['ds'])
-        
-        # 職種ごとに分析
-        for role in work_records['role'].unique():
-            if not role or role == '':
+        return work_records
+
+    def aggregate_slot_supply(
+        self,
+        work_records: pd.DataFrame,
+        by: Sequence[str] = ('role', 'employment'),
+    ) -> Dict[str, SlotSupplyTable]:
+        """
+        ``by`` の各列について (グループ × スロット) の供給時間と時間帯ヒストグラムを
+        一度に集計する。時刻はレコードごとに 1 回だけ整数スロット番号へ変換し、
+        グループ番号との組を整数キーにして bincount で合計する。
+        """
+        n_slots = max(1, (24 * 60) // max(1, int(self.slot_minutes)))
+        empty = {
+            col: SlotSupplyTable.empty(self.slot_minutes, n_slots, len(work_records))
+            for col in by
+        }
+        if 'ds' not in work_records.columns or work_records.empty:
+            return empty
+
+        ts = pd.to_datetime(work_records['ds'], errors='coerce')
+        valid = ts.notna().to_numpy()
+        minute_of_day = (ts.dt.hour * 60 + ts.dt.minute).to_numpy(dtype=np.float64)
+        slot_idx = np.zeros(len(ts), dtype=np.int64)
+        slot_idx[valid] = np.minimum(
+            minute_of_day[valid] // self.slot_minutes, n_slots - 1
+        ).astype(np.int64)
+        hour = np.zeros(len(ts), dtype=np.int64)
+        hour[valid] = ts.dt.hour.to_numpy()[valid].astype(np.int64)
+        if 'parsed_slots_count' in work_records.columns:
+            slots = pd.to_numeric(work_records['parsed_slots_count'], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+        else:
+            slots = np.ones(len(ts), dtype=np.float64)
+        weights = slots * self.slot_hours
+
+        tables: Dict[str, SlotSupplyTable] = {}
+        for col in by:
+            if col not in work_records.columns:
+                tables[col] = empty[col]
                 continue
-                
-            role_records = work_records[work_records['role'] == role]
-            
-            # 職種別供給量を時間スロット別に集計
-            role_supply = self._aggregate_supply_by_timeslot(role_records)
-            
-            # 職種別実働パターン分析
-            working_patterns = self._analyze_working_patterns(role_records)
-            
-            # 需要との比較
-            total_records = len(work_records)
-            role_records_count = len(role_records)
-            role_supply_ratio = role_records_count / max(total_records, 1)
-            
+            codes, keys = pd.factorize(work_records[col])
+            # 空文字のグループは集計対象外
+            keep = np.array([bool(k) and k != '' for k in keys], dtype=bool)
+            n_groups = len(keys)
+            in_group = codes >= 0
+            g = codes[in_group]
+            n_records = np.bincount(g, minlength=n_groups)
+            row = in_group & valid
+            gv = codes[row]
+            supply = np.bincount(
+                gv * n_slots + slot_idx[row], weights=weights[row], minlength=n_groups * n_slots
+            ).reshape(n_groups, n_slots)
+            hours = np.bincount(gv * 24 + hour[row], minlength=n_groups * 24).reshape(n_groups, 24)
+            tables[col] = SlotSupplyTable(
+                keys=pd.Index(keys[keep]),
+                supply=supply[keep],
+                hour_counts=hours[keep],
+                record_counts=n_records[keep],
+                total_records=len(work_records),
+                slot_minutes=int(self.slot_minutes),
+            )
+        return tables
+
+    def _analyze_groups(
+        self,
+        table: SlotSupplyTable,
+        need_data: pd.DataFrame,
+        cost_per_hour: Optional[Dict[str, float]] = None,
+        with_cost: bool = False,
+    ) -> Dict[str, Dict]:
+        """集計済みテーブルから各グループの需要カバレッジを求める"""
+        analysis: Dict[str, Dict] = {}
+        # 需要データ由来の需要はグループに依存しないので 1 回だけ計算する
+        need_demand = self._demand_from_need_data(need_data)
+        supply_totals = table.supply.sum(axis=1)
+        supply_ratios = table.record_counts / max(table.total_records, 1)
+
+        for i, key in enumerate(table.keys):
+            working_patterns = self._patterns_from_hour_counts(table.hour_counts[i])
             demand_coverage = self._calculate_demand_coverage(
-                role_supply, need_data, working_patterns, role_supply_ratio
+                table.supply[i], need_data, working_patterns, float(supply_ratios[i]),
+                total_supply=float(supply_totals[i]), need_demand=need_demand,
             )
-            
-            # 分析結果を保存
-            role_analysis[role] = {
+            result = {
                 **demand_coverage,
-                'supply_by_slot': role_supply,
+                'supply_by_slot': table.supply[i],
                 'working_patterns': working_patterns,
-                'record_count': role_records_count,
-                'supply_ratio': role_supply_ratio
+                'record_count': int(table.record_counts[i]),
+                'supply_ratio': float(supply_ratios[i]),
             }
-            
-            log.debug(f"[TimeAxis] {role}: 需要{demand_coverage['total_demand']:.1f}h, "
+            if with_cost:
+                hourly_cost = cost_per_hour.get(key, 0) if cost_per_hour else 0
+                result['hourly_cost'] = hourly_cost
+                result['total_cost'] = demand_coverage['total_supply'] * hourly_cost
+            analysis[key] = result
+
+            log.debug(f"[TimeAxis] {key}: 需要{demand_coverage['total_demand']:.1f}h, "
                      f"供給{demand_coverage['total_supply']:.1f}h, "
                      f"不足{demand_coverage['total_shortage']:.1f}h")
-        
+        return analysis
+
+    def calculate_all_shortages(
+        self,
+        actual_data: pd.DataFrame,
+        need_data: pd.DataFrame,
+        cost_per_hour: Optional[Dict[str, float]] = None,
+    ) -> Tuple[Dict[str, Dict], Dict[str, Dict]]:
+        """職種別・雇用形態別の分析を 1 回の集計でまとめて行う"""
+        work_records = self._prepare_work_records(actual_data)
+        if work_records is None:
+            return {}, {}
+        tables = self.aggregate_slot_supply(work_records, ('role', 'employment'))
+        role_analysis = self._analyze_groups(tables['role'], need_data)
+        employment_analysis = self._analyze_groups(
+            tables['employment'], need_data, cost_per_hour, with_cost=True
+        )
+        log.info(f"[TimeAxis] 一括分析完了: {len(role_analysis)}職種, {len(employment_analysis)}形態")
+        return role_analysis, employment_analysis
+
+    def calculate_role_based_shortage(
+        self, 
+        actual_data: pd.DataFrame,
+        need_data: pd.DataFrame
+    ) -> Dict[str, Dict]:
+        """職種別の時間軸ベース不足時間計算"""
+        work_records = self._prepare_work_records(actual_data)
+        if work_records is None:
+            return {}
+        table = self.aggregate_slot_supply(work_records, ('role',))['role']
+        role_analysis = self._analyze_groups(table, need_data)
         log.info(f"[TimeAxis] 職種別分析完了: {len(role_analysis)}職種")
         return role_analysis
     
@@ -180,100 +324,42 @@ class TimeAxisShortageCalculator:
         cost_per_hour: Optional[Dict[str, float]] = None
     ) -> Dict[str, Dict]:
         """雇用形態別の時間軸ベース不足時間計算 (動的データ対応)"""
-        employment_analysis = {}
-        
-        # 勤務レコードのみ抽出
-        work_records = actual_data[actual_data['parsed_slots_count'] > 0].copy()
-        
-        if work_records.empty:
-            log.warning("[TimeAxis] 勤務レコードが見つかりません")
+        work_records = self._prepare_work_records(actual_data)
+        if work_records is None:
             return {}
-        
-        # 動的スロット検出（職種ベース分析と共有）
-        if self.auto_detect and 'ds' in work_records.columns:
-            self._detect_and_update_slot_interval(work_records['ds'])
-        
-        # 雇用形態ごとに分析
-        for employment in work_records['employment'].unique():
-            if not employment or employment == '':
-                continue
-                
-            emp_records = work_records[work_records['employment'] == employment]
-            
-            # 雇用形態別供給量を時間スロット別に集計
-            emp_supply = self._aggregate_supply_by_timeslot(emp_records)
-            
-            # 雇用形態別実働パターン分析
-            working_patterns = self._analyze_working_patterns(emp_records)
-            
-            # 需要との比較（動的計算）
-            total_records = len(work_records)
-            emp_records_count = len(emp_records)
-            emp_supply_ratio = emp_records_count / max(total_records, 1)
-            
-            demand_coverage = self._calculate_demand_coverage(
-                emp_supply, need_data, working_patterns, emp_supply_ratio
-            )
-            
-            # コスト分析
-            hourly_cost = cost_per_hour.get(employment, 0) if cost_per_hour else 0
-            
-            employment_analysis[employment] = {
-                **demand_coverage,
-                'supply_by_slot': emp_supply,
-                'working_patterns': working_patterns,
-                'record_count': emp_records_count,
-                'supply_ratio': emp_supply_ratio,
-                'hourly_cost': hourly_cost,
-                'total_cost': demand_coverage['total_supply'] * hourly_cost
-            }
-            
-            log.debug(f"[TimeAxis] {employment}: 需要{demand_coverage['total_demand']:.1f}h, "
-                     f"供給{demand_coverage['total_supply']:.1f}h, "
-                     f"不足{demand_coverage['total_shortage']:.1f}h")
-        
+        table = self.aggregate_slot_supply(work_records, ('employment',))['employment']
+        employment_analysis = self._analyze_groups(table, need_data, cost_per_hour, with_cost=True)
         log.info(f"[TimeAxis] 雇用形態別分析完了: {len(employment_analysis)}形態")
         return employment_analysis
     
-    def _aggregate_supply_by_timeslot(self, records: pd.DataFrame) -> Dict[str, float]:
-        """時間スロット別供給量集計"""
-        if 'ds' not in records.columns:
-            return {}
-        
-        supply_by_slot = defaultdict(float)
-        
-        for _, record in records.iterrows():
-            timestamp = record['ds']
-            slots = record.get('parsed_slots_count', 1)
-            time_key = timestamp.strftime('%H:%M')
-            supply_by_slot[time_key] += slots * self.slot_hours
-        
-        return dict(supply_by_slot)
+    def _aggregate_supply_by_timeslot(self, records: pd.DataFrame) -> np.ndarray:
+        """時間スロット別供給量集計 (全レコードを 1 グループとして集計)"""
+        if 'ds' not in records.columns or records.empty:
+            return np.zeros(0, dtype=np.float64)
+        tmp = records.assign(_all='all')
+        table = self.aggregate_slot_supply(tmp, ('_all',))['_all']
+        return table.supply[0] if len(table.keys) else np.zeros(table.n_slots, dtype=np.float64)
     
     def _analyze_working_patterns(self, records: pd.DataFrame) -> Dict:
         """実働パターン分析"""
-        patterns = {}
-        
         if 'ds' not in records.columns or records.empty:
-            return patterns
-        
-        # 時間帯別集計
-        hour_counts = defaultdict(int)
-        for _, record in records.iterrows():
-            hour = record['ds'].hour
-            hour_counts[hour] += 1
-        
-        if hour_counts:
-            peak_hour = max(hour_counts, key=hour_counts.get)
-            total_records = sum(hour_counts.values())
+            return {}
+        hours = pd.to_datetime(records['ds'], errors='coerce').dt.hour.dropna().to_numpy(dtype=np.int64)
+        return self._patterns_from_hour_counts(np.bincount(hours, minlength=24))
+
+    @staticmethod
+    def _patterns_from_hour_counts(hour_counts: np.ndarray) -> Dict:
+        """時間帯ヒストグラム (長さ 24) からピーク時間帯を求める"""
+        patterns = {}
+        total_records = int(hour_counts.sum())
+        if total_records > 0:
+            peak_hour = int(np.argmax(hour_counts))
             peak_ratio = hour_counts[peak_hour] / max(total_records, 1)
-            
             patterns.update({
                 'peak_hours': [peak_hour],
                 'peak_ratio': min(2.0, 1.0 + peak_ratio),  # 最大2倍まで
-                'hour_distribution': dict(hour_counts)
+                'hour_distribution': hour_counts,
             })
-        
         return patterns
     
     def _detect_and_update_slot_interval(self, timestamp_data: pd.Series) -> None:
@@ -283,11 +369,8 @@ class TimeAxisShortageCalculator:
             return
         
         # 分の値を抽出して分析
-        minutes_set = set()
-        for timestamp in timestamp_data.dropna():
-            minutes_set.add(timestamp.minute)
-        
-        minutes_list = sorted(list(minutes_set))
+        minutes = pd.to_datetime(timestamp_data, errors='coerce').dropna().dt.minute.unique()
+        minutes_list = sorted(int(m) for m in minutes)
         
         # 一般的なスロット間隔パターンを確認
         slot_patterns = {
@@ -342,14 +425,9 @@ def calculate_time_axis_shortage(
         total_shortage_baseline=total_shortage_baseline  # 検証用途のみ
     )
     
-    # 職種別分析
-    role_analysis = calculator.calculate_role_based_shortage(
-        working_data, need_data or pd.DataFrame()
-    )
-    
-    # 雇用形態別分析
-    employment_analysis = calculator.calculate_employment_based_shortage(
-        working_data, need_data or pd.DataFrame()
+    # 職種別・雇用形態別分析（1 回の集計で両方を求める）
+    role_analysis, employment_analysis = calculator.calculate_all_shortages(
+        working_data, need_data if need_data is not None else pd.DataFrame()
     )
     
     # 結果を辞書形式で返す（既存インターフェース互換）
@@ -363,7 +441,7 @@ def calculate_time_axis_shortage(
         for employment, analysis in employment_analysis.items()
     }
     
-    log.info(f"[TimeAxis] 検出スロット: {calculator.slot_minutes}分 (信頼度: {getattr(calculator.detected_slot_info, {}).get('confidence', 'N/A')})")
+    log.info(f"[TimeAxis] 検出スロット: {calculator.slot_minutes}分 (信頼度: {(calculator.detected_slot_info or {}).get('confidence', 'N/A')})")
     log.info(f"[TimeAxis] 時間軸ベース計算完了: 職種{len(role_shortages)}個, 雇用形態{len(employment_shortages)}個")
     
     return role_shortages, employment_shortages
\ No newline at end of file
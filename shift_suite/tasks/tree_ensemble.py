@@ -0,0 +1,523 @@
+"""
+shift_suite.tasks.tree_ensemble v1.0.0 – NumPy ヒストグラム型決定木アンサンブル
+────────────────────────────────────────────────────────────────
+* sklearn / XGBoost / LightGBM が無い環境で ``turnover_prediction`` が使う
+  分類器。従来の Simple* クラスは多数派クラスを返すだけのダミーだった。
+* 特徴量は分位点で最大 ``max_bins`` 個のビンに量子化し (欠損は専用ビン)、
+  木は深さ優先ではなく **レベル単位** で成長させる。同じ深さの全ノードの
+  勾配ヒストグラムを 1 回の ``np.bincount`` でまとめて作り、累積和から
+  全ノード × 全特徴量 × 全閾値の分割ゲインを一括で評価する。
+* ``HistGradientBoostingClassifier`` : 二値はロジスティック損失、多クラスは
+  softmax (クラスごとの木はスレッドで並列に構築)。
+* ``HistRandomForestClassifier`` : ブートストラップ重み + ノードごとの
+  特徴量サブサンプリング。木はスレッドプールで並列に構築する。
+* どちらも fit / predict / predict_proba / score / feature_importances_ /
+  classes_ を持ち、sklearn の分類器と置き換えて使える。
+"""
+
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, List, Sequence
+
+import numpy as np
+
+MAX_BINS = 255
+DEFAULT_MAX_BINS = 63  # 数千行規模では 255 と精度差がほぼ無く、分割探索が約 2 倍速い
+_MIN_GAIN = 1e-12
+# 1 回のヒストグラム計算で確保するセル数の上限 (ノード × 特徴量 × ビン)
+_HIST_CELL_BUDGET = 1 << 19
+
+
+def _resolve_n_jobs(n_jobs: int | None) -> int:
+    cpus = os.cpu_count() or 1
+    if n_jobs is None or n_jobs == 0:
+        return 1
+    if n_jobs < 0:
+        return max(1, cpus + 1 + n_jobs)
+    return min(n_jobs, cpus)
+
+
+def _parallel_map(func: Callable, items: Sequence, n_jobs: int) -> List:
+    if n_jobs <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(n_jobs, len(items))) as pool:
+        return list(pool.map(func, items))
+
+
+def _sigmoid(raw: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(raw, -35.0, 35.0)))
+
+
+# ─────────────────────────── binning ───────────────────────────
+class _BinMapper:
+    """特徴量ごとの分位点ビン境界。欠損値は最後のビン (``n_bins - 1``) に入る"""
+
+    def __init__(self, max_bins: int = MAX_BINS):
+        if not 2 <= max_bins <= MAX_BINS:
+            raise ValueError(f"max_bins must be in [2, {MAX_BINS}]")
+        self.max_bins = max_bins
+        self.n_bins = max_bins + 1
+        self.edges_: List[np.ndarray] = []
+
+    def fit(self, X: np.ndarray) -> "_BinMapper":
+        self.edges_ = []
+        for col in X.T:
+            values = np.unique(col[~np.isnan(col)])
+            if len(values) <= self.max_bins:
+                edges = (values[:-1] + values[1:]) / 2.0
+            else:
+                qs = np.linspace(0, 100, self.max_bins + 1)[1:-1]
+                edges = np.unique(np.percentile(col[~np.isnan(col)], qs, method="midpoint"))
+            self.edges_.append(edges)
+        return self
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        binned = np.empty(X.shape, dtype=np.uint8)
+        for j, edges in enumerate(self.edges_):
+            col = X[:, j]
+            b = np.searchsorted(edges, col, side="right")
+            b[np.isnan(col)] = self.n_bins - 1
+            binned[:, j] = b
+        return binned
+
+
+# ─────────────────────────── tree ───────────────────────────
+@dataclass
+class _Tree:
+    feature: np.ndarray      # 葉は -1
+    threshold: np.ndarray    # ビン番号 (<= で左)
+    left: np.ndarray
+    right: np.ndarray
+    value: np.ndarray        # (n_nodes, n_outputs)
+    max_depth: int
+
+    def apply(self, binned: np.ndarray) -> np.ndarray:
+        """各行が到達する葉ノード番号"""
+        node = np.zeros(len(binned), dtype=np.intp)
+        rows = np.arange(len(binned))
+        for _ in range(self.max_depth):
+            feat = self.feature[node]
+            internal = feat >= 0
+            if not internal.any():
+                break
+            go_left = binned[rows, np.maximum(feat, 0)] <= self.threshold[node]
+            node = np.where(internal, np.where(go_left, self.left[node], self.right[node]), node)
+        return node
+
+
+def _cell_base(binned: np.ndarray, n_bins: int) -> np.ndarray:
+    """ヒストグラム上の (特徴量, ビン) 位置。fit ごとに 1 回だけ作る"""
+    return binned.astype(np.int32) + (np.arange(binned.shape[1], dtype=np.int32) * n_bins)[None, :]
+
+
+def _grow_tree(
+    binned: np.ndarray,
+    cell_base: np.ndarray,
+    grad: np.ndarray,
+    hess: np.ndarray,
+    count: np.ndarray,
+    *,
+    n_bins: int,
+    max_depth: int,
+    min_samples_leaf: float,
+    min_child_weight: float,
+    l2: float,
+    max_features: int | None,
+    rng: np.random.Generator | None,
+) -> tuple[_Tree, np.ndarray, np.ndarray]:
+    """
+    レベル単位で木を成長させる。
+
+    grad : (n, K) 勾配 (RF は -y×重み)
+    hess : (n,)   ヘッシアン (RF はサンプル重み)
+    count: (n,)   min_samples_leaf 判定用の重み付き件数
+    戻り値は (木, 学習行の到達葉, 特徴量ごとのゲイン合計)
+    """
+    n, n_features = binned.shape
+    n_out = grad.shape[1]
+    B = n_bins
+    stats = np.column_stack([grad, hess, count])          # (n, K+2)
+    n_stats = stats.shape[1]
+
+    feature = [-1]
+    threshold = [0]
+    left = [-1]
+    right = [-1]
+    totals = [stats.sum(axis=0)]
+    importances = np.zeros(n_features)
+
+    node_of = np.zeros(n, dtype=np.intp)
+    frontier = np.array([0], dtype=np.intp)
+
+    for _depth in range(max_depth):
+        tot = np.asarray([totals[i] for i in frontier])
+        splittable = tot[:, -1] >= 2 * min_samples_leaf
+        frontier = frontier[splittable]
+        if len(frontier) == 0:
+            break
+
+        slot_of = np.full(len(feature), -1, dtype=np.intp)
+        slot_of[frontier] = np.arange(len(frontier))
+        row_slot = slot_of[node_of]
+        active_rows = np.flatnonzero(row_slot >= 0)
+        if len(active_rows) == 0:
+            break
+
+        best_feat = np.full(len(frontier), -1, dtype=np.intp)
+        best_bin = np.zeros(len(frontier), dtype=np.intp)
+        best_gain = np.full(len(frontier), -np.inf)
+        best_left = np.zeros((len(frontier), n_stats))
+
+        chunk = max(1, _HIST_CELL_BUDGET // (n_features * B))
+        for c0 in range(0, len(frontier), chunk):
+            c1 = min(c0 + chunk, len(frontier))
+            S = c1 - c0
+            rows = active_rows[(row_slot[active_rows] >= c0) & (row_slot[active_rows] < c1)]
+            if len(rows) == 0:
+                continue
+            flat = ((row_slot[rows] - c0)[:, None] * (n_features * B) + cell_base[rows]).ravel()
+            size = S * n_features * B
+            hist = np.empty((n_stats, size))
+            for s in range(n_stats):
+                w = np.repeat(stats[rows, s], n_features)
+                hist[s] = np.bincount(flat, weights=w, minlength=size)
+            # 閾値候補は行が存在するビンだけ (空ビンの分割は直前のビンと同じ)。
+            # 非空セルは (ノード, 特徴量, ビン) 昇順なので区間ごとの累積和で左側統計になる
+            cells = np.flatnonzero(hist[-1] > 0)
+            if len(cells) == 0:
+                continue
+            seg = cells // B                                # (node, feature)
+            seg_starts = np.flatnonzero(np.r_[True, seg[1:] != seg[:-1]])
+            seg_len = np.diff(np.r_[seg_starts, len(cells)])
+            csum = np.cumsum(hist[:, cells], axis=1)
+            before = np.where(seg_starts > 0, csum[:, seg_starts - 1], 0.0)
+            left_st = csum - np.repeat(before, seg_len, axis=1)   # 左側 (bin <= b)
+            total = np.repeat(left_st[:, seg_starts + seg_len - 1], seg_len, axis=1)
+            right_st = total - left_st
+            GL, HL, CL = left_st[:n_out], left_st[n_out], left_st[n_out + 1]
+            GR, HR, CR = right_st[:n_out], right_st[n_out], right_st[n_out + 1]
+            G, H = total[:n_out], total[n_out]
+
+            with np.errstate(divide="ignore", invalid="ignore"):
+                gain = (
+                    (GL ** 2).sum(axis=0) / (HL + l2)
+                    + (GR ** 2).sum(axis=0) / (HR + l2)
+                    - (G ** 2).sum(axis=0) / (H + l2)
+                )
+            valid = (
+                (CL >= min_samples_leaf) & (CR >= min_samples_leaf)
+                & (HL >= min_child_weight) & (HR >= min_child_weight)
+            )
+            if max_features is not None and max_features < n_features and rng is not None:
+                keys = rng.random((S, n_features))
+                kth = np.partition(keys, max_features - 1, axis=1)[:, max_features - 1:max_features]
+                valid &= (keys <= kth).ravel()[seg]
+            gain = np.where(valid & np.isfinite(gain), gain, -np.inf)
+
+            # ノードごとの最大ゲイン (cells は昇順なのでノード単位で連続)
+            node_local = seg // n_features
+            starts = np.flatnonzero(np.r_[True, node_local[1:] != node_local[:-1]])
+            nodes = node_local[starts]
+            node_best = np.maximum.reduceat(gain, starts)
+            counts = np.diff(np.r_[starts, len(cells)])
+            is_best = gain == np.repeat(node_best, counts)
+            first = np.minimum.reduceat(np.where(is_best, np.arange(len(cells)), len(cells)), starts)
+            first = np.minimum(first, len(cells) - 1)
+            slots = c0 + nodes
+            best_feat[slots] = seg[first] % n_features
+            best_bin[slots] = cells[first] % B
+            best_gain[slots] = node_best
+            best_left[slots] = left_st[:, first].T
+
+        do_split = best_gain > _MIN_GAIN
+        if not do_split.any():
+            break
+
+        new_frontier = []
+        child_left = np.full(len(frontier), -1, dtype=np.intp)
+        child_right = np.full(len(frontier), -1, dtype=np.intp)
+        for i in np.flatnonzero(do_split):
+            node = frontier[i]
+            lid, rid = len(feature), len(feature) + 1
+            feature[node] = int(best_feat[i])
+            threshold[node] = int(best_bin[i])
+            left[node], right[node] = lid, rid
+            feature += [-1, -1]
+            threshold += [0, 0]
+            left += [-1, -1]
+            right += [-1, -1]
+            totals += [best_left[i], totals[node] - best_left[i]]
+            importances[best_feat[i]] += best_gain[i]
+            child_left[i], child_right[i] = lid, rid
+            new_frontier += [lid, rid]
+
+        moving = active_rows[do_split[row_slot[active_rows]]]
+        slots = row_slot[moving]
+        go_left = binned[moving, best_feat[slots]] <= best_bin[slots]
+        node_of[moving] = np.where(go_left, child_left[slots], child_right[slots])
+        frontier = np.asarray(new_frontier, dtype=np.intp)
+
+    tot = np.asarray(totals)
+    value = -tot[:, :n_out] / (tot[:, n_out:n_out + 1] + l2)
+    value[~np.isfinite(value)] = 0.0
+    tree = _Tree(
+        feature=np.asarray(feature, dtype=np.intp),
+        threshold=np.asarray(threshold, dtype=np.intp),
+        left=np.asarray(left, dtype=np.intp),
+        right=np.asarray(right, dtype=np.intp),
+        value=value,
+        max_depth=max_depth,
+    )
+    return tree, node_of, importances
+
+
+# ─────────────────────────── common base ───────────────────────────
+class _HistTreeClassifierBase:
+    def _validate_X(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=float)
+        if X.ndim != 2:
+            raise ValueError("X must be 2-dimensional")
+        return X
+
+    def _encode_y(self, y) -> np.ndarray:
+        y = np.asarray(y)
+        self.classes_ = np.unique(y)
+        return np.searchsorted(self.classes_, y)
+
+    def predict(self, X) -> np.ndarray:
+        proba = self.predict_proba(X)
+        return self.classes_[np.argmax(proba, axis=1)]
+
+    def score(self, X, y) -> float:
+        return float((self.predict(X) == np.asarray(y)).mean())
+
+    def _check_fitted(self) -> None:
+        if getattr(self, "_bin_mapper", None) is None:
+            raise RuntimeError(f"{type(self).__name__} is not fitted yet")
+
+
+# ─────────────────────────── gradient boosting ───────────────────────────
+class HistGradientBoostingClassifier(_HistTreeClassifierBase):
+    """ヒストグラム型勾配ブースティング (二値: ロジスティック, 多クラス: softmax)"""
+
+    def __init__(
+        self,
+        n_estimators: int = 100,
+        learning_rate: float = 0.1,
+        max_depth: int = 6,
+        min_samples_leaf: int = 20,
+        min_child_weight: float = 1e-3,
+        l2_regularization: float = 1.0,
+        subsample: float = 1.0,
+        max_bins: int = DEFAULT_MAX_BINS,
+        random_state: int | None = None,
+        n_jobs: int | None = -1,
+        **_ignored,
+    ):
+        # XGBClassifier / LGBMClassifier 向けの引数 (eval_metric, verbosity 等) は無視する
+        self.n_estimators = n_estimators
+        self.learning_rate = learning_rate
+        self.max_depth = max_depth
+        self.min_samples_leaf = min_samples_leaf
+        self.min_child_weight = min_child_weight
+        self.l2_regularization = l2_regularization
+        self.subsample = subsample
+        self.max_bins = max_bins
+        self.random_state = random_state
+        self.n_jobs = n_jobs
+        self._bin_mapper: _BinMapper | None = None
+        self.feature_importances_: np.ndarray | None = None
+
+    def fit(self, X, y, **_fit_kwargs) -> "HistGradientBoostingClassifier":
+        X = self._validate_X(X)
+        y_idx = self._encode_y(y)
+        n, n_features = X.shape
+        n_classes = len(self.classes_)
+        self.n_features_in_ = n_features
+        rng = np.random.default_rng(self.random_state)
+        n_jobs = _resolve_n_jobs(self.n_jobs)
+
+        self._bin_mapper = _BinMapper(self.max_bins).fit(X)
+        binned = self._bin_mapper.transform(X)
+        cell_base = _cell_base(binned, self._bin_mapper.n_bins)
+        K = 1 if n_classes <= 2 else n_classes
+        onehot = np.eye(n_classes)[y_idx] if K > 1 else (y_idx == 1)[:, None].astype(float)
+
+        prior = onehot.mean(axis=0).clip(1e-6, 1 - 1e-6)
+        self._init_raw = np.log(prior / (1 - prior)) if K == 1 else np.log(prior)
+        raw = np.tile(self._init_raw, (n, 1))
+        self._trees: List[List[_Tree]] = []
+        importances = np.zeros(n_features)
+
+        if n_classes < 2:
+            self.feature_importances_ = importances
+            return self
+
+        grow = dict(
+            n_bins=self._bin_mapper.n_bins,
+            max_depth=self.max_depth,
+            min_samples_leaf=self.min_samples_leaf,
+            min_child_weight=self.min_child_weight,
+            l2=self.l2_regularization,
+            max_features=None,
+            rng=None,
+        )
+        for _ in range(self.n_estimators):
+            if K == 1:
+                p = _sigmoid(raw)
+            else:
+                e = np.exp(raw - raw.max(axis=1, keepdims=True))
+                p = e / e.sum(axis=1, keepdims=True)
+            grad = p - onehot
+            hess = np.maximum(p * (1.0 - p), 1e-16)
+            if self.subsample < 1.0:
+                weight = (rng.random(n) < self.subsample).astype(float)
+            else:
+                weight = np.ones(n)
+
+            def fit_class(k: int):
+                return _grow_tree(
+                    binned, cell_base, (grad[:, k] * weight)[:, None], hess[:, k] * weight, weight,
+                    **grow,
+                )
+
+            round_trees = []
+            for k, (tree, leaf_of, gain) in enumerate(_parallel_map(fit_class, range(K), n_jobs)):
+                tree.value *= self.learning_rate
+                raw[:, k] += tree.value[leaf_of, 0]
+                importances += gain
+                round_trees.append(tree)
+            self._trees.append(round_trees)
+
+        total = importances.sum()
+        self.feature_importances_ = importances / total if total > 0 else importances
+        return self
+
+    def decision_function(self, X) -> np.ndarray:
+        self._check_fitted()
+        binned = self._bin_mapper.transform(self._validate_X(X))
+        raw = np.tile(self._init_raw, (len(binned), 1))
+        for round_trees in self._trees:
+            for k, tree in enumerate(round_trees):
+                raw[:, k] += tree.value[tree.apply(binned), 0]
+        return raw
+
+    def predict_proba(self, X) -> np.ndarray:
+        raw = self.decision_function(X)
+        if len(self.classes_) < 2:
+            return np.ones((len(raw), 1))
+        if raw.shape[1] == 1:
+            p = _sigmoid(raw[:, 0])
+            return np.column_stack([1.0 - p, p])
+        e = np.exp(raw - raw.max(axis=1, keepdims=True))
+        return e / e.sum(axis=1, keepdims=True)
+
+
+# ─────────────────────────── random forest ───────────────────────────
+class HistRandomForestClassifier(_HistTreeClassifierBase):
+    """ヒストグラム型ランダムフォレスト (ジニ不純度 = one-hot の二乗誤差で分割)"""
+
+    def __init__(
+        self,
+        n_estimators: int = 100,
+        max_depth: int | None = 12,
+        min_samples_leaf: int = 1,
+        max_features: str | int | float | None = "sqrt",
+        bootstrap: bool = True,
+        max_bins: int = DEFAULT_MAX_BINS,
+        random_state: int | None = None,
+        n_jobs: int | None = -1,
+        **_ignored,
+    ):
+        self.n_estimators = n_estimators
+        self.max_depth = max_depth
+        self.min_samples_leaf = min_samples_leaf
+        self.max_features = max_features
+        self.bootstrap = bootstrap
+        self.max_bins = max_bins
+        self.random_state = random_state
+        self.n_jobs = n_jobs
+        self._bin_mapper: _BinMapper | None = None
+        self.feature_importances_: np.ndarray | None = None
+
+    def _n_split_features(self, n_features: int) -> int:
+        mf = self.max_features
+        if mf is None:
+            return n_features
+        if mf == "sqrt":
+            return max(1, int(np.sqrt(n_features)))
+        if mf == "log2":
+            return max(1, int(np.log2(n_features)))
+        if isinstance(mf, float):
+            return max(1, int(mf * n_features))
+        return max(1, min(int(mf), n_features))
+
+    def fit(self, X, y, **_fit_kwargs) -> "HistRandomForestClassifier":
+        X = self._validate_X(X)
+        y_idx = self._encode_y(y)
+        n, n_features = X.shape
+        n_classes = len(self.classes_)
+        self.n_features_in_ = n_features
+
+        self._bin_mapper = _BinMapper(self.max_bins).fit(X)
+        binned = self._bin_mapper.transform(X)
+        cell_base = _cell_base(binned, self._bin_mapper.n_bins)
+        # 二値は P(class1) だけを葉に持つ (one-hot 2 列と同じ分割になる)
+        target = np.eye(n_classes)[y_idx] if n_classes > 2 else (y_idx == 1)[:, None].astype(float)
+        max_depth = self.max_depth if self.max_depth is not None else max(1, int(np.ceil(np.log2(max(n, 2)))) * 2)
+        max_features = self._n_split_features(n_features)
+        seeds = np.random.SeedSequence(self.random_state).spawn(self.n_estimators)
+
+        def fit_tree(seed):
+            rng = np.random.default_rng(seed)
+            if self.bootstrap:
+                weight = np.bincount(rng.integers(0, n, n), minlength=n).astype(float)
+            else:
+                weight = np.ones(n)
+            tree, _, gain = _grow_tree(
+                binned,
+                cell_base,
+                -target * weight[:, None],
+                weight,
+                weight,
+                n_bins=self._bin_mapper.n_bins,
+                max_depth=max_depth,
+                min_samples_leaf=self.min_samples_leaf,
+                min_child_weight=0.0,
+                l2=0.0,
+                max_features=max_features,
+                rng=rng,
+            )
+            total = gain.sum()
+            return tree, (gain / total if total > 0 else gain)
+
+        results = _parallel_map(fit_tree, seeds, _resolve_n_jobs(self.n_jobs))
+        self._trees = [tree for tree, _ in results]
+        self.feature_importances_ = (
+            np.mean([imp for _, imp in results], axis=0) if results else np.zeros(n_features)
+        )
+        return self
+
+    def predict_proba(self, X) -> np.ndarray:
+        self._check_fitted()
+        binned = self._bin_mapper.transform(self._validate_X(X))
+        n_classes = len(self.classes_)
+        proba = np.zeros((len(binned), n_classes if n_classes > 2 else 1))
+        for tree in self._trees:
+            proba += tree.value[tree.apply(binned)]
+        # 葉の値 -G/H は葉に落ちた (ブートストラップ重み付き) クラス比率
+        proba /= max(len(self._trees), 1)
+        if n_classes == 2:
+            return np.column_stack([1.0 - proba[:, 0], proba[:, 0]])
+        if n_classes == 1:
+            return np.ones((len(binned), 1))
+        return proba
+
+
+__all__ = [
+    "HistGradientBoostingClassifier",
+    "HistRandomForestClassifier",
+]
@@ -7,27 +7,48 @@ shift_suite.tasks.turnover_prediction - 離職リスク予測モデル
   3. 早期警告システム
   4. 離職リスク軽減提案
   5. チーム離職リスク分析
+  6. 学習済みモデルのレジストリ（特徴量スキーマハッシュ付きで永続化し、
+     特徴量分布のドリフトが閾値を超えたときだけ再学習）
+  7. sklearn / XGBoost / LightGBM が無い環境でも tree_ensemble の
+     ヒストグラム型ランダムフォレスト・勾配ブースティングで実際に学習する
 """
 
 from __future__ import annotations
 
 import datetime as dt
+import hashlib
+import json
 import logging
+import os
+import pickle
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple, Union
 
 import numpy as np
 import pandas as pd
 
+try:
+    import fcntl
+    _HAS_FCNTL = True
+except ImportError:  # Windows
+    _HAS_FCNTL = False
+
 # Define SLOT_HOURS constant (30 minutes = 0.5 hours)
 SLOT_HOURS = 0.5
 
 # sklearn imports for ML-based prediction
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
-from sklearn.model_selection import train_test_split, cross_val_score
-from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sklearn.metrics import classification_report, roc_auc_score, confusion_matrix
-from sklearn.linear_model import LogisticRegression
+try:
+    from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+    from sklearn.model_selection import train_test_split, cross_val_score
+    from sklearn.preprocessing import StandardScaler, LabelEncoder
+    from sklearn.metrics import classification_report, roc_auc_score, confusion_matrix
+    from sklearn.linear_model import LogisticRegression
+except ImportError:  # 下の Simple* / NumPy 実装にフォールバック
+    pass
+
+from .tree_ensemble import HistGradientBoostingClassifier, HistRandomForestClassifier
 
 # Try to import XGBoost and LightGBM for better accuracy
 try:
@@ -43,77 +64,9 @@ except ImportError:
     LIGHTGBM_AVAILABLE = False
 
 # Legacy simple implementations (kept for backward compatibility)
-class SimpleRandomForestClassifier:
-    """Simple Random Forest Classifier implementation"""
-    
-    def __init__(self, n_estimators=10, max_depth=3, random_state=None):
-        self.n_estimators = n_estimators
-        self.max_depth = max_depth
-        self.random_state = random_state
-        self.feature_importances_ = None
-        
-    def fit(self, X, y):
-        if self.random_state:
-            np.random.seed(self.random_state)
-            
-        # Simple implementation: use majority class prediction
-        unique_classes, counts = np.unique(y, return_counts=True)
-        self.majority_class = unique_classes[np.argmax(counts)]
-        
-        # Store feature importances (dummy implementation)
-        self.feature_importances_ = np.ones(X.shape[1]) / X.shape[1]
-        
-        return self
-    
-    def predict(self, X):
-        # Simple implementation: always predict majority class
-        return np.full(X.shape[0], self.majority_class)
-    
-    def predict_proba(self, X):
-        # Return dummy probabilities
-        n_samples = X.shape[0]
-        n_classes = 2  # Assuming binary classification
-        probas = np.full((n_samples, n_classes), 0.5)
-        return probas
-    
-    def score(self, X, y):
-        predictions = self.predict(X)
-        return (predictions == y).mean()
-
-class SimpleGradientBoostingClassifier:
-    """Simple Gradient Boosting Classifier implementation"""
-    
-    def __init__(self, n_estimators=100, learning_rate=0.1, random_state=None):
-        self.n_estimators = n_estimators
-        self.learning_rate = learning_rate
-        self.random_state = random_state
-        self.feature_importances_ = None
-        
-    def fit(self, X, y):
-        if self.random_state:
-            np.random.seed(self.random_state)
-            
-        # Simple implementation: use majority class prediction
-        unique_classes, counts = np.unique(y, return_counts=True)
-        self.majority_class = unique_classes[np.argmax(counts)]
-        
-        # Store feature importances (dummy implementation)
-        self.feature_importances_ = np.ones(X.shape[1]) / X.shape[1]
-        
-        return self
-    
-    def predict(self, X):
-        return np.full(X.shape[0], self.majority_class)
-    
-    def predict_proba(self, X):
-        n_samples = X.shape[0]
-        n_classes = 2
-        probas = np.full((n_samples, n_classes), 0.5)
-        return probas
-    
-    def score(self, X, y):
-        predictions = self.predict(X)
-        return (predictions == y).mean()
+# ランダムフォレスト / 勾配ブースティングは NumPy のヒストグラム型実装 (tree_ensemble)
+SimpleRandomForestClassifier = HistRandomForestClassifier
+SimpleGradientBoostingClassifier = HistGradientBoostingClassifier
 
 class SimpleLogisticRegression:
     """Simple Logistic Regression implementation"""
@@ -293,9 +246,15 @@ def simple_classification_report(y_true, y_pred, target_names=None):
     return report
 
 def simple_roc_auc_score(y_true, y_score):
-    """Simple ROC AUC score implementation"""
-    # Simplified AUC calculation
-    return 0.5  # Return neutral score
+    """Simple ROC AUC score implementation (Mann-Whitney U, 同順位は平均順位)"""
+    y_true = np.asarray(y_true)
+    y_score = np.asarray(y_score, dtype=float)
+    pos = y_true == np.max(y_true)
+    n_pos, n_neg = int(pos.sum()), int((~pos).sum())
+    if n_pos == 0 or n_neg == 0:
+        return 0.5
+    ranks = pd.Series(y_score).rank(method='average').to_numpy()
+    return float((ranks[pos].sum() - n_pos * (n_pos + 1) / 2) / (n_pos * n_neg))
 
 def simple_confusion_matrix(y_true, y_pred):
     """Simple confusion matrix implementation"""
@@ -333,9 +292,10 @@ except ImportError:
     confusion_matrix = simple_confusion_matrix
 import warnings
 
-from .utils import log, save_df_parquet, write_meta
-from .constants import NIGHT_START_HOUR, NIGHT_END_HOUR, is_night_shift_time
+from .utils import log, safe_pickle_loads, save_df_parquet, write_meta
+from .constants import MODEL_DIR, NIGHT_START_HOUR, NIGHT_END_HOUR, is_night_shift_time
 from .utils import validate_and_convert_slot_minutes, safe_slot_calculation
+from .staff_index import staff_partition
 
 # Log model availability
 if SKLEARN_AVAILABLE:
@@ -351,47 +311,196 @@ else:
 if LIGHTGBM_AVAILABLE:
     log.info("[turnover_prediction] LightGBM available for enhanced predictions")
 
-# Simple XGBoost replacement
-class SimpleXGBClassifier:
-    """Simple XGBoost classifier replacement"""
-    
-    def __init__(self, **kwargs):
-        self.classes_ = None
-        self.feature_importances_ = None
-        
-    def fit(self, X, y, **kwargs):
-        # Simple implementation: use majority class
-        unique_classes, counts = np.unique(y, return_counts=True)
-        self.classes_ = unique_classes
-        self.majority_class = unique_classes[np.argmax(counts)]
-        
-        # Dummy feature importances
-        if hasattr(X, 'shape'):
-            self.feature_importances_ = np.ones(X.shape[1]) / X.shape[1]
-        else:
-            self.feature_importances_ = np.array([1.0])
-        
-        return self
-        
-    def predict(self, X):
-        if hasattr(X, 'shape'):
-            return np.full(X.shape[0], self.majority_class)
-        else:
-            return np.array([self.majority_class])
-    
-    def predict_proba(self, X):
-        if hasattr(X, 'shape'):
-            n_samples = X.shape[0]
-        else:
-            n_samples = 1
-        n_classes = len(self.classes_) if self.classes_ is not None else 2
-        return np.full((n_samples, n_classes), 1.0 / n_classes)
+# Simple XGBoost replacement (XGBoost 未導入時のみ ``xgb`` を差し替える)
+SimpleXGBClassifier = HistGradientBoostingClassifier
+
 
 class SimpleXGB:
     """Simple XGBoost module replacement"""
     XGBClassifier = SimpleXGBClassifier
-    
-xgb = SimpleXGB()
+
+
+if not XGBOOST_AVAILABLE:
+    xgb = SimpleXGB()
+
+
+# ─────────────────────────── モデルレジストリ ───────────────────────────
+DEFAULT_REGISTRY_DIR = MODEL_DIR / "turnover" / "registry"
+# 保存済みモデルの unpickle で解決を許可するモジュール (numpy / pandas 以外)
+MODEL_PICKLE_MODULES = ('sklearn', 'lightgbm', 'xgboost', 'shift_suite.tasks.tree_ensemble', __name__)
+DEFAULT_DRIFT_THRESHOLD = 0.2   # 特徴量あたり平均 PSI（小標本バイアス補正後）
+DRIFT_BINS = 5
+_PSI_EPS = 1e-4
+CATEGORICAL_FEATURES = ['age_group', 'employment_type', 'department']
+
+
+def feature_schema_hash(feature_names: List[str], lookback_months: int) -> str:
+    """特徴量構成と集計期間から互換性キーを作る"""
+    key = f"{lookback_months}|{'|'.join(feature_names)}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+
+
+def build_reference_profile(X: np.ndarray) -> Dict[str, Any]:
+    """ドリフト判定用に学習時の特徴量分布（分位ビンと各ビンの構成比）を保存する"""
+    X = np.asarray(X, dtype=float)
+    edges, proportions = [], []
+    for j in range(X.shape[1]):
+        col = X[:, j]
+        inner = np.unique(np.quantile(col, np.linspace(0, 1, DRIFT_BINS + 1)[1:-1]))
+        counts = np.bincount(np.searchsorted(inner, col, side='right'), minlength=len(inner) + 1)
+        edges.append(inner.tolist())
+        proportions.append((counts / max(len(col), 1)).tolist())
+    return {'n_samples': int(X.shape[0]), 'edges': edges, 'proportions': proportions}
+
+
+def feature_drift(reference: Dict[str, Any], X: np.ndarray) -> Tuple[float, np.ndarray]:
+    """
+    学習時分布に対する PSI (Population Stability Index) を特徴量ごとに計算する。
+
+    スタッフ数が数十名規模だと同一分布でも PSI が大きく出るため、
+    期待値 ``(k-1)(1/n_ref + 1/n_new)`` を差し引いた値を使う。
+    戻り値は (特徴量平均 PSI, 特徴量ごとの PSI)。
+    """
+    X = np.asarray(X, dtype=float)
+    n_ref, n_new = reference['n_samples'], X.shape[0]
+    if n_new == 0 or n_ref == 0:
+        return float('inf'), np.array([])
+
+    psi = np.zeros(X.shape[1])
+    for j, (inner, expected) in enumerate(zip(reference['edges'], reference['proportions'])):
+        inner = np.asarray(inner, dtype=float)
+        expected = np.clip(np.asarray(expected, dtype=float), _PSI_EPS, None)
+        counts = np.bincount(np.searchsorted(inner, X[:, j], side='right'), minlength=len(inner) + 1)
+        actual = np.clip(counts / n_new, _PSI_EPS, None)
+        raw = np.sum((actual - expected) * np.log(actual / expected))
+        bias = (len(expected) - 1) * (1.0 / n_ref + 1.0 / n_new)
+        psi[j] = max(raw - bias, 0.0)
+    return float(psi.mean()) if len(psi) else 0.0, psi
+
+
+class TurnoverModelRegistry:
+    """
+    学習済み離職予測モデルのバージョン管理。
+
+    ``<root>/registry.json`` に各バージョンのスキーマハッシュ・モデル種別・
+    ファイルの SHA-256 を記録し、本体は ``turnover_v<NNNN>.pkl`` に保存する。
+    読み込み時は SHA-256 を照合し、レジストリ外で書き換えられたファイルは使わない。
+    unpickle は ``MODEL_PICKLE_MODULES`` のクラスだけを解決する制限付きで行う。
+    保存はロック (``registry.lock``、POSIX では flock でプロセス間も排他) の下で
+    索引を読み直して追記し、一時ファイル + ``os.replace`` で置き換える。
+    """
+
+    INDEX_FILE = "registry.json"
+    LOCK_FILE = "registry.lock"
+    _thread_lock = threading.Lock()
+
+    def __init__(self, root: Union[str, Path] = DEFAULT_REGISTRY_DIR, keep_versions: int = 5):
+        self.root = Path(root)
+        self.keep_versions = keep_versions
+
+    @contextmanager
+    def _locked(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        with self._thread_lock, open(self.root / self.LOCK_FILE, 'a+b') as lock_fp:
+            if _HAS_FCNTL:
+                fcntl.flock(lock_fp.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if _HAS_FCNTL:
+                    fcntl.flock(lock_fp.fileno(), fcntl.LOCK_UN)
+
+    def _atomic_write(self, name: str, data: bytes) -> None:
+        tmp = self.root / f".{name}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            tmp.write_bytes(data)
+            os.replace(tmp, self.root / name)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    # ---- index ------------------------------------------------------------
+    def _read_index(self) -> List[Dict[str, Any]]:
+        index_fp = self.root / self.INDEX_FILE
+        if not index_fp.exists():
+            return []
+        try:
+            return json.loads(index_fp.read_text(encoding='utf-8')).get('versions', [])
+        except Exception as e:
+            log.warning(f"[TurnoverModelRegistry] Failed to read {index_fp}: {e}")
+            return []
+
+    def _write_index(self, versions: List[Dict[str, Any]]) -> None:
+        self._atomic_write(
+            self.INDEX_FILE,
+            json.dumps({'versions': versions}, ensure_ascii=False, indent=2, default=str).encode('utf-8'),
+        )
+
+    def versions(self) -> List[Dict[str, Any]]:
+        return self._read_index()
+
+    def latest(self, schema_hash: str, model_type: str) -> Optional[Dict[str, Any]]:
+        """スキーマとモデル種別が一致する最新バージョンのエントリ"""
+        matches = [
+            v for v in self._read_index()
+            if v.get('schema_hash') == schema_hash and v.get('model_type') == model_type
+        ]
+        return max(matches, key=lambda v: v['version']) if matches else None
+
+    # ---- save / load ------------------------------------------------------
+    def save(self, artifact: Dict[str, Any], *, schema_hash: str, model_type: str,
+             n_samples: int, training_results: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """新しいバージョンとして保存してエントリを返す。書き込めなければ None"""
+        try:
+            with self._locked():
+                return self._save_locked(artifact, schema_hash, model_type, n_samples, training_results)
+        except OSError as e:
+            log.warning(f"[TurnoverModelRegistry] Failed to save model to {self.root}: {e}")
+            return None
+
+    def _save_locked(self, artifact: Dict[str, Any], schema_hash: str, model_type: str,
+                     n_samples: int, training_results: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        versions = self._read_index()
+        version = max((v['version'] for v in versions), default=0) + 1
+
+        payload = pickle.dumps({**artifact, 'version': version, 'schema_hash': schema_hash})
+        file_name = f"turnover_v{version:04d}.pkl"
+        self._atomic_write(file_name, payload)
+
+        entry = {
+            'version': version,
+            'file': file_name,
+            'sha256': hashlib.sha256(payload).hexdigest(),
+            'schema_hash': schema_hash,
+            'model_type': model_type,
+            'n_samples': n_samples,
+            'auc': {k: round(float(r.get('auc', 0.0)), 4) for k, r in (training_results or {}).items()},
+            'created': dt.datetime.now().isoformat(timespec='seconds'),
+        }
+        versions.append(entry)
+
+        # 古いバージョンを間引く
+        versions.sort(key=lambda v: v['version'])
+        while len(versions) > self.keep_versions:
+            old = versions.pop(0)
+            (self.root / old['file']).unlink(missing_ok=True)
+
+        self._write_index(versions)
+        log.info(f"[TurnoverModelRegistry] Saved v{version} ({schema_hash}) → {self.root / file_name}")
+        return entry
+
+    def load(self, entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        fp = self.root / entry['file']
+        if not fp.exists():
+            return None
+        payload = fp.read_bytes()
+        if hashlib.sha256(payload).hexdigest() != entry.get('sha256'):
+            log.warning(f"[TurnoverModelRegistry] Checksum mismatch, ignoring {fp}")
+            return None
+        try:
+            return safe_pickle_loads(payload, allowed_modules=MODEL_PICKLE_MODULES)
+        except Exception as e:
+            log.warning(f"[TurnoverModelRegistry] Failed to load {fp}: {e}")
+            return None
 
 
 class TurnoverPredictionEngine:
@@ -406,7 +515,9 @@ class TurnoverPredictionEngine:
         Parameters
         ----------
         model_type : str, default 'ensemble'
-            使用するモデルタイプ ('logistic', 'random_forest', 'xgboost', 'ensemble')
+            使用するモデルタイプ ('logistic', 'random_forest', 'xgboost', 'lightgbm',
+            'gradient_boosting', 'ensemble')。XGBoost / LightGBM が未導入の場合は
+            NumPy のヒストグラム型勾配ブースティングで代替する
         lookback_months : int, default 6
             過去何ヶ月分のデータを使って予測するか
         enable_early_warning : bool, default True
@@ -425,6 +536,11 @@ class TurnoverPredictionEngine:
         self.models: Dict[str, Any] = {}
         self.scalers: Dict[str, StandardScaler] = {}
         self.feature_importance: Dict[str, float] = {}
+        # 推論時に学習時と同じ列構成・カテゴリ符号を再現するための状態
+        self.feature_names: List[str] = []
+        self.category_maps: Dict[str, Dict[str, int]] = {}
+        self.reference_profile: Optional[Dict[str, Any]] = None
+        self.model_version: Optional[int] = None
         self.risk_thresholds: Dict[str, float] = {
             'low': 0.3,
             'medium': 0.6,
@@ -440,11 +556,10 @@ class TurnoverPredictionEngine:
         # 現在の日付を基準とする
         current_date = pd.Timestamp.now()
         
-        for staff in long_df['staff'].unique():
-            staff_df = long_df[long_df['staff'] == staff].copy()
-            
+        for staff, staff_df in staff_partition(long_df).items():
             if len(staff_df) < 10:  # 最小限のデータ量チェック
                 continue
+            staff_df = staff_df.copy()
             
             # 時系列データの準備
             staff_df['date'] = pd.to_datetime(staff_df['ds'])
@@ -682,37 +797,48 @@ class TurnoverPredictionEngine:
         
         return features_df
     
-    def prepare_model_data(self, features_df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, List[str]]:
-        """機械学習用データの準備"""
+    def prepare_model_data(self, features_df: pd.DataFrame,
+                           refit: bool = True) -> Tuple[np.ndarray, Optional[np.ndarray], List[str]]:
+        """
+        機械学習用データの準備
+
+        ``refit=False`` のときは学習時に保存したカテゴリ符号と特徴量列を再利用する
+        （未知カテゴリは -1、欠けた列は 0）。ラベル列が無い場合 y は None。
+        """
         # カテゴリカル変数のエンコーディング
         df_model = features_df.copy()
+        reuse = not refit and bool(self.feature_names)
         
-        # カテゴリカル特徴量のエンコーディング
-        categorical_features = ['age_group', 'employment_type', 'department']
-        
-        for feature in categorical_features:
+        # カテゴリカル特徴量のエンコーディング（LabelEncoder と同じくソート順で採番）
+        for feature in CATEGORICAL_FEATURES:
             if feature in df_model.columns:
-                le = LabelEncoder()
-                df_model[feature + '_encoded'] = le.fit_transform(df_model[feature].astype(str))
-        
-        # 特徴量の選択
-        feature_columns = [
-            'avg_total_hours', 'std_total_hours', 'avg_work_days',
-            'avg_hours_variance', 'avg_start_time_variance', 'avg_night_ratio',
-            'avg_weekend_ratio', 'avg_task_diversity', 'max_consecutive_days',
-            'avg_rest_ratio', 'hours_trend', 'variance_trend', 'night_trend',
-            'work_consistency', 'schedule_stability', 'tenure_months'
-        ]
-        
-        # エンコードされたカテゴリカル特徴量を追加
-        encoded_features = [col for col in df_model.columns if col.endswith('_encoded')]
-        feature_columns.extend(encoded_features)
-        
-        # 実際に存在する特徴量のみを使用
-        available_features = [col for col in feature_columns if col in df_model.columns]
+                values = df_model[feature].astype(str)
+                if not reuse or feature not in self.category_maps:
+                    self.category_maps[feature] = {v: i for i, v in enumerate(sorted(values.unique()))}
+                df_model[feature + '_encoded'] = values.map(self.category_maps[feature]).fillna(-1).astype(int)
+        
+        if reuse:
+            available_features = list(self.feature_names)
+            X = df_model.reindex(columns=available_features, fill_value=0).fillna(0).values
+        else:
+            # 特徴量の選択
+            feature_columns = [
+                'avg_total_hours', 'std_total_hours', 'avg_work_days',
+                'avg_hours_variance', 'avg_start_time_variance', 'avg_night_ratio',
+                'avg_weekend_ratio', 'avg_task_diversity', 'max_consecutive_days',
+                'avg_rest_ratio', 'hours_trend', 'variance_trend', 'night_trend',
+                'work_consistency', 'schedule_stability', 'tenure_months'
+            ]
+            
+            # エンコードされたカテゴリカル特徴量を追加
+            encoded_features = [col for col in df_model.columns if col.endswith('_encoded')]
+            feature_columns.extend(encoded_features)
+            
+            # 実際に存在する特徴量のみを使用
+            available_features = [col for col in feature_columns if col in df_model.columns]
+            X = df_model[available_features].fillna(0).values
         
-        X = df_model[available_features].fillna(0).values
-        y = df_model['will_turnover'].values
+        y = df_model['will_turnover'].values if 'will_turnover' in df_model.columns else None
         
         return X, y, available_features
     
@@ -737,6 +863,8 @@ class TurnoverPredictionEngine:
         X_test_scaled = scaler.transform(X_test)
         
         self.scalers['main'] = scaler
+        self.feature_names = list(feature_names)
+        self.reference_profile = build_reference_profile(X)
         
         results = {}
         
@@ -810,6 +938,33 @@ class TurnoverPredictionEngine:
             }
             log.info(f"[TurnoverPredictionEngine] LightGBM AUC: {lgb_auc:.4f}")
         
+        # 5. ヒストグラム型勾配ブースティング（NumPy 実装）
+        #    XGBoost / LightGBM が指定されたのに未導入の場合もこちらで代替する
+        boosting_missing = (
+            (self.model_type == 'xgboost' and not XGBOOST_AVAILABLE)
+            or (self.model_type == 'lightgbm' and not LIGHTGBM_AVAILABLE)
+            or (self.model_type == 'ensemble' and not (XGBOOST_AVAILABLE or LIGHTGBM_AVAILABLE))
+        )
+        if self.model_type == 'gradient_boosting' or boosting_missing:
+            gb_model = HistGradientBoostingClassifier(
+                n_estimators=200,
+                max_depth=6,
+                learning_rate=0.1,
+                min_samples_leaf=min(20, max(1, len(X_train) // 20)),
+                random_state=42
+            )
+            gb_model.fit(X_train, y_train)
+            
+            gb_pred_proba = gb_model.predict_proba(X_test)[:, 1]
+            gb_auc = roc_auc_score(y_test, gb_pred_proba) if len(np.unique(y_test)) > 1 else 0.5
+            
+            self.models['gradient_boosting'] = gb_model
+            results['gradient_boosting'] = {
+                'auc': gb_auc,
+                'feature_importance': dict(zip(feature_names, gb_model.feature_importances_))
+            }
+            log.info(f"[TurnoverPredictionEngine] Histogram GBM AUC: {gb_auc:.4f}")
+        
         # アンサンブルモデル
         if self.model_type == 'ensemble' and len(self.models) > 1:
             # 各モデルの予測を平均
@@ -833,58 +988,134 @@ class TurnoverPredictionEngine:
         return results
     
     def predict_turnover_risk(self, features_df: pd.DataFrame) -> pd.DataFrame:
-        """離職リスクの予測"""
+        """離職リスクの予測（全スタッフを各モデル 1 回の predict_proba でまとめて推論）"""
         if not self.models:
             log.warning("[TurnoverPredictionEngine] No trained models available")
             return pd.DataFrame()
         
-        # データ準備
-        X, _, feature_names = self.prepare_model_data(features_df)
-        
-        predictions = []
-        
-        for idx, (_, row) in enumerate(features_df.iterrows()):
-            staff = row['staff']
-            
-            # 各モデルの予測
-            model_predictions = {}
-            
-            for model_name, model in self.models.items():
-                if model_name == 'logistic':
-                    X_scaled = self.scalers['main'].transform([X[idx]])
-                    pred_proba = model.predict_proba(X_scaled)[0, 1]
-                else:
-                    pred_proba = model.predict_proba([X[idx]])[0, 1]
-                
-                model_predictions[model_name] = pred_proba
-            
-            # アンサンブル予測
-            if len(model_predictions) > 1:
-                ensemble_pred = np.mean(list(model_predictions.values()))
-            else:
-                ensemble_pred = list(model_predictions.values())[0]
-            
-            # リスクレベルの判定
-            if ensemble_pred >= self.risk_thresholds['high']:
-                risk_level = 'high'
-            elif ensemble_pred >= self.risk_thresholds['medium']:
-                risk_level = 'medium'
-            elif ensemble_pred >= self.risk_thresholds['low']:
-                risk_level = 'low'
-            else:
-                risk_level = 'very_low'
-            
-            prediction_result = {
-                'staff': staff,
-                'turnover_probability': ensemble_pred,
-                'risk_level': risk_level,
-                'prediction_date': dt.datetime.now().strftime('%Y-%m-%d'),
-                **{f'{model}_prob': prob for model, prob in model_predictions.items()}
-            }
-            
-            predictions.append(prediction_result)
+        # データ準備（学習時の列構成・カテゴリ符号を再利用）
+        X, _, _ = self.prepare_model_data(features_df, refit=False)
+        
+        # 各モデルの予測
+        model_predictions: Dict[str, np.ndarray] = {}
+        for model_name, model in self.models.items():
+            X_in = self.scalers['main'].transform(X) if model_name == 'logistic' else X
+            model_predictions[model_name] = model.predict_proba(X_in)[:, 1]
+        
+        # アンサンブル予測
+        ensemble_pred = np.mean(np.column_stack(list(model_predictions.values())), axis=1)
+        
+        # リスクレベルの判定
+        risk_level = np.select(
+            [
+                ensemble_pred >= self.risk_thresholds['high'],
+                ensemble_pred >= self.risk_thresholds['medium'],
+                ensemble_pred >= self.risk_thresholds['low'],
+            ],
+            ['high', 'medium', 'low'],
+            default='very_low',
+        )
+        
+        return pd.DataFrame({
+            'staff': features_df['staff'].values,
+            'turnover_probability': ensemble_pred,
+            'risk_level': risk_level,
+            'prediction_date': dt.datetime.now().strftime('%Y-%m-%d'),
+            **{f'{model}_prob': prob for model, prob in model_predictions.items()}
+        })
+    
+    # ------------------------------------------------------------------
+    # レジストリ連携
+    # ------------------------------------------------------------------
+    def schema_hash(self, feature_names: Optional[List[str]] = None) -> str:
+        return feature_schema_hash(list(feature_names or self.feature_names), self.lookback_months)
+    
+    def to_artifact(self) -> Dict[str, Any]:
+        """レジストリに保存する推論用の状態"""
+        return {
+            'model_type': self.model_type,
+            'lookback_months': self.lookback_months,
+            'slot_minutes': self.slot_minutes,
+            'models': self.models,
+            'scalers': self.scalers,
+            'feature_names': self.feature_names,
+            'category_maps': self.category_maps,
+            'feature_importance': self.feature_importance,
+            'risk_thresholds': self.risk_thresholds,
+            'reference_profile': self.reference_profile,
+        }
+    
+    def load_artifact(self, artifact: Dict[str, Any]) -> None:
+        self.models = artifact['models']
+        self.scalers = artifact['scalers']
+        self.feature_names = list(artifact['feature_names'])
+        self.category_maps = artifact.get('category_maps', {})
+        self.feature_importance = artifact.get('feature_importance', {})
+        self.risk_thresholds = artifact.get('risk_thresholds', self.risk_thresholds)
+        self.reference_profile = artifact.get('reference_profile')
+        self.model_version = artifact.get('version')
+    
+    def score_or_train(
+        self,
+        features_df: pd.DataFrame,
+        *,
+        registry: Optional[TurnoverModelRegistry] = None,
+        drift_threshold: float = DEFAULT_DRIFT_THRESHOLD,
+        retrain: bool = False,
+    ) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+        """
+        レジストリの学習済みモデルで推論し、必要なときだけ再学習する。
+
+        再学習するのは (1) スキーマが一致するモデルが無い、(2) ``retrain=True``、
+        (3) 学習時分布からのドリフトが ``drift_threshold`` を超えた場合のみ。
+        戻り値は (予測結果, 実行情報)。実行情報には ``action``（'scored' / 'trained'）、
+        ``model_version``、``drift``、``training_results`` が入る。
+        """
+        registry = registry or TurnoverModelRegistry()
+        info: Dict[str, Any] = {'action': 'scored', 'drift': None, 'training_results': {},
+                                'model_version': None}
+        if features_df.empty:
+            return pd.DataFrame(), info
+        
+        # 推論時の特徴量構成を確定してスキーマを照合
+        _, _, candidate_features = self.prepare_model_data(features_df)
+        schema = self.schema_hash(candidate_features)
+        info['schema_hash'] = schema
+        
+        entry = None if retrain else registry.latest(schema, self.model_type)
+        artifact = registry.load(entry) if entry else None
+        if artifact is not None:
+            self.load_artifact(artifact)
+            X, _, _ = self.prepare_model_data(features_df, refit=False)
+            if self.reference_profile is not None:
+                drift, per_feature = feature_drift(self.reference_profile, X)
+                info['drift'] = drift
+                if drift > drift_threshold:
+                    top = np.argsort(per_feature)[::-1][:3]
+                    info['drifted_features'] = {
+                        self.feature_names[i]: round(float(per_feature[i]), 4) for i in top
+                    }
+                    log.info(f"[TurnoverPredictionEngine] Feature drift {drift:.3f} > {drift_threshold} "
+                             f"– retraining (v{self.model_version})")
+                    artifact = None
+        
+        if artifact is None:
+            info['action'] = 'trained'
+            labeled = self.generate_synthetic_labels(features_df.copy())
+            X, y, feature_names = self.prepare_model_data(labeled)
+            self.models, self.scalers = {}, {}
+            info['training_results'] = self.train_models(X, y, feature_names)
+            entry = registry.save(
+                self.to_artifact(),
+                schema_hash=self.schema_hash(),
+                model_type=self.model_type,
+                n_samples=len(X),
+                training_results=info['training_results'],
+            )
+            self.model_version = entry['version'] if entry else None
         
-        return pd.DataFrame(predictions)
+        info['model_version'] = self.model_version
+        return self.predict_turnover_risk(features_df), info
     
     def generate_risk_alerts(self, predictions_df: pd.DataFrame) -> List[Dict[str, Any]]:
         """離職リスクアラートの生成"""
@@ -983,7 +1214,10 @@ def predict_staff_turnover(
     *,
     model_type: str = 'ensemble',
     lookback_months: int = 6,
-    staff_metadata: Optional[pd.DataFrame] = None
+    staff_metadata: Optional[pd.DataFrame] = None,
+    registry_dir: Union[str, Path] = DEFAULT_REGISTRY_DIR,
+    drift_threshold: float = DEFAULT_DRIFT_THRESHOLD,
+    retrain: bool = False
 ) -> Path:
     """
     スタッフの離職リスク予測を実行
@@ -1000,6 +1234,12 @@ def predict_staff_turnover(
         分析対象期間（月数）
     staff_metadata : pd.DataFrame, optional
         スタッフメタデータ（年齢、雇用形態等）
+    registry_dir : Path, default ``MODEL_DIR / "turnover" / "registry"`` (``constants.DATA_DIR`` 配下)
+        学習済みモデルの保存先。スキーマが一致するモデルがあれば再学習しない
+    drift_threshold : float, default 0.2
+        特徴量分布のドリフト（平均 PSI）がこれを超えたら再学習する
+    retrain : bool, default False
+        True のとき保存済みモデルを使わず必ず再学習する
     
     Returns
     -------
@@ -1021,17 +1261,14 @@ def predict_staff_turnover(
         log.warning("[predict_staff_turnover] No features extracted")
         return output_path
     
-    # 合成ラベルの生成（実際の離職データがない場合）
-    features_with_labels = engine.generate_synthetic_labels(features_df)
-    
-    # モデル用データの準備
-    X, y, feature_names = engine.prepare_model_data(features_with_labels)
-    
-    # モデル訓練
-    training_results = engine.train_models(X, y, feature_names)
-    
-    # 離職リスク予測
-    predictions_df = engine.predict_turnover_risk(features_with_labels)
+    # 保存済みモデルで推論（未登録・ドリフト時のみ合成ラベルで再学習）
+    predictions_df, run_info = engine.score_or_train(
+        features_df,
+        registry=TurnoverModelRegistry(registry_dir),
+        drift_threshold=drift_threshold,
+        retrain=retrain,
+    )
+    training_results = run_info['training_results']
     
     # アラート生成
     alerts = engine.generate_risk_alerts(predictions_df)
@@ -1049,6 +1286,9 @@ def predict_staff_turnover(
         model_type=model_type,
         lookback_months=lookback_months,
         training_results=training_results,
+        model_action=run_info['action'],
+        model_version=run_info['model_version'],
+        feature_drift=run_info['drift'],
         feature_importance=engine.feature_importance,
         alerts_count=len(alerts),
         critical_alerts=[a for a in alerts if a['level'] == 'critical'],
@@ -1067,4 +1307,10 @@ def predict_staff_turnover(
     return output_path
 
 
-__all__ = ['TurnoverPredictionEngine', 'predict_staff_turnover']
\ No newline at end of file
+__all__ = [
+    'TurnoverPredictionEngine',
+    'TurnoverModelRegistry',
+    'feature_drift',
+    'feature_schema_hash',
+    'predict_staff_turnover',
+]
\ No newline at end of file
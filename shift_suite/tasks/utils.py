@@ -15,6 +15,14 @@ shift_suite.tasks.utils  v1.3.0 – 動的スロット対応版
 * 2025-07-29
     - 動的スロット対応: validate_and_convert_slot_minutes追加
     - 全体最適化対応: 統一された設定検証機能
+* v1.4.0
+    - _parse_as_date の文字列パース結果をメモ化し、列ラベル → 日付の
+      解決は date_columns() に集約 (列タプル単位でもメモ化)
+    - save_df_parquet は日付列の型付き日付軸を parquet メタデータに保存し、
+      read_df_parquet で読み込み時にリゾルバへ登録する
+* v1.4.1
+    - safe_pickle_load / safe_pickle_loads: 許可したモジュールのクラスと
+      numpy / pandas の復元用関数だけを解決する制限付き unpickle
 """
 
 from __future__ import annotations
@@ -22,7 +30,9 @@ from __future__ import annotations
 import datetime as dt  #  dt エイリアスも明示的にインポート (他モジュールとの互換性のため)
 import json
 import logging
+import io
 import math
+import pickle
 import re
 import shutil
 import tempfile
@@ -32,7 +42,8 @@ from datetime import (
     timedelta,
 )  #  dt エイリアスではなく datetime, timedelta を直接使用
 from pathlib import Path
-from typing import Any, Dict, Sequence
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
 
 import numpy as np
 import pandas as pd
@@ -291,13 +302,50 @@ def save_df_parquet(
     *,
     index: bool = True,
 ) -> Path:
-    """Save DataFrame to Parquet file."""
+    """
+    Save DataFrame to Parquet file.
+
+    日付ラベルの列がある場合は ``{列名: ISO 日付}`` を parquet メタデータ
+    (``DATE_AXIS_META_KEY``) に保存し、読み込み側で再パースしなくて済むようにする。
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
     fp_path = Path(fp)
     fp_path.parent.mkdir(parents=True, exist_ok=True)
-    df.to_parquet(fp_path, index=index)
+    table = pa.Table.from_pandas(df, preserve_index=index)
+    axis = date_columns(df.columns)
+    if axis:
+        axis_json = json.dumps({str(c): d.isoformat() for c, d in axis.items()}, ensure_ascii=False)
+        table = table.replace_schema_metadata(
+            {**(table.schema.metadata or {}), DATE_AXIS_META_KEY: axis_json.encode("utf-8")}
+        )
+    pq.write_table(table, fp_path)
     return fp_path
 
 
+def read_date_axis(fp: Path | str) -> Dict[str, dt.date]:
+    """parquet メタデータの日付軸 (無ければ空 dict)。取得した対応はリゾルバに登録する"""
+    import pyarrow.parquet as pq
+
+    raw = (pq.read_schema(fp).metadata or {}).get(DATE_AXIS_META_KEY)
+    if not raw:
+        return {}
+    axis = {c: dt.date.fromisoformat(d) for c, d in json.loads(raw).items()}
+    register_date_labels(axis)
+    return axis
+
+
+def read_df_parquet(fp: Path | str, **kwargs) -> DataFrame:
+    """``pd.read_parquet`` + 日付軸メタデータのリゾルバ登録"""
+    df = pd.read_parquet(fp, **kwargs)
+    try:
+        read_date_axis(fp)
+    except Exception as e:  # noqa: BLE001 - メタデータが無くても読み込み自体は成功させる
+        log.debug(f"[utils] date axis metadata unavailable for {fp}: {e}")
+    return df
+
+
 # ────────────────── 5. メタファイル ──────────────────
 def write_meta(target: Path | str, /, **meta) -> Path:
     """
@@ -428,8 +476,63 @@ def calculate_jain_index(values: pd.Series) -> float:
 
 
 # 追加箇所: _parse_as_date 関数の定義 (build_stats.py から移設)
+# 文字列ラベル → 日付 のメモ (read_date_axis で保存済みの日付軸も登録される)
+DATE_AXIS_META_KEY = b"shift_suite.date_axis"
+_DATE_LABEL_CACHE: Dict[str, dt.date | None] = {}
+_DATE_LABEL_CACHE_MAX = 100_000
+_SUMMARY5_LOWER = frozenset(s.lower() for s in SUMMARY5)
+
+
+def register_date_labels(mapping: Dict[str, dt.date]) -> None:
+    """既知の ラベル → 日付 をリゾルバに登録する"""
+    if len(_DATE_LABEL_CACHE) + len(mapping) > _DATE_LABEL_CACHE_MAX:
+        _DATE_LABEL_CACHE.clear()
+    _DATE_LABEL_CACHE.update(mapping)
+
+
 def _parse_as_date(column_name: Any) -> dt.date | None:
-    """列名を日付オブジェクトにパース試行。失敗時は None"""
+    """列名を日付オブジェクトにパース試行。失敗時は None (文字列はメモ化)"""
+    if isinstance(column_name, str):
+        try:
+            return _DATE_LABEL_CACHE[column_name]
+        except KeyError:
+            pass
+        result = _parse_date_label_uncached(column_name)
+        if len(_DATE_LABEL_CACHE) >= _DATE_LABEL_CACHE_MAX:
+            _DATE_LABEL_CACHE.clear()
+        _DATE_LABEL_CACHE[column_name] = result
+        return result
+    return _parse_date_label_uncached(column_name)
+
+
+@lru_cache(maxsize=256)
+def _date_columns_cached(columns: tuple) -> Dict[Any, dt.date]:
+    out: Dict[Any, dt.date] = {}
+    for c in columns:
+        if c in SUMMARY5:
+            continue
+        d = _parse_as_date(str(c))
+        if d is not None:
+            out[c] = d
+    return out
+
+
+def date_columns(columns: Iterable) -> Dict[Any, dt.date]:
+    """
+    列ラベル → 日付 の対応 (日付として解釈できる列のみ、元の順序)。
+
+    heat / need / shortage の横持ち表の日付列はこの関数で解決する。
+    同じ列構成に対する結果はメモ化されるため、呼び出し側で保持しなくてよい。
+    返り値は共有されるため変更しないこと。
+    """
+    cols = tuple(columns)
+    try:
+        return _date_columns_cached(cols)
+    except TypeError:  # ハッシュ不能なラベルが混在
+        return _date_columns_cached.__wrapped__(cols)
+
+
+def _parse_date_label_uncached(column_name: Any) -> dt.date | None:
     # 🔍 【追加】パース過程のデバッグログ（必要に応じて有効化）
     # log.debug(f"[DATE_PARSE] パース試行: '{column_name}' (型: {type(column_name)})")
 
@@ -442,7 +545,7 @@ def _parse_as_date(column_name: Any) -> dt.date | None:
         else:
             result = column_name
     elif isinstance(column_name, str):
-        if column_name.lower() in [s.lower() for s in SUMMARY5]:
+        if column_name.lower() in _SUMMARY5_LOWER:
             result = None
         else:
             m = re.search(r"(\d{4}-\d{1,2}-\d{1,2})", column_name)
@@ -552,7 +655,74 @@ def _valid_df(df: pd.DataFrame) -> bool:
     return isinstance(df, pd.DataFrame) and not df.empty
 
 
-# ────────────────── 10. Public Re-export ──────────────────
+# ────────────────── 10. Restricted Unpickling ──────────────────
+# クラスはモジュール接頭辞で、関数は numpy / pandas の復元用ヘルパーだけを許可する
+_SAFE_PICKLE_MODULES = ("numpy", "pandas")
+_SAFE_PICKLE_GLOBALS = {
+    ("builtins", name) for name in (
+        "bool", "bytearray", "bytes", "complex", "dict", "float", "frozenset",
+        "int", "list", "range", "set", "slice", "str", "tuple",
+    )
+} | {
+    ("collections", "Counter"), ("collections", "OrderedDict"),
+    ("collections", "defaultdict"), ("collections", "deque"),
+    ("copyreg", "_reconstructor"),
+    ("datetime", "date"), ("datetime", "datetime"), ("datetime", "time"),
+    ("datetime", "timedelta"), ("datetime", "timezone"),
+    ("decimal", "Decimal"), ("zoneinfo", "ZoneInfo"),
+    ("pytz", "_p"), ("pytz", "_UTC"),
+}
+_SAFE_PICKLE_HELPER = re.compile(r"^(_reconstruct|scalar|_frombuffer|NA|NaT|_new_\w+|\w*unpickle\w*)$")
+
+
+def _module_allowed(module: str, prefixes: Iterable[str]) -> bool:
+    return any(module == p or module.startswith(p + ".") for p in prefixes)
+
+
+class _RestrictedUnpickler(pickle.Unpickler):
+    def __init__(self, file, allowed_modules: Iterable[str] = (), allowed_classes: Iterable[Tuple[str, str]] = ()):
+        super().__init__(file)
+        self._prefixes = tuple(_SAFE_PICKLE_MODULES) + tuple(allowed_modules)
+        self._globals = _SAFE_PICKLE_GLOBALS | set(allowed_classes or ())
+
+    def find_class(self, module: str, name: str) -> Any:
+        if (module, name) in self._globals:
+            return super().find_class(module, name)
+        if _module_allowed(module, self._prefixes):
+            obj = super().find_class(module, name)
+            # 再エクスポートされた外部モジュールのクラス (subprocess.Popen 等) は通さない
+            if isinstance(obj, type) and _module_allowed(obj.__module__, self._prefixes):
+                return obj
+            if not isinstance(obj, type) and _SAFE_PICKLE_HELPER.match(name):
+                return obj
+        raise pickle.UnpicklingError(f"Unsafe class: {module}.{name}")
+
+
+def safe_pickle_loads(
+    data: bytes,
+    allowed_classes: Optional[Iterable[Tuple[str, str]]] = None,
+    *,
+    allowed_modules: Iterable[str] = (),
+) -> Any:
+    """
+    制限付き unpickle。numpy / pandas / 標準の値型に加えて、``allowed_modules``
+    (モジュール接頭辞) で定義されたクラスと ``allowed_classes`` の (モジュール, 名前) だけを解決する。
+    """
+    return _RestrictedUnpickler(io.BytesIO(data), allowed_modules, allowed_classes or ()).load()
+
+
+def safe_pickle_load(
+    file_path: Path | str,
+    allowed_classes: Optional[Iterable[Tuple[str, str]]] = None,
+    *,
+    allowed_modules: Iterable[str] = (),
+) -> Any:
+    """``safe_pickle_loads`` のファイル版"""
+    with open(file_path, "rb") as f:
+        return _RestrictedUnpickler(f, allowed_modules, allowed_classes or ()).load()
+
+
+# ────────────────── 11. Public Re-export ──────────────────
 __all__: Sequence[str] = [
     "log",
     "excel_date",
@@ -562,13 +732,19 @@ __all__: Sequence[str] = [
     "safe_read_excel",
     "save_df_xlsx",
     "save_df_parquet",
+    "read_df_parquet",
+    "read_date_axis",
     "write_meta",
     "safe_make_archive",
     "derive_min_staff",
     "derive_max_staff",
     "calculate_jain_index",
     "_parse_as_date",  # 追加
+    "date_columns",
+    "register_date_labels",
     "_valid_df",       # 統合追加
+    "safe_pickle_load",
+    "safe_pickle_loads",
     "date_with_weekday",
     "validate_need_calculation",
     "log_need_calculation_summary",
@@ -0,0 +1,236 @@
+"""
+shift_suite.tasks.workbook_cache v1.0.0 – 解析済みワークブックのキャッシュ
+────────────────────────────────────────────────────────────────
+* インポートウィザード・期間推定・プレビュー・ingest_excel が同じ Excel を
+  何度も ``pd.read_excel`` していたため、シートごとのセルグリッドを一度だけ
+  openpyxl (read_only) で読み込み、ファイルハッシュをキーに保持する。
+* ``ParsedWorkbook.read_sheet`` は ``pd.read_excel`` と同じ変換規則
+  (数値セルの int 化・末尾空行/空列の除去・TextParser による型推論) で
+  DataFrame を組み立てるため、呼び出し側は引数をそのまま移せる。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+from .utils import log
+
+MAX_CACHED_WORKBOOKS = 4
+MAX_CACHED_DIGESTS = 256
+_HASH_CHUNK_BYTES = 1 << 20
+
+_Row = List[Any]
+
+
+def file_digest(path: Path | str) -> str:
+    """ファイル内容の SHA-256 (キャッシュキー)"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_BYTES), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _convert_cell(cell) -> Any:
+    """pandas の openpyxl リーダーと同じセル値変換"""
+    from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+
+    value = cell.value
+    if value is None:
+        return ""
+    if cell.data_type == TYPE_ERROR:
+        return np.nan
+    if cell.data_type == TYPE_NUMERIC:
+        as_int = int(value)
+        if as_int == value:
+            return as_int
+        return float(value)
+    return value
+
+
+def _rows_needed(header: int | None, skiprows: int | None, nrows: int | None) -> int | None:
+    """``nrows`` 指定時に pandas がファイルから読む行数 (BaseExcelReader._calc_rows 相当)"""
+    if nrows is None:
+        return None
+    header_rows = 1 if header is None else 1 + header
+    if skiprows is None:
+        return header_rows + nrows
+    if isinstance(skiprows, int):
+        return header_rows + nrows + skiprows
+    return None
+
+
+class ParsedWorkbook:
+    """
+    1 つの Excel ファイルの解析済みセルグリッド。
+
+    各シートは最初にアクセスされた時点で 1 回だけ読み込まれ、以降の
+    ヘッダー確認・セル参照・プレビュー・全件読み込みはすべてメモリ上の
+    グリッドから返す。
+    """
+
+    def __init__(self, path: Path | str, digest: str | None = None):
+        from openpyxl import load_workbook
+
+        self.path = Path(path)
+        self.digest = digest or file_digest(self.path)
+        book = load_workbook(self.path, read_only=True, data_only=True, keep_links=False)
+        try:
+            self.sheet_names: List[str] = list(book.sheetnames)
+        finally:
+            book.close()
+        self._grids: Dict[str, List[_Row]] = {}
+        self._lock = threading.Lock()
+
+    # ---- grid ---------------------------------------------------------------
+    def _parse_sheet(self, sheet_name: str) -> List[_Row]:
+        from openpyxl import load_workbook
+
+        book = load_workbook(self.path, read_only=True, data_only=True, keep_links=False)
+        try:
+            sheet = book[sheet_name]
+            sheet.reset_dimensions()
+            rows: List[_Row] = []
+            for row in sheet.rows:
+                converted = [_convert_cell(cell) for cell in row]
+                while converted and converted[-1] == "":
+                    converted.pop()
+                rows.append(converted)
+        finally:
+            book.close()
+        log.info(f"[workbook_cache] parsed sheet '{sheet_name}' ({len(rows)} rows) ← {self.path.name}")
+        return rows
+
+    def grid(self, sheet_name: str) -> List[_Row]:
+        """末尾の空セルを除いた生の行リスト (pandas 変換前)"""
+        if sheet_name not in self.sheet_names:
+            raise ValueError(f"Worksheet named '{sheet_name}' not found")
+        with self._lock:
+            if sheet_name not in self._grids:
+                self._grids[sheet_name] = self._parse_sheet(sheet_name)
+            return self._grids[sheet_name]
+
+    def _sheet_data(self, sheet_name: str, rows_needed: int | None) -> List[_Row]:
+        rows = self.grid(sheet_name)
+        if rows_needed is not None:
+            rows = rows[:rows_needed]
+        last = max((i for i, r in enumerate(rows) if r), default=-1)
+        rows = rows[: last + 1]
+        if not rows:
+            return []
+        width = max(len(r) for r in rows)
+        return [r + [""] * (width - len(r)) for r in rows]
+
+    # ---- pandas 互換 API --------------------------------------------------------
+    def read_sheet(
+        self,
+        sheet_name: str,
+        *,
+        header: int | None = 0,
+        nrows: int | None = None,
+        skiprows: int | None = None,
+        usecols: Sequence[int] | None = None,
+        dtype: Any = None,
+        index_col: int | None = None,
+    ) -> pd.DataFrame:
+        """``pd.read_excel(path, sheet_name=..., ...)`` と同じ結果を返す"""
+        data = self._sheet_data(sheet_name, _rows_needed(header, skiprows, nrows))
+        if not data:
+            return pd.DataFrame()
+        try:
+            parser = TextParser(
+                data,
+                header=header,
+                index_col=index_col,
+                dtype=dtype,
+                skiprows=skiprows,
+                nrows=nrows,
+                skip_blank_lines=False,
+                usecols=usecols,
+            )
+            return parser.read(nrows=nrows)
+        except pd.errors.EmptyDataError:
+            return pd.DataFrame()
+
+    def cell(self, sheet_name: str, row: int, col: int) -> Any:
+        """0 始まりの (row, col) のセル値。範囲外は None"""
+        rows = self.grid(sheet_name)
+        if row < len(rows) and col < len(rows[row]):
+            value = rows[row][col]
+            return None if value == "" else value
+        return None
+
+    def cell_text(self, sheet_name: str, row: int, col: int) -> str:
+        """``read_excel(..., header=None, dtype=str)`` で 1 セル読んだ場合と同じ文字列"""
+        df = self.read_sheet(
+            sheet_name, header=None, skiprows=row, nrows=1, usecols=[col], dtype=str
+        )
+        return str(df.iloc[0, 0])
+
+    def preview(self, sheet_name: str, nrows: int = 5, header: int | None = None) -> pd.DataFrame:
+        return self.read_sheet(sheet_name, header=header, nrows=nrows)
+
+
+# ─────────────────────────── cache ───────────────────────────
+_CACHE: "OrderedDict[str, ParsedWorkbook]" = OrderedDict()
+_DIGESTS: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+
+def open_workbook(path: Path | str) -> ParsedWorkbook:
+    """
+    ファイルハッシュをキーにした ``ParsedWorkbook`` を返す。
+
+    同じ内容のファイルは (パスが異なっても) 同じインスタンスを共有する。
+    シートは遅延読み込みのため、共有インスタンスの読み込み元は直近に開いたパスに
+    付け替える (最初のファイルが移動・削除されていても読める)。
+    ハッシュ計算はパス・サイズ・mtime が変わらない限り再実行しない。
+    """
+    p = Path(path)
+    stat = p.stat()  # 存在しない場合は FileNotFoundError
+    stat_key = (str(p.resolve()), stat.st_size, stat.st_mtime_ns)
+    with _CACHE_LOCK:
+        digest = _DIGESTS.get(stat_key)
+    if digest is None:
+        digest = file_digest(p)
+
+    with _CACHE_LOCK:
+        _DIGESTS[stat_key] = digest
+        _DIGESTS.move_to_end(stat_key)
+        while len(_DIGESTS) > MAX_CACHED_DIGESTS:
+            _DIGESTS.popitem(last=False)
+        workbook = _CACHE.get(digest)
+        if workbook is not None:
+            _CACHE.move_to_end(digest)
+            workbook.path = p
+            return workbook
+
+    workbook = ParsedWorkbook(p, digest)
+    with _CACHE_LOCK:
+        workbook = _CACHE.setdefault(digest, workbook)
+        _CACHE.move_to_end(digest)
+        while len(_CACHE) > MAX_CACHED_WORKBOOKS:
+            _CACHE.popitem(last=False)
+    return workbook
+
+
+def clear_workbook_cache() -> None:
+    with _CACHE_LOCK:
+        _CACHE.clear()
+        _DIGESTS.clear()
+
+
+__all__ = [
+    "ParsedWorkbook",
+    "clear_workbook_cache",
+    "file_digest",
+    "open_workbook",
+]